@@ -64,7 +64,8 @@ class MaterialDBWorkbench ( FreeCADGui.Workbench ):
         self._addPreferencePages()
 
         self.appendToolbar(QT_TRANSLATE_NOOP('MaterialDB', 'MaterialDB'),
-                        ['MaterialDB_CreateDatabase', 'MaterialDB_Migrate'])
+                        ['MaterialDB_CreateDatabase', 'MaterialDB_Upgrade', 'MaterialDB_Recompress',
+                         'MaterialDB_Migrate'])
 
     def GetClassName(self):
         return "Gui::PythonWorkbench"
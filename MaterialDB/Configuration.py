@@ -31,3 +31,7 @@ def getPreferencesLocation():
 def getDatabaseName():
     prefs = getPreferencesLocation()
     return FreeCAD.ParamGet(prefs).GetString("Database", "material")
+
+def getConnectionType():
+    prefs = getPreferencesLocation()
+    return FreeCAD.ParamGet(prefs).GetString("Connection", "ODBC")
@@ -0,0 +1,48 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+"""Functions for choosing the database class for the configured connection type"""
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+from MaterialDB.Configuration import getConnectionType
+
+def getDatabase():
+    if getConnectionType() == "SQLite":
+        from MaterialDB.Database.DatabaseSQLite import DatabaseSQLite
+        return DatabaseSQLite()
+    if getConnectionType() == "MySQL":
+        from MaterialDB.Database.DatabaseMySQLNative import DatabaseMySQLNative
+        return DatabaseMySQLNative()
+
+    from MaterialDB.Database.DatabaseMySQL import DatabaseMySQL
+    return DatabaseMySQL()
+
+def getDatabaseCreate():
+    if getConnectionType() == "SQLite":
+        from MaterialDB.Database.DatabaseSQLiteCreate import DatabaseSQLiteCreate
+        return DatabaseSQLiteCreate()
+    if getConnectionType() == "MySQL":
+        from MaterialDB.Database.DatabaseMySQLNativeCreate import DatabaseMySQLNativeCreate
+        return DatabaseMySQLNativeCreate()
+
+    from MaterialDB.Database.DatabaseMySQLCreate import DatabaseMySQLCreate
+    return DatabaseMySQLCreate()
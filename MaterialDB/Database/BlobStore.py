@@ -0,0 +1,41 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+"""Functions for the content addressed store of long property values"""
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import hashlib
+
+from MaterialDB.Database.Codec import ZLIB, encode, decode
+
+def blobHash(text : str) -> str:
+    """Returns the key of a value in the blob store, the SHA-256 of its UTF-8 encoding"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def packBlob(text : str, threshold : int, codec : str = ZLIB) -> tuple[str, int, bytes]:
+    """Returns the codec, uncompressed size and data to store for the value"""
+    data = text.encode("utf-8")
+    encodedCodec, encoded = encode(data, threshold, codec)
+    return encodedCodec, len(data), encoded
+
+def unpackBlob(codec : str | None, data : bytes) -> str:
+    return decode(codec, data).decode("utf-8")
@@ -0,0 +1,94 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+"""Functions for compressing stored values"""
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import bz2
+import lzma
+import zlib
+
+try:
+    # Python 3.14 and later
+    from compression import zstd
+except ImportError:
+    zstd = None
+
+# Codec names as stored in the codec columns. Uncompressed values have no name
+NONE = ""
+ZLIB = "zlib"
+BZ2 = "bz2"
+LZMA = "lzma"
+ZSTD = "zstd"
+
+_codecs = {
+    ZLIB : (zlib.compress, zlib.decompress),
+    BZ2 : (bz2.compress, bz2.decompress),
+    LZMA : (lzma.compress, lzma.decompress)
+}
+if zstd is not None:
+    _codecs[ZSTD] = (zstd.compress, zstd.decompress)
+
+def available() -> list[str]:
+    """
+    Returns the codecs this Python can read and write. A value written with
+    a codec that another client doesn't have can't be read by that client.
+    """
+    return list(_codecs)
+
+def encode(data : bytes, threshold : int, codec : str = ZLIB) -> tuple[str, bytes]:
+    """
+    Compresses data of at least threshold bytes, returning the codec used
+    and the encoded data. Data is only compressed when that makes it smaller.
+    A negative threshold turns compression off.
+    """
+    if codec not in _codecs:
+        raise ValueError("Unknown codec '{}'".format(codec))
+    if 0 <= threshold <= len(data):
+        compressed = _codecs[codec][0](data)
+        if len(compressed) < len(data):
+            return codec, compressed
+    return NONE, data
+
+def decode(codec : str | None, data : bytes) -> bytes:
+    if not codec:
+        return bytes(data)
+    if codec not in _codecs:
+        raise ValueError("Unknown codec '{}'".format(codec))
+    return _codecs[codec][1](data)
+
+def encodeText(text : str, threshold : int, codec : str = ZLIB) -> tuple[str, str, bytes | None]:
+    """
+    Encodes a value stored in a text column with a codec and a data column.
+    Returns the text, the codec and the data. Compressed values have empty
+    text, and uncompressed values have no data.
+    """
+    encodedCodec, data = encode(text.encode("utf-8"), threshold, codec)
+    if encodedCodec == NONE:
+        return text, NONE, None
+    return "", encodedCodec, data
+
+def decodeText(text : str, codec : str | None, data : bytes | None) -> str:
+    """Reverses encodeText()"""
+    if not codec:
+        return text
+    return decode(codec, data).decode("utf-8")
@@ -0,0 +1,206 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+"""Class for pooling database connections across threads"""
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import threading
+import time
+from typing import Any, Callable
+
+from MaterialDB.Database.Exceptions import DatabaseConnectionError
+
+def _defaultHealthCheck(connection : Any) -> None:
+    cursor = connection.cursor()
+    cursor.execute("SELECT 1")
+    cursor.fetchone()
+    cursor.close()
+
+class ConnectionPool:
+    """
+    A pool of connections shared by every thread in the process.
+
+    A thread checks out at most one connection and keeps it until it calls
+    release() or discard(), so all the cursors a thread creates share the
+    same transaction. Connections held by threads that have exited are
+    reclaimed, and idle connections above the minimum size are closed once
+    they have been unused for longer than the idle timeout.
+    """
+
+    def __init__(self, factory : Callable[[], Any], minSize : int = 1, maxSize : int = 8,
+                 idleTimeout : float = 300.0, checkoutTimeout : float = 30.0,
+                 healthCheck : Callable[[Any], None] = _defaultHealthCheck):
+        self._factory = factory
+        self._minSize = max(0, minSize)
+        self._maxSize = max(1, maxSize, self._minSize)
+        self._idleTimeout = idleTimeout
+        self._checkoutTimeout = checkoutTimeout
+        self._healthCheck = healthCheck
+
+        self._condition = threading.Condition()
+        self._idle = [] # (connection, time last used), most recently used last
+        self._checkedOut = {} # thread ident -> (thread, connection)
+        self._size = 0 # open connections, idle or checked out
+
+    @property
+    def size(self) -> int:
+        with self._condition:
+            return self._size
+
+    @property
+    def idle(self) -> int:
+        with self._condition:
+            return len(self._idle)
+
+    def current(self) -> Any | None:
+        """Returns the connection checked out by the calling thread, if any"""
+        thread = threading.current_thread()
+        with self._condition:
+            entry = self._checkedOut.get(thread.ident)
+            if entry is not None and entry[0] is thread:
+                return entry[1]
+        return None
+
+    def connection(self) -> Any:
+        """Returns the calling thread's connection, checking one out if required"""
+        connection = self.current()
+        if connection is not None:
+            return connection
+
+        thread = threading.current_thread()
+        connection = self._checkout()
+        with self._condition:
+            self._checkedOut[thread.ident] = (thread, connection)
+        return connection
+
+    def release(self) -> None:
+        """Returns the calling thread's connection to the pool"""
+        connection = self._detach()
+        if connection is None:
+            return
+        try:
+            # Don't hand an open transaction to the next thread
+            connection.rollback()
+        except Exception:
+            self._close(connection)
+            return
+
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def discard(self) -> None:
+        """Closes the calling thread's connection rather than returning it to the pool"""
+        connection = self._detach()
+        if connection is not None:
+            self._close(connection)
+
+    def closeAll(self) -> None:
+        """Closes every idle connection and abandons those checked out"""
+        with self._condition:
+            connections = [connection for connection, _ in self._idle]
+            connections += [connection for _, connection in self._checkedOut.values()]
+            self._idle = []
+            self._checkedOut = {}
+        for connection in connections:
+            self._close(connection)
+
+    def _detach(self) -> Any | None:
+        thread = threading.current_thread()
+        with self._condition:
+            entry = self._checkedOut.get(thread.ident)
+            if entry is None or entry[0] is not thread:
+                return None
+            del self._checkedOut[thread.ident]
+            return entry[1]
+
+    def _checkout(self) -> Any:
+        deadline = time.monotonic() + self._checkoutTimeout
+        while True:
+            self._reclaim()
+            self._evict()
+
+            connection = None
+            create = False
+            with self._condition:
+                if self._idle:
+                    connection, _ = self._idle.pop()
+                elif self._size < self._maxSize:
+                    # Reserve the slot now, connect outside the lock
+                    self._size += 1
+                    create = True
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise DatabaseConnectionError("Timed out waiting for a pooled connection")
+                    self._condition.wait(min(remaining, 1.0))
+                    continue
+
+            if create:
+                try:
+                    return self._factory()
+                except Exception:
+                    with self._condition:
+                        self._size -= 1
+                        self._condition.notify()
+                    raise
+
+            try:
+                self._healthCheck(connection)
+                return connection
+            except Exception:
+                # Stale connection. Drop it and try again
+                self._close(connection)
+
+    def _reclaim(self) -> None:
+        """Closes connections still checked out by threads that have exited"""
+        with self._condition:
+            dead = [ident for ident, (thread, _) in self._checkedOut.items() if not thread.is_alive()]
+            connections = [self._checkedOut.pop(ident)[1] for ident in dead]
+        for connection in connections:
+            self._close(connection)
+
+    def _evict(self) -> None:
+        """Closes connections that have been idle for longer than the timeout"""
+        now = time.monotonic()
+        expired = []
+        with self._condition:
+            keep = []
+            # Oldest first so the most recently used connections survive
+            for connection, lastUsed in self._idle:
+                if now - lastUsed > self._idleTimeout and \
+                        self._size - len(expired) > self._minSize:
+                    expired.append(connection)
+                else:
+                    keep.append((connection, lastUsed))
+            self._idle = keep
+        for connection in expired:
+            self._close(connection)
+
+    def _close(self, connection : Any) -> None:
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
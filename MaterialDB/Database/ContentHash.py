@@ -0,0 +1,73 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+"""Functions for hashing the content of models and materials"""
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import hashlib
+import json
+from typing import Any
+
+def contentHash(content : Any) -> str:
+    """Returns the SHA-256 of the content as canonical JSON, in hex"""
+    text = json.dumps(content, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def materialContent(record : dict) -> dict:
+    """
+    Returns the parts of a material record that make up its content. The
+    library and folder are where the material is kept rather than what it
+    is, so they are left out. Tags and models are unordered.
+    """
+    return {
+        "name" : record["name"],
+        "author" : record["author"],
+        "license" : record["license"],
+        "parent" : record["parent"],
+        "description" : record["description"],
+        "url" : record["url"],
+        "reference" : record["reference"],
+        # Tag names aren't case sensitive
+        "tags" : sorted(set(tag.lower() for tag in record["tags"])),
+        "models" : sorted(set(record["physicalModels"]) | set(record["appearanceModels"])),
+        "properties" : record["properties"]
+    }
+
+def modelContent(record : dict) -> dict:
+    """Returns the parts of a model record that make up its content"""
+    return {
+        "type" : record["type"],
+        "name" : record["name"],
+        "url" : record["url"],
+        "description" : record["description"],
+        "doi" : record["doi"],
+        "inherits" : sorted(set(record["inherits"])),
+        "properties" : sorted(record["properties"], key=lambda property: property["name"])
+    }
+
+def materialHash(record : dict) -> str:
+    """Hashes a record in the form returned by DatabaseMySQL._getMaterialRecords()"""
+    return contentHash(materialContent(record))
+
+def modelHash(record : dict) -> str:
+    """Hashes a record in the form returned by DatabaseMySQL._getModelRecords()"""
+    return contentHash(modelContent(record))
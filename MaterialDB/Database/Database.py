@@ -22,6 +22,8 @@
 __author__ = "David Carter"
 __url__ = "https://www.davesrocketshop.com"
 
+import threading
+
 import pyodbc
 from pyodbc import Cursor, Connection
 
@@ -29,41 +31,43 @@ import FreeCAD
 
 from DraftTools import translate
 
+from MaterialDB.Database import Codec
+from MaterialDB.Database.ConnectionPool import ConnectionPool
 from MaterialDB.Database.Exceptions import DatabaseConnectionError
 from MaterialDB.Configuration import getPreferencesLocation
 
-_connection = None
-
-class Database:
+# Connection pools are shared by all Database instances, keyed by connection string
+_pools = {}
+_poolsLock = threading.Lock()
 
-    def __init__(self):
-        self._disconnect()
+# Drivers known to accept arrays of parameters, as used by fast_executemany
+_fastExecuteManyDrivers = ["maodbc", "myodbc"]
 
-        # self._database = "material" # This needs to be generalized
+class Database:
 
     def _connect(self, noDatabase : bool = False) -> None:
-        global _connection
-        if _connection is None:
-            self._connectODBC(noDatabase)
+        self._getPool(noDatabase).connection()
 
     def _disconnect(self) -> None:
-        global _connection
-        if _connection:
-            _connection.close()
-        _connection = None
+        """Closes the calling thread's connections, forcing a reconnection on next use"""
+        for pool in self._allPools():
+            pool.discard()
+
+    def _release(self) -> None:
+        """Returns the calling thread's connections to their pools.
+
+        Worker threads should call this when they are finished with the database"""
+        for pool in self._allPools():
+            pool.release()
 
     def _getConnection(self) -> Connection | None:
-        global _connection
-        return _connection
+        return self._getPool().current()
 
     def _cursor(self, noDatabase : bool = False) -> Cursor:
-        global _connection
         for retry in range(3):
             try:
-                self._connect(noDatabase)
-                if _connection:
-                    cursor = _connection.cursor()
-                    return cursor
+                connection = self._getPool(noDatabase).connection()
+                return connection.cursor()
             except pyodbc.ProgrammingError:
                 # Force a reconnection
                 FreeCAD.Console.PrintError(translate('MaterialDB', "\nUnable to connect to database. Reconnecting...\n"))
@@ -71,48 +75,117 @@ class Database:
 
         raise DatabaseConnectionError()
 
-    def _connectODBC(self, noDatabase : bool = False) -> None:
-        global _connection
+    def _allPools(self) -> list[ConnectionPool]:
+        with _poolsLock:
+            return list(_pools.values())
+
+    def _getPool(self, noDatabase : bool = False) -> ConnectionPool:
+        connectString = self._connectString(noDatabase)
+        with _poolsLock:
+            pool = _pools.get(connectString)
+            if pool is None:
+                prefs = getPreferencesLocation()
+                pool = ConnectionPool(lambda: self._newConnection(connectString),
+                    minSize=FreeCAD.ParamGet(prefs).GetInt("PoolMinSize", 1),
+                    maxSize=FreeCAD.ParamGet(prefs).GetInt("PoolMaxSize", 8),
+                    idleTimeout=FreeCAD.ParamGet(prefs).GetInt("PoolIdleTimeout", 300),
+                    checkoutTimeout=FreeCAD.ParamGet(prefs).GetInt("PoolCheckoutTimeout", 30))
+                _pools[connectString] = pool
+        return pool
+
+    def _connectString(self, noDatabase : bool = False) -> str:
+        prefs = getPreferencesLocation()
+        connectString = ""
+        currentDriver = FreeCAD.ParamGet(prefs).GetString("Driver", "")
+        if currentDriver:
+            connectString = connectString + "Driver={%s}" % (currentDriver)
+        currentDSN = FreeCAD.ParamGet(prefs).GetString("DSN", "")
+        if currentDSN:
+            if connectString:
+                connectString = connectString + ';'
+            connectString = connectString + 'DSN={}'.format(currentDSN)
+        hostname = FreeCAD.ParamGet(prefs).GetString("Hostname", "")
+        if hostname:
+            if connectString:
+                connectString = connectString + ';'
+            connectString = connectString + "Server={}".format(hostname)
+        port = FreeCAD.ParamGet(prefs).GetString("Port", "")
+        if port:
+            connectString = connectString + ";Port={}".format(port)
+        dbName = FreeCAD.ParamGet(prefs).GetString("Database", "material")
+        if dbName and not noDatabase:
+            connectString = connectString + ";Database={}".format(dbName)
+        username = FreeCAD.ParamGet(prefs).GetString("Username", "")
+        if username:
+            connectString = connectString + ";Uid={}".format(username)
+        password = FreeCAD.ParamGet(prefs).GetString("Password", "")
+        if password:
+            connectString = connectString + ";Pwd={}".format(password)
+        connectString = connectString + ";charset=utf8mb4"
+        return connectString
+
+    def _newConnection(self, connectString : str) -> Connection:
+        """Opens a connection for the pool. Backends that don't use ODBC override this"""
+        return self._connectODBC(connectString)
+
+    def _connectODBC(self, connectString : str) -> Connection:
         try:
-            prefs = getPreferencesLocation()
-            connectString = ""
-            currentDriver = FreeCAD.ParamGet(prefs).GetString("Driver", "")
-            if currentDriver:
-                  connectString = connectString + "Driver={%s}" % (currentDriver)
-            currentDSN = FreeCAD.ParamGet(prefs).GetString("DSN", "")
-            if currentDSN:
-                if connectString:
-                    connectString = connectString + ';'
-                connectString = connectString + 'DSN={}'.format(currentDSN)
-            hostname = FreeCAD.ParamGet(prefs).GetString("Hostname", "")
-            if hostname:
-                if connectString:
-                    connectString = connectString + ';'
-                connectString = connectString + "Server={}".format(hostname)
-            port = FreeCAD.ParamGet(prefs).GetString("Port", "")
-            if port:
-                  connectString = connectString + ";Port={}".format(port)
-            dbName = FreeCAD.ParamGet(prefs).GetString("Database", "material")
-            if dbName and not noDatabase:
-                  connectString = connectString + ";Database={}".format(dbName)
-            username = FreeCAD.ParamGet(prefs).GetString("Username", "")
-            if username:
-                  connectString = connectString + ";Uid={}".format(username)
-            password = FreeCAD.ParamGet(prefs).GetString("Password", "")
-            if password:
-                  connectString = connectString + ";Pwd={}".format(password)
-            connectString = connectString + ";charset=utf8mb4"
-            print(connectString)
-
-            _connection = pyodbc.connect(connectString)
-            _connection.setdecoding(pyodbc.SQL_CHAR, encoding='utf-8')
-            _connection.setdecoding(pyodbc.SQL_WCHAR, encoding='utf-8')
-            _connection.setencoding(encoding='utf-8')
+            connection = pyodbc.connect(connectString)
+            connection.setdecoding(pyodbc.SQL_CHAR, encoding='utf-8')
+            connection.setdecoding(pyodbc.SQL_WCHAR, encoding='utf-8')
+            connection.setencoding(encoding='utf-8')
+            return connection
         except Exception as ex:
             print("Unable to create connection:", ex)
-            self._disconnect()
             raise DatabaseConnectionError(error=ex)
 
+    def _batchSize(self) -> int:
+        """Returns the number of rows to fetch at a time when streaming results"""
+        prefs = getPreferencesLocation()
+        return max(1, FreeCAD.ParamGet(prefs).GetInt("FetchBatchSize", 500))
+
+    def _compressionThreshold(self) -> int:
+        """
+        Returns the size in bytes below which stored values aren't compressed.
+        A negative threshold turns compression off.
+        """
+        prefs = getPreferencesLocation()
+        return FreeCAD.ParamGet(prefs).GetInt("CompressionThreshold", 1024)
+
+    def _compressionCodec(self) -> str:
+        """Returns the codec used to compress new values, zlib unless another available one is chosen"""
+        prefs = getPreferencesLocation()
+        codec = FreeCAD.ParamGet(prefs).GetString("CompressionCodec", Codec.ZLIB)
+        if codec not in Codec.available():
+            return Codec.ZLIB
+        return codec
+
+    def _blobCacheSize(self) -> int:
+        """Returns the memory budget in bytes for values read from the blob store"""
+        prefs = getPreferencesLocation()
+        return max(0, FreeCAD.ParamGet(prefs).GetInt("BlobCacheSize", 32)) * 1024 * 1024
+
+    def _commit(self, cursor : Cursor) -> None:
+        self._committing(cursor)
+        cursor.commit()
+        self._committed()
+
+    def _committing(self, cursor : Cursor) -> None:
+        """Called before a commit so subclasses can write state gathered during the transaction"""
+        pass
+
+    def _committed(self) -> None:
+        """Called after a commit so subclasses can publish state from the transaction"""
+        pass
+
+    def _rollback(self, cursor : Cursor) -> None:
+        cursor.rollback()
+        self._rolledBack()
+
+    def _rolledBack(self) -> None:
+        """Called after a rollback so subclasses can discard state from the failed transaction"""
+        pass
+
     def _lastId(self, cursor : Cursor) -> int:
         """Returns the last insertion id"""
         cursor.execute("SELECT @@IDENTITY as id")
@@ -121,6 +194,48 @@ class Database:
             return row.id
         return 0
 
+    def _upsertId(self, cursor : Cursor) -> int:
+        """
+        Returns the id of the row written by an INSERT ... ON DUPLICATE KEY
+        UPDATE that sets id = LAST_INSERT_ID(id), whether it was inserted or
+        updated
+        """
+        cursor.execute("SELECT LAST_INSERT_ID() AS id")
+        row = cursor.fetchone()
+        if row:
+            return row.id
+        return 0
+
+    def _executeMany(self, cursor : Cursor, sql : str, rows : list[tuple], fast : bool = True,
+                     batchSize : int = 1000) -> None:
+        """
+        Executes the statement once for each row of parameters, sending
+        batchSize rows at a time. When fast is set and the driver supports it
+        the rows are sent as parameter arrays rather than one at a time.
+        """
+        if not rows:
+            return
+
+        cursor.fast_executemany = fast and self._fastExecuteMany(cursor)
+        try:
+            for index in range(0, len(rows), batchSize):
+                cursor.executemany(sql, rows[index:index + batchSize])
+        finally:
+            cursor.fast_executemany = False
+
+    def _fastExecuteMany(self, cursor : Cursor) -> bool:
+        prefs = getPreferencesLocation()
+        if not FreeCAD.ParamGet(prefs).GetBool("FastExecuteMany", True):
+            return False
+        try:
+            driver = cursor.connection.getinfo(pyodbc.SQL_DRIVER_NAME).lower()
+        except pyodbc.Error:
+            return False
+        for name in _fastExecuteManyDrivers:
+            if name in driver:
+                return True
+        return False
+
     def checkCreatePermissions(self) -> bool:
         return False
 
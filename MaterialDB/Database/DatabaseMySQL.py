@@ -22,8 +22,9 @@
 __author__ = "David Carter"
 __url__ = "https://www.davesrocketshop.com"
 
+import threading
 import traceback
-from typing import Any
+from typing import Any, Callable, Iterator
 from pyodbc import Cursor
 
 from PySide.QtCore import QByteArray, QBuffer, QIODevice
@@ -33,20 +34,52 @@ import Materials
 from MaterialAPI.MaterialManagerExternal import MaterialLibraryType, MaterialLibraryObjectType, \
     ModelObjectType, MaterialObjectType
 from MaterialDB.Database.Database import Database
+from MaterialDB.Database.BlobStore import blobHash, packBlob, unpackBlob
+from MaterialDB.Database.Codec import decode, decodeText, encode, encodeText
+from MaterialDB.Database.ContentHash import materialHash, modelHash
+from MaterialDB.Database.DeferredValue import DeferredValue, prefetch
+from MaterialDB.Database.DependencyOrder import dependencyOrder
+from MaterialDB.Database.FolderIndex import FolderIndex
+from MaterialDB.Database.PackedArray import packArray, unpackArray
 from MaterialDB.Database.Exceptions import DatabaseLibraryCreationError, \
     DatabaseIconError, DatabaseLibraryNotFound, DatabaseLibraryReadOnlyError, \
     DatabaseFolderCreationError, \
     DatabaseModelCreationError, DatabaseMaterialCreationError, \
     DatabaseModelUpdateError, \
     DatabaseModelExistsError, DatabaseMaterialExistsError, \
-    DatabaseModelNotFound, DatabaseMaterialNotFound, \
-    DatabaseRenameError, DatabaseDeleteError
+    DatabaseModelNotFound, DatabaseMaterialNotFound, DatabaseFilterError, \
+    DatabaseRenameError, DatabaseDeleteError, DatabaseTableCreationError
+from MaterialDB.manager.Cache import LRUCache
+
+# Columns rewritten when a model property or property column is upserted
+_modelPropertyColumns = ["model_property_display_name", "model_property_type", "model_property_units",
+                         "model_property_url", "model_property_description"]
+
+# MaterialFilterOptions that _materialFilter() honours. See its docstring
+_filterOptions = ["IncludeLegacy", "IncludeFavorites", "IncludeRecent", "IncludeEmptyFolders",
+                  "IncludeEmptyLibraries"]
+
+# Unique key of the string and long string value tables
+_valueKeys = ["material_property_value_id", "material_property_value_index"]
+
+# Blobs never change once written, so a single cache serves every database
+# and connection without ever being invalidated. See _blobCache()
+_blobs = None
+_blobsLock = threading.Lock()
 
 class DatabaseMySQL(Database):
 
     def __init__(self):
         super().__init__()
 
+        # Folder trees by library_id. See _resolvePath()
+        self._folderIndexes = {}
+        self._folderLock = threading.RLock()
+
+        # Changes and folders waiting for the calling thread's transaction to
+        # commit. See _logChange() and _stageFolders()
+        self._pending = threading.local()
+
     #
     # Library methods
     #
@@ -97,34 +130,32 @@ class DatabaseMySQL(Database):
     def createLibrary(self, libraryName: str, icon: bytes | None, readOnly: bool) -> None:
         cursor = self._cursor()
         try:
+            # The unique library name makes concurrent creation safe
+            cursor.execute(self._insertIgnore() + " INTO library (library_name, library_icon, library_read_only) "
+                           "VALUES (?, ?, ?)", libraryName, (icon if icon else None), readOnly)
+            if cursor.rowcount > 0:
+                self._logChange(cursor, "library", "create", self._lastId(cursor), libraryName)
+                self._commit(cursor)
+                return
 
-            cursor.execute("SELECT library_id, library_icon, library_read_only FROM library WHERE library_name = ?", libraryName)
+            cursor.execute("SELECT library_icon, library_read_only FROM library WHERE library_name = ?", libraryName)
             row = cursor.fetchone()
-            if not row:
-                if icon is None or len(icon) == 0:
-                    cursor.execute("INSERT INTO library (library_name, library_read_only) "
-                                        "VALUES (?, ?)", libraryName, readOnly)
-                else:
-                    cursor.execute("INSERT INTO library (library_name, library_icon, library_read_only) "
-                            "VALUES (?, ?, ?)", libraryName, icon, readOnly)
-                cursor.commit()
+            # Check that everything matches
+            if icon is None:
+                if readOnly == row.library_read_only and (row.library_icon is None or len(row.library_icon) == 0):
+                    return
             else:
-                # Check that everything matches
-                if icon is None:
-                    if readOnly == row.library_read_only and (row.library_icon is None or len(row.library_icon) == 0):
-                        return
-                else:
-                    # if readOnly == row.library_read_only and icon == row.library_icon.decode('UTF-8'):
-                    #     return
-                    if readOnly == row.library_read_only and icon == row.library_icon:
-                        return
-                    
-                raise DatabaseLibraryCreationError("Library already exists")
+                # if readOnly == row.library_read_only and icon == row.library_icon.decode('UTF-8'):
+                #     return
+                if readOnly == row.library_read_only and icon == row.library_icon:
+                    return
+
+            raise DatabaseLibraryCreationError("Library already exists")
         except DatabaseLibraryCreationError as createError:
-            cursor.rollback()
+            self._rollback(cursor)
             raise createError
         except Exception as ex:
-            cursor.rollback()
+            self._rollback(cursor)
             print("Unable to create library '{}':".format(libraryName), ex)
             raise DatabaseLibraryCreationError(error=ex)
 
@@ -138,13 +169,15 @@ class DatabaseMySQL(Database):
 
             cursor.execute("UPDATE library SET library_name = ? "
                                 "WHERE library_name = ?", newName, oldName)
+            if cursor.rowcount > 0:
+                self._logChange(cursor, "library", "rename", self._findLibrary(cursor, newName), newName, oldName)
 
-            cursor.commit()
+            self._commit(cursor)
         except DatabaseRenameError as renameError:
-            cursor.rollback()
+            self._rollback(cursor)
             raise renameError
         except Exception as ex:
-            cursor.rollback()
+            self._rollback(cursor)
             print("Unable to rename library:", ex)
             raise DatabaseRenameError(error=ex)
 
@@ -153,110 +186,229 @@ class DatabaseMySQL(Database):
         try:
             cursor.execute("UPDATE library SET library_icon = ? "
                                 "WHERE library_name = ?", icon, libraryName)
+            self._logChange(cursor, "library", "update", self._findLibrary(cursor, libraryName), libraryName)
 
-            cursor.commit()
+            self._commit(cursor)
         except Exception as ex:
-            cursor.rollback()
+            self._rollback(cursor)
             print("Unable to change icon:", ex)
             raise DatabaseIconError(error=ex)
 
     def removeLibrary(self, libraryName: str) -> None:
         cursor = self._cursor()
         try:
+            # Logged first, while the library name can still be found
+            self._logChange(cursor, "library", "delete", self._findLibrary(cursor, libraryName), libraryName)
             cursor.execute("DELETE FROM library WHERE library_name = ?", libraryName)
+            self._collectBlobs(cursor)
 
-            cursor.commit()
+            self._commit(cursor)
+            self._forgetFolders()
         except Exception as ex:
-            cursor.rollback()
+            self._rollback(cursor)
             print("Unable to remove library:", ex)
             raise DatabaseDeleteError(error=ex)
 
     def libraryModels(self, libraryName: str) -> list[MaterialLibraryObjectType]:
+        return list(self.iterLibraryModels(libraryName))
+
+    def libraryMaterials(self, libraryName: str,
+                         filter: Materials.MaterialFilter = None,
+                         options: Materials.MaterialFilterOptions = None) -> list[MaterialLibraryObjectType]:
+        return list(self.iterLibraryMaterials(libraryName, filter, options))
+
+    def libraryFolders(self, libraryName: str) -> list[str]:
+        return list(self.iterLibraryFolders(libraryName))
+
+    def iterLibraryModels(self, libraryName: str, batchSize: int = 0) -> Iterator[MaterialLibraryObjectType]:
+        """
+        Yields the models in the library, fetching batchSize rows at a time.
+        A batchSize of 0 uses the FetchBatchSize preference.
+        """
+        cursor = self._cursor()
+        try:
+            sql, params = self._libraryModelsQuery(cursor, libraryName)
+            cursor.execute(sql, *params)
+            for row in self._fetchBatches(cursor, batchSize):
+                yield MaterialLibraryObjectType(row.model_id, row.folder_name, row.model_name)
+        except DatabaseLibraryNotFound as notFound:
+            self._rollback(cursor)
+            raise notFound # Rethrow
+        except Exception as ex:
+            self._rollback(cursor)
+            print("Unable to get library models:", ex)
+            raise DatabaseLibraryNotFound(error=ex)
+        finally:
+            # Discard any rows the caller didn't consume
+            cursor.close()
+
+    def iterLibraryMaterials(self, libraryName: str,
+                             filter: Materials.MaterialFilter = None,
+                             options: Materials.MaterialFilterOptions = None,
+                             batchSize: int = 0) -> Iterator[MaterialLibraryObjectType]:
+        """
+        Yields the materials in the library matching the filter, fetching
+        batchSize rows at a time. A batchSize of 0 uses the FetchBatchSize
+        preference.
+        """
+        cursor = self._cursor()
+        try:
+            query = self._libraryMaterialsQuery(cursor, libraryName, filter, options)
+            if query is None:
+                # Nothing in the database can satisfy the filter
+                return
+            sql, params = query
+            cursor.execute(sql, *params)
+            for row in self._fetchBatches(cursor, batchSize):
+                yield MaterialLibraryObjectType(row.material_id, row.folder_name, row.material_name)
+        except (DatabaseLibraryNotFound, DatabaseFilterError) as notFound:
+            self._rollback(cursor)
+            raise notFound # Rethrow
+        except Exception as ex:
+            self._rollback(cursor)
+            print("Unable to get library materials:", ex)
+            raise DatabaseMaterialNotFound(error=ex)
+        finally:
+            # Discard any rows the caller didn't consume
+            cursor.close()
+
+    def iterLibraryFolders(self, libraryName: str, batchSize: int = 0) -> Iterator[str]:
+        """
+        Yields the paths of the folders in the library, fetching batchSize rows
+        at a time. A batchSize of 0 uses the FetchBatchSize preference.
+        """
+        cursor = self._cursor()
+        try:
+            sql, params = self._libraryFoldersQuery(cursor, libraryName)
+            cursor.execute(sql, *params)
+            for row in self._fetchBatches(cursor, batchSize):
+                yield "/" + row.folder_path
+        except DatabaseLibraryNotFound as notFound:
+            self._rollback(cursor)
+            raise notFound # Rethrow
+        except Exception as ex:
+            self._rollback(cursor)
+            print("Unable to get library folders:", ex)
+            raise DatabaseMaterialNotFound(error=ex)
+        finally:
+            # Discard any rows the caller didn't consume
+            cursor.close()
+
+    def libraryModelsPage(self, libraryName: str, after: str | None, limit: int) -> list[MaterialLibraryObjectType]:
+        """
+        Returns up to limit models ordered by UUID, starting after the UUID of
+        the last model on the previous page. Pass None for the first page.
+        """
         cursor = self._cursor()
         try:
+            sql, params = self._libraryModelsQuery(cursor, libraryName, after, limit)
+            cursor.execute(sql, *params)
             models = []
-
-            cursor.execute("SELECT library_id FROM library WHERE library_name = ?", libraryName)
-            row = cursor.fetchone()
-            if not row:
-                raise DatabaseLibraryNotFound()
-
-            cursor.execute("SELECT m.model_id, GetFolder(m.folder_id) as folder_name, m.model_name"
-                           " FROM model m, library l"
-                           " WHERE m.library_id = l.library_id AND l.library_name = ?", libraryName)
-            rows = cursor.fetchall()
-            for row in rows:
-                # Convert the folder_id to a path
+            for row in cursor.fetchall():
                 models.append(MaterialLibraryObjectType(row.model_id, row.folder_name, row.model_name))
 
             return models
         except DatabaseLibraryNotFound as notFound:
-            cursor.rollback()
-            # Rethrow
-            raise notFound
+            self._rollback(cursor)
+            raise notFound # Rethrow
         except Exception as ex:
-            cursor.rollback()
+            self._rollback(cursor)
             print("Unable to get library models:", ex)
             raise DatabaseLibraryNotFound(error=ex)
 
-    def libraryMaterials(self, libraryName: str,
-                         filter: Materials.MaterialFilter = None,
-                         options: Materials.MaterialFilterOptions = None) -> list[MaterialLibraryObjectType]:
+    def libraryMaterialsPage(self, libraryName: str, after: str | None, limit: int,
+                             filter: Materials.MaterialFilter = None,
+                             options: Materials.MaterialFilterOptions = None) -> list[MaterialLibraryObjectType]:
+        """
+        Returns up to limit materials matching the filter ordered by UUID,
+        starting after the UUID of the last material on the previous page. Pass
+        None for the first page.
+        """
         cursor = self._cursor()
         try:
             materials = []
-
-            cursor.execute("SELECT library_id FROM library WHERE library_name = ?", libraryName)
-            row = cursor.fetchone()
-            if not row:
-                raise DatabaseLibraryNotFound()
-
-            cursor.execute("SELECT m.material_id, GetFolder(m.folder_id) as folder_name, m.material_name"
-                           " FROM material m, library l"
-                           " WHERE m.library_id = l.library_id AND l.library_name = ?", libraryName)
-            rows = cursor.fetchall()
-            for row in rows:
+            query = self._libraryMaterialsQuery(cursor, libraryName, filter, options, after, limit)
+            if query is None:
+                return materials
+            sql, params = query
+            cursor.execute(sql, *params)
+            for row in cursor.fetchall():
                 materials.append(MaterialLibraryObjectType(row.material_id, row.folder_name, row.material_name))
 
             return materials
-        except DatabaseLibraryNotFound as notFound:
-            cursor.rollback()
+        except (DatabaseLibraryNotFound, DatabaseFilterError) as notFound:
+            self._rollback(cursor)
             raise notFound # Rethrow
         except Exception as ex:
-            cursor.rollback()
+            self._rollback(cursor)
             print("Unable to get library materials:", ex)
             raise DatabaseMaterialNotFound(error=ex)
 
-    def libraryFolders(self, libraryName: str) -> list[str]:
+    def libraryFoldersPage(self, libraryName: str, after: str | None, limit: int) -> list[str]:
+        """
+        Returns up to limit folder paths in sorted order, starting after the
+        last path on the previous page. Pass None for the first page.
+        """
         cursor = self._cursor()
         try:
-            cursor.execute("SELECT library_id FROM library WHERE library_name = ?", libraryName)
-            row = cursor.fetchone()
-            if not row:
-                raise DatabaseLibraryNotFound()
-
-            cursor.execute("SELECT f.folder_id, f.folder_name, f.library_id, f.parent_id"
-                           " FROM folder f, library l"
-                           " WHERE f.library_id = l.library_id AND l.library_name = ?"
-                           " ORDER BY f.parent_id", libraryName)
-            rows = cursor.fetchall()
-            folderTree = {}
-            for row in rows:
-                # folders.append(MaterialLibraryObjectType(row.material_id, row.folder_name, row.material_name))
-                if row.parent_id is None:
-                    folderTree[row.folder_id] = "/" + row.folder_name
-                else:
-                    folderTree[row.folder_id] = folderTree[row.parent_id] + "/" + row.folder_name
+            if after is not None:
+                after = "/".join(self._pathList(after))
+            sql, params = self._libraryFoldersQuery(cursor, libraryName, after, limit)
+            cursor.execute(sql, *params)
+            folders = []
+            for row in cursor.fetchall():
+                folders.append("/" + row.folder_path)
 
-            return list(folderTree.values())
+            return folders
         except DatabaseLibraryNotFound as notFound:
-            cursor.rollback()
+            self._rollback(cursor)
             raise notFound # Rethrow
         except Exception as ex:
-            cursor.rollback()
+            self._rollback(cursor)
             print("Unable to get library folders:", ex)
             raise DatabaseMaterialNotFound(error=ex)
 
+    def _libraryModelsQuery(self, cursor : Cursor, libraryName : str,
+                            after : str | None = None, limit : int = 0) -> tuple[str, list[Any]]:
+        libraryIndex = self._findLibrary(cursor, libraryName)
+        if libraryIndex == 0:
+            raise DatabaseLibraryNotFound()
+
+        sql = ("SELECT m.model_id, f.folder_path as folder_name, m.model_name"
+               " FROM model m LEFT JOIN folder f ON f.folder_id = m.folder_id"
+               " WHERE m.library_id = ?")
+        params = [libraryIndex]
+        return self._keyset(sql, params, "m.model_id", after, limit)
+
+    def _libraryMaterialsQuery(self, cursor : Cursor, libraryName : str,
+                               filter : Materials.MaterialFilter | None,
+                               options : Materials.MaterialFilterOptions | None,
+                               after : str | None = None, limit : int = 0) -> tuple[str, list[Any]] | None:
+        libraryIndex = self._findLibrary(cursor, libraryName)
+        if libraryIndex == 0:
+            raise DatabaseLibraryNotFound()
+
+        predicates = self._materialFilter(cursor, filter, options)
+        if predicates is None:
+            return None
+        where, params = predicates
+
+        sql = ("SELECT m.material_id, f.folder_path as folder_name, m.material_name"
+               " FROM material m LEFT JOIN folder f ON f.folder_id = m.folder_id"
+               " WHERE m.library_id = ?" + where)
+        params = [libraryIndex] + params
+        return self._keyset(sql, params, "m.material_id", after, limit)
+
+    def _libraryFoldersQuery(self, cursor : Cursor, libraryName : str,
+                             after : str | None = None, limit : int = 0) -> tuple[str, list[Any]]:
+        libraryIndex = self._findLibrary(cursor, libraryName)
+        if libraryIndex == 0:
+            raise DatabaseLibraryNotFound()
+
+        sql = "SELECT f.folder_path FROM folder f WHERE f.library_id = ?"
+        params = [libraryIndex]
+        return self._keyset(sql, params, "f.folder_path", after, limit)
+
     def librarySubFolders(self, libraryName: str, path: str) -> list[str]:
         cursor = self._cursor()
         try:
@@ -264,20 +416,9 @@ class DatabaseMySQL(Database):
             if libraryIndex == 0:
                 raise DatabaseLibraryNotFound()
 
-            pathList = self._pathList(path)
-            parentIndex = 0 # start at the root
-            for index in range(0, len(pathList)):
-                if parentIndex == 0:
-                    cursor.execute("SELECT folder_id FROM folder WHERE folder_name = ? AND library_id = ?"
-                        " AND parent_id IS NULL", pathList[index], libraryIndex)
-                else:
-                    cursor.execute("SELECT folder_id FROM folder WHERE folder_name = ? AND library_id = ?"
-                        " AND parent_id = ?", pathList[index], libraryIndex, parentIndex)
-                row = cursor.fetchone()
-                if row:
-                    parentIndex = row.folder_id
-                else:
-                    raise DatabaseLibraryNotFound()
+            parentIndex = self._findFolder(cursor, libraryIndex, self._pathList(path))
+            if parentIndex is None:
+                raise DatabaseLibraryNotFound()
 
             cursor.execute("SELECT folder_name FROM folder "
                            "WHERE library_id = ? AND parent_id = ?", libraryIndex, parentIndex)
@@ -288,10 +429,10 @@ class DatabaseMySQL(Database):
 
             return folders
         except DatabaseLibraryNotFound as notFound:
-            cursor.rollback()
+            self._rollback(cursor)
             raise notFound # Rethrow
         except Exception as ex:
-            cursor.rollback()
+            self._rollback(cursor)
             print("Unable to get library subfolders:", ex)
             # print(type(ex))
             # traceback.print_exc() 
@@ -301,6 +442,8 @@ class DatabaseMySQL(Database):
         cursor.execute("SELECT library_id FROM library WHERE library_name = ?", name)
         row = cursor.fetchone()
         if row:
+            # Saves _logChange() looking it up again
+            self._libraryNames()[row.library_id] = name
             return row.library_id
         return 0
     
@@ -341,12 +484,25 @@ class DatabaseMySQL(Database):
         try:
             libraryIndex = self._findWriteableLibrary(cursor, libraryName)
             self._createPath(cursor, libraryIndex, path)
-            cursor.commit()
+            self._commit(cursor)
         except Exception as ex:
-            cursor.rollback()
+            self._rollback(cursor)
             print("Unable to create folder:", ex)
             raise DatabaseFolderCreationError(error=ex)
 
+    def createFolders(self, libraryName: str, paths: list[str]) -> None:
+        """Creates any of the folders that don't already exist in a single transaction"""
+        cursor = self._cursor()
+        try:
+            libraryIndex = self._findWriteableLibrary(cursor, libraryName)
+            for path in dict.fromkeys(paths):
+                self._createPath(cursor, libraryIndex, path)
+            self._commit(cursor)
+        except Exception as ex:
+            self._rollback(cursor)
+            print("Unable to create folders:", ex)
+            raise DatabaseFolderCreationError(error=ex)
+
     def renameFolder(self, libraryName: str, oldPath: str, newPath: str) -> None:
         cursor = self._cursor()
         try:
@@ -358,39 +514,30 @@ class DatabaseMySQL(Database):
             if len(oldPathList) != len(newPathList):
                 raise DatabaseRenameError("Path lengths don't match")
 
-            parentIndex = 0 # start at the root
             if len(newPathList) > 0:
                 for index in range(0, len(newPathList) - 1):
                     if oldPathList[index] != newPathList[index]:
                         raise DatabaseRenameError("Path tree doesn't match")
-                    if parentIndex == 0:
-                        cursor.execute("SELECT folder_id FROM folder WHERE folder_name = ? AND library_id = ?"
-                            " AND parent_id IS NULL", oldPathList[index], libraryIndex)
-                    else:
-                        cursor.execute("SELECT folder_id FROM folder WHERE folder_name = ? AND library_id = ?"
-                            " AND parent_id = ?", oldPathList[index], libraryIndex, parentIndex)
-                    row = cursor.fetchone()
-                    if row:
-                        parentIndex = row.folder_id
-                    else:
-                        raise DatabaseRenameError("Folder path doesn't exist")
-                if parentIndex == 0:
-                    cursor.execute("UPDATE folder "
-                                "SET folder_name = ? "
-                                "WHERE parent_id IS NULL AND folder_name = ? AND library_id = ?", newPathList[-1], oldPathList[-1], libraryIndex)
-                else:
-                    cursor.execute("UPDATE folder "
-                                "SET folder_name = ? "
-                                "WHERE parent_id = ? AND folder_name = ? AND library_id = ?", newPathList[-1], parentIndex, oldPathList[-1], libraryIndex)
+                _, folderId, depth = self._resolvePath(cursor, libraryIndex, oldPathList)
+                if depth < len(oldPathList) - 1:
+                    raise DatabaseRenameError("Folder path doesn't exist")
+                if depth < len(oldPathList):
+                    raise DatabaseRenameError("Unable to update folder path")
+                cursor.execute("UPDATE folder "
+                            "SET folder_name = ?, folder_path = ? "
+                            "WHERE folder_id = ?", newPathList[-1], "/".join(newPathList), folderId)
                 if cursor.rowcount < 1:
                     raise DatabaseRenameError("Unable to update folder path")
-            cursor.commit()
+                self._updateFolderPaths(cursor, libraryIndex, "/".join(oldPathList), "/".join(newPathList))
+                self._logChange(cursor, "folder", "rename", libraryIndex, "/".join(newPathList), "/".join(oldPathList))
+                self._stageFolders(cursor, libraryIndex).rename(folderId, newPathList[-1])
+            self._commit(cursor)
 
         except DatabaseRenameError as renameError:
-            cursor.rollback()
+            self._rollback(cursor)
             raise renameError # Re-raise
         except Exception as ex:
-            cursor.rollback
+            self._rollback(cursor)
             raise DatabaseRenameError(error=ex)
 
     def deleteRecursive(self, libraryName: str, path: str) -> None:
@@ -399,34 +546,24 @@ class DatabaseMySQL(Database):
             libraryIndex = self._findWriteableLibrary(cursor, libraryName)
 
             pathList = self._pathList(path)
-            parentIndex = 0 # start at the root
             if len(pathList) > 0:
-                for index in range(0, len(pathList) - 1):
-                    if parentIndex == 0:
-                        cursor.execute("SELECT folder_id FROM folder WHERE folder_name = ? AND library_id = ?"
-                            " AND parent_id IS NULL", pathList[index], libraryIndex)
-                    else:
-                        cursor.execute("SELECT folder_id FROM folder WHERE folder_name = ? AND library_id = ?"
-                            " AND parent_id = ?", pathList[index], libraryIndex, parentIndex)
-                    row = cursor.fetchone()
-                    if row:
-                        parentIndex = row.folder_id
-                    else:
-                        raise DatabaseDeleteError("Folder path doesn't exist")
-                if parentIndex == 0:
-                    cursor.execute("DELETE from folder "
-                                "WHERE parent_id IS NULL AND folder_name = ? AND library_id = ?", pathList[-1], libraryIndex)
-                else:
-                    cursor.execute("DELETE from folder "
-                                "WHERE parent_id = ? AND folder_name = ? AND library_id = ?", parentIndex, pathList[-1], libraryIndex)
+                _, folderId, depth = self._resolvePath(cursor, libraryIndex, pathList)
+                if depth < len(pathList) - 1:
+                    raise DatabaseDeleteError("Folder path doesn't exist")
+                if depth < len(pathList):
+                    raise DatabaseDeleteError("Unable to delete folder")
+                cursor.execute("DELETE from folder WHERE folder_id = ?", folderId)
                 if cursor.rowcount < 1:
                     raise DatabaseDeleteError("Unable to delete folder")
-            cursor.commit()
+                self._logChange(cursor, "folder", "delete", libraryIndex, "/".join(pathList))
+                self._collectBlobs(cursor)
+                self._stageFolders(cursor, libraryIndex).remove(folderId)
+            self._commit(cursor)
         except DatabaseDeleteError as deleteError:
-            cursor.rollback()
+            self._rollback(cursor)
             raise deleteError
         except Exception as ex:
-            cursor.rollback()
+            self._rollback(cursor)
             raise DatabaseDeleteError(error=ex)
         
     def folderMaterials(self, libraryName: str, path: str) -> list[MaterialLibraryObjectType]:
@@ -436,23 +573,13 @@ class DatabaseMySQL(Database):
             libraryIndex = self._findLibrary(cursor, libraryName)
 
             pathList = self._pathList(path)
-            parentIndex = 0 # start at the root
             if len(pathList) > 0:
-                for index in range(0, len(pathList) - 1):
-                    if parentIndex == 0:
-                        cursor.execute("SELECT folder_id FROM folder WHERE folder_name = ? AND library_id = ?"
-                            " AND parent_id IS NULL", pathList[index], libraryIndex)
-                    else:
-                        cursor.execute("SELECT folder_id FROM folder WHERE folder_name = ? AND library_id = ?"
-                            " AND parent_id = ?", pathList[index], libraryIndex, parentIndex)
-                    row = cursor.fetchone()
-                    if row:
-                        parentIndex = row.folder_id
-                    else:
-                        raise DatabaseMaterialNotFound("Folder path doesn't exist")
-                cursor.execute("SELECT material_id, GetFolder(folder_id) as folder_name, material_name"
-                            " FROM material"
-                            " WHERE folder_id = ? AND library_id = ?", parentIndex, libraryIndex)
+                parentIndex = self._findFolder(cursor, libraryIndex, pathList[:-1])
+                if parentIndex is None:
+                    raise DatabaseMaterialNotFound("Folder path doesn't exist")
+                cursor.execute("SELECT m.material_id, f.folder_path as folder_name, m.material_name"
+                            " FROM material m LEFT JOIN folder f ON f.folder_id = m.folder_id"
+                            " WHERE m.folder_id = ? AND m.library_id = ?", parentIndex, libraryIndex)
                 # if parentIndex == 0:
                 #     cursor.execute("SELECT material_id FROM material WHERE folder_id IS NULL AND library_id = ?", libraryIndex)
                 # else:
@@ -474,45 +601,130 @@ class DatabaseMySQL(Database):
 
         return path.split('/')
 
-    def _createPathRecursive(self, cursor : Cursor, libraryIndex : int, parentIndex : int, pathIndex : int, pathList : list[str]) -> int:
-        newId = 0
-
-        if parentIndex == 0:
-            # No parent. This is a root folder
-            # First see if the folder exists
-            cursor.execute("SELECT folder_id FROM folder WHERE folder_name = ? AND library_id = ?"
-                " AND parent_id IS NULL", pathList[pathIndex], libraryIndex)
-            row = cursor.fetchone()
-            if row:
-                newId = row.folder_id
-            else:
-                cursor.execute("INSERT INTO folder (folder_name, library_id) "
-                                            "VALUES (?, ?)", pathList[pathIndex], libraryIndex)
-                newId = self._lastId(cursor)
-        else:
-            # First see if the folder exists
-            cursor.execute("SELECT folder_id FROM folder WHERE folder_name = ? AND library_id = ?"
-                " AND parent_id = ?", pathList[pathIndex], libraryIndex, parentIndex)
-            row = cursor.fetchone()
-            if row:
-                newId = row.folder_id
-            else:
-                cursor.execute("INSERT INTO folder (folder_name, library_id, parent_id) "
-                                            "VALUES (?, ?, ?)", pathList[pathIndex], libraryIndex, parentIndex)
-                newId = self._lastId(cursor)
-
-        index = pathIndex + 1
-        if index >= len(pathList):
-            return newId
-        return self._createPathRecursive(cursor, libraryIndex, newId, index, pathList)
+    def _readFolderIndex(self, cursor : Cursor, libraryIndex : int) -> FolderIndex:
+        cursor.execute("SELECT folder_id, folder_name, parent_id FROM folder WHERE library_id = ?", libraryIndex)
+        rows = cursor.fetchall()
+        return FolderIndex([(row.folder_id, row.folder_name, row.parent_id) for row in rows])
+
+    def _loadFolderIndex(self, cursor : Cursor, libraryIndex : int) -> FolderIndex:
+        folders = self._readFolderIndex(cursor, libraryIndex)
+        with self._folderLock:
+            self._folderIndexes[libraryIndex] = folders
+        return folders
+
+    def _forgetFolders(self) -> None:
+        with self._folderLock:
+            self._folderIndexes = {}
+
+    def _stagedFolders(self) -> dict[int, FolderIndex]:
+        """Returns the folder indexes changed by the calling thread's open transaction"""
+        if not hasattr(self._pending, "folders"):
+            self._pending.folders = {}
+        return self._pending.folders
+
+    def _stageFolders(self, cursor : Cursor, libraryIndex : int) -> FolderIndex:
+        """
+        Returns a copy of the library's folder index for the open transaction
+        to change. It replaces the shared index when the transaction commits
+        and is discarded if it rolls back.
+        """
+        staged = self._stagedFolders()
+        folders = staged.get(libraryIndex)
+        if folders is None:
+            folders = self._readFolderIndex(cursor, libraryIndex)
+            staged[libraryIndex] = folders
+        return folders
+
+    def _committed(self) -> None:
+        self._libraryNames().clear()
+        staged = self._stagedFolders()
+        if staged:
+            with self._folderLock:
+                self._folderIndexes.update(staged)
+            staged.clear()
+
+    def _rolledBack(self) -> None:
+        # Folders changed in the failed transaction were only staged
+        self._stagedFolders().clear()
+        self._pendingChanges().clear()
+        self._libraryNames().clear()
+        self._pending.committed = None
+
+    def _resolvePath(self, cursor : Cursor, libraryIndex : int, pathList : list[str]) -> tuple[FolderIndex, int, int]:
+        """
+        Resolves as much of the path as exists using the library's folder index,
+        loading it on first use. Returns the index, the id of the deepest folder
+        found (0 for the library root) and the number of path segments matched.
+
+        The index is reloaded once on a partial match in case another session
+        has created the folders since it was loaded. Once the open transaction
+        has changed the library's folders its staged index is used instead.
+        """
+        staged = self._stagedFolders().get(libraryIndex)
+        if staged is not None:
+            folderId, depth = staged.find(pathList)
+            return staged, folderId, depth
+
+        with self._folderLock:
+            folders = self._folderIndexes.get(libraryIndex)
+        fresh = folders is None
+        if fresh:
+            folders = self._loadFolderIndex(cursor, libraryIndex)
+        with self._folderLock:
+            folderId, depth = folders.find(pathList)
+        if depth < len(pathList) and not fresh:
+            folders = self._loadFolderIndex(cursor, libraryIndex)
+            with self._folderLock:
+                folderId, depth = folders.find(pathList)
+        return folders, folderId, depth
+
+    def _findFolder(self, cursor : Cursor, libraryIndex : int, pathList : list[str]) -> int | None:
+        """Returns the folder id for the path, 0 for the library root, or None if it doesn't exist"""
+        _, folderId, depth = self._resolvePath(cursor, libraryIndex, pathList)
+        if depth < len(pathList):
+            return None
+        return folderId
 
     def _createPath(self, cursor : Cursor, libraryIndex : int, path : str) -> int:
-        newId = 0
-
+        """Returns the folder id for the path, creating only the missing folders"""
         pathList = self._pathList(path)
-        if len(pathList) > 0:
-            return self._createPathRecursive(cursor, libraryIndex, 0, 0, pathList)
-        return newId
+        if libraryIndex not in self._stagedFolders():
+            with self._folderLock:
+                folders = self._folderIndexes.get(libraryIndex)
+                if folders is not None:
+                    parentIndex, depth = folders.find(pathList)
+                    if depth == len(pathList):
+                        return parentIndex
+
+        # Something is missing. The staged index is read in this transaction so it's current
+        folders = self._stageFolders(cursor, libraryIndex)
+        parentIndex, depth = folders.find(pathList)
+        parentPath = folders.path(parentIndex)
+        for name in pathList[depth:]:
+            if parentIndex == 0:
+                # No parent. This is a root folder
+                folderPath = name
+                cursor.execute("INSERT INTO folder (folder_name, folder_path, library_id) "
+                                            "VALUES (?, ?, ?)", name, folderPath, libraryIndex)
+            else:
+                folderPath = parentPath + "/" + name
+                cursor.execute("INSERT INTO folder (folder_name, folder_path, library_id, parent_id) "
+                                            "VALUES (?, ?, ?, ?)", name, folderPath, libraryIndex, parentIndex)
+            newId = self._lastId(cursor)
+            self._logChange(cursor, "folder", "create", libraryIndex, folderPath)
+            folders.add(parentIndex, name, newId)
+            parentIndex = newId
+            parentPath = folderPath
+
+        return parentIndex
+
+    def _updateFolderPaths(self, cursor : Cursor, libraryIndex : int, oldPath : str, newPath : str) -> None:
+        """Rewrites the stored path of every folder below oldPath after a rename or move"""
+        oldPrefix = oldPath + "/"
+        cursor.execute("UPDATE folder "
+                       "SET folder_path = CONCAT(?, SUBSTRING(folder_path, ?)) "
+                       "WHERE library_id = ? AND SUBSTRING(folder_path, 1, ?) = ?",
+                       newPath + "/", len(oldPrefix) + 1, libraryIndex, len(oldPrefix), oldPrefix)
 
     def _getPath(self, cursor : Cursor, folderId : int) -> str:
         path = ""
@@ -556,44 +768,46 @@ class DatabaseMySQL(Database):
     def getModel(self, uuid: str) -> ModelObjectType:
         cursor = self._cursor()
         try:
-            cursor.execute("SELECT library_id, GetFolder(folder_id) as folder_name, model_type, "
-                "model_name, model_url, model_description, model_doi FROM model WHERE model_id = ?",
-                        uuid)
-
-            row = cursor.fetchone()
-            if not row:
+            records = self._getModelRecords(cursor, [uuid])
+            if uuid not in records:
                 raise DatabaseModelNotFound()
 
-            model = Materials.Model()
-            # model.UUID = uuid
-            model.Type = row.model_type
-            model.Name = row.model_name
-            model.Directory = row.folder_name
-            model.URL = row.model_url
-            model.Description = row.model_description
-            model.DOI = row.model_doi
+            self._commit(cursor)
+            return self._buildModel(records[uuid])
 
-            # model.Library = self._getLibrary(row.library_id)
-            library = self._getLibrary(cursor, row.library_id)
+        except DatabaseModelNotFound as notFound:
+            self._rollback(cursor)
+            # Rethrow
+            raise notFound
+        except Exception as ex:
+            self._rollback(cursor)
+            print("Unable to get model:", ex)
+            raise DatabaseModelNotFound(error=ex)
 
-            inherits = self._getInherits(cursor, uuid)
-            for inherit in inherits:
-                model.addInheritance(inherit)
+    def getModels(self, uuids: list[str]) -> list[ModelObjectType]:
+        """Returns the models in the same order as the UUIDs, using three queries per batch"""
+        cursor = self._cursor()
+        try:
+            records = {}
+            for chunk in self._chunks(list(dict.fromkeys(uuids))):
+                records.update(self._getModelRecords(cursor, chunk))
 
-            properties = self._getModelProperties(cursor, uuid)
-            for property in properties:
-                model.addProperty(property)
+            models = []
+            for uuid in uuids:
+                if uuid not in records:
+                    raise DatabaseModelNotFound("Model '{}' not found".format(uuid))
+                models.append(self._buildModel(records[uuid]))
 
-            cursor.commit()
-            return ModelObjectType(library.name, model)
+            self._commit(cursor)
+            return models
 
         except DatabaseModelNotFound as notFound:
-            cursor.rollback()
+            self._rollback(cursor)
             # Rethrow
             raise notFound
         except Exception as ex:
-            cursor.rollback()
-            print("Unable to get model:", ex)
+            self._rollback(cursor)
+            print("Unable to get models:", ex)
             raise DatabaseModelNotFound(error=ex)
 
     def createModel(self, libraryName: str, path: str, model: Materials.Model) -> None:
@@ -601,33 +815,94 @@ class DatabaseMySQL(Database):
         try:
             libraryIndex = self._findLibrary(cursor, libraryName)
             if libraryIndex > 0:
-                self._createModel(cursor, libraryIndex, path, model)
-            cursor.commit()
+                create = lambda path, model: self._createModel(cursor, libraryIndex, path, model)
+                inherited = list(model.Inherited)
+                if len(self._existingModels(cursor, inherited)) == len(set(inherited)):
+                    create(path, model)
+                else:
+                    # Models migrated one at a time may arrive before the models they inherit
+                    self._insertDeferred(cursor, [(path, model)], create)
+            self._commit(cursor)
         except DatabaseModelExistsError as exists:
-            cursor.rollback()
+            self._rollback(cursor)
             # Rethrow
             raise exists
         except Exception as ex:
-            cursor.rollback()
+            self._rollback(cursor)
             # print("Exception '{}'".format(type(ex).__name__))
             print("Unable to create model:", ex)
             raise DatabaseModelCreationError(error=ex)
 
+    def createModels(self, libraryName: str, models: list[tuple[str, Materials.Model]]) -> int:
+        """
+        Creates the models that aren't already in the database in a single
+        transaction. Models that exist are skipped, so an interrupted migration
+        can be restarted from the beginning. Returns the number created.
+        """
+        cursor = self._cursor()
+        try:
+            libraryIndex = self._findLibrary(cursor, libraryName)
+            if libraryIndex == 0:
+                raise DatabaseLibraryNotFound()
+
+            existing = self._existingModels(cursor, [model.UUID for _, model in models])
+            models = [(path, model) for path, model in models if model.UUID not in existing]
+            inherited = [inherit for _, model in models for inherit in model.Inherited]
+            known = self._existingModels(cursor, inherited)
+
+            # Insert each model after the models it inherits so the foreign keys
+            # can stay on
+            deferred = []
+            created = set()
+            for path, model in dependencyOrder(models, lambda item: item[1].UUID,
+                                               lambda item: list(item[1].Inherited)):
+                if model.UUID in created:
+                    continue
+                if all(inherit in known for inherit in model.Inherited):
+                    self._insertModel(cursor, libraryIndex, path, model)
+                    known.add(model.UUID)
+                    created.add(model.UUID)
+                else:
+                    deferred.append((path, model))
+
+            # Models inheriting from models that don't exist
+            self._insertDeferred(cursor, deferred, lambda path, model: self._insertModel(cursor, libraryIndex, path, model))
+            created.update([model.UUID for _, model in deferred])
+
+            self._commit(cursor)
+            return len(created)
+        except DatabaseLibraryNotFound as notFound:
+            self._rollback(cursor)
+            raise notFound # Rethrow
+        except Exception as ex:
+            self._rollback(cursor)
+            print("Unable to create models:", ex)
+            raise DatabaseModelCreationError(error=ex)
+
+    def _existingModels(self, cursor : Cursor, uuids : list[str]) -> set[str]:
+        existing = set()
+        for chunk in self._chunks(list(dict.fromkeys(uuids))):
+            cursor.execute("SELECT DISTINCT model_id FROM model WHERE model_id IN ({})".format(
+                self._placeholders(chunk)), *chunk)
+            existing.update([row.model_id for row in cursor.fetchall()])
+
+        return existing
+
     def updateModel(self, libraryName: str, path: str, model: Materials.Model) -> None:
         cursor = self._cursor()
         try:
             libraryIndex = self._findWriteableLibrary(cursor, libraryName)
             self._updateModel(cursor, libraryIndex, path, model)
-            cursor.commit()
+            self._commit(cursor)
         except DatabaseModelNotFound as exists:
-            cursor.rollback()
+            self._rollback(cursor)
             # Rethrow
             raise exists
         except DatabaseLibraryReadOnlyError as ro:
-            cursor.rollback()
+            self._rollback(cursor)
             raise ro
         except Exception as ex:
-            cursor.rollback()
+            self._rollback(cursor)
             print("Unable to update model:", ex)
             raise DatabaseModelUpdateError(error=ex)
         
@@ -636,16 +911,16 @@ class DatabaseMySQL(Database):
         try:
             libraryIndex = self._findWriteableLibrary(cursor, libraryName)
             self._updateModelPath(cursor, libraryIndex, path, uuid)
-            cursor.commit()
+            self._commit(cursor)
         except DatabaseModelNotFound as exists:
-            cursor.rollback()
+            self._rollback(cursor)
             # Rethrow
             raise exists
         except DatabaseLibraryReadOnlyError as ro:
-            cursor.rollback()
+            self._rollback(cursor)
             raise ro
         except Exception as ex:
-            cursor.rollback()
+            self._rollback(cursor)
             print("Unable to update model:", ex)
             raise DatabaseModelUpdateError(error=ex)
 
@@ -654,16 +929,16 @@ class DatabaseMySQL(Database):
         try:
             libraryIndex = self._findWriteableLibrary(cursor, libraryName)
             self._updateModelName(cursor, libraryIndex, name, uuid)
-            cursor.commit()
+            self._commit(cursor)
         except DatabaseModelNotFound as exists:
-            cursor.rollback()
+            self._rollback(cursor)
             # Rethrow
             raise exists
         except DatabaseLibraryReadOnlyError as ro:
-            cursor.rollback()
+            self._rollback(cursor)
             raise ro
         except Exception as ex:
-            cursor.rollback()
+            self._rollback(cursor)
             print("Unable to update model:", ex)
             raise DatabaseModelUpdateError(error=ex)
 
@@ -672,20 +947,24 @@ class DatabaseMySQL(Database):
         try:
             libraryIndex = self._findWriteableLibrary(cursor, libraryName)
             self._moveModel(cursor, libraryIndex, path, uuid)
-            cursor.commit()
+            self._commit(cursor)
         except DatabaseModelNotFound as exists:
-            cursor.rollback()
+            self._rollback(cursor)
             # Rethrow
             raise exists
         except DatabaseLibraryReadOnlyError as ro:
-            cursor.rollback()
+            self._rollback(cursor)
             raise ro
         except Exception as ex:
-            cursor.rollback()
+            self._rollback(cursor)
             print("Unable to update model:", ex)
             raise DatabaseModelUpdateError(error=ex)
 
-    def removeModel(self, uuid: str) -> None:
+    def removeModel(self, uuid: str) -> list[tuple[str, str]]:
+        """
+        Removes the model. Returns the (kind, uuid) pairs of the models and
+        materials that referred to it, as their content has changed
+        """
         cursor = self._cursor()
         try:
             cursor.execute("SELECT library_id FROM model WHERE model_id = ?", uuid)
@@ -702,115 +981,90 @@ class DatabaseMySQL(Database):
                 else:
                     raise DatabaseLibraryNotFound()
                 
+                self._logChange(cursor, "model", "delete", oldLibraryIndex, uuid)
+                referring = self._forgetModelReferences(cursor, uuid)
                 cursor.execute("DELETE FROM model WHERE model_id = ?", uuid)
                 if cursor.rowcount < 0:
                     raise DatabaseDeleteError()
-            cursor.commit()
+            self._commit(cursor)
+            return referring
         except DatabaseLibraryNotFound as noLibrary:
-            cursor.rollback()
+            self._rollback(cursor)
             raise noLibrary
         except DatabaseDeleteError as delError:
-            cursor.rollback()
+            self._rollback(cursor)
             raise delError
         except Exception as ex:
-            cursor.rollback()
+            self._rollback(cursor)
             print(f"Unable to remove model: {ex}")
             raise DatabaseDeleteError(error=ex)
 
-    def _createModelPropertyColumn(self, cursor : Cursor, propertyId : int, property : Materials.ModelProperty, libraryIndex : int) -> None:
-        cursor.execute("SELECT model_property_column_id FROM model_property_column WHERE model_property_id "
-            "= ? AND model_property_name = ?", propertyId, property.Name)
-        row = cursor.fetchone()
-        if not row:
-            cursor.execute("INSERT INTO model_property_column (model_property_id, model_property_name, "
-                "model_property_display_name, model_property_type, "
-                "model_property_units, model_property_url, "
-                "model_property_description) "
-                "VALUES (?, ?, ?, ?, ?, ?, ?)",
-                propertyId,
-                property.Name,
-                property.DisplayName,
-                property.Type,
-                property.Units,
-                property.URL,
-                property.Description
-                )
+    def _createModelPropertyColumns(self, cursor : Cursor, propertyId : int, columns : list[Materials.ModelProperty], libraryIndex : int) -> None:
+        self._executeMany(cursor, "INSERT INTO model_property_column (model_property_id, model_property_name, "
+                                  "model_property_display_name, model_property_type, "
+                                  "model_property_units, model_property_url, "
+                                  "model_property_description) "
+                                  "VALUES (?, ?, ?, ?, ?, ?, ?)" +
+                                  self._onDuplicateUpdate(["model_property_id", "model_property_name"],
+                                                          _modelPropertyColumns),
+                          [(propertyId, column.Name, column.DisplayName, column.Type, column.Units,
+                            column.URL, column.Description) for column in columns])
 
     def _createModelProperty(self, cursor : Cursor, modelUUID : str, property : Materials.ModelProperty, libraryIndex : int) -> None:
+        """Creates the property or updates it if it already exists"""
         if property.Inherited:
             return
 
-        cursor.execute("SELECT model_property_id FROM model_property WHERE model_id "
-                                "= ? AND model_property_name = ?", modelUUID, property.Name)
-        row = cursor.fetchone()
-        if not row:
-            cursor.execute("INSERT INTO model_property (model_id, model_property_name, "
-                                    "model_property_display_name, model_property_type, "
-                                    "model_property_units, model_property_url, "
-                                    "model_property_description) "
-                                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
-                modelUUID,
-                property.Name,
-                property.DisplayName,
-                property.Type,
-                property.Units,
-                property.URL,
-                property.Description
-                )
-            propertyId = self._lastId(cursor)
-            for column in property.Columns:
-                self._createModelPropertyColumn(cursor, propertyId, column, libraryIndex)
-
-    def _updateModelProperty(self,cursor : Cursor,  modelUUID : str, property : Materials.ModelProperty, libraryIndex : int) -> None:
-        if property.Inherited:
-            return
-
-        cursor.execute("SELECT model_property_id FROM model_property WHERE model_id "
-                                "= ? AND model_property_name = ?", modelUUID, property.Name)
-        row = cursor.fetchone()
-        if not row:
-            cursor.execute("INSERT INTO model_property (model_id, model_property_name, "
-                                    "model_property_display_name, model_property_type, "
-                                    "model_property_units, model_property_url, "
-                                    "model_property_description) "
-                                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
-                modelUUID,
-                property.Name,
-                property.DisplayName,
-                property.Type,
-                property.Units,
-                property.URL,
-                property.Description
-                )
-            propertyId = self._lastId(cursor)
-            for column in property.Columns:
-                self._createModelPropertyColumn(cursor, propertyId, column, libraryIndex)
+        cursor.execute("INSERT INTO model_property (model_id, model_property_name, "
+                                "model_property_display_name, model_property_type, "
+                                "model_property_units, model_property_url, "
+                                "model_property_description) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?)" +
+                                self._onDuplicateUpdate(["model_id", "model_property_name"],
+                                                        _modelPropertyColumns, "model_property_id"),
+            modelUUID,
+            property.Name,
+            property.DisplayName,
+            property.Type,
+            property.Units,
+            property.URL,
+            property.Description
+            )
+        columns = list(property.Columns)
+        if columns:
+            propertyId = self._upsertId(cursor)
+            self._createModelPropertyColumns(cursor, propertyId, columns, libraryIndex)
 
     def _createModel(self, cursor : Cursor, libraryIndex : int, path : str, model : Materials.Model) -> None:
-        pathIndex = self._createPath(cursor, libraryIndex, path)
         cursor.execute("SELECT model_id FROM model WHERE model_id = ?", model.UUID)
         row = cursor.fetchone()
         if row:
             raise DatabaseModelExistsError()
         else:
-            cursor.execute("INSERT INTO model (model_id, library_id, folder_id, "
-                        "model_name, model_type, model_url, model_description, model_doi) "
-                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                        model.UUID,
-                        libraryIndex,
-                        (None if pathIndex == 0 else pathIndex),
-                        model.Name,
-                        model.Type,
-                        model.URL,
-                        model.Description,
-                        model.DOI,
-                        )
+            self._insertModel(cursor, libraryIndex, path, model)
 
-            for inherit in model.Inherited:
-                self._createInheritance(cursor, model.UUID, inherit, libraryIndex)
-
-            for property in model.Properties.values():
-                self._createModelProperty(cursor, model.UUID, property, libraryIndex)
+    def _insertModel(self, cursor : Cursor, libraryIndex : int, path : str, model : Materials.Model) -> None:
+        pathIndex = self._createPath(cursor, libraryIndex, path)
+        cursor.execute("INSERT INTO model (model_id, library_id, folder_id, "
+                    "model_name, model_type, model_url, model_description, model_doi, model_hash) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    model.UUID,
+                    libraryIndex,
+                    (None if pathIndex == 0 else pathIndex),
+                    model.Name,
+                    model.Type,
+                    model.URL,
+                    model.Description,
+                    model.DOI,
+                    modelHash(self._modelRecord(model)),
+                    )
+        self._logChange(cursor, "model", "create", libraryIndex, model.UUID)
+
+        for inherit in model.Inherited:
+            self._createInheritance(cursor, model.UUID, inherit, libraryIndex)
+
+        for property in model.Properties.values():
+            self._createModelProperty(cursor, model.UUID, property, libraryIndex)
 
     def _updateModelPath(self, cursor : Cursor, libraryIndex : int, path : str, uuid : str) -> None:
         pathIndex = self._createPath(cursor, libraryIndex, path)
@@ -825,6 +1079,31 @@ class DatabaseMySQL(Database):
                         (None if pathIndex == 0 else pathIndex),
                         uuid
                         )
+            self._logChange(cursor, "model", "update", libraryIndex, uuid)
+
+    def _forgetModelReferences(self, cursor : Cursor, uuid : str) -> list[tuple[str, str]]:
+        """
+        Clears the hashes of the materials and models that refer to a model
+        about to be removed, as removing it also removes their references.
+        Returns their (kind, uuid) pairs
+        """
+        cursor.execute("SELECT m.material_id, m.library_id FROM material m "
+                       "JOIN material_models mm ON mm.material_id = m.material_id WHERE mm.model_id = ?", uuid)
+        materials = cursor.fetchall()
+        cursor.execute("SELECT m.model_id, m.library_id FROM model m "
+                       "JOIN model_inheritance mi ON mi.model_id = m.model_id WHERE mi.inherits_id = ?", uuid)
+        models = cursor.fetchall()
+
+        # The stored hashes no longer match. updateContentHashes() restores them
+        cursor.execute("UPDATE material SET material_hash = NULL WHERE material_id IN "
+                       "(SELECT material_id FROM material_models WHERE model_id = ?)", uuid)
+        cursor.execute("UPDATE model SET model_hash = NULL WHERE model_id IN "
+                       "(SELECT model_id FROM model_inheritance WHERE inherits_id = ?)", uuid)
+        for row in materials:
+            self._logChange(cursor, "material", "update", row.library_id, row.material_id)
+        for row in models:
+            self._logChange(cursor, "model", "update", row.library_id, row.model_id)
+        return [("material", row.material_id) for row in materials] + [("model", row.model_id) for row in models]
 
     def _updateModelName(self, cursor : Cursor, libraryIndex : int, name : str, uuid : str) -> None:
         cursor.execute("SELECT model_id FROM model WHERE library_id = ? AND model_id = ?", libraryIndex, uuid)
@@ -832,12 +1111,15 @@ class DatabaseMySQL(Database):
         if not row:
             raise DatabaseModelNotFound()
         else:
+            # The stored hash no longer matches. updateContentHashes() restores it
             cursor.execute("UPDATE model SET "
-                           "  model_name = ?"
+                           "  model_name = ?,"
+                           "  model_hash = NULL"
                            " WHERE model_id = ?",
                         name,
                         uuid
                         )
+            self._logChange(cursor, "model", "update", libraryIndex, uuid)
 
     def _moveModel(self, cursor : Cursor, libraryIndex : int, path : str, uuid : str) -> None:
         pathIndex = self._createPath(cursor, libraryIndex, path)
@@ -865,13 +1147,25 @@ class DatabaseMySQL(Database):
                             pathIndex,
                             uuid
                             )
+                if oldLibraryIndex != libraryIndex:
+                    self._logChange(cursor, "model", "delete", oldLibraryIndex, uuid)
+                    self._logChange(cursor, "model", "create", libraryIndex, uuid)
+                else:
+                    self._logChange(cursor, "model", "update", libraryIndex, uuid)
 
     def _updateModel(self, cursor : Cursor, libraryIndex : int, path : str, model : Materials.Model) -> None:
         pathIndex = self._createPath(cursor, libraryIndex, path)
-        cursor.execute("SELECT model_id FROM model WHERE library_id = ? AND model_id = ?", libraryIndex, model.UUID)
+        contentHash = modelHash(self._modelRecord(model))
+        cursor.execute("SELECT folder_id, model_hash FROM model WHERE library_id = ? AND model_id = ?", libraryIndex, model.UUID)
         row = cursor.fetchone()
         if not row:
             raise DatabaseModelNotFound()
+        elif row.model_hash == contentHash:
+            # Unchanged, but it may have moved
+            if row.folder_id != (None if pathIndex == 0 else pathIndex):
+                cursor.execute("UPDATE model SET folder_id = ? WHERE model_id = ?",
+                               (None if pathIndex == 0 else pathIndex), model.UUID)
+                self._logChange(cursor, "model", "update", libraryIndex, model.UUID)
         else:
             cursor.execute("UPDATE model SET "
                            "  folder_id = ?,"
@@ -879,7 +1173,8 @@ class DatabaseMySQL(Database):
                            "  model_type = ?,"
                            "  model_url = ?,"
                            "  model_description = ?,"
-                           "  model_doi = ?"
+                           "  model_doi = ?,"
+                           "  model_hash = ?"
                            " WHERE model_id = ?",
                         (None if pathIndex == 0 else pathIndex),
                         model.Name,
@@ -887,8 +1182,10 @@ class DatabaseMySQL(Database):
                         model.URL,
                         model.Description,
                         model.DOI,
+                        contentHash,
                         model.UUID
                         )
+            self._logChange(cursor, "model", "update", libraryIndex, model.UUID)
 
             # Do these deletes need to be smarter due to foreing key constraints?
             cursor.execute("DELETE FROM model_inheritance WHERE model_id = ?", model.UUID)
@@ -906,144 +1203,212 @@ class DatabaseMySQL(Database):
                 cursor.execute("DELETE FROM model_property WHERE model_property_id = ?", property_id)
 
             for property in model.Properties.values():
-                self._updateModelProperty(cursor, model.UUID, property, libraryIndex)
+                self._createModelProperty(cursor, model.UUID, property, libraryIndex)
 
-    def _createInheritance(self, cursor : Cursor, modelUUID : str, inheritUUID : str, libraryIndex : int) -> None:
-        cursor.execute("SELECT model_inheritance_id FROM model_inheritance WHERE model_id "
-                                "= ? AND inherits_id = ?", modelUUID, inheritUUID)
-        row = cursor.fetchone()
-        if not row:
-            # Mass updates may insert models out of sequence creating a foreign key violation
-            self._foreignKeysIgnore(cursor)
-            cursor.execute("INSERT INTO model_inheritance (model_id, inherits_id) "
-                                    "VALUES (?, ?)", modelUUID, inheritUUID)
-            self._foreignKeysRestore(cursor)
+    def _modelRecord(self, model : Materials.Model) -> dict:
+        """Returns the model content in the form returned by _getModelRecords()"""
+        def propertyRecord(property : Materials.ModelProperty) -> dict:
+            return {
+                "name" : property.Name,
+                "displayName" : property.DisplayName,
+                "type" : property.Type,
+                "units" : property.Units,
+                "url" : property.URL,
+                "description" : property.Description,
+                "columns" : [propertyRecord(column) for column in property.Columns]
+            }
+
+        return {
+            "type" : model.Type,
+            "name" : model.Name,
+            "url" : model.URL,
+            "description" : model.Description,
+            "doi" : model.DOI,
+            "inherits" : list(model.Inherited),
+            "properties" : [propertyRecord(property) for property in model.Properties.values()
+                            if not property.Inherited]
+        }
 
-    def _getInherits(self, cursor : Cursor, uuid : str) -> list[str]:
-        inherits = []
-        cursor.execute("SELECT inherits_id FROM model_inheritance "
-                                    "WHERE model_id = ?",
-                       uuid)
+    def _createInheritance(self, cursor : Cursor, modelUUID : str, inheritUUID : str, libraryIndex : int) -> None:
+        cursor.execute(self._insertIgnore() + " INTO model_inheritance (model_id, inherits_id) "
+                                "VALUES (?, ?)", modelUUID, inheritUUID)
+
+    def _getModelRecords(self, cursor : Cursor, uuids : list[str]) -> dict[str, dict]:
+        """
+        Loads the models as plain records keyed by UUID.
+
+        Properties and their columns are read in a single joined query, so the
+        cost doesn't depend on the number of properties. Use _buildModel() to
+        convert a record.
+        """
+        records = {}
+        if len(uuids) < 1:
+            return records
+
+        placeholders = self._placeholders(uuids)
+        cursor.execute("SELECT m.model_id, l.library_name, f.folder_path as folder_name, "
+            "m.model_type, m.model_name, m.model_url, m.model_description, m.model_doi "
+            "FROM model m JOIN library l ON m.library_id = l.library_id "
+            "LEFT JOIN folder f ON f.folder_id = m.folder_id "
+            "WHERE m.model_id IN ({})".format(placeholders),
+                       *uuids)
         rows = cursor.fetchall()
         for row in rows:
-            inherits.append(row.inherits_id)
-
-        return inherits
-
-    def _getModelColumns(self, cursor : Cursor, uuid : str, propertyName : str) -> list[Materials.ModelProperty]:
-        columns = []
-        cursor.execute("SELECT model_property_id FROM model_property "
-                                    "WHERE model_id = ? AND model_property_name = ?",
-                       uuid, propertyName)
-        propertyId = 0
-        row = cursor.fetchone()
-        if row:
-            propertyId = row.model_property_id
-            cursor.execute("SELECT model_property_name, "
-                                    "model_property_display_name, model_property_type, "
-                                    "model_property_units, model_property_url, "
-                                    "model_property_description FROM model_property_column "
-                                    "WHERE model_property_id = ?",
-                        propertyId)
-
-            rows = cursor.fetchall()
-            for row in rows:
-                prop = Materials.ModelProperty()
-                prop.Name = row.model_property_name
-                prop.DisplayName = row.model_property_display_name
-                prop.Type = row.model_property_type
-                prop.Units = row.model_property_units
-                prop.URL = row.model_property_url
-                prop.Description = row.model_property_description
-
-                columns.append(prop)
-
-        return columns
-
-    def _getModelProperties(self, cursor : Cursor, uuid : str) -> list[Materials.ModelProperty]:
-        properties = []
-        cursor.execute("SELECT model_property_name, "
-                                    "model_property_display_name, model_property_type, "
-                                    "model_property_units, model_property_url, "
-                                    "model_property_description FROM model_property "
-                                    "WHERE model_id = ?",
-                       uuid)
-
+            if row.model_id in records:
+                # Same UUID in more than one library. Keep the first
+                continue
+            records[row.model_id] = {
+                "uuid" : row.model_id,
+                "library" : row.library_name,
+                "folder" : row.folder_name,
+                "type" : row.model_type,
+                "name" : row.model_name,
+                "url" : row.model_url,
+                "description" : row.model_description,
+                "doi" : row.model_doi,
+                "inherits" : [],
+                "properties" : []
+            }
+        if len(records) < 1:
+            return records
+
+        cursor.execute("SELECT model_id, inherits_id FROM model_inheritance "
+                                    "WHERE model_id IN ({}) "
+                                    "ORDER BY model_inheritance_id ASC".format(placeholders),
+                       *uuids)
         rows = cursor.fetchall()
         for row in rows:
-            prop = Materials.ModelProperty()
-            prop.Name = row.model_property_name
-            prop.DisplayName = row.model_property_display_name
-            prop.Type = row.model_property_type
-            prop.Units = row.model_property_units
-            prop.URL = row.model_property_url
-            prop.Description = row.model_property_description
-
-            properties.append(prop)
-
-        # This has to happen after the properties are retrieved to prevent nested queries
-        for property in properties:
-            columns = self._getModelColumns(cursor, uuid, property.Name)
-            for column in columns:
-                property.addColumn(column)
-
-        return properties
+            records[row.model_id]["inherits"].append(row.inherits_id)
+
+        cursor.execute("SELECT p.model_id, p.model_property_id, p.model_property_name, "
+                                    "p.model_property_display_name, p.model_property_type, "
+                                    "p.model_property_units, p.model_property_url, "
+                                    "p.model_property_description, "
+                                    "c.model_property_column_id, c.model_property_name AS column_name, "
+                                    "c.model_property_display_name AS column_display_name, "
+                                    "c.model_property_type AS column_type, "
+                                    "c.model_property_units AS column_units, "
+                                    "c.model_property_url AS column_url, "
+                                    "c.model_property_description AS column_description "
+                                    "FROM model_property p LEFT JOIN model_property_column c "
+                                    "ON c.model_property_id = p.model_property_id "
+                                    "WHERE p.model_id IN ({}) "
+                                    "ORDER BY p.model_property_id ASC, "
+                                    "c.model_property_column_id ASC".format(placeholders),
+                       *uuids)
+        properties = {}
+        rows = cursor.fetchall()
+        for row in rows:
+            property = properties.get(row.model_property_id)
+            if property is None:
+                property = {
+                    "name" : row.model_property_name,
+                    "displayName" : row.model_property_display_name,
+                    "type" : row.model_property_type,
+                    "units" : row.model_property_units,
+                    "url" : row.model_property_url,
+                    "description" : row.model_property_description,
+                    "columns" : []
+                }
+                properties[row.model_property_id] = property
+                records[row.model_id]["properties"].append(property)
+            if row.model_property_column_id is not None:
+                property["columns"].append({
+                    "name" : row.column_name,
+                    "displayName" : row.column_display_name,
+                    "type" : row.column_type,
+                    "units" : row.column_units,
+                    "url" : row.column_url,
+                    "description" : row.column_description
+                })
+
+        return records
+
+    def _buildModelProperty(self, record : dict) -> Materials.ModelProperty:
+        prop = Materials.ModelProperty()
+        prop.Name = record["name"]
+        prop.DisplayName = record["displayName"]
+        prop.Type = record["type"]
+        prop.Units = record["units"]
+        prop.URL = record["url"]
+        prop.Description = record["description"]
+
+        for column in record.get("columns", []):
+            prop.addColumn(self._buildModelProperty(column))
+
+        return prop
+
+    def _buildModel(self, record : dict) -> ModelObjectType:
+        model = Materials.Model()
+        # model.UUID = uuid
+        model.Type = record["type"]
+        model.Name = record["name"]
+        model.Directory = record["folder"]
+        model.URL = record["url"]
+        model.Description = record["description"]
+        model.DOI = record["doi"]
+
+        for inherit in record["inherits"]:
+            model.addInheritance(inherit)
+
+        for property in record["properties"]:
+            model.addProperty(self._buildModelProperty(property))
+
+        return ModelObjectType(record["library"], model)
 
     #
     # Material methods
     #
 
-    def getMaterial(self, uuid: str) -> MaterialObjectType:
+    def getMaterial(self, uuid: str, lazy: bool = False) -> MaterialObjectType:
+        """
+        Returns the material. When lazy is set the SVG, Image and ImageList
+        values aren't read, and those properties are left unset. Use
+        getMaterialRecords() for handles that can fetch them later.
+        """
         cursor = self._cursor()
         try:
-            cursor.execute("SELECT library_id, GetFolder(folder_id) as folder_name, material_name, "
-                                "material_author, material_license, material_parent_uuid, "
-                                "material_description, material_url, material_reference FROM "
-                                "material WHERE material_id = ?",
-                        uuid)
-
-            row = cursor.fetchone()
-            if not row:
+            records = self._getMaterialRecords(cursor, [uuid], lazy)
+            if uuid not in records:
                 raise DatabaseMaterialNotFound()
-            material = Materials.Material()
-            # material.UUID = uuid
-            material.Name = row.material_name
-            material.Directory = row.folder_name
-            material.Author = row.material_author
-            material.License = row.material_license
-            material.Parent = row.material_parent_uuid
-            material.Description = row.material_description
-            material.URL = row.material_url
-            material.Reference = row.material_reference
 
-            library = self._getLibrary(cursor, row.library_id)
+            return self._buildMaterial(records[uuid])
 
-            tags = self._getTags(cursor, uuid)
-            for tag in tags:
-                material.addTag(tag)
-
-            for model in self._getMaterialModels(cursor, uuid, True):
-                material.addPhysicalModel(model)
-
-            for model in self._getMaterialModels(cursor, uuid, False):
-                material.addAppearanceModel(model)
+        except DatabaseMaterialNotFound as notFound:
+            self._rollback(cursor)
+            # Rethrow
+            raise notFound
+        except Exception as ex:
+            self._rollback(cursor)
+            print("Unable to get material:", ex)
+            raise DatabaseMaterialNotFound(error=ex)
 
-            # self.addModelProperties(material)
+    def getMaterials(self, uuids: list[str], lazy: bool = False) -> list[MaterialObjectType]:
+        """
+        Returns the materials in the same order as the UUIDs, using a few set
+        queries per batch. lazy is as for getMaterial()
+        """
+        cursor = self._cursor()
+        try:
+            records = {}
+            for chunk in self._chunks(list(dict.fromkeys(uuids))):
+                records.update(self._getMaterialRecords(cursor, chunk, lazy))
 
-            # The actual properties are set by the model. We just need to load the values
-            properties = self._getMaterialProperties(cursor, uuid)
-            for name, value in properties.items():
-                material.setValue(name, value)
+            materials = []
+            for uuid in uuids:
+                if uuid not in records:
+                    raise DatabaseMaterialNotFound("Material '{}' not found".format(uuid))
+                materials.append(self._buildMaterial(records[uuid]))
 
-            return MaterialObjectType(library.name, material)
+            return materials
 
         except DatabaseMaterialNotFound as notFound:
-            cursor.rollback()
+            self._rollback(cursor)
             # Rethrow
             raise notFound
         except Exception as ex:
-            cursor.rollback()
-            print("Unable to get material:", ex)
+            self._rollback(cursor)
+            print("Unable to get materials:", ex)
             raise DatabaseMaterialNotFound(error=ex)
 
     def createMaterial(self, libraryName: str, path: str, material: Materials.Material) -> None:
@@ -1051,30 +1416,658 @@ class DatabaseMySQL(Database):
         try:
             libraryIndex = self._findLibrary(cursor, libraryName)
             if libraryIndex > 0:
-                self._createMaterial(cursor, libraryIndex, path, material)
-            cursor.commit()
+                create = lambda path, material: self._createMaterial(cursor, libraryIndex, path, material)
+                models = self._materialModels(material)
+                if (not material.Parent or self._existingMaterialIds(cursor, [material.Parent])) and \
+                        len(self._existingModels(cursor, models)) == len(set(models)):
+                    create(path, material)
+                else:
+                    # Materials migrated one at a time may arrive before their
+                    # parents or models
+                    self._insertDeferred(cursor, [(path, material)], create)
+            self._commit(cursor)
         except DatabaseMaterialExistsError as exists:
-            cursor.rollback()
+            self._rollback(cursor)
             # Rethrow
             raise exists
         except Exception as ex:
-            cursor.rollback()
+            self._rollback(cursor)
             print("Unable to create material:", ex)
             raise DatabaseMaterialCreationError(error=ex)
         
+    def createMaterials(self, libraryName: str, materials: list[tuple[str, Materials.Material]]) -> int:
+        """
+        Creates the materials that aren't already in the library in a single
+        transaction. Materials that exist are skipped, so an interrupted
+        migration can be restarted from the beginning. Returns the number
+        created.
+        """
+        cursor = self._cursor()
+        try:
+            libraryIndex = self._findLibrary(cursor, libraryName)
+            if libraryIndex == 0:
+                raise DatabaseLibraryNotFound()
+
+            existing = self._existingMaterials(cursor, libraryIndex, [material.UUID for _, material in materials])
+            materials = [(path, material) for path, material in materials if material.UUID not in existing]
+            knownParents = self._existingMaterialIds(cursor, [material.Parent for _, material in materials
+                                                              if material.Parent])
+            knownModels = self._existingModels(cursor, [model for _, material in materials
+                                                        for model in self._materialModels(material)])
+
+            # Insert each material after its parent so the foreign keys can stay on
+            deferred = []
+            created = set()
+            for path, material in dependencyOrder(materials, lambda item: item[1].UUID,
+                                                  lambda item: [item[1].Parent] if item[1].Parent else []):
+                if material.UUID in created:
+                    continue
+                if (not material.Parent or material.Parent in knownParents) and \
+                        all(model in knownModels for model in self._materialModels(material)):
+                    self._insertMaterial(cursor, libraryIndex, path, material)
+                    knownParents.add(material.UUID)
+                    created.add(material.UUID)
+                else:
+                    deferred.append((path, material))
+
+            # Materials referencing parents or models that don't exist
+            self._insertDeferred(cursor, deferred, lambda path, material: self._insertMaterial(cursor, libraryIndex, path, material))
+            created.update([material.UUID for _, material in deferred])
+
+            self._commit(cursor)
+            return len(created)
+        except DatabaseLibraryNotFound as notFound:
+            self._rollback(cursor)
+            raise notFound # Rethrow
+        except Exception as ex:
+            self._rollback(cursor)
+            print("Unable to create materials:", ex)
+            raise DatabaseMaterialCreationError(error=ex)
+
+    def checkConsistency(self, libraryName: str) -> dict[str, list[tuple[str, str]]]:
+        """
+        Finds references from the library's models and materials to models and
+        materials that don't exist. These aren't caught by the foreign keys
+        when they are disabled during migration. Returns lists of
+        (uuid, missing uuid) pairs keyed by the kind of reference.
+        """
+        cursor = self._cursor()
+        try:
+            libraryIndex = self._findLibrary(cursor, libraryName)
+            if libraryIndex == 0:
+                raise DatabaseLibraryNotFound()
+
+            problems = {}
+            cursor.execute("SELECT i.model_id, i.inherits_id FROM model_inheritance i"
+                           " JOIN model m ON m.model_id = i.model_id"
+                           " WHERE m.library_id = ?"
+                           " AND NOT EXISTS (SELECT 1 FROM model p WHERE p.model_id = i.inherits_id)",
+                           libraryIndex)
+            problems["modelInheritance"] = [(row.model_id, row.inherits_id) for row in cursor.fetchall()]
+
+            cursor.execute("SELECT mm.material_id, mm.model_id FROM material_models mm"
+                           " JOIN material m ON m.material_id = mm.material_id"
+                           " WHERE m.library_id = ?"
+                           " AND NOT EXISTS (SELECT 1 FROM model p WHERE p.model_id = mm.model_id)",
+                           libraryIndex)
+            problems["materialModels"] = [(row.material_id, row.model_id) for row in cursor.fetchall()]
+
+            cursor.execute("SELECT m.material_id, m.material_parent_uuid FROM material m"
+                           " WHERE m.library_id = ? AND m.material_parent_uuid IS NOT NULL"
+                           " AND m.material_parent_uuid <> ''"
+                           " AND NOT EXISTS (SELECT 1 FROM material p WHERE p.material_id = m.material_parent_uuid)",
+                           libraryIndex)
+            problems["materialParents"] = [(row.material_id, row.material_parent_uuid) for row in cursor.fetchall()]
+
+            return problems
+        except DatabaseLibraryNotFound as notFound:
+            self._rollback(cursor)
+            raise notFound # Rethrow
+        except Exception as ex:
+            self._rollback(cursor)
+            print("Unable to check library consistency:", ex)
+            raise DatabaseLibraryNotFound(error=ex)
+
+    #
+    # Record methods, used to copy the database
+    #
+
+    def libraryRecords(self) -> list[tuple[str, bytes | None, bool]]:
+        """Returns (name, icon, read only) tuples for every library"""
+        cursor = self._cursor()
+        try:
+            cursor.execute("SELECT library_name, library_icon, library_read_only FROM library")
+            return [(row.library_name, row.library_icon, bool(row.library_read_only)) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    def getMaterialArrays(self, uuids: list[str], names: list[str] | None = None) -> dict[str, dict[str, Any]]:
+        """
+        Returns the 2D and 3D array properties of the materials as NumPy
+        arrays, keyed by material UUID and then property name, without
+        building the materials. Only the named properties are returned when
+        names is set. Materials without matching arrays are left out.
+        """
+        cursor = self._cursor()
+        try:
+            arrays = {}
+            for chunk in self._chunks(list(dict.fromkeys(uuids))):
+                records = self._getMaterialPropertyRecords(cursor, chunk, ["2DArray", "3DArray"], names)
+                for uuid, properties in records.items():
+                    materialArrays = self.numericArrays(properties)
+                    if materialArrays:
+                        arrays[uuid] = materialArrays
+            self._commit(cursor)
+            return arrays
+        finally:
+            cursor.close()
+
+    def numericArrays(self, properties: dict[str, tuple[str, Any]],
+                      names: list[str] | None = None) -> dict[str, Any]:
+        """
+        Wraps the arrays in a record's properties as NumericArray2D and
+        NumericArray3D objects. This needs NumPy, which is imported when
+        first used.
+        """
+        from MaterialDB.Database.NumericArray import numericArray
+
+        arrays = {}
+        for name, (type, raw) in properties.items():
+            if type in ["2DArray", "3DArray"] and raw is not None and (names is None or name in names):
+                arrays[name] = numericArray(type, raw, self._buildPropertyValue)
+        return arrays
+
+    def getModelRecords(self, uuids: list[str]) -> dict[str, dict]:
+        """Returns the models that exist as plain records keyed by UUID"""
+        return self._getRecords(uuids, self._getModelRecords)
+
+    def getMaterialRecords(self, uuids: list[str], lazy: bool = False) -> dict[str, dict]:
+        """
+        Returns the materials that exist as plain records keyed by UUID. When
+        lazy is set the raw values of SVG, Image and ImageList properties are
+        DeferredValue handles, which are read when first used. Pass the
+        values to DeferredValue.prefetch() to read many at once. The handles
+        are snapshots of the material as it was read, so don't cache them.
+        """
+        return self._getRecords(uuids, lambda cursor, chunk: self._getMaterialRecords(cursor, chunk, lazy))
+
+    def iterLibraryRecords(self, libraryName: str, kind: str, batchSize: int = 0) -> Iterator[dict[str, dict]]:
+        """
+        Yields the library's models or materials, as chosen by kind, in
+        batches of plain records keyed by UUID
+        """
+        if kind not in ["model", "material"]:
+            raise ValueError("Unknown object kind '{}'".format(kind))
+        load = self._getModelRecords if kind == "model" else self._getMaterialRecords
+        if batchSize < 1:
+            batchSize = self._batchSize()
+
+        cursor = self._cursor()
+        try:
+            libraryIndex = self._findLibrary(cursor, libraryName)
+            if libraryIndex == 0:
+                raise DatabaseLibraryNotFound()
+
+            cursor.execute("SELECT {0}_id AS uuid FROM {0} WHERE library_id = ?".format(kind), libraryIndex)
+            uuids = [row.uuid for row in cursor.fetchall()]
+            for chunk in self._chunks(uuids, batchSize):
+                yield load(cursor, chunk)
+        finally:
+            cursor.close()
+
+    def buildModel(self, record: dict) -> ModelObjectType:
+        return self._buildModel(record)
+
+    def buildMaterial(self, record: dict) -> MaterialObjectType:
+        # Read any deferred values together rather than one at a time
+        prefetch([raw for _, raw in record["properties"].values()])
+        return self._buildMaterial(record)
+
+    def _getRecords(self, uuids : list[str], load : Callable[[Cursor, list[str]], dict[str, dict]]) -> dict[str, dict]:
+        cursor = self._cursor()
+        try:
+            records = {}
+            for chunk in self._chunks(list(dict.fromkeys(uuids))):
+                records.update(load(cursor, chunk))
+            self._commit(cursor)
+            return records
+        finally:
+            cursor.close()
+
+    def changesSince(self, sequence: int, limit: int = 0) -> list[dict[str, Any]]:
+        """
+        Returns the changes made after the given sequence number, oldest
+        first. Pass the sequence of the last change seen, or 0 for every
+        change. A limit of 0 returns them all.
+
+        Sequence numbers are allocated as a transaction commits, and no two
+        transactions can hold them at once, so a change is never committed
+        with a number below one that has already been seen.
+        """
+        cursor = self._cursor()
+        try:
+            sql = "SELECT change_id, change_time, change_object, change_type, library_name, " \
+                  "change_key, change_old_key FROM change_log WHERE change_id > ? ORDER BY change_id ASC"
+            params = [sequence]
+            if limit > 0:
+                sql += " LIMIT ?"
+                params.append(limit)
+            cursor.execute(sql, *params)
+
+            changes = []
+            for row in cursor.fetchall():
+                changes.append({
+                    "sequence" : row.change_id,
+                    "time" : row.change_time,
+                    "object" : row.change_object,
+                    "change" : row.change_type,
+                    "library" : row.library_name,
+                    "key" : row.change_key,
+                    "oldKey" : row.change_old_key
+                })
+            return changes
+        finally:
+            cursor.close()
+
+    def lastChange(self) -> int:
+        """
+        Returns the sequence number of the most recent change, or 0 if there
+        are none. Pruning the log doesn't change it.
+        """
+        cursor = self._cursor()
+        try:
+            cursor.execute("SELECT change_id FROM change_sequence")
+            row = cursor.fetchone()
+            if row is None or row.change_id is None:
+                return 0
+            return row.change_id
+        finally:
+            cursor.close()
+
+    def lastCommitted(self) -> tuple[int, int] | None:
+        """
+        Returns the first and last sequence numbers given to the changes in
+        the calling thread's most recent commit, or None if it logged none
+        """
+        return getattr(self._pending, "committed", None)
+
+    def pruneChanges(self, sequence: int) -> None:
+        """Removes the changes up to and including the given sequence number"""
+        cursor = self._cursor()
+        try:
+            cursor.execute("DELETE FROM change_log WHERE change_id <= ?", sequence)
+            self._commit(cursor)
+        except Exception as ex:
+            self._rollback(cursor)
+            print("Unable to prune the change log:", ex)
+            raise DatabaseDeleteError(error=ex)
+
+    def modelHashes(self, libraryName: str) -> dict[str, str | None]:
+        """
+        Returns the content hash of every model in the library keyed by UUID.
+        The hash is None when it isn't known, such as after a rename.
+        """
+        return self._contentHashes(libraryName, "model")
+
+    def materialHashes(self, libraryName: str) -> dict[str, str | None]:
+        """Returns the content hash of every material in the library keyed by UUID"""
+        return self._contentHashes(libraryName, "material")
+
+    def modelFolders(self, libraryName: str) -> dict[str, str]:
+        """Returns the folder path of every model in the library keyed by UUID, empty for the library root"""
+        return self._objectFolders(libraryName, "model")
+
+    def materialFolders(self, libraryName: str) -> dict[str, str]:
+        """Returns the folder path of every material in the library keyed by UUID, empty for the library root"""
+        return self._objectFolders(libraryName, "material")
+
+    def modelContentHash(self, model: Materials.Model) -> str:
+        """Returns the hash the model would be stored with"""
+        return modelHash(self._modelRecord(model))
+
+    def materialContentHash(self, material: Materials.Material) -> str:
+        """Returns the hash the material would be stored with"""
+        return materialHash(self._materialRecord(material, self._materialRows(material)))
+
+    def updateContentHashes(self) -> int:
+        """
+        Computes the missing content hashes, such as those of objects written
+        by earlier versions. Returns the number of objects updated.
+        """
+        cursor = self._cursor()
+        try:
+            updated = 0
+            for table, load, hash in [("model", self._getModelRecords, modelHash),
+                                      ("material", self._getMaterialRecords, materialHash)]:
+                cursor.execute("SELECT DISTINCT {0}_id AS uuid FROM {0} WHERE {0}_hash IS NULL".format(table))
+                uuids = [row.uuid for row in cursor.fetchall()]
+                for chunk in self._chunks(uuids, self._batchSize()):
+                    records = load(cursor, chunk)
+                    self._executeMany(cursor, "UPDATE {0} SET {0}_hash = ? WHERE {0}_id = ?".format(table),
+                                      [(hash(record), uuid) for uuid, record in records.items()])
+                    self._commit(cursor)
+                    updated += len(records)
+
+            return updated
+        except Exception as ex:
+            self._rollback(cursor)
+            print("Unable to update content hashes:", ex)
+            raise DatabaseTableCreationError(error=ex)
+
+    def packArrays(self) -> int:
+        """
+        Converts arrays written by earlier versions, stored a row per cell, to
+        the packed format. Each batch is committed as it completes so an
+        interrupted conversion resumes where it stopped. Returns the number of
+        arrays converted.
+        """
+        cursor = self._cursor()
+        try:
+            packed = 0
+            threshold = self._compressionThreshold()
+            codec = self._compressionCodec()
+            while True:
+                cursor.execute("SELECT pv.material_property_value_id, pv.material_id, pv.material_property_name "
+                               "FROM material_property_value pv "
+                               "WHERE pv.material_property_type IN ('2DArray', '3DArray') "
+                               "AND EXISTS (SELECT 1 FROM material_property_array_description ad "
+                               "WHERE ad.material_property_value_id = pv.material_property_value_id) "
+                               "AND NOT EXISTS (SELECT 1 FROM material_property_array_packed ap "
+                               "WHERE ap.material_property_value_id = pv.material_property_value_id) "
+                               "LIMIT ?", self._batchSize())
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+
+                records = self._getMaterialPropertyRecords(cursor, list({row.material_id for row in rows}))
+                arrays = [(row.material_property_value_id,) +
+                          packArray(records[row.material_id][row.material_property_name][1], threshold, codec)
+                          for row in rows]
+                self._executeMany(cursor, "INSERT INTO material_property_array_packed "
+                                          " (material_property_value_id, material_property_array_codec, "
+                                          "  material_property_array_data)"
+                                          " VALUES (?, ?, ?)", arrays, fast=False)
+
+                # The cells and 3D depth values are now part of the packed row
+                valueIds = [row.material_property_value_id for row in rows]
+                placeholders = self._placeholders(valueIds)
+                cursor.execute("DELETE FROM material_property_array_value "
+                               "WHERE material_property_value_id IN ({})".format(placeholders), *valueIds)
+                cursor.execute("DELETE FROM material_property_string_value "
+                               "WHERE material_property_value_id IN ({})".format(placeholders), *valueIds)
+                self._commit(cursor)
+                packed += len(rows)
+
+            return packed
+        except Exception as ex:
+            self._rollback(cursor)
+            print("Unable to pack arrays:", ex)
+            raise DatabaseTableCreationError(error=ex)
+
+    def moveToBlobStore(self) -> int:
+        """
+        Moves long strings written by earlier versions into the blob store.
+        Each batch is committed as it completes. Returns the number of values
+        moved.
+        """
+        cursor = self._cursor()
+        try:
+            moved = 0
+            while True:
+                cursor.execute("SELECT material_property_long_string_value_id, material_property_value "
+                               "FROM material_property_long_string_value "
+                               "WHERE blob_hash IS NULL AND material_property_value <> '' "
+                               "LIMIT ?", self._batchSize())
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+
+                hashes = self._storeBlobs(cursor, [row.material_property_value for row in rows])
+                self._executeMany(cursor, "UPDATE material_property_long_string_value "
+                                          "SET material_property_value = '', blob_hash = ? "
+                                          "WHERE material_property_long_string_value_id = ?",
+                                  [(hash, row.material_property_long_string_value_id)
+                                   for hash, row in zip(hashes, rows)])
+                self._commit(cursor)
+                moved += len(rows)
+
+            return moved
+        except Exception as ex:
+            self._rollback(cursor)
+            print("Unable to move values to the blob store:", ex)
+            raise DatabaseTableCreationError(error=ex)
+
+    def recompress(self, progress : Callable[[int], None] | None = None) -> int:
+        """
+        Rewrites the stored blobs, packed arrays and string values that aren't
+        encoded the way the current CompressionCodec and CompressionThreshold
+        preferences would encode them. Use it after changing either, or to
+        compress values written before compression was added. Each batch is
+        committed as it completes, so this can run alongside other work. A
+        value is only rewritten if it still holds what was read, leaving
+        alone any edited in the meantime.
+        progress is called after each batch with the number of values
+        rewritten so far. Returns the number of values rewritten.
+        """
+        cursor = self._cursor()
+        try:
+            # Unused blobs aren't worth compressing
+            self._collectBlobs(cursor)
+            self._commit(cursor)
+
+            threshold = self._compressionThreshold()
+            codec = self._compressionCodec()
+            rewritten = 0
+
+            def reencode(row):
+                encodedCodec, data = encode(decode(row.codec, row.data), threshold, codec)
+                if encodedCodec == (row.codec or "") and data == bytes(row.data):
+                    return None
+                return (encodedCodec, data, row.id, row.codec, bytes(row.data))
+
+            # Each is (query, parameters, key, update, conversion)
+            tables = [
+                ("SELECT blob_hash AS id, blob_codec AS codec, blob_data AS data FROM blob_store WHERE 1 = 1", [],
+                 "blob_hash", "UPDATE blob_store SET blob_codec = ?, blob_data = ? "
+                 "WHERE blob_hash = ? AND blob_codec = ? AND blob_data = ?", reencode),
+                ("SELECT material_property_value_id AS id, material_property_array_codec AS codec, "
+                 "material_property_array_data AS data FROM material_property_array_packed WHERE 1 = 1", [],
+                 "material_property_value_id",
+                 "UPDATE material_property_array_packed SET material_property_array_codec = ?, "
+                 "material_property_array_data = ? WHERE material_property_value_id = ? "
+                 "AND material_property_array_codec = ? AND material_property_array_data = ?", reencode)
+            ]
+
+            # Only string values that are compressed, or might be worth compressing, need to be read
+            def reencodeText(row):
+                text = decodeText(row.value, row.codec, row.data)
+                encoded = encodeText(text, threshold, codec)
+                current = (row.value, row.codec or "", bytes(row.data) if row.data is not None else None)
+                if encoded == current:
+                    return None
+                return encoded + (row.id, row.value, row.codec, current[2])
+
+            sql = "SELECT material_property_string_value_id AS id, material_property_value AS value, " \
+                  "material_property_value_codec AS codec, material_property_value_data AS data " \
+                  "FROM material_property_string_value WHERE (material_property_value_codec <> ''"
+            params = []
+            if threshold >= 0:
+                # A character takes at most 4 bytes, whichever way the database measures length
+                sql += " OR LENGTH(material_property_value) >= ?"
+                params.append(threshold // 4)
+            sql += ")"
+            tables.append((sql, params, "material_property_string_value_id",
+                           "UPDATE material_property_string_value SET material_property_value = ?, "
+                           "material_property_value_codec = ?, material_property_value_data = ? "
+                           "WHERE material_property_string_value_id = ? AND " +
+                           self._binaryEquals("material_property_value") +
+                           " AND material_property_value_codec = ? "
+                           "AND (material_property_value_codec = '' OR material_property_value_data = ?)",
+                           reencodeText))
+
+            for select, selectParams, key, update, convert in tables:
+                after = None
+                while True:
+                    query, queryParams = self._keyset(select, selectParams, key, after, self._batchSize())
+                    cursor.execute(query, *queryParams)
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    after = rows[-1].id
+
+                    changed = [change for change in [convert(row) for row in rows] if change is not None]
+                    self._executeMany(cursor, update, changed, fast=False)
+                    self._commit(cursor)
+                    rewritten += len(changed)
+                    if progress is not None:
+                        progress(rewritten)
+
+            return rewritten
+        except Exception as ex:
+            self._rollback(cursor)
+            print("Unable to recompress values:", ex)
+            raise DatabaseTableCreationError(error=ex)
+
+    def collectBlobs(self) -> int:
+        """
+        Removes blobs that are no longer used. A blob is referenced by each
+        long string row holding its hash, and is removed in the same
+        transaction as the last of them. Blobs left by earlier versions, or
+        by deletes made outside this class, stay until this is run. Upgrades
+        and recompress() run it too. Returns the number removed.
+        """
+        cursor = self._cursor()
+        try:
+            collected = self._collectBlobs(cursor)
+            self._commit(cursor)
+            return collected
+        except Exception as ex:
+            self._rollback(cursor)
+            print("Unable to collect blobs:", ex)
+            raise DatabaseDeleteError(error=ex)
+
+    def _contentHashes(self, libraryName : str, table : str) -> dict[str, str | None]:
+        cursor = self._cursor()
+        try:
+            libraryIndex = self._findLibrary(cursor, libraryName)
+            if libraryIndex == 0:
+                raise DatabaseLibraryNotFound()
+
+            # Covered by the {table}_hash_index index
+            cursor.execute("SELECT {0}_id AS uuid, {0}_hash AS hash FROM {0} WHERE library_id = ?".format(table),
+                           libraryIndex)
+            return { row.uuid : row.hash for row in cursor.fetchall() }
+        except DatabaseLibraryNotFound as notFound:
+            self._rollback(cursor)
+            raise notFound # Rethrow
+        except Exception as ex:
+            self._rollback(cursor)
+            print("Unable to get content hashes:", ex)
+            raise DatabaseLibraryNotFound(error=ex)
+
+    def _objectFolders(self, libraryName : str, table : str) -> dict[str, str]:
+        cursor = self._cursor()
+        try:
+            libraryIndex = self._findLibrary(cursor, libraryName)
+            if libraryIndex == 0:
+                raise DatabaseLibraryNotFound()
+
+            cursor.execute("SELECT o.{0}_id AS uuid, f.folder_path FROM {0} o "
+                           "LEFT JOIN folder f ON f.folder_id = o.folder_id "
+                           "WHERE o.library_id = ?".format(table), libraryIndex)
+            return { row.uuid : row.folder_path or "" for row in cursor.fetchall() }
+        except DatabaseLibraryNotFound as notFound:
+            self._rollback(cursor)
+            raise notFound # Rethrow
+        except Exception as ex:
+            self._rollback(cursor)
+            print("Unable to get folders:", ex)
+            raise DatabaseLibraryNotFound(error=ex)
+
+    def _logChange(self, cursor : Cursor, object : str, change : str, libraryIndex : int,
+                   key : str, oldKey : str | None = None) -> None:
+        """
+        Records a change in the same transaction as the change itself. The
+        entry is written by _committing() so the sequence numbers follow the
+        order in which transactions commit.
+        """
+        names = self._libraryNames()
+        if object == "library":
+            # Library changes are keyed by the library's name
+            names[libraryIndex] = key
+        elif libraryIndex not in names:
+            cursor.execute("SELECT library_name FROM library WHERE library_id = ?", libraryIndex)
+            row = cursor.fetchone()
+            if row is None:
+                return
+            names[libraryIndex] = row.library_name
+        self._pendingChanges().append((object, change, names[libraryIndex], key, oldKey))
+
+    def _libraryNames(self) -> dict[int, str]:
+        """Returns the library names by library_id known to the calling thread's open transaction"""
+        if not hasattr(self._pending, "libraryNames"):
+            self._pending.libraryNames = {}
+        return self._pending.libraryNames
+
+    def _pendingChanges(self) -> list[tuple[str, str, str, str, str | None]]:
+        """Returns the changes logged by the calling thread's open transaction"""
+        if not hasattr(self._pending, "changes"):
+            self._pending.changes = []
+        return self._pending.changes
+
+    def _committing(self, cursor : Cursor) -> None:
+        self._pending.committed = None
+        changes = self._pendingChanges()
+        if not changes:
+            return
+
+        # The counter stays locked until the commit, so a transaction that
+        # numbers its changes after this one also commits after it
+        cursor.execute("UPDATE change_sequence SET change_id = change_id + ?", len(changes))
+        cursor.execute("SELECT change_id FROM change_sequence")
+        first = cursor.fetchone().change_id - len(changes) + 1
+        self._executeMany(cursor, "INSERT INTO change_log "
+                          "(change_id, change_object, change_type, library_name, change_key, change_old_key) "
+                          "VALUES (?, ?, ?, ?, ?, ?)",
+                          [(first + offset,) + entry for offset, entry in enumerate(changes)])
+        self._pending.committed = (first, first + len(changes) - 1)
+        changes.clear()
+
+    def _existingMaterialIds(self, cursor : Cursor, uuids : list[str]) -> set[str]:
+        """Returns the UUIDs of the materials that exist in any library"""
+        existing = set()
+        for chunk in self._chunks(list(dict.fromkeys(uuids))):
+            cursor.execute("SELECT DISTINCT material_id FROM material WHERE material_id IN ({})".format(
+                self._placeholders(chunk)), *chunk)
+            existing.update([row.material_id for row in cursor.fetchall()])
+
+        return existing
+
+    def _materialModels(self, material : Materials.Material) -> list[str]:
+        return list(material.PhysicalModels) + list(material.AppearanceModels)
+
+    def _existingMaterials(self, cursor : Cursor, libraryIndex : int, uuids : list[str]) -> set[str]:
+        existing = set()
+        for chunk in self._chunks(list(dict.fromkeys(uuids))):
+            cursor.execute("SELECT material_id FROM material WHERE library_id = ? AND material_id IN ({})".format(
+                self._placeholders(chunk)), libraryIndex, *chunk)
+            existing.update([row.material_id for row in cursor.fetchall()])
+
+        return existing
+
     def updateMaterial(self, libraryName: str, path: str, material: Materials.Material) -> None:
         cursor = self._cursor()
         try:
             libraryIndex = self._findLibrary(cursor, libraryName)
             if libraryIndex > 0:
                 self._updateMaterial(cursor, libraryIndex, path, material)
-            cursor.commit()
+            self._commit(cursor)
         except DatabaseMaterialNotFound as notFound:
-            cursor.rollback()
+            self._rollback(cursor)
             # Rethrow
             raise notFound
         except Exception as ex:
-            cursor.rollback()
+            self._rollback(cursor)
             print("Unable to update material:", ex)
             raise DatabaseMaterialCreationError(error=ex)
 
@@ -1108,46 +2101,32 @@ class DatabaseMySQL(Database):
             pass
         return False
 
-    def _createTag(self, cursor : Cursor, materialUUID : str, tag : str, libraryIndex : int) -> None:
-        tagId = 0
-        cursor.execute("SELECT material_tag_id FROM material_tag WHERE material_tag_name = ?", tag)
-        row = cursor.fetchone()
-        if row:
-            tagId = row.material_tag_id
-        else:
-            cursor.execute("INSERT INTO material_tag (material_tag_name) "
-                                    "VALUES (?)", tag)
-            tagId = self._lastId(cursor)
+    def _createTags(self, cursor : Cursor, materialUUID : str, tags : list[str], libraryIndex : int) -> None:
+        tags = list(dict.fromkeys(tags))
+        if not tags:
+            return
 
-        cursor.execute("SELECT material_id, material_tag_id FROM material_tag_mapping "
-                                "WHERE material_id = ? AND material_tag_id = ?", materialUUID, tagId)
-        row = cursor.fetchone()
-        if not row:
-            cursor.execute("INSERT INTO material_tag_mapping (material_id, material_tag_id) "
-                          "VALUES (?, ?)", materialUUID, tagId)
-
-    def _updateTags(self, cursor : Cursor, materialUUID : str, tags : list[str], libraryIndex : int) -> None:
-        currentTags = self._getTags(cursor, materialUUID)
-        deleteTags = []
-        for tag in currentTags:
-            if tag not in tags:
-                deleteTags.append(tag)
-
-        # Remove deleted tags
-        for tag in deleteTags:
-            tagId = 0
-            cursor.execute("SELECT material_tag_id FROM material_tag WHERE material_tag_name = ?", tag)
-            row = cursor.fetchone()
-            if row:
-                tagId = row.material_tag_id
+        tagIds = self._getTagIds(cursor, tags)
+        missing = [tag for tag in tags if tag.lower() not in tagIds]
+        if missing:
+            self._executeMany(cursor, self._insertIgnore() + " INTO material_tag (material_tag_name) VALUES (?)",
+                              [(tag,) for tag in missing])
+            tagIds.update(self._getTagIds(cursor, missing))
 
-                cursor.execute("DELETE FROM material_tag_mapping "
-                                        "WHERE material_id = ? AND material_tag_id = ?", materialUUID, tagId)
+        self._executeMany(cursor, self._insertIgnore() + " INTO material_tag_mapping (material_id, material_tag_id) "
+                                  "VALUES (?, ?)",
+                          [(materialUUID, tagIds[tag.lower()]) for tag in tags])
 
-        # add new tags
-        for tag in tags:
-            if tag not in currentTags:
-                self._createTag(cursor, materialUUID, tag, libraryIndex)
+    def _getTagIds(self, cursor : Cursor, tags : list[str]) -> dict[str, int]:
+        """Returns the tag ids keyed by lower case name, as tag names aren't case sensitive"""
+        tagIds = {}
+        for chunk in self._chunks(tags):
+            cursor.execute("SELECT material_tag_id, material_tag_name FROM material_tag "
+                           "WHERE material_tag_name IN ({})".format(self._placeholders(chunk)), *chunk)
+            for row in cursor.fetchall():
+                tagIds[row.material_tag_name.lower()] = row.material_tag_id
+
+        return tagIds
 
     def _getTags(self, cursor : Cursor, uuid : str) -> list[str]:
         tags = []
@@ -1161,353 +2140,277 @@ class DatabaseMySQL(Database):
 
         return tags
 
-    def _createMaterialModel(self, cursor : Cursor, materialUUID : str, modelUUID : str, libraryIndex : int) -> None:
-        cursor.execute("INSERT IGNORE INTO material_models (material_id, model_id) "
-                                "VALUES (?, ?)", materialUUID, modelUUID)
-
-    def _updateMaterialModels(self, cursor : Cursor, materialUUID : str, physicalUUIDs : list[str], appearanceUUIDs : list[str], libraryIndex : int) -> None:
-        deleteModels = []
-        physical = self._getMaterialModels(cursor, materialUUID, True)
-        for model in physical:
-            if not model in physicalUUIDs:
-                deleteModels.append(model)
-        appearance = self._getMaterialModels(cursor, materialUUID, False)
-        for model in appearance:
-            if not model in appearanceUUIDs:
-                deleteModels.append(model)
-
-        # Delete removed models
-        for model in deleteModels:
-            cursor.execute("DELETE FROM material_models "
-                    "WHERE material_id = ? AND model_id = ?", materialUUID, model)
-
-        # Add new models
-        for model in physicalUUIDs:
-            if model not in physical:
-                self._createMaterialModel(cursor, materialUUID, model, libraryIndex)
-        for model in appearanceUUIDs:
-            if model not in appearance:
-                self._createMaterialModel(cursor, materialUUID, model, libraryIndex)
+    def _createMaterialModels(self, cursor : Cursor, materialUUID : str, modelUUIDs : list[str], libraryIndex : int) -> None:
+        self._executeMany(cursor, self._insertIgnore() + " INTO material_models (material_id, model_id) "
+                                  "VALUES (?, ?)",
+                          [(materialUUID, model) for model in dict.fromkeys(modelUUIDs)])
 
-    def _createMaterialPropertyValue(self, cursor : Cursor, materialUUID : str, name : str, type : str) -> int:
+    def _updateMaterialPropertyValue(self, cursor : Cursor, materialUUID : str, name : str, type : str) -> int:
+        """Returns the id of the property's value row, creating it if required"""
         cursor.execute("INSERT INTO material_property_value (material_id, material_property_name, material_property_type) "
-                    "VALUES (?, ?, ?)",
+                    "VALUES (?, ?, ?)" +
+                    self._onDuplicateUpdate(["material_id", "material_property_name"],
+                                            ["material_property_type"], "material_property_value_id"),
                     materialUUID, name, type)
 
-        return self._lastId(cursor)
-
-    def _updateMaterialPropertyValue(self, cursor : Cursor, materialUUID : str, name : str, type : str) -> int:
-        cursor.execute("SELECT material_property_value_id FROM material_property_value "
-                          "WHERE material_id = ? AND material_property_name= ?",
-                       materialUUID, name)
-
-        row = cursor.fetchone()
-        if row:
-            value_id = row.material_property_value_id
-        else:
-            value_id = self._createMaterialPropertyValue(cursor, materialUUID, name, type)
-        return value_id
+        return self._upsertId(cursor)
 
     def _deleteMaterialPropertyValue(self, cursor : Cursor, materialUUID : str, name : str) -> None:
         cursor.execute("DELETE FROM material_property_value "
                           "WHERE material_id = ? AND material_property_name= ?",
                        materialUUID, name)
 
-    def _createStringValue(self, cursor : Cursor, materialUUID : str, name : str, type : str, value : str) -> None:
-        if value is not None:
-            value_id = self._createMaterialPropertyValue(cursor, materialUUID, name, type)
-            cursor.execute("INSERT INTO material_property_string_value "
-                        " (material_property_value_id, material_property_value)"
-                        " VALUES (?, ?)",
-                        value_id, value)
-
     def _updateStringValue(self, cursor : Cursor, materialUUID : str, name : str, type : str, value : str) -> None:
         if value is not None:
             value_id = self._updateMaterialPropertyValue(cursor, materialUUID, name, type)
-            cursor.execute("SELECT material_property_string_value_id FROM material_property_string_value "
-                            "WHERE material_property_value_id = ?",
-                        value_id)
-
-            row = cursor.fetchone()
-            if row:
-                cursor.execute("UPDATE material_property_string_value "
-                            " SET material_property_value = ?"
-                            " WHERE material_property_value_id = ?",
-                            value, value_id)
-            else:
-                cursor.execute("INSERT INTO material_property_string_value "
-                            " (material_property_value_id, material_property_value)"
-                            " VALUES (?, ?)",
-                            value_id, value)
+            self._insertStrings(cursor, [(value_id, 0, value)])
         else:
             self._deleteMaterialPropertyValue(cursor, materialUUID, name)
 
-    def _createLongStringValue(self, cursor : Cursor, materialUUID : str, name : str, type : str, value : str) -> None:
-        if value is not None:
-            value_id = self._createMaterialPropertyValue(cursor, materialUUID, name, type)
-            cursor.execute("INSERT INTO material_property_long_string_value "
-                        " (material_property_value_id, material_property_value)"
-                        " VALUES (?, ?)",
-                        value_id, value)
-
     def _updateLongStringValue(self, cursor : Cursor, materialUUID : str, name : str, type : str, value : str) -> None:
+        replaced = self._propertyBlobs(cursor, materialUUID, [name])
         if value is not None:
             value_id = self._updateMaterialPropertyValue(cursor, materialUUID, name, type)
-            cursor.execute("SELECT material_property_long_string_value_id FROM material_property_long_string_value "
-                            "WHERE material_property_value_id = ?",
-                        value_id)
-
-            row = cursor.fetchone()
-            if row:
-                cursor.execute("UPDATE material_property_long_string_value "
-                            " SET material_property_value = ?"
-                            " WHERE material_property_value_id = ?",
-                            value, value_id)
-            else:
-                cursor.execute("INSERT INTO material_property_long_string_value "
-                            " (material_property_value_id, material_property_value)"
-                            " VALUES (?, ?)",
-                            value_id, value)
+            self._insertLongStrings(cursor, [(value_id, 0, value)])
         else:
             self._deleteMaterialPropertyValue(cursor, materialUUID, name)
-
-    def _createListValue(self, cursor : Cursor, materialUUID : str, name : str, type : str, list : list[str]) -> None:
-        if list is not None:
-            value_id = self._createMaterialPropertyValue(cursor, materialUUID, name, type)
-
-            for entry in list:
-                cursor.execute("INSERT INTO material_property_string_value "
-                            " (material_property_value_id, material_property_value)"
-                            " VALUES (?, ?)",
-                            value_id, entry)
-
+        self._collectBlobs(cursor, replaced)
 
     def _updateListValue(self, cursor : Cursor, materialUUID : str, name : str, type : str, list : list[str]) -> None:
         value_id = self._updateMaterialPropertyValue(cursor, materialUUID, name, type)
 
-        # Remove and re-add any list entries
+        # Overwrite the entries in place and remove any left over
+        self._insertStrings(cursor, [(value_id, index, entry) for index, entry in enumerate(list)])
         cursor.execute("DELETE FROM material_property_string_value "
-                        "WHERE material_property_value_id = ?",
-                        value_id)
-        for entry in list:
-            cursor.execute("INSERT INTO material_property_string_value "
-                        " (material_property_value_id, material_property_value)"
-                        " VALUES (?, ?)",
-                        value_id, entry)
-
-
-    def _createLongListValue(self, cursor : Cursor, materialUUID : str, name : str, type : str, list : list[str]) -> None:
-        if list is not None:
-            value_id = self._createMaterialPropertyValue(cursor, materialUUID, name, type)
-
-            for entry in list:
-                cursor.execute("INSERT INTO material_property_long_string_value "
-                            " (material_property_value_id, material_property_value)"
-                            " VALUES (?, ?)",
-                            value_id, entry)
+                        "WHERE material_property_value_id = ? AND material_property_value_index >= ?",
+                        value_id, len(list))
 
     def _updateLongListValue(self, cursor : Cursor, materialUUID : str, name : str, type : str, list : list[str]) -> None:
+        replaced = self._propertyBlobs(cursor, materialUUID, [name])
         value_id = self._updateMaterialPropertyValue(cursor, materialUUID, name, type)
 
-        # Remove and re-add any list entries
+        # Overwrite the entries in place and remove any left over
+        self._insertLongStrings(cursor, [(value_id, index, entry) for index, entry in enumerate(list)])
         cursor.execute("DELETE FROM material_property_long_string_value "
-                        "WHERE material_property_value_id = ?",
-                        value_id)
-        for entry in list:
-            cursor.execute("INSERT INTO material_property_long_string_value "
-                        " (material_property_value_id, material_property_value)"
-                        " VALUES (?, ?)",
-                        value_id, entry)
-
-    def _createArrayValue3D(self, cursor : Cursor, materialUUID : str, name : str, propertyType : str, array : Materials.Array3D) -> None:
-        if array is not None:
-            value_id = self._createMaterialPropertyValue(cursor, materialUUID, name, propertyType)
-
-            rows = 0
-            for depth in range(array.Depth):
-                rows = max(rows, array.getRows(depth))
-            cursor.execute("INSERT INTO material_property_array_description "
-                        " (material_property_value_id, material_property_array_rows, "
-                        "  material_property_array_columns, material_property_array_depth)"
-                        " VALUES (?, ?, ?, ?)",
-                        value_id, rows, array.Columns, array.Depth)
-
-            arrayData = array.Array
-            for depth, depthValue in enumerate(arrayData):
-                cursor.execute("INSERT INTO material_property_string_value "
-                        " (material_property_value_id, material_property_value)"
-                        " VALUES (?, ?)",
-                        value_id, array.getDepthValue(depth).UserString)
-            for depth, depthValue in enumerate(arrayData):
-                for row, rowValue in enumerate(depthValue):
-                    for column, columnValue in enumerate(rowValue):
-                        if columnValue is None:
-                            value = None
-                        else:
-                            value = columnValue.UserString
-                        cursor.execute("INSERT INTO material_property_array_value "
-                                    " (material_property_value_id, material_property_value_row, "
-                                    "  material_property_value_column, material_property_value_depth, "
-                                    "  material_property_value_depth_rows, material_property_value)"
-                                    " VALUES (?, ?, ?, ?, ?, ?)",
-                                    value_id, row, column, depth, array.getRows(depth), value)
-
-    def _createArrayValue2D(self, cursor : Cursor, materialUUID : str, name : str, propertyType : str, array : Materials.Array2D) -> None:
-        if array is not None:
-            value_id = self._createMaterialPropertyValue(cursor, materialUUID, name, propertyType)
-
-            cursor.execute("INSERT INTO material_property_array_description "
-                        " (material_property_value_id, material_property_array_rows, "
-                        "  material_property_array_columns)"
-                        " VALUES (?, ?, ?)",
-                        value_id, array.Rows, array.Columns)
-            arrayData = array.Array
-            for row, rowValue in enumerate(arrayData):
-                for column, columnValue in enumerate(rowValue):
-                    if columnValue is None:
-                        value = None
-                    elif hasattr(columnValue, "UserString"):
-                        value = columnValue.UserString
-                    else:
-                        value = columnValue
-                    cursor.execute("INSERT INTO material_property_array_value "
-                                " (material_property_value_id, material_property_value_row, "
-                                "  material_property_value_column, material_property_value)"
-                                " VALUES (?, ?, ?, ?)",
-                                value_id, row, column, value)
-
-    def _createMaterialProperty(self, cursor : Cursor, materialUUID : str, material : Materials.Material, property : Materials.MaterialProperty) -> None:
+                        "WHERE material_property_value_id = ? AND material_property_value_index >= ?",
+                        value_id, len(list))
+        self._collectBlobs(cursor, replaced)
+
+    def _arrayRows3D(self, array : Materials.Array3D) -> dict[str, Any]:
+        """The array is packed into a single row. See _rawPropertyValue() for the layout"""
+        columns = array.Columns
+        arrayData = array.Array
+        depths = []
+        for depth in range(array.Depth):
+            depthValue = arrayData[depth] if depth < len(arrayData) else []
+            depthRows = array.getRows(depth)
+            depths.append({
+                "value" : array.getDepthValue(depth).UserString,
+                "rows" : depthRows,
+                "values" : self._arrayCells(depthValue, depthRows, columns)
+            })
+
+        return {
+            "description" : (max([depth["rows"] for depth in depths], default=0), columns, array.Depth),
+            "packed" : { "columns" : columns, "depths" : depths }
+        }
+
+    def _arrayRows2D(self, array : Materials.Array2D) -> dict[str, Any]:
+        """The array is packed into a single row. See _rawPropertyValue() for the layout"""
+        rows = array.Rows
+        columns = array.Columns
+        return {
+            "description" : (rows, columns, -1),
+            "packed" : { "rows" : rows, "columns" : columns,
+                         "values" : self._arrayCells(array.Array, rows, columns) }
+        }
+
+    def _arrayCells(self, arrayData : list[list[Any]], rows : int, columns : int) -> list[list[str | None]]:
+        """Returns the cells as a rows by columns list of strings, with None for empty cells"""
+        cells = [[None] * columns for row in range(rows)]
+        for row, rowValue in enumerate(arrayData[:rows]):
+            for column, columnValue in enumerate(rowValue[:columns]):
+                if columnValue is None:
+                    continue
+                elif hasattr(columnValue, "UserString"):
+                    cells[row][column] = columnValue.UserString
+                else:
+                    cells[row][column] = columnValue
+        return cells
+
+    def _materialPropertyRows(self, material : Materials.Material, property : Materials.MaterialProperty) -> dict[str, Any] | None:
+        """
+        Returns the rows to store for the property, keyed by the table they go
+        in, or None if the property has no value to store
+        """
         if property.Type == "2DArray" or \
            property.Type == "3DArray":
             if material.hasPhysicalProperty(property.Name):
                 array = material.getPhysicalValue(property.Name)
             else:
                 array = material.getAppearanceValue(property.Name)
+            if array is None:
+                return None
             if array.Dimensions == 2:
-                self._createArrayValue2D(cursor, materialUUID, property.Name, property.Type, array)
-            else:
-                self._createArrayValue3D(cursor, materialUUID, property.Name, property.Type, array)
+                return self._arrayRows2D(array)
+            return self._arrayRows3D(array)
         elif property.Type == "List" or \
            property.Type == "FileList":
-            self._createListValue(cursor, materialUUID, property.Name, property.Type, property.Value)
-        elif property.Type == "ImageList":
-            self._createLongListValue(cursor, materialUUID, property.Name, property.Type, property.Value)
-        elif property.Type == "Quantity":
-            if property.Empty:
-                return
-            self._createStringValue(cursor, materialUUID, property.Name, property.Type, property.Value.UserString)
-        elif property.Type == "SVG" or \
-            property.Type == "Image":
-            self._createLongStringValue(cursor, materialUUID, property.Name, property.Type, property.Value)
-        else:
-            self._createStringValue(cursor, materialUUID, property.Name, property.Type, property.Value)
-
-    def _updateMaterialProperty(self, cursor : Cursor, materialUUID : str, material : Materials.Material, property : Materials.MaterialProperty) -> None:
-        # if property.Type == "2DArray" or \
-        #    property.Type == "3DArray":
-        #     if material.hasPhysicalProperty(property.Name):
-        #         array = material.getPhysicalValue(property.Name)
-        #     else:
-        #         array = material.getAppearanceValue(property.Name)
-        #     if array.Dimensions == 2:
-        #         self._createArrayValue2D(materialUUID, property.Name, property.Type, array, libraryIndex)
-        #     else:
-        #         self._createArrayValue3D(materialUUID, property.Name, property.Type, array, libraryIndex)
-        if property.Type == "List" or \
-           property.Type == "FileList":
-            self._updateListValue(cursor, materialUUID, property.Name, property.Type, property.Value)
+            if property.Value is None:
+                return None
+            return { "strings" : list(property.Value) }
         elif property.Type == "ImageList":
-            self._updateLongListValue(cursor, materialUUID, property.Name, property.Type, property.Value)
+            if property.Value is None:
+                return None
+            return { "longStrings" : list(property.Value) }
         elif property.Type == "Quantity":
             if property.Empty:
-                return
-            self._updateStringValue(cursor, materialUUID, property.Name, property.Type, property.Value.UserString)
+                return None
+            return { "strings" : [property.Value.UserString] }
         elif property.Type == "SVG" or \
             property.Type == "Image":
-            self._updateLongStringValue(cursor, materialUUID, property.Name, property.Type, property.Value)
+            if property.Value is None:
+                return None
+            return { "longStrings" : [property.Value] }
         else:
-            self._updateStringValue(cursor, materialUUID, property.Name, property.Type, property.Value)
-
-    def _updateMaterialProperties(self, cursor : Cursor, materialUUID : str, material : Materials.Material) -> None:
-        properties = self._getMaterialProperties(cursor, materialUUID)
-        newProperties = material.PropertyObjects
-        deleteProperties = []
-        for name, value in properties.items():
-            if name not in newProperties:
-                deleteProperties.append(name)
-
-        for name in deleteProperties:
-            cursor.execute("DELETE FROM material_property_value "
-                        "WHERE material_id = ? AND material_property_name = ?", materialUUID, name)
+            if property.Value is None:
+                return None
+            return { "strings" : [property.Value] }
 
+    def _materialRows(self, material : Materials.Material) -> dict[str, tuple[str, dict[str, Any]]]:
+        """Returns the type and rows of each property that has a value, keyed by name"""
+        propertyRows = {}
         for property in material.PropertyObjects.values():
-            self._updateMaterialProperty(cursor, material.UUID, material, property)
+            rows = self._materialPropertyRows(material, property)
+            if rows is not None:
+                propertyRows[property.Name] = (property.Type, rows)
+        return propertyRows
+
+    def _createMaterialProperties(self, cursor : Cursor, materialUUID : str,
+                                  propertyRows : dict[str, tuple[str, dict[str, Any]]]) -> None:
+        """
+        Creates the properties returned by _materialRows() with one batch of
+        inserts per table. The value ids are read back in a single query
+        instead of one per property.
+        """
+        if not propertyRows:
+            return
 
-    def _createMaterial(self, cursor : Cursor, libraryIndex : int, path : str, material : Materials.Material):
-        pathIndex = self._createPath(cursor, libraryIndex, path)
+        self._executeMany(cursor, "INSERT INTO material_property_value "
+                                  " (material_id, material_property_name, material_property_type)"
+                                  " VALUES (?, ?, ?)" +
+                                  self._onDuplicateUpdate(["material_id", "material_property_name"],
+                                                          ["material_property_type"]),
+                          [(materialUUID, name, type) for name, (type, _) in propertyRows.items()])
+
+        valueIds = {}
+        names = list(propertyRows.keys())
+        for chunk in self._chunks(names):
+            cursor.execute("SELECT material_property_value_id, material_property_name"
+                           " FROM material_property_value"
+                           " WHERE material_id = ? AND material_property_name IN ({})".format(self._placeholders(chunk)),
+                           materialUUID, *chunk)
+            for row in cursor.fetchall():
+                valueIds[row.material_property_name] = row.material_property_value_id
+
+        strings = []
+        longStrings = []
+        descriptions = []
+        arrays = []
+        threshold = self._compressionThreshold()
+        codec = self._compressionCodec()
+        for name, (_, rows) in propertyRows.items():
+            valueId = valueIds[name]
+            strings.extend([(valueId, index, value) for index, value in enumerate(rows.get("strings", []))])
+            longStrings.extend([(valueId, index, value) for index, value in enumerate(rows.get("longStrings", []))])
+            if "description" in rows:
+                descriptions.append((valueId,) + rows["description"])
+            if "packed" in rows:
+                arrays.append((valueId,) + packArray(rows["packed"], threshold, codec))
+
+        self._insertStrings(cursor, strings)
+        self._insertLongStrings(cursor, longStrings)
+        self._executeMany(cursor, "INSERT INTO material_property_array_description "
+                                  " (material_property_value_id, material_property_array_rows, "
+                                  "  material_property_array_columns, material_property_array_depth)"
+                                  " VALUES (?, ?, ?, ?)", descriptions)
+        self._executeMany(cursor, "INSERT INTO material_property_array_packed "
+                                  " (material_property_value_id, material_property_array_codec, "
+                                  "  material_property_array_data)"
+                                  " VALUES (?, ?, ?)", arrays, fast=False)
 
+    def _createMaterial(self, cursor : Cursor, libraryIndex : int, path : str, material : Materials.Material):
         cursor.execute("SELECT material_id FROM material WHERE material_id = ? AND library_id = ?", material.UUID, libraryIndex)
         row = cursor.fetchone()
         if row:
             raise DatabaseMaterialExistsError()
         else:
-            # Mass updates may insert models out of sequence creating a foreign key
-            # violation
-            self._foreignKeysIgnore(cursor)
-
-            cursor.execute("INSERT INTO material (material_id, library_id, folder_id, "
-                            "material_name, material_author, material_license, "
-                            "material_parent_uuid, material_description, material_url, "
-                            "material_reference) "
-                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-                            material.UUID,
-                            libraryIndex,
-                            (None if pathIndex == 0 else pathIndex),
-                            material.Name,
-                            material.Author,
-                            material.License,
-                            material.Parent,
-                            material.Description,
-                            material.URL,
-                            material.Reference,
-                            )
-
-            for tag in material.Tags:
-                self._createTag(cursor, material.UUID, tag, libraryIndex)
-
-            # print("{} Physical models".format(len(material.PhysicalModels)))
-            for model in material.PhysicalModels:
-                self._createMaterialModel(cursor, material.UUID, model, libraryIndex)
+            self._insertMaterial(cursor, libraryIndex, path, material)
 
-            # print("{} Appearance models".format(len(material.AppearanceModels)))
-            for model in material.AppearanceModels:
-                self._createMaterialModel(cursor, material.UUID, model, libraryIndex)
+    def _insertMaterial(self, cursor : Cursor, libraryIndex : int, path : str, material : Materials.Material):
+        propertyRows = self._materialRows(material)
+        pathIndex = self._createPath(cursor, libraryIndex, path)
+        cursor.execute("INSERT INTO material (material_id, library_id, folder_id, "
+                        "material_name, material_author, material_license, "
+                        "material_parent_uuid, material_description, material_url, "
+                        "material_reference, material_hash) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        material.UUID,
+                        libraryIndex,
+                        (None if pathIndex == 0 else pathIndex),
+                        material.Name,
+                        material.Author,
+                        material.License,
+                        material.Parent,
+                        material.Description,
+                        material.URL,
+                        material.Reference,
+                        materialHash(self._materialRecord(material, propertyRows)),
+                        )
+        self._logChange(cursor, "material", "create", libraryIndex, material.UUID)
 
-            # print("{} Properties".format(len(material.PropertyObjects)))
-            for property in material.PropertyObjects.values():
-                self._createMaterialProperty(cursor, material.UUID, material, property)
+        self._createTags(cursor, material.UUID, material.Tags, libraryIndex)
+        self._createMaterialModels(cursor, material.UUID, self._materialModels(material), libraryIndex)
+        self._createMaterialProperties(cursor, material.UUID, propertyRows)
 
     def _updateMaterial(self, cursor : Cursor, libraryIndex : int, path : str, material : Materials.Material):
+        """
+        Writes only what has changed. When the content hash matches nothing
+        but the location can have changed. Otherwise the stored material is
+        loaded in one bulk read and compared with the new one.
+
+        SVG, Image and ImageList properties without a value keep their stored
+        value, as they are left unset on materials read lazily. Remove the
+        property's model to remove the value.
+        """
+        propertyRows = self._materialRows(material)
+        unset = [property.Name for property in material.PropertyObjects.values()
+                 if property.Type in ["SVG", "Image", "ImageList"] and property.Name not in propertyRows]
+        kept = {}
+        if unset:
+            kept = self._getMaterialPropertyRecords(cursor, [material.UUID], names=unset).get(material.UUID, {})
+        record = self._materialRecord(material, propertyRows)
+        record["properties"].update(kept)
+        contentHash = materialHash(record)
         pathIndex = self._createPath(cursor, libraryIndex, path)
+        folderIndex = (None if pathIndex == 0 else pathIndex)
 
-        cursor.execute("SELECT material_id FROM material WHERE material_id = ?",
+        cursor.execute("SELECT library_id, folder_id, material_hash FROM material WHERE material_id = ?",
                        material.UUID)
         row = cursor.fetchone()
         if not row:
             raise DatabaseMaterialNotFound()
-        else:
-            # Mass updates may insert models out of sequence creating a foreign key
-            # violation
-            self._foreignKeysIgnore(cursor)
 
+        if row.library_id != libraryIndex or row.folder_id != folderIndex or \
+                row.material_hash != contentHash:
             cursor.execute("UPDATE material SET "
                             "library_id = ?, folder_id = ?, "
                             "material_name = ?, material_author = ?, material_license = ?, "
                             "material_parent_uuid = ?, material_description = ?, material_url = ?, "
-                            "material_reference = ? "
+                            "material_reference = ?, material_hash = ? "
                             "WHERE material_id = ?",
                             libraryIndex,
-                            (None if pathIndex == 0 else pathIndex),
+                            folderIndex,
                             material.Name,
                             material.Author,
                             material.License,
@@ -1515,174 +2418,698 @@ class DatabaseMySQL(Database):
                             material.Description,
                             material.URL,
                             material.Reference,
+                            contentHash,
                             material.UUID,
                             )
+            if row.library_id != libraryIndex:
+                self._logChange(cursor, "material", "delete", row.library_id, material.UUID)
+                self._logChange(cursor, "material", "create", libraryIndex, material.UUID)
+            else:
+                self._logChange(cursor, "material", "update", libraryIndex, material.UUID)
+        if row.material_hash == contentHash:
+            return
 
-            self._updateTags(cursor, material.UUID, material.Tags, libraryIndex)
-            self._updateMaterialModels(cursor, material.UUID, material.PhysicalModels, material.AppearanceModels, libraryIndex)
-            self._updateMaterialProperties(cursor, material.UUID, material)
+        stored = self._getMaterialRecords(cursor, [material.UUID])[material.UUID]
+        self._updateTags(cursor, material.UUID, stored["tags"], list(material.Tags), libraryIndex)
+        self._updateMaterialModels(cursor, material.UUID,
+                                   stored["physicalModels"] + stored["appearanceModels"],
+                                   self._materialModels(material), libraryIndex)
+        self._updateMaterialProperties(cursor, material.UUID, propertyRows,
+                                       { name : value for name, value in stored["properties"].items()
+                                         if name not in kept })
+
+    def _updateTags(self, cursor : Cursor, materialUUID : str, currentTags : list[str], tags : list[str], libraryIndex : int) -> None:
+        # Tag names aren't case sensitive
+        current = set(tag.lower() for tag in currentTags)
+        wanted = set(tag.lower() for tag in tags)
+        deleteTags = [tag for tag in currentTags if tag.lower() not in wanted]
+        for chunk in self._chunks(deleteTags):
+            cursor.execute("DELETE FROM material_tag_mapping "
+                           "WHERE material_id = ? AND material_tag_id IN "
+                           "(SELECT material_tag_id FROM material_tag WHERE material_tag_name IN ({}))".format(
+                               self._placeholders(chunk)),
+                           materialUUID, *chunk)
+
+        self._createTags(cursor, materialUUID, [tag for tag in tags if tag.lower() not in current], libraryIndex)
+
+    def _updateMaterialModels(self, cursor : Cursor, materialUUID : str, currentUUIDs : list[str], modelUUIDs : list[str], libraryIndex : int) -> None:
+        deleteModels = [model for model in currentUUIDs if model not in modelUUIDs]
+        for chunk in self._chunks(deleteModels):
+            cursor.execute("DELETE FROM material_models "
+                           "WHERE material_id = ? AND model_id IN ({})".format(self._placeholders(chunk)),
+                           materialUUID, *chunk)
+
+        self._createMaterialModels(cursor, materialUUID,
+                                   [model for model in modelUUIDs if model not in currentUUIDs],
+                                   libraryIndex)
+
+    def _rawPropertyRows(self, type : str, rows : dict[str, Any]) -> Any:
+        """Converts rows from _materialPropertyRows() to the raw value they load as"""
+        return self._rawPropertyValue({
+            "type" : type,
+            "strings" : rows.get("strings", []),
+            "long" : rows.get("longStrings", []),
+            "shape" : rows.get("description"),
+            "cells" : [],
+            "packed" : rows.get("packed")
+        })
+
+    def _materialRecord(self, material : Materials.Material,
+                        propertyRows : dict[str, tuple[str, dict[str, Any]]]) -> dict:
+        """Returns the material content in the form returned by _getMaterialRecords()"""
+        return {
+            "name" : material.Name,
+            "author" : material.Author,
+            "license" : material.License,
+            "parent" : material.Parent,
+            "description" : material.Description,
+            "url" : material.URL,
+            "reference" : material.Reference,
+            "tags" : list(material.Tags),
+            "physicalModels" : list(material.PhysicalModels),
+            "appearanceModels" : list(material.AppearanceModels),
+            "properties" : { name : (type, self._rawPropertyRows(type, rows))
+                             for name, (type, rows) in propertyRows.items() }
+        }
+
+    def _updateMaterialProperties(self, cursor : Cursor, materialUUID : str,
+                                  propertyRows : dict[str, tuple[str, dict[str, Any]]],
+                                  currentProperties : dict[str, tuple[str, Any]]) -> None:
+        """
+        Compares the properties returned by _materialRows() with the stored
+        raw values. A changed scalar is updated in place. Anything else that
+        changed, such as a list or an array, is deleted and inserted again,
+        all in batches.
+        """
+        deleteProperties = [name for name in currentProperties if name not in propertyRows]
+        strings = []
+        longStrings = []
+        insertRows = {}
+        for name, (type, rows) in propertyRows.items():
+            raw = self._rawPropertyRows(type, rows)
+            current = currentProperties.get(name)
+            if current == (type, raw):
+                continue
+            if current is not None and current[0] == type and \
+                    isinstance(current[1], str) and isinstance(raw, str):
+                if "longStrings" in rows:
+                    longStrings.append((raw, materialUUID, name))
+                else:
+                    strings.append((raw, materialUUID, name))
+            else:
+                if current is not None:
+                    deleteProperties.append(name)
+                insertRows[name] = (type, rows)
 
-    def _getMaterialModels(self, cursor : Cursor, uuid : str, isPhysical : bool) -> list[int]:
-        models = []
-        cursor.execute("SELECT m1.model_id FROM material_models m1, model m2 "
-            "WHERE m1.material_id = ? AND m1.model_id = m2.model_id AND m2.model_type = ?",
-                       uuid,
-                       ("Physical" if isPhysical else "Appearance"))
+        # Blobs are removed with the last value referring to them
+        replaced = self._propertyBlobs(cursor, materialUUID, deleteProperties + [name for _, _, name in longStrings])
 
+        for chunk in self._chunks(deleteProperties):
+            cursor.execute("DELETE FROM material_property_value "
+                           "WHERE material_id = ? AND material_property_name IN ({})".format(self._placeholders(chunk)),
+                           materialUUID, *chunk)
+
+        threshold = self._compressionThreshold()
+        codec = self._compressionCodec()
+        strings = [encodeText(raw, threshold, codec) + (uuid, name) for raw, uuid, name in strings]
+        self._executeMany(cursor, "UPDATE material_property_string_value "
+                                  "SET material_property_value = ?, material_property_value_codec = ?, "
+                                  "material_property_value_data = ? "
+                                  "WHERE material_property_value_index = 0 AND material_property_value_id = "
+                                  "(SELECT material_property_value_id FROM material_property_value "
+                                  "WHERE material_id = ? AND material_property_name = ?)",
+                          strings, fast=not any(row[2] is not None for row in strings))
+        hashes = self._storeBlobs(cursor, [raw for raw, _, _ in longStrings])
+        self._executeMany(cursor, "UPDATE material_property_long_string_value "
+                                  "SET material_property_value = '', blob_hash = ? "
+                                  "WHERE material_property_value_index = 0 AND material_property_value_id = "
+                                  "(SELECT material_property_value_id FROM material_property_value "
+                                  "WHERE material_id = ? AND material_property_name = ?)",
+                          [(hash, uuid, name) for hash, (_, uuid, name) in zip(hashes, longStrings)])
+        self._createMaterialProperties(cursor, materialUUID, insertRows)
+        self._collectBlobs(cursor, replaced)
+
+    def _materialFilter(self, cursor : Cursor, filter : Materials.MaterialFilter | None,
+                        options : Materials.MaterialFilterOptions | None) -> tuple[str, list[Any]] | None:
+        """
+        Translates the filter into predicates on the material table, aliased
+        as m. Returns the SQL to append to the WHERE clause and its parameters,
+        or None when no material can match.
+
+        A material has a model if it has the model itself or any model that
+        inherits from it. A model is complete when every property of the model,
+        including the inherited ones, has a value.
+
+        Of the options, IncludeFavorites, IncludeRecent, IncludeEmptyFolders
+        and IncludeEmptyLibraries add entries to the tree the caller builds
+        from the list rather than choosing materials. Every material in the
+        database has a UUID, so none of them are legacy materials and the
+        list is the same whatever IncludeLegacy is. Any other option that is
+        set raises DatabaseFilterError, so the caller can filter another way.
+        """
+        if options is not None:
+            unsupported = [name for name in dir(options) if not name.startswith("_") and
+                           name not in _filterOptions and getattr(options, name, None) is True]
+            if unsupported:
+                raise DatabaseFilterError("Filter options not supported: {}".format(", ".join(unsupported)))
+
+        if filter is None:
+            return "", []
+
+        required = list(dict.fromkeys(filter.RequiredModels))
+        complete = list(dict.fromkeys(filter.RequiredCompleteModels))
+        if not required and not complete:
+            return "", []
+
+        where = ""
+        params = []
+        # A complete model is also a required one
+        models = list(dict.fromkeys(required + complete))
+        descendants = self._getModelDescendants(cursor, models)
+        for uuid in models:
+            matching = descendants.get(uuid, [])
+            if not matching:
+                return None
+            where += (" AND EXISTS (SELECT 1 FROM material_models mm"
+                      " WHERE mm.material_id = m.material_id AND mm.model_id IN ({}))").format(
+                          self._placeholders(matching))
+            params.extend(matching)
+
+        for uuid in complete:
+            names = self._getModelPropertyNames(cursor, uuid)
+            if not names:
+                continue
+            where += (" AND (SELECT COUNT(DISTINCT pv.material_property_name)"
+                      " FROM material_property_value pv"
+                      " WHERE pv.material_id = m.material_id AND pv.material_property_name IN ({})"
+                      " AND (EXISTS (SELECT 1 FROM material_property_string_value sv"
+                      "   WHERE sv.material_property_value_id = pv.material_property_value_id"
+                      "   AND (sv.material_property_value <> '' OR sv.material_property_value_codec <> ''))"
+                      " OR EXISTS (SELECT 1 FROM material_property_long_string_value lv"
+                      "   WHERE lv.material_property_value_id = pv.material_property_value_id"
+                      "   AND (lv.blob_hash IS NOT NULL OR lv.material_property_value <> ''))"
+                      " OR EXISTS (SELECT 1 FROM material_property_array_description ad"
+                      "   WHERE ad.material_property_value_id = pv.material_property_value_id))"
+                      ") = ?").format(self._placeholders(names))
+            params.extend(names)
+            params.append(len(names))
+
+        return where, params
+
+    def _getModelDescendants(self, cursor : Cursor, uuids : list[str]) -> dict[str, list[str]]:
+        """Returns each model along with every model that inherits from it, directly or indirectly"""
+        descendants = {}
+        for chunk in self._chunks(uuids):
+            cursor.execute("WITH RECURSIVE descendants (required_id, model_id) AS ("
+                           " SELECT model_id, model_id FROM model WHERE model_id IN ({})"
+                           " UNION"
+                           " SELECT d.required_id, i.model_id FROM model_inheritance i"
+                           " JOIN descendants d ON i.inherits_id = d.model_id"
+                           ") SELECT required_id, model_id FROM descendants".format(self._placeholders(chunk)),
+                           *chunk)
+            for row in cursor.fetchall():
+                descendants.setdefault(row.required_id, []).append(row.model_id)
+
+        return descendants
+
+    def _getModelPropertyNames(self, cursor : Cursor, uuid : str) -> list[str]:
+        """Returns the names of the model's properties, including those it inherits"""
+        cursor.execute("WITH RECURSIVE ancestors (model_id) AS ("
+                       " SELECT ?"
+                       " UNION"
+                       " SELECT i.inherits_id FROM model_inheritance i"
+                       " JOIN ancestors a ON i.model_id = a.model_id"
+                       ") SELECT DISTINCT p.model_property_name FROM model_property p"
+                       " JOIN ancestors a ON p.model_id = a.model_id", uuid)
+
+        return [row.model_property_name for row in cursor.fetchall()]
+
+    def _getMaterialRecords(self, cursor : Cursor, uuids : list[str], lazy : bool = False) -> dict[str, dict]:
+        """
+        Loads the materials as plain records keyed by UUID.
+
+        The number of queries is fixed, regardless of the number of
+        materials or properties. Use _buildMaterial() to convert a record.
+        lazy is as for _getMaterialPropertyRecords()
+        """
+        records = {}
+        if len(uuids) < 1:
+            return records
+
+        placeholders = self._placeholders(uuids)
+        cursor.execute("SELECT m.material_id, l.library_name, f.folder_path as folder_name, "
+                            "m.material_name, m.material_author, m.material_license, "
+                            "m.material_parent_uuid, m.material_description, m.material_url, "
+                            "m.material_reference FROM material m JOIN library l ON m.library_id = l.library_id "
+                            "LEFT JOIN folder f ON f.folder_id = m.folder_id "
+                            "WHERE m.material_id IN ({})".format(placeholders),
+                       *uuids)
         rows = cursor.fetchall()
         for row in rows:
-            models.append(row.model_id)
-
-        return models
-
-    def _getMaterialPropertyStringValue(self, cursor : Cursor, materialPropertyValueId : int) -> str | None:
-        cursor.execute("SELECT material_property_value "
-                        "FROM material_property_string_value "
-                        "WHERE material_property_value_id = ?",
-                       materialPropertyValueId)
-        row = cursor.fetchone()
-        if not row:
-            return None
-
-        return row.material_property_value
-
-    def _getMaterialPropertyLongStringValue(self, cursor : Cursor, materialPropertyValueId : int) -> str | None:
-        cursor.execute("SELECT material_property_value "
-                        "FROM material_property_long_string_value "
-                        "WHERE material_property_value_id = ?",
-                       materialPropertyValueId)
-        row = cursor.fetchone()
-        if not row:
-            return None
-
-        return row.material_property_value
-
-    def _getMaterialPropertyListValue(self, cursor : Cursor, materialPropertyValueId : int) -> list[str]:
-        cursor.execute("SELECT material_property_value "
-                        "FROM material_property_string_value "
-                        "WHERE material_property_value_id = ? "
-                        "ORDER BY material_property_value_id ASC",
-                       materialPropertyValueId)
+            if row.material_id in records:
+                # Same UUID in more than one library. Keep the first
+                continue
+            records[row.material_id] = {
+                "uuid" : row.material_id,
+                "library" : row.library_name,
+                "folder" : row.folder_name,
+                "name" : row.material_name,
+                "author" : row.material_author,
+                "license" : row.material_license,
+                "parent" : row.material_parent_uuid,
+                "description" : row.material_description,
+                "url" : row.material_url,
+                "reference" : row.material_reference,
+                "tags" : [],
+                "physicalModels" : [],
+                "appearanceModels" : [],
+                "properties" : {}
+            }
+        if len(records) < 1:
+            return records
+
+        cursor.execute("SELECT m.material_id, t.material_tag_name FROM material_tag t, material_tag_mapping m "
+                          "WHERE m.material_id IN ({}) AND m.material_tag_id = t.material_tag_id".format(placeholders),
+                       *uuids)
         rows = cursor.fetchall()
-        list = []
         for row in rows:
-            list.append(row.material_property_value)
+            records[row.material_id]["tags"].append(row.material_tag_name)
 
-        return list
-
-    def _getMaterialPropertyLongListValue(self, cursor : Cursor, materialPropertyValueId : int) -> list[str]:
-        cursor.execute("SELECT material_property_value "
-                        "FROM material_property_long_string_value "
-                        "WHERE material_property_value_id = ? "
-                        "ORDER BY material_property_value_id ASC",
-                       materialPropertyValueId)
+        cursor.execute("SELECT DISTINCT m1.material_id, m1.model_id, m2.model_type FROM material_models m1, model m2 "
+            "WHERE m1.material_id IN ({}) AND m1.model_id = m2.model_id".format(placeholders),
+                       *uuids)
         rows = cursor.fetchall()
-        list = []
         for row in rows:
-            list.append(row.material_property_value)
-
-        return list
-
-    def _getMaterialPropertyArray2D(self, cursor : Cursor, materialPropertyValueId : int) -> Materials.Array2D:
-        array=Materials.Array2D()
-
-        cursor.execute("SELECT material_property_array_rows, material_property_array_columns "
-                        "FROM material_property_array_description "
-                        "WHERE material_property_value_id = ?",
-                       materialPropertyValueId)
-        row = cursor.fetchone()
-        if not row:
-            return None
-        # Columns must be set first so rows can be created
-        # print("rows {}, columns {}".format(row.material_property_array_rows, row.material_property_array_columns))
-        array.Columns = row.material_property_array_columns
-        array.Rows = row.material_property_array_rows
-
-        cursor.execute("SELECT material_property_value_row, material_property_value_column,"
-                        " material_property_value_depth, material_property_value "
-                        "FROM material_property_array_value "
-                        "WHERE material_property_value_id = ? "
-                        "ORDER BY material_property_value_id ASC",
-                       materialPropertyValueId)
+            if row.model_type == "Physical":
+                records[row.material_id]["physicalModels"].append(row.model_id)
+            else:
+                records[row.material_id]["appearanceModels"].append(row.model_id)
+
+        properties = self._getMaterialPropertyRecords(cursor, uuids, lazy=lazy)
+        for uuid, record in records.items():
+            record["properties"] = properties.get(uuid, {})
+
+        return records
+
+    def _getMaterialPropertyRecords(self, cursor : Cursor, uuids : list[str], types : list[str] | None = None,
+                                    names : list[str] | None = None,
+                                    lazy : bool = False) -> dict[str, dict[str, tuple[str, Any]]]:
+        """
+        Loads the property values for the materials, keyed by material UUID and
+        then property name. Each value is a tuple of the property type and its
+        raw value, as described in _rawPropertyValue(). Only properties of the
+        given types and names are loaded when they're set.
+
+        When lazy is set the long string table isn't read. The raw values of
+        SVG, Image and ImageList properties are DeferredValue handles instead.
+        """
+        placeholders = self._placeholders(uuids)
+
+        # Scalar strings, lists, and the depth values of unpacked 3D arrays all live in the string table
+        sql = "SELECT pv.material_id, pv.material_property_value_id, pv.material_property_name, " \
+              "pv.material_property_type, sv.material_property_value, " \
+              "sv.material_property_value_codec, sv.material_property_value_data " \
+              "FROM material_property_value pv LEFT JOIN material_property_string_value sv " \
+              "ON sv.material_property_value_id = pv.material_property_value_id " \
+              "WHERE pv.material_id IN ({}) ".format(placeholders)
+        params = list(uuids)
+        if types is not None:
+            sql += "AND pv.material_property_type IN ({}) ".format(self._placeholders(types))
+            params.extend(types)
+        if names is not None:
+            sql += "AND pv.material_property_name IN ({}) ".format(self._placeholders(names))
+            params.extend(names)
+        sql += "ORDER BY pv.material_property_value_id ASC, " \
+               "sv.material_property_value_index ASC, " \
+               "sv.material_property_string_value_id ASC"
+        cursor.execute(sql, *params)
+        values = {}
+        longIds = []
+        arrayIds = []
         rows = cursor.fetchall()
         for row in rows:
-            # print(f"row: {row.material_property_value_row} column: {row.material_property_value_column} value: {row.material_property_value}")
-            array.setValue(row.material_property_value_row,
-                            row.material_property_value_column,
-                            row.material_property_value)
-
-        return array
-
-    def _getMaterialPropertyArray3D(self, cursor : Cursor, materialPropertyValueId : int) -> Materials.Array3D:
-        array=Materials.Array3D()
-
-        cursor.execute("SELECT material_property_array_depth, material_property_array_columns "
-                        "FROM material_property_array_description "
-                        "WHERE material_property_value_id = ?",
-                       materialPropertyValueId)
-        row = cursor.fetchone()
-        if not row:
-            return None
-        # Columns must be set first so depth can be created
-        array.Columns = row.material_property_array_columns
-        array.Depth = row.material_property_array_depth
-
-        cursor.execute("SELECT material_property_value "
-                        "FROM material_property_string_value "
-                        "WHERE material_property_value_id = ?",
-                       materialPropertyValueId)
-        rows = cursor.fetchall()
-        for depth, row in enumerate(rows):
-            array.setDepthValue(depth, row.material_property_value)
-
-        cursor.execute("SELECT material_property_value_row, material_property_value_column,"
-                        " material_property_value_depth, material_property_value_depth_rows,"
-                        " material_property_value "
-                        "FROM material_property_array_value "
-                        "WHERE material_property_value_id = ? "
-                        "ORDER BY material_property_value_id ASC",
-                       materialPropertyValueId)
-        rows = cursor.fetchall()
+            value = values.get(row.material_property_value_id)
+            if value is None:
+                value = {
+                    "material" : row.material_id,
+                    "name" : row.material_property_name,
+                    "type" : row.material_property_type,
+                    "strings" : [],
+                    "long" : [],
+                    "shape" : None,
+                    "cells" : [],
+                    "packed" : None
+                }
+                values[row.material_property_value_id] = value
+                if row.material_property_type in ["SVG", "Image", "ImageList"]:
+                    longIds.append(row.material_property_value_id)
+                elif row.material_property_type in ["2DArray", "3DArray"]:
+                    arrayIds.append(row.material_property_value_id)
+            if row.material_property_value is not None:
+                value["strings"].append(decodeText(row.material_property_value, row.material_property_value_codec,
+                                                   row.material_property_value_data))
+
+        # Only visit the remaining tables when there's something to find. These
+        # select by value so only the properties loaded above are read
+        if not lazy:
+            for valueId, long in self._getLongValues(cursor, longIds).items():
+                values[valueId]["long"] = long
+
+        for chunk in self._chunks(arrayIds):
+            cursor.execute("SELECT material_property_value_id, material_property_array_codec, "
+                            "material_property_array_data "
+                            "FROM material_property_array_packed "
+                            "WHERE material_property_value_id IN ({})".format(self._placeholders(chunk)),
+                           *chunk)
+            rows = cursor.fetchall()
+            for row in rows:
+                values[row.material_property_value_id]["packed"] = unpackArray(row.material_property_array_codec,
+                                                                               row.material_property_array_data)
 
-        for row in rows:
-            array.setRows(row.material_property_value_depth, row.material_property_value_depth_rows)
-            array.setValue(row.material_property_value_depth,
-                            row.material_property_value_row,
-                            row.material_property_value_column,
-                            row.material_property_value)
+        # Arrays written by earlier versions have a row per cell until packArrays() is run
+        unpacked = [valueId for valueId in arrayIds if values[valueId]["packed"] is None]
+        if unpacked:
+            self._getArrayCells(cursor, unpacked, values)
 
-        return array
+        properties = {}
+        for valueId, value in values.items():
+            materialProperties = properties.setdefault(value["material"], {})
+            if lazy and value["type"] in ["SVG", "Image", "ImageList"]:
+                raw = DeferredValue((valueId, value["type"]), self._loadDeferred)
+            else:
+                raw = self._rawPropertyValue(value)
+            materialProperties[value["name"]] = (value["type"], raw)
+        return properties
 
-    def _getMaterialPropertyValue(self, cursor : Cursor, materialPropertyValueId : int, type : str) -> Any:
+    def _getLongValues(self, cursor : Cursor, valueIds : list[int]) -> dict[int, list[str]]:
+        """Loads the long strings of the values, in order, keyed by value id"""
+        entries = []
+        for chunk in self._chunks(valueIds):
+            cursor.execute("SELECT material_property_value_id, material_property_value, blob_hash "
+                            "FROM material_property_long_string_value "
+                            "WHERE material_property_value_id IN ({}) "
+                            "ORDER BY material_property_value_id ASC, "
+                            "material_property_value_index ASC, "
+                            "material_property_long_string_value_id ASC".format(self._placeholders(chunk)),
+                           *chunk)
+            entries.extend(cursor.fetchall())
+
+        # Values written by earlier versions are stored in the row until moveToBlobStore() is run
+        blobs = self._getBlobs(cursor, list({row.blob_hash for row in entries if row.blob_hash is not None}))
+        longs = { valueId : [] for valueId in valueIds }
+        for row in entries:
+            longs[row.material_property_value_id].append(
+                blobs[row.blob_hash] if row.blob_hash is not None else row.material_property_value)
+        return longs
+
+    def _blobCache(self) -> LRUCache:
+        global _blobs
+        with _blobsLock:
+            if _blobs is None:
+                _blobs = LRUCache(self._blobCacheSize())
+            return _blobs
+
+    def _getBlobs(self, cursor : Cursor, hashes : list[str]) -> dict[str, str]:
+        """Returns the values in the blob store keyed by hash, only reading those that aren't cached"""
+        cache = self._blobCache()
+        blobs = {}
+        for hash in hashes:
+            text = cache.get(hash)
+            if text is not None:
+                blobs[hash] = text
+        for chunk in self._chunks([hash for hash in hashes if hash not in blobs]):
+            cursor.execute("SELECT blob_hash, blob_codec, blob_data FROM blob_store "
+                           "WHERE blob_hash IN ({})".format(self._placeholders(chunk)), *chunk)
+            for row in cursor.fetchall():
+                text = unpackBlob(row.blob_codec, row.blob_data)
+                blobs[row.blob_hash] = text
+                cache.put(row.blob_hash, text, len(text))
+        return blobs
+
+    def _storeBlobs(self, cursor : Cursor, texts : list[str]) -> list[str | None]:
+        """
+        Adds the values to the blob store, returning the hash of each. Values
+        already in the store aren't sent again. Empty values aren't stored
+        and have no hash.
+        """
+        hashes = [blobHash(text) if text else None for text in texts]
+        unique = { hash : text for hash, text in zip(hashes, texts) if hash is not None }
+        existing = set()
+        for chunk in self._chunks(list(unique)):
+            # Locked so they can't be collected before the caller refers to them
+            cursor.execute("SELECT blob_hash FROM blob_store WHERE blob_hash IN ({})".format(self._placeholders(chunk)) +
+                           self._shareLock(), *chunk)
+            existing.update([row.blob_hash for row in cursor.fetchall()])
+
+        threshold = self._compressionThreshold()
+        codec = self._compressionCodec()
+        # Blobs are mostly images. Binding them as fixed size parameter arrays
+        # wastes a lot of memory
+        self._executeMany(cursor, self._insertIgnore() + " INTO blob_store (blob_hash, blob_codec, blob_size, blob_data) "
+                                  "VALUES (?, ?, ?, ?)",
+                          [(hash,) + packBlob(text, threshold, codec) for hash, text in unique.items() if hash not in existing],
+                          fast=False)
+        return hashes
+
+    def _insertStrings(self, cursor : Cursor, rows : list[tuple[int, int, str]]) -> None:
+        """Writes (value id, index, value) rows, compressing values over the threshold"""
+        threshold = self._compressionThreshold()
+        codec = self._compressionCodec()
+        encoded = [(valueId, index) + encodeText(value, threshold, codec) for valueId, index, value in rows]
+        # Compressed values are bound as binary, which parameter arrays handle poorly
+        self._executeMany(cursor, "INSERT INTO material_property_string_value "
+                                  " (material_property_value_id, material_property_value_index, material_property_value, "
+                                  "  material_property_value_codec, material_property_value_data)"
+                                  " VALUES (?, ?, ?, ?, ?)" +
+                                  self._onDuplicateUpdate(_valueKeys, ["material_property_value",
+                                                                       "material_property_value_codec",
+                                                                       "material_property_value_data"]),
+                          encoded, fast=not any(row[4] is not None for row in encoded))
+
+    def _insertLongStrings(self, cursor : Cursor, rows : list[tuple[int, int, str]]) -> None:
+        """Writes (value id, index, value) rows, keeping the values in the blob store"""
+        hashes = self._storeBlobs(cursor, [value for _, _, value in rows])
+        self._executeMany(cursor, "INSERT INTO material_property_long_string_value "
+                                  " (material_property_value_id, material_property_value_index, "
+                                  "  material_property_value, blob_hash)"
+                                  " VALUES (?, ?, '', ?)" +
+                                  self._onDuplicateUpdate(_valueKeys, ["material_property_value", "blob_hash"]),
+                          [(valueId, index, hash) for (valueId, index, _), hash in zip(rows, hashes)])
+
+    def _collectBlobs(self, cursor : Cursor, hashes : list[str] | None = None) -> int:
+        """
+        Removes the blobs no long string refers to, returning the number
+        removed. When hashes is given only those blobs are checked.
+        """
+        sql = self._deleteIgnore() + " FROM blob_store WHERE NOT EXISTS " \
+              "(SELECT 1 FROM material_property_long_string_value lv " \
+              "WHERE lv.blob_hash = blob_store.blob_hash)"
+        if hashes is None:
+            cursor.execute(sql)
+            return max(cursor.rowcount, 0)
+
+        collected = 0
+        for chunk in self._chunks(list(dict.fromkeys(hashes))):
+            cursor.execute(sql + " AND blob_hash IN ({})".format(self._placeholders(chunk)), *chunk)
+            collected += max(cursor.rowcount, 0)
+        return collected
+
+    def _propertyBlobs(self, cursor : Cursor, materialUUID : str, names : list[str]) -> list[str]:
+        """Returns the hashes of the blobs held by the named properties of the material"""
+        hashes = set()
+        for chunk in self._chunks(list(dict.fromkeys(names))):
+            cursor.execute("SELECT lv.blob_hash FROM material_property_long_string_value lv "
+                           "JOIN material_property_value pv "
+                           "ON pv.material_property_value_id = lv.material_property_value_id "
+                           "WHERE lv.blob_hash IS NOT NULL AND pv.material_id = ? "
+                           "AND pv.material_property_name IN ({})".format(self._placeholders(chunk)),
+                           materialUUID, *chunk)
+            hashes.update([row.blob_hash for row in cursor.fetchall()])
+        return list(hashes)
+
+    def _loadDeferred(self, handles : list[DeferredValue]) -> None:
+        """Reads the values of deferred long string properties in a query per batch"""
+        cursor = self._cursor()
+        try:
+            longs = self._getLongValues(cursor, list(dict.fromkeys([handle.key[0] for handle in handles])))
+
+            # Values replaced since the material was read are stored under new ids
+            empty = [valueId for valueId, values in longs.items() if not values]
+            found = set()
+            for chunk in self._chunks(empty):
+                cursor.execute("SELECT material_property_value_id FROM material_property_value "
+                               "WHERE material_property_value_id IN ({})".format(self._placeholders(chunk)), *chunk)
+                found.update([row.material_property_value_id for row in cursor.fetchall()])
+            if len(found) < len(empty):
+                raise DatabaseMaterialNotFound("The property values have changed since the material was read")
+            self._commit(cursor)
+
+            for handle in handles:
+                valueId, type = handle.key
+                handle.resolve(self._rawPropertyValue({ "type" : type, "long" : longs[valueId] }))
+        except DatabaseMaterialNotFound as notFound:
+            self._rollback(cursor)
+            raise notFound # Rethrow
+        except Exception as ex:
+            self._rollback(cursor)
+            print("Unable to get deferred values:", ex)
+            raise DatabaseMaterialNotFound(error=ex)
+        finally:
+            cursor.close()
+
+    def _getArrayCells(self, cursor : Cursor, valueIds : list[int], values : dict[int, dict]) -> None:
+        """Loads the shape and cells of arrays stored with a row per cell"""
+        for chunk in self._chunks(valueIds):
+            placeholders = self._placeholders(chunk)
+            cursor.execute("SELECT material_property_value_id, material_property_array_rows, "
+                            "material_property_array_columns, material_property_array_depth "
+                            "FROM material_property_array_description "
+                            "WHERE material_property_value_id IN ({})".format(placeholders),
+                           *chunk)
+            rows = cursor.fetchall()
+            for row in rows:
+                values[row.material_property_value_id]["shape"] = (row.material_property_array_rows,
+                                                                   row.material_property_array_columns,
+                                                                   row.material_property_array_depth)
+
+            cursor.execute("SELECT material_property_value_id, material_property_value_row, "
+                            "material_property_value_column, material_property_value_depth, "
+                            "material_property_value_depth_rows, material_property_value "
+                            "FROM material_property_array_value "
+                            "WHERE material_property_value_id IN ({}) "
+                            "ORDER BY material_property_array_value_id ASC".format(placeholders),
+                           *chunk)
+            rows = cursor.fetchall()
+            for row in rows:
+                values[row.material_property_value_id]["cells"].append((row.material_property_value_row,
+                                                                       row.material_property_value_column,
+                                                                       row.material_property_value_depth,
+                                                                       row.material_property_value_depth_rows,
+                                                                       row.material_property_value))
+
+    def _rawPropertyValue(self, value : dict) -> Any:
+        """
+        Converts the rows loaded for a property to its raw value. Scalars are
+        strings, lists are lists of strings, 2D arrays are
+        {"rows", "columns", "values"} and 3D arrays are
+        {"columns", "depths" : [{"value", "rows", "values"}]} where "values"
+        is a list of rows, each a list of cell strings
+        """
+        type = value["type"]
+        if type in ["2DArray", "3DArray"] and value.get("packed") is not None:
+            return value["packed"]
         if type == "2DArray":
-            return self._getMaterialPropertyArray2D(cursor, materialPropertyValueId)
+            if value["shape"] is None:
+                return None
+            rows, columns, _ = value["shape"]
+            cells = [[None] * columns for row in range(rows)]
+            for row, column, _, _, cell in value["cells"]:
+                if row < rows and column < columns:
+                    cells[row][column] = cell
+            return { "rows" : rows, "columns" : columns, "values" : cells }
         elif type == "3DArray":
-            return self._getMaterialPropertyArray3D(cursor, materialPropertyValueId)
+            if value["shape"] is None:
+                return None
+            _, columns, depth = value["shape"]
+            depthRows = [0] * depth
+            for _, _, cellDepth, cellDepthRows, _ in value["cells"]:
+                if 0 <= cellDepth < depth:
+                    depthRows[cellDepth] = max(depthRows[cellDepth], cellDepthRows)
+            depths = []
+            for index in range(depth):
+                depths.append({
+                    "value" : value["strings"][index] if index < len(value["strings"]) else None,
+                    "rows" : depthRows[index],
+                    "values" : [[None] * columns for row in range(depthRows[index])]
+                })
+            for row, column, cellDepth, _, cell in value["cells"]:
+                if 0 <= cellDepth < depth and row < depthRows[cellDepth] and column < columns:
+                    depths[cellDepth]["values"][row][column] = cell
+            return { "columns" : columns, "depths" : depths }
         elif type == "SVG" or \
            type == "Image":
-            return self._getMaterialPropertyLongStringValue(cursor, materialPropertyValueId)
+            if len(value["long"]) < 1:
+                return None
+            return value["long"][0]
         elif type == "List" or \
            type == "FileList":
-            return self._getMaterialPropertyListValue(cursor, materialPropertyValueId)
+            return value["strings"]
         elif type == "ImageList":
-            return self._getMaterialPropertyLongListValue(cursor, materialPropertyValueId)
-
-        return self._getMaterialPropertyStringValue(cursor, materialPropertyValueId)
-
-    def _getMaterialProperties(self, cursor : Cursor, uuid : str) -> dict[str,str]:
-        cursor.execute("SELECT material_property_value_id, material_property_name, material_property_type "
-                        "FROM material_property_value "
-                        "WHERE material_id = ?",
-                       uuid)
+            return value["long"]
 
-        propertyKeys = {}
-        rows = cursor.fetchall()
-        for row in rows:
-            propertyKeys[row.material_property_name] = (row.material_property_value_id, row.material_property_type)
+        if len(value["strings"]) < 1:
+            return None
+        return value["strings"][0]
 
+    def _buildPropertyValue(self, type : str, raw : Any) -> Any:
+        """Converts a raw property value to the form expected by Materials.Material.setValue()"""
+        if raw is None:
+            return None
+        if type == "2DArray":
+            array = Materials.Array2D()
+            # Columns must be set first so rows can be created
+            array.Columns = raw["columns"]
+            array.Rows = raw["rows"]
+            for row, rowValue in enumerate(raw["values"]):
+                for column, columnValue in enumerate(rowValue):
+                    if columnValue is not None:
+                        array.setValue(row, column, columnValue)
+            return array
+        elif type == "3DArray":
+            array = Materials.Array3D()
+            # Columns must be set first so depth can be created
+            array.Columns = raw["columns"]
+            array.Depth = len(raw["depths"])
+            for depth, depthValue in enumerate(raw["depths"]):
+                if depthValue["value"] is not None:
+                    array.setDepthValue(depth, depthValue["value"])
+                array.setRows(depth, depthValue["rows"])
+                for row, rowValue in enumerate(depthValue["values"]):
+                    for column, columnValue in enumerate(rowValue):
+                        if columnValue is not None:
+                            array.setValue(depth, row, column, columnValue)
+            return array
+
+        # Strings and lists of strings are used as is
+        return raw
+
+    def _buildMaterial(self, record : dict) -> MaterialObjectType:
+        material = Materials.Material()
+        # material.UUID = uuid
+        material.Name = record["name"]
+        material.Directory = record["folder"]
+        material.Author = record["author"]
+        material.License = record["license"]
+        material.Parent = record["parent"]
+        material.Description = record["description"]
+        material.URL = record["url"]
+        material.Reference = record["reference"]
+
+        for tag in record["tags"]:
+            material.addTag(tag)
+
+        for model in record["physicalModels"]:
+            material.addPhysicalModel(model)
+
+        for model in record["appearanceModels"]:
+            material.addAppearanceModel(model)
+
+        # The actual properties are set by the model. We just need to load the values
+        for name, (type, raw) in record["properties"].items():
+            if isinstance(raw, DeferredValue):
+                if not raw.loaded:
+                    # Left unset for lazy materials
+                    continue
+                raw = raw.value
+            material.setValue(name, self._buildPropertyValue(type, raw))
+
+        return MaterialObjectType(record["library"], material)
+
+    def _getMaterialProperties(self, cursor : Cursor, uuid : str) -> dict[str, Any]:
         properties = {}
-        for key, value in propertyKeys.items():
-            properties[key] = self._getMaterialPropertyValue(cursor, value[0], value[1])
+        records = self._getMaterialPropertyRecords(cursor, [uuid]).get(uuid, {})
+        for name, (type, raw) in records.items():
+            properties[name] = self._buildPropertyValue(type, raw)
 
         return properties
     
@@ -1694,6 +3121,85 @@ class DatabaseMySQL(Database):
     # Support methods
     #
 
+    def _chunks(self, values : list[Any], size : int = 1000) -> list[list[Any]]:
+        """Splits the values into lists small enough for a single IN (...) clause"""
+        return [values[index:index + size] for index in range(0, len(values), size)]
+
+    def _keyset(self, sql : str, params : list[Any], key : str,
+                after : Any | None, limit : int) -> tuple[str, list[Any]]:
+        """
+        Adds keyset pagination to a query. Rows are ordered by key and start
+        after the key of the last row on the previous page. Unlike OFFSET, the
+        cost of a page doesn't depend on how far into the listing it is.
+        """
+        if after is not None:
+            sql += " AND {} > ?".format(key)
+            params = params + [after]
+        if after is not None or limit > 0:
+            sql += " ORDER BY {}".format(key)
+        if limit > 0:
+            sql += " LIMIT {}".format(int(limit))
+        return sql, params
+
+    def _fetchBatches(self, cursor : Cursor, batchSize : int = 0) -> Iterator[Any]:
+        """Yields the rows of the executed query, fetching batchSize rows at a time"""
+        if batchSize <= 0:
+            batchSize = self._batchSize()
+        while True:
+            rows = cursor.fetchmany(batchSize)
+            if not rows:
+                break
+            yield from rows
+
+    def _placeholders(self, values : list[Any]) -> str:
+        """Returns the parameter markers for an IN (...) clause"""
+        return ", ".join(["?"] * len(values))
+
+    def _insertDeferred(self, cursor : Cursor, deferred : list[tuple[str, Any]],
+                        insert : Callable[[str, Any], None]) -> None:
+        """
+        Inserts objects whose references can't be satisfied, with the foreign
+        key checks off. checkConsistency() reports these references.
+        """
+        if not deferred:
+            return
+        self._foreignKeysIgnore(cursor)
+        try:
+            for path, item in deferred:
+                insert(path, item)
+        finally:
+            self._foreignKeysRestore(cursor)
+
+    def _insertIgnore(self) -> str:
+        """Returns the start of an insert that skips rows duplicating a unique key"""
+        return "INSERT IGNORE"
+
+    def _onDuplicateUpdate(self, keys : list[str], columns : list[str], idColumn : str | None = None) -> str:
+        """
+        Returns the clause that turns an insert into an upsert, overwriting the
+        columns of the row that matches the unique key. When idColumn is given
+        _upsertId() returns the id of the row written
+        """
+        updates = ["{0} = VALUES({0})".format(column) for column in columns]
+        if idColumn is not None:
+            updates.insert(0, "{0} = LAST_INSERT_ID({0})".format(idColumn))
+        return " ON DUPLICATE KEY UPDATE " + ", ".join(updates)
+
+    def _deleteIgnore(self) -> str:
+        """
+        Returns the start of a delete that skips rows a foreign key still
+        refers to, such as a blob referred to by a write not yet committed
+        """
+        return "DELETE IGNORE"
+
+    def _shareLock(self) -> str:
+        """Returns the clause that locks the rows a query reads until the transaction ends"""
+        return " LOCK IN SHARE MODE"
+
+    def _binaryEquals(self, column : str) -> str:
+        """Returns a predicate comparing the column with a parameter byte for byte, whatever its collation"""
+        return "BINARY {} = ?".format(column)
+
     def _foreignKeysIgnore(self, cursor : Cursor) -> None:
         cursor.execute("SET FOREIGN_KEY_CHECKS=0")
 
@@ -26,6 +26,11 @@ from MaterialDB.Database.DatabaseMySQL import DatabaseMySQL
 from MaterialDB.Configuration import getDatabaseName
 from MaterialDB.Database.Exceptions import DatabaseCreationError, DatabaseTableCreationError
 
+# Starts the change sequence after the last change already logged
+_seedChangeSequence = "INSERT INTO change_sequence (change_id) SELECT last FROM" \
+    " (SELECT COALESCE(MAX(change_id), 0) AS last FROM change_log) l" \
+    " WHERE NOT EXISTS (SELECT * FROM change_sequence)"
+
 class DatabaseMySQLCreate(DatabaseMySQL):
 
     def __init__(self):
@@ -42,6 +47,7 @@ class DatabaseMySQLCreate(DatabaseMySQL):
             "folder" :  """CREATE TABLE IF NOT EXISTS folder (
                             folder_id INTEGER AUTO_INCREMENT NOT NULL PRIMARY KEY,
                             folder_name VARCHAR(512) NOT NULL,
+                            folder_path VARCHAR(1024) NOT NULL DEFAULT '',
                             library_id INTEGER NOT NULL,
                             parent_id INTEGER,
                             FOREIGN KEY (library_id)
@@ -60,6 +66,7 @@ class DatabaseMySQLCreate(DatabaseMySQL):
                             model_url VARCHAR(255),
                             model_description TEXT,
                             model_doi VARCHAR(255),
+                            model_hash CHAR(64),
                             PRIMARY KEY (model_id, library_id),
                             FOREIGN KEY (library_id)
                                 REFERENCES library(library_id)
@@ -72,6 +79,7 @@ class DatabaseMySQLCreate(DatabaseMySQL):
                             model_inheritance_id INTEGER AUTO_INCREMENT NOT NULL PRIMARY KEY,
                             model_id CHAR(36) NOT NULL,
                             inherits_id CHAR(36) NOT NULL,
+                            UNIQUE KEY model_inheritance_unique (model_id, inherits_id),
                             FOREIGN KEY (model_id)
                                 REFERENCES model(model_id)
                                 ON DELETE CASCADE,
@@ -88,6 +96,7 @@ class DatabaseMySQLCreate(DatabaseMySQL):
                             model_property_units VARCHAR(255) NOT NULL,
                             model_property_url VARCHAR(255) NOT NULL,
                             model_property_description TEXT,
+                            UNIQUE KEY model_property_unique (model_id, model_property_name),
                             FOREIGN KEY (model_id)
                                 REFERENCES model(model_id)
                                 ON DELETE CASCADE
@@ -101,6 +110,7 @@ class DatabaseMySQLCreate(DatabaseMySQL):
                             model_property_units VARCHAR(255) NOT NULL,
                             model_property_url VARCHAR(255) NOT NULL,
                             model_property_description TEXT,
+                            UNIQUE KEY model_property_column_unique (model_property_id, model_property_name),
                             FOREIGN KEY (model_property_id)
                                 REFERENCES model_property(model_property_id)
                                 ON DELETE CASCADE
@@ -116,6 +126,7 @@ class DatabaseMySQLCreate(DatabaseMySQL):
                             material_description TEXT,
                             material_url VARCHAR(255),
                             material_reference VARCHAR(255),
+                            material_hash CHAR(64),
                             PRIMARY KEY (material_id, library_id),
                             FOREIGN KEY (library_id)
                                 REFERENCES library(library_id)
@@ -158,6 +169,7 @@ class DatabaseMySQLCreate(DatabaseMySQL):
                         material_id CHAR(36) NOT NULL,
                         material_property_name VARCHAR(255) NOT NULL,
                     	material_property_type VARCHAR(255) NOT NULL,
+                        UNIQUE KEY material_property_value_unique (material_id, material_property_name),
                         FOREIGN KEY (material_id)
                             REFERENCES material(material_id)
                             ON DELETE CASCADE
@@ -165,18 +177,34 @@ class DatabaseMySQLCreate(DatabaseMySQL):
             "material_property_string_value" : """CREATE TABLE IF NOT EXISTS material_property_string_value (
                         material_property_string_value_id INTEGER AUTO_INCREMENT NOT NULL PRIMARY KEY,
                         material_property_value_id INTEGER NOT NULL,
+                        material_property_value_index INTEGER NOT NULL DEFAULT 0,
                         material_property_value TEXT NOT NULL,
+                        material_property_value_codec VARCHAR(16) NOT NULL DEFAULT '',
+                        material_property_value_data LONGBLOB,
+                        UNIQUE KEY material_property_string_value_unique (material_property_value_id, material_property_value_index),
                         FOREIGN KEY (material_property_value_id)
                             REFERENCES material_property_value(material_property_value_id)
                             ON DELETE CASCADE
                     )""",
+            # Long values by content, so values shared by materials are stored once
+            "blob_store" : """CREATE TABLE IF NOT EXISTS blob_store (
+                        blob_hash CHAR(64) NOT NULL PRIMARY KEY,
+                        blob_codec VARCHAR(16) NOT NULL DEFAULT '',
+                        blob_size INTEGER NOT NULL,
+                        blob_data LONGBLOB NOT NULL
+                    )""",
             "material_property_long_string_value" : """CREATE TABLE IF NOT EXISTS material_property_long_string_value (
                         material_property_long_string_value_id INTEGER AUTO_INCREMENT NOT NULL PRIMARY KEY,
                         material_property_value_id INTEGER NOT NULL,
+                        material_property_value_index INTEGER NOT NULL DEFAULT 0,
                         material_property_value MEDIUMTEXT NOT NULL,
+                        blob_hash CHAR(64),
+                        UNIQUE KEY material_property_long_string_value_unique (material_property_value_id, material_property_value_index),
                         FOREIGN KEY (material_property_value_id)
                             REFERENCES material_property_value(material_property_value_id)
-                            ON DELETE CASCADE
+                            ON DELETE CASCADE,
+                        CONSTRAINT material_property_long_string_value_blob FOREIGN KEY (blob_hash)
+                            REFERENCES blob_store(blob_hash)
                     )""",
             "material_property_array_description" : """CREATE TABLE IF NOT EXISTS material_property_array_description (
                             material_property_array_description_id INTEGER AUTO_INCREMENT NOT NULL PRIMARY KEY,
@@ -199,13 +227,115 @@ class DatabaseMySQLCreate(DatabaseMySQL):
                         FOREIGN KEY (material_property_value_id)
                             REFERENCES material_property_value(material_property_value_id)
                             ON DELETE CASCADE
+                    )""",
+            # An array as a single, possibly compressed, blob. See PackedArray.py
+            "material_property_array_packed" : """CREATE TABLE IF NOT EXISTS material_property_array_packed (
+                        material_property_value_id INTEGER NOT NULL PRIMARY KEY,
+                        material_property_array_codec VARCHAR(16) NOT NULL DEFAULT '',
+                        material_property_array_data LONGBLOB NOT NULL,
+                        FOREIGN KEY (material_property_value_id)
+                            REFERENCES material_property_value(material_property_value_id)
+                            ON DELETE CASCADE
+                    )""",
+            "change_log" : """CREATE TABLE IF NOT EXISTS change_log (
+                        change_id BIGINT AUTO_INCREMENT NOT NULL PRIMARY KEY,
+                        change_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                        change_object ENUM('library', 'folder', 'model', 'material') NOT NULL,
+                        change_type ENUM('create', 'update', 'rename', 'delete') NOT NULL,
+                        library_name VARCHAR(512) NOT NULL,
+                        change_key VARCHAR(1024) NOT NULL,
+                        change_old_key VARCHAR(1024)
+                    )""",
+            # A single row holding the last change_log sequence number. See _committing()
+            "change_sequence" : """CREATE TABLE IF NOT EXISTS change_sequence (
+                        change_id BIGINT NOT NULL
                     )"""
         }
         self._indexes = {
             "model_model_id_index" : """CREATE INDEX model_model_id_index ON model (model_id)""",
             "material_material_id_index" : """CREATE INDEX material_material_id_index ON material (material_id)""",
-            "material_property_value_material_id_index" : "CREATE INDEX material_property_value_material_id_index ON material_property_value (material_id)"
+            "model_hash_index" : "CREATE INDEX model_hash_index ON model (library_id, model_hash)",
+            "material_hash_index" : "CREATE INDEX material_hash_index ON material (library_id, material_hash)",
+            "material_property_value_material_id_index" : "CREATE INDEX material_property_value_material_id_index ON material_property_value (material_id)",
+            "folder_path_index" : "CREATE INDEX folder_path_index ON folder (library_id, folder_path(255))"
         }
+        # Upgrades for databases created by earlier versions. Each must be safe to repeat
+        self._migrations = [
+            "ALTER TABLE folder ADD COLUMN IF NOT EXISTS folder_path VARCHAR(1024) NOT NULL DEFAULT '' AFTER folder_name",
+            "UPDATE folder SET folder_path = IFNULL(GetFolder(folder_id), '')",
+            "CREATE INDEX IF NOT EXISTS folder_path_index ON folder (library_id, folder_path(255))",
+
+            # Unique keys for upserts. Duplicates are removed first, keeping the newest
+            "DELETE a FROM model_inheritance a JOIN model_inheritance b"
+                " ON a.model_id = b.model_id AND a.inherits_id = b.inherits_id"
+                " AND a.model_inheritance_id < b.model_inheritance_id",
+            "ALTER TABLE model_inheritance ADD UNIQUE KEY IF NOT EXISTS model_inheritance_unique (model_id, inherits_id)",
+            "DELETE a FROM model_property a JOIN model_property b"
+                " ON a.model_id = b.model_id AND a.model_property_name = b.model_property_name"
+                " AND a.model_property_id < b.model_property_id",
+            "ALTER TABLE model_property ADD UNIQUE KEY IF NOT EXISTS model_property_unique (model_id, model_property_name)",
+            "DELETE a FROM model_property_column a JOIN model_property_column b"
+                " ON a.model_property_id = b.model_property_id AND a.model_property_name = b.model_property_name"
+                " AND a.model_property_column_id < b.model_property_column_id",
+            "ALTER TABLE model_property_column ADD UNIQUE KEY IF NOT EXISTS model_property_column_unique"
+                " (model_property_id, model_property_name)",
+            "DELETE a FROM material_property_value a JOIN material_property_value b"
+                " ON a.material_id = b.material_id AND a.material_property_name = b.material_property_name"
+                " AND a.material_property_value_id < b.material_property_value_id",
+            "ALTER TABLE material_property_value ADD UNIQUE KEY IF NOT EXISTS material_property_value_unique"
+                " (material_id, material_property_name)",
+
+            # List entries are numbered in the order they were written
+            "ALTER TABLE material_property_string_value ADD COLUMN IF NOT EXISTS"
+                " material_property_value_index INTEGER NOT NULL DEFAULT 0 AFTER material_property_value_id",
+            "UPDATE material_property_string_value s JOIN"
+                " (SELECT material_property_string_value_id, ROW_NUMBER() OVER"
+                "   (PARTITION BY material_property_value_id ORDER BY material_property_string_value_id) - 1 AS position"
+                "  FROM material_property_string_value) n"
+                " ON n.material_property_string_value_id = s.material_property_string_value_id"
+                " SET s.material_property_value_index = n.position",
+            "ALTER TABLE material_property_string_value ADD UNIQUE KEY IF NOT EXISTS material_property_string_value_unique"
+                " (material_property_value_id, material_property_value_index)",
+            "ALTER TABLE material_property_long_string_value ADD COLUMN IF NOT EXISTS"
+                " material_property_value_index INTEGER NOT NULL DEFAULT 0 AFTER material_property_value_id",
+            "UPDATE material_property_long_string_value s JOIN"
+                " (SELECT material_property_long_string_value_id, ROW_NUMBER() OVER"
+                "   (PARTITION BY material_property_value_id ORDER BY material_property_long_string_value_id) - 1 AS position"
+                "  FROM material_property_long_string_value) n"
+                " ON n.material_property_long_string_value_id = s.material_property_long_string_value_id"
+                " SET s.material_property_value_index = n.position",
+            "ALTER TABLE material_property_long_string_value ADD UNIQUE KEY IF NOT EXISTS"
+                " material_property_long_string_value_unique (material_property_value_id, material_property_value_index)",
+
+            # Content hashes. Existing rows are hashed by updateContentHashes()
+            "ALTER TABLE model ADD COLUMN IF NOT EXISTS model_hash CHAR(64) AFTER model_doi",
+            "CREATE INDEX IF NOT EXISTS model_hash_index ON model (library_id, model_hash)",
+            "ALTER TABLE material ADD COLUMN IF NOT EXISTS material_hash CHAR(64) AFTER material_reference",
+            "CREATE INDEX IF NOT EXISTS material_hash_index ON material (library_id, material_hash)",
+
+            # Change log for incremental sync
+            self._tables["change_log"],
+
+            # Packed arrays. Existing arrays are converted by packArrays()
+            self._tables["material_property_array_packed"],
+
+            # Blob store. Existing long strings are moved by moveToBlobStore()
+            self._tables["blob_store"],
+            "ALTER TABLE material_property_long_string_value ADD COLUMN IF NOT EXISTS"
+                " blob_hash CHAR(64) AFTER material_property_value",
+            "ALTER TABLE material_property_long_string_value ADD CONSTRAINT material_property_long_string_value_blob"
+                " FOREIGN KEY IF NOT EXISTS (blob_hash) REFERENCES blob_store(blob_hash)",
+
+            # Compressed string values. Existing values are compressed by recompress()
+            "ALTER TABLE material_property_string_value ADD COLUMN IF NOT EXISTS"
+                " material_property_value_codec VARCHAR(16) NOT NULL DEFAULT '' AFTER material_property_value",
+            "ALTER TABLE material_property_string_value ADD COLUMN IF NOT EXISTS"
+                " material_property_value_data LONGBLOB AFTER material_property_value_codec",
+
+            # Sequence numbers allocated at commit, continuing from the existing log
+            self._tables["change_sequence"],
+            _seedChangeSequence
+        ]
         self._functions = {
             "GetFolder" : """CREATE FUNCTION IF NOT EXISTS GetFolder(id INTEGER)
                         RETURNS VARCHAR(1024) DETERMINISTIC
@@ -261,6 +391,7 @@ class DatabaseMySQLCreate(DatabaseMySQL):
 
             cursor.execute("SET FOREIGN_KEY_CHECKS=1")
             cursor.commit()
+            self._forgetFolders()
         except Exception as err:
             print(err)
 
@@ -270,6 +401,7 @@ class DatabaseMySQLCreate(DatabaseMySQL):
 
             for table in self._tables:
                 cursor.execute(self._tables[table])
+            cursor.execute(_seedChangeSequence)
             cursor.commit()
         except Exception as err:
             raise DatabaseTableCreationError(error=err)
@@ -316,6 +448,24 @@ class DatabaseMySQLCreate(DatabaseMySQL):
         except Exception as err:
             raise DatabaseTableCreationError(error=err)
 
+    def migrateTables(self):
+        """Brings the tables of an existing database up to the current schema"""
+        try:
+            cursor = self._cursor()
+
+            for migration in self._migrations:
+                cursor.execute(migration)
+            cursor.commit()
+            self._forgetFolders()
+        except Exception as err:
+            self._rollback(cursor)
+            raise DatabaseTableCreationError(error=err)
+
+        self.packArrays()
+        self.moveToBlobStore()
+        self.collectBlobs()
+        self.updateContentHashes()
+
     def createDatabase(self, dbName):
         # Force a fresh connection
         self._disconnect()
@@ -341,4 +491,5 @@ class DatabaseMySQLCreate(DatabaseMySQL):
 
         # Force a reconnection with the newly created database
         self._disconnect()
+        self._forgetFolders()
 
@@ -0,0 +1,89 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+from pyodbc import Cursor, Connection
+
+import FreeCAD
+
+from MaterialDB.Configuration import getPreferencesLocation
+from MaterialDB.Database.DatabaseMySQL import DatabaseMySQL
+from MaterialDB.Database.Exceptions import DatabaseConnectionError
+from MaterialDB.Database.MySQLNativeConnection import connectNative
+
+class DatabaseMySQLNative(DatabaseMySQL):
+    """
+    Connects with MySQL Connector/Python rather than ODBC. Queries are sent
+    as server side prepared statements using the binary protocol, and the
+    protocol can optionally be compressed for slow links.
+    """
+
+    def __init__(self):
+        super().__init__()
+
+        # Connection options by pool key, see _connectString()
+        self._options = {}
+
+    def _connectOptions(self, noDatabase : bool = False) -> dict:
+        prefs = getPreferencesLocation()
+        options = {
+            "host" : FreeCAD.ParamGet(prefs).GetString("Hostname", "localhost") or "localhost",
+            "charset" : "utf8mb4",
+            "autocommit" : False,
+            "compress" : FreeCAD.ParamGet(prefs).GetBool("Compression", False)
+        }
+        port = FreeCAD.ParamGet(prefs).GetString("Port", "")
+        if port:
+            options["port"] = int(port)
+        dbName = FreeCAD.ParamGet(prefs).GetString("Database", "material")
+        if dbName and not noDatabase:
+            options["database"] = dbName
+        username = FreeCAD.ParamGet(prefs).GetString("Username", "")
+        if username:
+            options["user"] = username
+        password = FreeCAD.ParamGet(prefs).GetString("Password", "")
+        if password:
+            options["password"] = password
+        return options
+
+    def _connectString(self, noDatabase : bool = False) -> str:
+        # Identifies the pool. The options are kept for opening its connections
+        options = self._connectOptions(noDatabase)
+        connectString = "mysql://{}@{}:{}/{}?compress={}".format(options.get("user", ""), options["host"],
+                                                        options.get("port", 3306), options.get("database", ""),
+                                                        options["compress"])
+        self._options[connectString] = options
+        return connectString
+
+    def _newConnection(self, connectString : str) -> Connection:
+        prefs = getPreferencesLocation()
+        try:
+            return connectNative(self._options[connectString],
+                                 FreeCAD.ParamGet(prefs).GetInt("PreparedStatementCacheSize", 256))
+        except Exception as ex:
+            print("Unable to create connection:", ex)
+            raise DatabaseConnectionError(error=ex)
+
+    def _fastExecuteMany(self, cursor : Cursor) -> bool:
+        # Inserts are always batched into multiple row statements
+        return False
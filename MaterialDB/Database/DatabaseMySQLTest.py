@@ -22,36 +22,13 @@
 __author__ = "David Carter"
 __url__ = "https://www.davesrocketshop.com"
 
-import pyodbc
-
-import Materials
-from MaterialDB.Database.Database import _connection
 from MaterialDB.Database.DatabaseMySQLCreate import DatabaseMySQLCreate
-from MaterialDB.Database.Exceptions import DatabaseConnectionError
-from MaterialDB.Configuration import getPreferencesLocation
 
 class DatabaseMySQLTest(DatabaseMySQLCreate):
 
     def __init__(self):
         super().__init__()
 
-    def _connect(self, noDatabase=False):
-        global _connection
-        if _connection is None:
-            self._connectODBCTest()
-
-    def _connectODBCTest(self):
+    def _connectString(self, noDatabase : bool = False) -> str:
         """ Testing requires a DSN called material-test be defined with all the necessary connection paramters """
-        global _connection
-        try:
-            connectString = 'DSN=material-test;charset=utf8mb4'
-            print(connectString)
-
-            _connection = pyodbc.connect(connectString)
-            _connection.setdecoding(pyodbc.SQL_CHAR, encoding='utf-8')
-            _connection.setdecoding(pyodbc.SQL_WCHAR, encoding='utf-8')
-            _connection.setencoding(encoding='utf-8')
-        except Exception as ex:
-            print("Unable to create connection:", ex)
-            _connection = None
-            raise DatabaseConnectionError(error=ex)
+        return 'DSN=material-test;charset=utf8mb4'
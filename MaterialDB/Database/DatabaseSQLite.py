@@ -0,0 +1,130 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import os
+
+from pyodbc import Cursor, Connection
+
+import FreeCAD
+
+from MaterialDB.Configuration import getPreferencesLocation, getDatabaseName
+from MaterialDB.Database.DatabaseMySQL import DatabaseMySQL
+from MaterialDB.Database.Exceptions import DatabaseConnectionError
+from MaterialDB.Database.SQLiteConnection import connectSQLite
+
+# Prefix of the pool keys, keeping them apart from ODBC connection strings
+_sqlitePrefix = "sqlite:"
+
+class DatabaseSQLite(DatabaseMySQL):
+    """
+    Keeps the database in a local SQLite file, for single user installations
+    and testing without a server. The queries are shared with DatabaseMySQL,
+    only the statements that differ between the two are replaced here.
+    """
+
+    def __init__(self):
+        super().__init__()
+
+    def _databasePath(self, dbName : str | None = None) -> str:
+        if dbName is None:
+            dbName = getDatabaseName()
+        prefs = getPreferencesLocation()
+        folder = FreeCAD.ParamGet(prefs).GetString("SQLiteFolder", "")
+        if not folder:
+            folder = os.path.join(FreeCAD.getUserAppDataDir(), "MaterialDB")
+        return os.path.join(folder, dbName + ".sqlite")
+
+    def _connectString(self, noDatabase : bool = False) -> str:
+        return _sqlitePrefix + self._databasePath()
+
+    def _newConnection(self, connectString : str) -> Connection:
+        path = connectString[len(_sqlitePrefix):]
+        prefs = getPreferencesLocation()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            return connectSQLite(path,
+                cacheSize=FreeCAD.ParamGet(prefs).GetInt("SQLiteCacheSize", 64),
+                mmapSize=FreeCAD.ParamGet(prefs).GetInt("SQLiteMmapSize", 256))
+        except Exception as ex:
+            print("Unable to open database:", ex)
+            raise DatabaseConnectionError(error=ex)
+
+    def _fastExecuteMany(self, cursor : Cursor) -> bool:
+        return False
+
+    def _lastId(self, cursor : Cursor) -> int:
+        """Returns the last insertion id"""
+        cursor.execute("SELECT last_insert_rowid() AS id")
+        row = cursor.fetchone()
+        if row:
+            return row.id
+        return 0
+
+    def _upsertId(self, cursor : Cursor) -> int:
+        """Returns the id from the RETURNING clause added by _onDuplicateUpdate()"""
+        row = cursor.fetchone()
+        if row:
+            return row.id
+        return 0
+
+    def _insertIgnore(self) -> str:
+        return "INSERT OR IGNORE"
+
+    def _onDuplicateUpdate(self, keys : list[str], columns : list[str], idColumn : str | None = None) -> str:
+        sql = " ON CONFLICT ({}) DO UPDATE SET ".format(", ".join(keys)) + \
+            ", ".join(["{0} = excluded.{0}".format(column) for column in columns])
+        if idColumn is not None:
+            # SQLite doesn't set last_insert_rowid() when a row is updated
+            sql += " RETURNING {} AS id".format(idColumn)
+        return sql
+
+    def _deleteIgnore(self) -> str:
+        # Writers are serialized, so no uncommitted write can refer to the rows
+        return "DELETE"
+
+    def _shareLock(self) -> str:
+        # The write lock taken by the transaction already keeps other writers out
+        return ""
+
+    def _binaryEquals(self, column : str) -> str:
+        # Text compares byte for byte unless another collation is asked for
+        return "{} = ?".format(column)
+
+    def _foreignKeysIgnore(self, cursor : Cursor) -> None:
+        """
+        The references that may be left unsatisfied, such as a model that
+        inherits one not yet migrated, aren't foreign keys in the SQLite
+        schema. SQLite can't turn foreign key checks off within a transaction.
+        """
+        pass
+
+    def _foreignKeysRestore(self, cursor : Cursor) -> None:
+        pass
+
+    def _updateFolderPaths(self, cursor : Cursor, libraryIndex : int, oldPath : str, newPath : str) -> None:
+        oldPrefix = oldPath + "/"
+        cursor.execute("UPDATE folder "
+                       "SET folder_path = ? || SUBSTR(folder_path, ?) "
+                       "WHERE library_id = ? AND SUBSTR(folder_path, 1, ?) = ?",
+                       newPath + "/", len(oldPrefix) + 1, libraryIndex, len(oldPrefix), oldPrefix)
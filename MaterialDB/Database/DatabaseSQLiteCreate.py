@@ -0,0 +1,345 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import os
+
+from MaterialDB.Database.DatabaseMySQLCreate import _seedChangeSequence
+from MaterialDB.Database.DatabaseSQLite import DatabaseSQLite
+from MaterialDB.Database.Exceptions import DatabaseCreationError, DatabaseTableCreationError
+
+class DatabaseSQLiteCreate(DatabaseSQLite):
+
+    def __init__(self):
+        super().__init__()
+
+        # The SQLite version of Resources/db/create_tables.sql. Names compare
+        # without case, as they do with the MySQL collation. References that
+        # checkConsistency() reports as missing aren't foreign keys, as SQLite
+        # can't suspend the checks while a migration is in progress
+        self._tables = {
+            "library" : """CREATE TABLE IF NOT EXISTS library (
+                            library_id INTEGER PRIMARY KEY,
+                            library_name VARCHAR(512) NOT NULL UNIQUE COLLATE NOCASE,
+                            library_icon BLOB,
+                            library_read_only INTEGER NOT NULL DEFAULT 0
+                        )""",
+            "folder" :  """CREATE TABLE IF NOT EXISTS folder (
+                            folder_id INTEGER PRIMARY KEY,
+                            folder_name VARCHAR(512) NOT NULL COLLATE NOCASE,
+                            folder_path VARCHAR(1024) NOT NULL DEFAULT '' COLLATE NOCASE,
+                            library_id INTEGER NOT NULL
+                                REFERENCES library(library_id) ON DELETE CASCADE,
+                            parent_id INTEGER
+                                REFERENCES folder(folder_id) ON DELETE CASCADE
+                        )""",
+            "model" :   """CREATE TABLE IF NOT EXISTS model (
+                            model_id CHAR(36) NOT NULL PRIMARY KEY,
+                            library_id INTEGER NOT NULL
+                                REFERENCES library(library_id) ON DELETE CASCADE,
+                            folder_id INTEGER
+                                REFERENCES folder(folder_id) ON DELETE CASCADE,
+                            model_type TEXT NOT NULL CHECK (model_type IN ('Physical', 'Appearance')),
+                            model_name VARCHAR(255) NOT NULL,
+                            model_url VARCHAR(255),
+                            model_description TEXT,
+                            model_doi VARCHAR(255),
+                            model_hash CHAR(64)
+                        )""",
+            "model_inheritance" : """CREATE TABLE IF NOT EXISTS model_inheritance (
+                            model_inheritance_id INTEGER PRIMARY KEY,
+                            model_id CHAR(36) NOT NULL
+                                REFERENCES model(model_id) ON DELETE CASCADE,
+                            inherits_id CHAR(36) NOT NULL,
+                            CONSTRAINT model_inheritance_unique UNIQUE (model_id, inherits_id)
+                        )""",
+            "model_property" : """CREATE TABLE IF NOT EXISTS model_property (
+                            model_property_id INTEGER PRIMARY KEY,
+                            model_id CHAR(36) NOT NULL
+                                REFERENCES model(model_id) ON DELETE CASCADE,
+                            model_property_name VARCHAR(255) NOT NULL,
+                            model_property_display_name VARCHAR(255) NOT NULL,
+                            model_property_type VARCHAR(255) NOT NULL,
+                            model_property_units VARCHAR(255) NOT NULL,
+                            model_property_url VARCHAR(255) NOT NULL,
+                            model_property_description TEXT,
+                            CONSTRAINT model_property_unique UNIQUE (model_id, model_property_name)
+                        )""",
+            "model_property_column" : """CREATE TABLE IF NOT EXISTS model_property_column (
+                            model_property_column_id INTEGER PRIMARY KEY,
+                            model_property_id INTEGER NOT NULL
+                                REFERENCES model_property(model_property_id) ON DELETE CASCADE,
+                            model_property_name VARCHAR(255) NOT NULL,
+                            model_property_display_name VARCHAR(255) NOT NULL,
+                            model_property_type VARCHAR(255) NOT NULL,
+                            model_property_units VARCHAR(255) NOT NULL,
+                            model_property_url VARCHAR(255) NOT NULL,
+                            model_property_description TEXT,
+                            CONSTRAINT model_property_column_unique UNIQUE (model_property_id, model_property_name)
+                        )""",
+            "material" : """CREATE TABLE IF NOT EXISTS material (
+                            material_id CHAR(36) NOT NULL PRIMARY KEY,
+                            library_id INTEGER NOT NULL
+                                REFERENCES library(library_id) ON DELETE CASCADE,
+                            folder_id INTEGER
+                                REFERENCES folder(folder_id) ON DELETE CASCADE,
+                            material_name VARCHAR(255) NOT NULL,
+                            material_author VARCHAR(255),
+                            material_license VARCHAR(255),
+                            material_parent_uuid CHAR(36),
+                            material_description TEXT,
+                            material_url VARCHAR(255),
+                            material_reference VARCHAR(255),
+                            material_hash CHAR(64)
+                        )""",
+            "material_tag" : """CREATE TABLE IF NOT EXISTS material_tag (
+                            material_tag_id INTEGER PRIMARY KEY,
+                            material_tag_name VARCHAR(255) NOT NULL UNIQUE COLLATE NOCASE
+                        )""",
+            "material_tag_mapping" : """CREATE TABLE IF NOT EXISTS material_tag_mapping (
+                        material_id CHAR(36) NOT NULL
+                            REFERENCES material(material_id) ON DELETE CASCADE,
+                        material_tag_id INTEGER NOT NULL
+                            REFERENCES material_tag(material_tag_id) ON DELETE CASCADE,
+                        PRIMARY KEY (material_id, material_tag_id)
+                    )""",
+            "material_models" : """CREATE TABLE IF NOT EXISTS material_models (
+                        material_id CHAR(36) NOT NULL
+                            REFERENCES material(material_id) ON DELETE CASCADE,
+                        model_id CHAR(36) NOT NULL,
+                        PRIMARY KEY (material_id, model_id)
+                    )""",
+            "material_property_value" : """CREATE TABLE IF NOT EXISTS material_property_value (
+                        material_property_value_id INTEGER PRIMARY KEY,
+                        material_id CHAR(36) NOT NULL
+                            REFERENCES material(material_id) ON DELETE CASCADE,
+                        material_property_name VARCHAR(255) NOT NULL,
+                        material_property_type VARCHAR(255) NOT NULL,
+                        CONSTRAINT material_property_value_unique UNIQUE (material_id, material_property_name)
+                    )""",
+            "material_property_string_value" : """CREATE TABLE IF NOT EXISTS material_property_string_value (
+                        material_property_string_value_id INTEGER PRIMARY KEY,
+                        material_property_value_id INTEGER NOT NULL
+                            REFERENCES material_property_value(material_property_value_id) ON DELETE CASCADE,
+                        material_property_value_index INTEGER NOT NULL DEFAULT 0,
+                        material_property_value TEXT NOT NULL,
+                        material_property_value_codec TEXT NOT NULL DEFAULT '',
+                        material_property_value_data BLOB,
+                        CONSTRAINT material_property_string_value_unique
+                            UNIQUE (material_property_value_id, material_property_value_index)
+                    )""",
+            "blob_store" : """CREATE TABLE IF NOT EXISTS blob_store (
+                        blob_hash TEXT NOT NULL PRIMARY KEY,
+                        blob_codec TEXT NOT NULL DEFAULT '',
+                        blob_size INTEGER NOT NULL,
+                        blob_data BLOB NOT NULL
+                    )""",
+            "material_property_long_string_value" : """CREATE TABLE IF NOT EXISTS material_property_long_string_value (
+                        material_property_long_string_value_id INTEGER PRIMARY KEY,
+                        material_property_value_id INTEGER NOT NULL
+                            REFERENCES material_property_value(material_property_value_id) ON DELETE CASCADE,
+                        material_property_value_index INTEGER NOT NULL DEFAULT 0,
+                        material_property_value TEXT NOT NULL,
+                        blob_hash TEXT REFERENCES blob_store(blob_hash),
+                        CONSTRAINT material_property_long_string_value_unique
+                            UNIQUE (material_property_value_id, material_property_value_index)
+                    )""",
+            "material_property_array_description" : """CREATE TABLE IF NOT EXISTS material_property_array_description (
+                            material_property_array_description_id INTEGER PRIMARY KEY,
+                            material_property_value_id INTEGER NOT NULL
+                                REFERENCES material_property_value(material_property_value_id) ON DELETE CASCADE,
+                            material_property_array_rows INTEGER NOT NULL,
+                            material_property_array_columns INTEGER NOT NULL,
+                            material_property_array_depth INTEGER NOT NULL DEFAULT -1
+                        )""",
+            "material_property_array_value" : """CREATE TABLE IF NOT EXISTS material_property_array_value (
+                        material_property_array_value_id INTEGER PRIMARY KEY,
+                        material_property_value_id INTEGER NOT NULL
+                            REFERENCES material_property_value(material_property_value_id) ON DELETE CASCADE,
+                        material_property_value_row INTEGER NOT NULL,
+                        material_property_value_column INTEGER NOT NULL,
+                        material_property_value_depth INTEGER NOT NULL DEFAULT -1,
+                        material_property_value_depth_rows INTEGER NOT NULL DEFAULT -1,
+                        material_property_value TEXT
+                    )""",
+            "material_property_array_packed" : """CREATE TABLE IF NOT EXISTS material_property_array_packed (
+                        material_property_value_id INTEGER NOT NULL PRIMARY KEY
+                            REFERENCES material_property_value(material_property_value_id) ON DELETE CASCADE,
+                        material_property_array_codec TEXT NOT NULL DEFAULT '',
+                        material_property_array_data BLOB NOT NULL
+                    )""",
+            "change_log" : """CREATE TABLE IF NOT EXISTS change_log (
+                        change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        change_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                        change_object TEXT NOT NULL CHECK (change_object IN ('library', 'folder', 'model', 'material')),
+                        change_type TEXT NOT NULL CHECK (change_type IN ('create', 'update', 'rename', 'delete')),
+                        library_name VARCHAR(512) NOT NULL,
+                        change_key VARCHAR(1024) NOT NULL,
+                        change_old_key VARCHAR(1024)
+                    )""",
+            # A single row holding the last change_log sequence number. See _committing()
+            "change_sequence" : """CREATE TABLE IF NOT EXISTS change_sequence (
+                        change_id INTEGER NOT NULL
+                    )"""
+        }
+        # Columns added since the tables were first created
+        self._columns = {
+            "material_property_string_value" : {
+                "material_property_value_codec" : "TEXT NOT NULL DEFAULT ''",
+                "material_property_value_data" : "BLOB"
+            },
+            "material_property_long_string_value" : {
+                "blob_hash" : "TEXT REFERENCES blob_store(blob_hash)"
+            }
+        }
+        # Stand in for the cascades of the references that aren't foreign keys
+        self._triggers = {
+            "model_delete_trigger" : """CREATE TRIGGER IF NOT EXISTS model_delete_trigger
+                        AFTER DELETE ON model
+                    BEGIN
+                        DELETE FROM material_models WHERE model_id = OLD.model_id;
+                    END"""
+        }
+        self._indexes = {
+            "model_library_index" : "CREATE INDEX IF NOT EXISTS model_library_index ON model (library_id, model_id)",
+            "material_library_index" : "CREATE INDEX IF NOT EXISTS material_library_index ON material (library_id, material_id)",
+            "model_hash_index" : "CREATE INDEX IF NOT EXISTS model_hash_index ON model (library_id, model_hash)",
+            "material_hash_index" : "CREATE INDEX IF NOT EXISTS material_hash_index ON material (library_id, material_hash)",
+            "material_models_model_index" : "CREATE INDEX IF NOT EXISTS material_models_model_index ON material_models (model_id)",
+            "material_property_array_value_index" : "CREATE INDEX IF NOT EXISTS material_property_array_value_index"
+                " ON material_property_array_value (material_property_value_id)",
+            "material_property_array_description_index" : "CREATE INDEX IF NOT EXISTS material_property_array_description_index"
+                " ON material_property_array_description (material_property_value_id)",
+            "material_property_long_string_value_blob_index" : "CREATE INDEX IF NOT EXISTS"
+                " material_property_long_string_value_blob_index ON material_property_long_string_value (blob_hash)",
+            "folder_path_index" : "CREATE INDEX IF NOT EXISTS folder_path_index ON folder (library_id, folder_path)",
+            "folder_parent_index" : "CREATE INDEX IF NOT EXISTS folder_parent_index ON folder (parent_id)"
+        }
+
+    def checkIfExists(self):
+        return os.path.exists(self._databasePath())
+
+    def dropTables(self):
+        try:
+            cursor = self._cursor()
+
+            # Foreign key checks are turned off to avoid requiring a specific sequence.
+            # This only works outside a transaction
+            cursor.commit()
+            cursor.execute("PRAGMA foreign_keys = OFF")
+
+            for table in self._tables:
+                cursor.execute("DROP TABLE IF EXISTS {}".format(table))
+            cursor.commit()
+
+            cursor.execute("PRAGMA foreign_keys = ON")
+            self._forgetFolders()
+        except Exception as err:
+            print(err)
+
+    def createTables(self):
+        try:
+            cursor = self._cursor()
+
+            for table in self._tables:
+                cursor.execute(self._tables[table])
+            for trigger in self._triggers:
+                cursor.execute(self._triggers[trigger])
+            cursor.execute(_seedChangeSequence)
+            cursor.commit()
+        except Exception as err:
+            raise DatabaseTableCreationError(error=err)
+
+    def dropIndexes(self):
+        try:
+            cursor = self._cursor()
+
+            for index in self._indexes:
+                cursor.execute("DROP INDEX IF EXISTS {}".format(index))
+
+            cursor.commit()
+        except Exception as err:
+            print(err)
+
+    def createIndexes(self):
+        try:
+            cursor = self._cursor()
+
+            for index in self._indexes:
+                cursor.execute(self._indexes[index])
+            cursor.commit()
+        except Exception as err:
+            raise DatabaseTableCreationError(error=err)
+
+    def dropFunctions(self):
+        """SQLite doesn't store functions"""
+        pass
+
+    def createFunctions(self):
+        """SQLite doesn't store functions. Folder paths are kept in folder_path"""
+        pass
+
+    def migrateTables(self):
+        """Brings the tables of an existing database up to the current schema"""
+        # Every SQLite database has the current schema apart from new tables, columns and indexes
+        self.createTables()
+        self._addColumns()
+        self.createIndexes()
+        self.packArrays()
+        self.moveToBlobStore()
+        self.collectBlobs()
+        self.updateContentHashes()
+
+    def _addColumns(self):
+        try:
+            cursor = self._cursor()
+
+            for table, columns in self._columns.items():
+                cursor.execute("PRAGMA table_info({})".format(table))
+                existing = [row.name for row in cursor.fetchall()]
+                for column, definition in columns.items():
+                    if column not in existing:
+                        cursor.execute("ALTER TABLE {} ADD COLUMN {} {}".format(table, column, definition))
+            cursor.commit()
+        except Exception as err:
+            raise DatabaseTableCreationError(error=err)
+
+    def createDatabase(self, dbName):
+        path = self._databasePath(dbName)
+        try:
+            print("dbName '{}'".format(dbName))
+            if len(dbName) < 1:
+                raise Exception("You must provide a database name")
+
+            # Every thread's connection to the old file must be closed
+            self._getPool().closeAll()
+            for suffix in ["", "-wal", "-shm"]:
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        except Exception as err:
+            print(err)
+            raise DatabaseCreationError(error=err)
+
+        # The file is created on the first connection
+        self._disconnect()
+        self._forgetFolders()
@@ -0,0 +1,70 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+"""Property values that are read from the database when first used"""
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+from typing import Any, Callable, Iterable
+
+class DeferredValue:
+    """
+    A handle for a property value that hasn't been read yet. The value is
+    fetched the first time it's used. Use prefetch() to read many handles
+    in one round trip.
+
+    A handle is a snapshot of the record it came from. Once loaded it keeps
+    its value when the property changes later, and loading it after the
+    value has been replaced fails. Read the record again for current values.
+
+    load is called with a list of handles and must resolve() each of them.
+    """
+
+    def __init__(self, key : Any, load : Callable[[list["DeferredValue"]], None]):
+        self.key = key
+        self.loaded = False
+        self._load = load
+        self._value = None
+
+    @property
+    def value(self) -> Any:
+        if not self.loaded:
+            self._load([self])
+        return self._value
+
+    def resolve(self, value : Any) -> None:
+        self._value = value
+        self.loaded = True
+
+    def __repr__(self) -> str:
+        return "DeferredValue({!r}, loaded={})".format(self.key, self.loaded)
+
+def prefetch(values : Iterable[Any]) -> None:
+    """
+    Loads every handle in values that hasn't been loaded yet, a batch per
+    loader. Values that aren't handles are ignored.
+    """
+    pending = {}
+    for value in values:
+        if isinstance(value, DeferredValue) and not value.loaded:
+            pending.setdefault(value._load, []).append(value)
+    for load, handles in pending.items():
+        load(handles)
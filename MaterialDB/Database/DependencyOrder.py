@@ -0,0 +1,149 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+"""Functions for ordering objects so they are written after the objects they reference"""
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+from typing import Any, Callable, Iterable, Iterator
+
+def dependencyLevels(items : list[Any], key : Callable[[Any], str],
+                     dependencies : Callable[[Any], list[str]]) -> list[list[Any]]:
+    """
+    Groups the items into levels. Every item depends only on items in earlier
+    levels, so the items within a level can be written in any order, or in
+    parallel. Dependencies on keys not in items are assumed to be satisfied
+    elsewhere. Items in a dependency cycle are put in a final level of their
+    own. Items keep their original order within each level.
+    """
+    keys = set([key(item) for item in items])
+    remaining = {}
+    dependents = {}
+    for index, item in enumerate(items):
+        pending = set([dependency for dependency in dependencies(item)
+                       if dependency in keys and dependency != key(item)])
+        remaining[index] = len(pending)
+        for dependency in pending:
+            dependents.setdefault(dependency, []).append(index)
+
+    # All items sharing a key are released together
+    indexes = {}
+    for index, item in enumerate(items):
+        indexes.setdefault(key(item), []).append(index)
+
+    levels = []
+    level = [index for index in range(len(items)) if remaining[index] == 0]
+    placed = set()
+    while level:
+        levels.append([items[index] for index in level])
+        placed.update(level)
+        released = set()
+        for index in level:
+            itemKey = key(items[index])
+            # Wait until every item with this key is placed
+            if all(other in placed for other in indexes[itemKey]):
+                for dependent in dependents.pop(itemKey, []):
+                    remaining[dependent] -= 1
+                    if remaining[dependent] == 0:
+                        released.add(dependent)
+        level = sorted(released)
+
+    cycle = [items[index] for index in range(len(items)) if index not in placed]
+    if cycle:
+        levels.append(cycle)
+    return levels
+
+def dependencyOrder(items : list[Any], key : Callable[[Any], str],
+                    dependencies : Callable[[Any], list[str]]) -> list[Any]:
+    """Returns the items ordered so each comes after the items it depends on"""
+    ordered = []
+    for level in dependencyLevels(items, key, dependencies):
+        ordered.extend(level)
+    return ordered
+
+def dependencyStream(items : Iterable[Any], key : Callable[[Any], str],
+                     dependencies : Callable[[Any], list[str]]) -> Iterator[Any]:
+    """
+    Yields the items so each comes after the items it depends on, reading
+    them as they are needed. An item is held back only until the items it
+    depends on have been read. Items still held back when the stream ends
+    depend on keys that aren't in it, which are assumed to be satisfied
+    elsewhere, and are yielded last in the order dependencyOrder() gives.
+    Only the keys already yielded and the items held back are kept in memory.
+    """
+    seen = set()
+    waiting = {} # key -> [item, keys it still waits for] entries
+    held = {} # id(entry) -> entry, in the order the items were read
+
+    for item in items:
+        itemKey = key(item)
+        pending = set([dependency for dependency in dependencies(item)
+                       if dependency not in seen and dependency != itemKey])
+        if pending:
+            entry = [item, pending]
+            held[id(entry)] = entry
+            for dependency in pending:
+                waiting.setdefault(dependency, []).append(entry)
+            continue
+
+        released = [item]
+        while released:
+            current = released.pop(0)
+            yield current
+            currentKey = key(current)
+            seen.add(currentKey)
+            for entry in waiting.pop(currentKey, []):
+                entry[1].discard(currentKey)
+                if not entry[1]:
+                    del held[id(entry)]
+                    released.append(entry[0])
+
+    yield from dependencyOrder([entry[0] for entry in held.values()], key, dependencies)
+
+def dependencyWaves(items : Iterable[Any], key : Callable[[Any], str],
+                    dependencies : Callable[[Any], list[str]], size : int) -> Iterator[list[Any]]:
+    """
+    Reads the items as for dependencyStream() and yields them in waves of at
+    most size items. Every item depends only on items in earlier waves, so
+    the items in a wave can be written in parallel once the waves before it
+    have been written. At most size items are buffered, besides those held
+    back by dependencyStream().
+    """
+    waves = []
+    placed = {} # key -> index in waves of the buffered items
+    buffered = 0
+    for item in dependencyStream(items, key, dependencies):
+        itemKey = key(item)
+        index = max([placed[dependency] + 1 for dependency in dependencies(item)
+                     if dependency in placed and dependency != itemKey], default=0)
+        if index == len(waves):
+            waves.append([])
+        waves[index].append(item)
+        placed[itemKey] = max(index, placed.get(itemKey, index))
+        buffered += 1
+
+        if buffered >= size:
+            wave = waves.pop(0)
+            buffered -= len(wave)
+            placed = { itemKey : index - 1 for itemKey, index in placed.items() if index > 0 }
+            yield wave
+
+    yield from waves
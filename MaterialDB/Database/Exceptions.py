@@ -139,6 +139,11 @@ class DatabaseMaterialNotFound(DatabaseBaseError):
     def __init__(self, message = "Material not found", error=None):
         super().__init__(message, error)
 
+class DatabaseFilterError(DatabaseBaseError):
+
+    def __init__(self, message = "Filter options not supported", error=None):
+        super().__init__(message, error)
+
 #---
 #
 # Generic errors
@@ -0,0 +1,116 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+"""Class for resolving folder paths without querying the database"""
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+class FolderNode:
+
+    def __init__(self, folderId : int, name : str, parent : "FolderNode | None"):
+        self.folderId = folderId
+        self.name = name
+        self.parent = parent
+        self.children = {}
+
+class FolderIndex:
+    """
+    An in memory tree of the folders in a single library, mapping paths to
+    folder ids. It is loaded from the folder table in one query and must be
+    kept up to date by the methods that write folders.
+    """
+
+    def __init__(self, rows : list[tuple[int, str, int | None]]):
+        """rows are (folder_id, folder_name, parent_id) tuples in any order"""
+        self._root = FolderNode(0, "", None)
+        self._nodes = {}
+
+        for folderId, name, _ in rows:
+            self._nodes[folderId] = FolderNode(folderId, name, None)
+        # Lowest id first so the oldest of any duplicate folders wins
+        for folderId, name, parentId in sorted(rows, key=lambda row: row[0]):
+            node = self._nodes[folderId]
+            parent = self._root if parentId is None else self._nodes.get(parentId)
+            if parent is None:
+                # Orphaned folder
+                continue
+            node.parent = parent
+            parent.children.setdefault(name, node)
+
+    def find(self, pathList : list[str]) -> tuple[int, int]:
+        """
+        Finds the longest existing prefix of the path. Returns the id of the
+        deepest folder found, or 0 for the library root, and the number of
+        path segments matched.
+        """
+        node = self._root
+        depth = 0
+        for name in pathList:
+            child = node.children.get(name)
+            if child is None:
+                break
+            node = child
+            depth += 1
+        return node.folderId, depth
+
+    def folderId(self, pathList : list[str]) -> int:
+        """Returns the id of the folder at the path, or 0 if it doesn't exist"""
+        folderId, depth = self.find(pathList)
+        if depth < len(pathList):
+            return 0
+        return folderId
+
+    def path(self, folderId : int) -> str:
+        """Returns the full path of the folder as stored in folder.folder_path"""
+        if folderId == 0:
+            return ""
+        names = []
+        node = self._nodes[folderId]
+        while node is not None and node is not self._root:
+            names.append(node.name)
+            node = node.parent
+        return "/".join(reversed(names))
+
+    def add(self, parentId : int, name : str, folderId : int) -> None:
+        parent = self._root if parentId == 0 else self._nodes[parentId]
+        node = FolderNode(folderId, name, parent)
+        self._nodes[folderId] = node
+        parent.children.setdefault(name, node)
+
+    def rename(self, folderId : int, name : str) -> None:
+        node = self._nodes[folderId]
+        if node.parent.children.get(node.name) is node:
+            del node.parent.children[node.name]
+        node.name = name
+        node.parent.children.setdefault(name, node)
+
+    def remove(self, folderId : int) -> None:
+        """Removes the folder and everything below it"""
+        node = self._nodes.get(folderId)
+        if node is None:
+            return
+        if node.parent is not None and node.parent.children.get(node.name) is node:
+            del node.parent.children[node.name]
+        pending = [node]
+        while pending:
+            current = pending.pop()
+            self._nodes.pop(current.folderId, None)
+            pending.extend(current.children.values())
@@ -0,0 +1,196 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+"""Adapts MySQL Connector/Python connections to the pyodbc interface used by the database classes"""
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+from collections import OrderedDict, deque
+from typing import Any
+
+# Statements sent with the binary protocol as server side prepared statements.
+# Anything else, such as DDL, uses the text protocol
+_preparedStatements = ("SELECT", "INSERT", "UPDATE", "DELETE", "REPLACE", "WITH")
+
+class NativeRow(tuple):
+    """A row whose columns can be read as attributes, as with pyodbc"""
+
+    __slots__ = ()
+    _columns = {}
+
+    def __getattr__(self, name : str) -> Any:
+        try:
+            return self[self._columns[name]]
+        except KeyError:
+            raise AttributeError(name) from None
+
+class NativeCursor:
+    """
+    A cursor taking pyodbc style arguments. Each statement runs on a prepared
+    cursor cached by the connection, so repeated queries are only parsed by
+    the server once. Results are read in full when the statement executes,
+    as the connection can't run another statement while rows are unread.
+    """
+
+    def __init__(self, connection : "NativeConnection"):
+        self.connection = connection
+        self.fast_executemany = False
+        self.rowcount = -1
+        self.description = None
+        self._rows = deque()
+
+    def execute(self, sql : str, *params : Any) -> "NativeCursor":
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = params[0]
+        if sql.lstrip()[:7].upper().startswith(_preparedStatements):
+            cursor, sql = self.connection._prepared(sql)
+        else:
+            cursor, sql = self.connection._text(), _textParameters(sql)
+        cursor.execute(sql, tuple(params))
+        self._read(cursor)
+        return self
+
+    def executemany(self, sql : str, rows : list[tuple]) -> None:
+        """Inserts are sent as multiple row statements rather than one statement per row"""
+        cursor = self.connection._text()
+        cursor.executemany(_textParameters(sql), [tuple(row) for row in rows])
+        self._read(cursor)
+
+    def _read(self, cursor : Any) -> None:
+        self.description = cursor.description
+        if cursor.with_rows:
+            rowType = self.connection._rowType(tuple(column[0] for column in cursor.description))
+            self._rows = deque(rowType(row) for row in cursor.fetchall())
+            # pyodbc doesn't count the rows of a query
+            self.rowcount = -1
+        else:
+            self._rows = deque()
+            self.rowcount = cursor.rowcount
+
+    def fetchone(self) -> NativeRow | None:
+        if self._rows:
+            return self._rows.popleft()
+        return None
+
+    def fetchmany(self, size : int = 1) -> list[NativeRow]:
+        return [self._rows.popleft() for _ in range(min(size, len(self._rows)))]
+
+    def fetchall(self) -> list[NativeRow]:
+        rows = list(self._rows)
+        self._rows.clear()
+        return rows
+
+    def __iter__(self) -> "NativeCursor":
+        return self
+
+    def __next__(self) -> NativeRow:
+        if self._rows:
+            return self._rows.popleft()
+        raise StopIteration
+
+    def commit(self) -> None:
+        self.connection.commit()
+
+    def rollback(self) -> None:
+        self.connection.rollback()
+
+    def close(self) -> None:
+        self._rows.clear()
+
+class NativeConnection:
+
+    def __init__(self, connection : Any, statementCacheSize : int = 256):
+        self._connection = connection
+        self._statementCacheSize = max(1, statementCacheSize)
+        self._statements = OrderedDict() # SQL -> (prepared cursor, SQL), least recently used first
+        self._textCursor = None
+        self._rowTypes = {}
+
+    def cursor(self) -> NativeCursor:
+        return NativeCursor(self)
+
+    def commit(self) -> None:
+        self._connection.commit()
+
+    def rollback(self) -> None:
+        self._connection.rollback()
+
+    def close(self) -> None:
+        for cursor, _ in self._statements.values():
+            _closeCursor(cursor)
+        self._statements.clear()
+        if self._textCursor is not None:
+            _closeCursor(self._textCursor)
+            self._textCursor = None
+        self._connection.close()
+
+    def _prepared(self, sql : str) -> tuple[Any, str]:
+        """
+        Returns the prepared cursor for the statement along with the SQL
+        string it was prepared from. The cursor only prepares again when
+        given a different string object.
+        """
+        entry = self._statements.get(sql)
+        if entry is not None:
+            self._statements.move_to_end(sql)
+            return entry
+
+        if len(self._statements) >= self._statementCacheSize:
+            # Closing the cursor deallocates the statement on the server
+            _, (cursor, _) = self._statements.popitem(last=False)
+            _closeCursor(cursor)
+        entry = (self._connection.cursor(prepared=True), sql)
+        self._statements[sql] = entry
+        return entry
+
+    def _text(self) -> Any:
+        if self._textCursor is None:
+            self._textCursor = self._connection.cursor()
+        return self._textCursor
+
+    def _rowType(self, columns : tuple[str, ...]) -> type:
+        rowType = self._rowTypes.get(columns)
+        if rowType is None:
+            rowType = type("NativeRow", (NativeRow,), {
+                "__slots__" : (),
+                "_columns" : { name : index for index, name in enumerate(columns) }
+            })
+            self._rowTypes[columns] = rowType
+        return rowType
+
+def _textParameters(sql : str) -> str:
+    """Converts the ? markers to the %s used by the text protocol. The SQL never quotes either"""
+    return sql.replace("?", "%s")
+
+def _closeCursor(cursor : Any) -> None:
+    try:
+        cursor.close()
+    except Exception:
+        pass
+
+def connectNative(options : dict[str, Any], statementCacheSize : int = 256) -> NativeConnection:
+    """
+    Opens a connection with MySQL Connector/Python, which is an optional
+    dependency. The options are passed to mysql.connector.connect()
+    """
+    import mysql.connector
+
+    return NativeConnection(mysql.connector.connect(**options), statementCacheSize)
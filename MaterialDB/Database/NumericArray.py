@@ -0,0 +1,189 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+"""NumPy views of array property values"""
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+from typing import Any, Callable
+
+import numpy
+
+def parseQuantities(cells : numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Splits an array of quantity strings such as "1.5 mm" into an array of
+    values and an array of units, converting every cell at once. Empty cells
+    have a value of NaN and no unit, as do cells that aren't numbers.
+    """
+    if cells.size == 0:
+        return numpy.full(cells.shape, numpy.nan), numpy.full(cells.shape, "")
+    text = numpy.char.strip(numpy.where(numpy.equal(cells, None), "", cells).astype(str))
+    parts = numpy.char.partition(text, " ")
+    numbers = parts[..., 0]
+    units = numpy.char.strip(parts[..., 2])
+
+    values = numpy.full(text.shape, numpy.nan)
+    present = numbers != ""
+    try:
+        values[present] = numbers[present].astype(float)
+    except ValueError:
+        # At least one cell isn't a number, so fall back to converting them one at a time
+        values[present] = [_toFloat(number) for number in numbers[present]]
+    units[~present] = ""
+    return values, units
+
+def _toFloat(number : str) -> float:
+    try:
+        return float(number)
+    except ValueError:
+        return numpy.nan
+
+def _cellArray(values : list[list[str | None]], rows : int, columns : int) -> numpy.ndarray:
+    cells = numpy.empty((rows, columns), dtype=object)
+    if rows > 0 and columns > 0:
+        cells[:, :] = values
+    return cells
+
+class NumericArray2D:
+    """
+    A 2D array property as NumPy arrays. The cells are parsed when first
+    used, and the Materials.Array2D is only built when asked for.
+    """
+
+    def __init__(self, raw : dict[str, Any], build : Callable[[dict[str, Any]], Any]):
+        self.rows = raw["rows"]
+        self.columns = raw["columns"]
+        self._raw = raw
+        self._build = build
+        self._cells = None
+        self._values = None
+        self._units = None
+        self._array = None
+
+    @property
+    def cells(self) -> numpy.ndarray:
+        """The cell strings as a rows by columns object array, with None for empty cells"""
+        if self._cells is None:
+            self._cells = _cellArray(self._raw["values"], self.rows, self.columns)
+        return self._cells
+
+    @property
+    def values(self) -> numpy.ndarray:
+        """The cell values as a rows by columns float array"""
+        if self._values is None:
+            self._values, self._units = parseQuantities(self.cells)
+        return self._values
+
+    @property
+    def units(self) -> numpy.ndarray:
+        """The cell units as a rows by columns string array"""
+        if self._units is None:
+            self._values, self._units = parseQuantities(self.cells)
+        return self._units
+
+    def array(self) -> Any:
+        """Returns the value as a Materials.Array2D"""
+        if self._array is None:
+            self._array = self._build(self._raw)
+        return self._array
+
+class NumericArray3D:
+    """
+    A 3D array property as NumPy arrays. Depths can have different numbers
+    of rows, so the arrays are depth by the largest number of rows by
+    columns, with rows past the end of a depth left empty. The
+    Materials.Array3D is only built when asked for.
+    """
+
+    def __init__(self, raw : dict[str, Any], build : Callable[[dict[str, Any]], Any]):
+        self.depth = len(raw["depths"])
+        self.columns = raw["columns"]
+        self.rows = numpy.array([depth["rows"] for depth in raw["depths"]], dtype=int)
+        self._raw = raw
+        self._build = build
+        self._cells = None
+        self._values = None
+        self._units = None
+        self._depthValues = None
+        self._depthUnits = None
+        self._array = None
+
+    @property
+    def cells(self) -> numpy.ndarray:
+        """The cell strings as a depth by rows by columns object array, with None for empty cells"""
+        if self._cells is None:
+            rows = int(self.rows.max()) if self.depth > 0 else 0
+            self._cells = numpy.empty((self.depth, rows, self.columns), dtype=object)
+            for index, depth in enumerate(self._raw["depths"]):
+                self._cells[index, :depth["rows"]] = _cellArray(depth["values"], depth["rows"], self.columns)
+        return self._cells
+
+    @property
+    def values(self) -> numpy.ndarray:
+        """The cell values as a depth by rows by columns float array"""
+        if self._values is None:
+            self._values, self._units = parseQuantities(self.cells)
+        return self._values
+
+    @property
+    def units(self) -> numpy.ndarray:
+        """The cell units as a depth by rows by columns string array"""
+        if self._units is None:
+            self._values, self._units = parseQuantities(self.cells)
+        return self._units
+
+    @property
+    def depthValues(self) -> numpy.ndarray:
+        """The value of each depth as a float array"""
+        if self._depthValues is None:
+            self._parseDepths()
+        return self._depthValues
+
+    @property
+    def depthUnits(self) -> numpy.ndarray:
+        """The unit of each depth value as a string array"""
+        if self._depthUnits is None:
+            self._parseDepths()
+        return self._depthUnits
+
+    def _parseDepths(self) -> None:
+        depths = numpy.empty(self.depth, dtype=object)
+        depths[:] = [depth["value"] for depth in self._raw["depths"]]
+        self._depthValues, self._depthUnits = parseQuantities(depths)
+
+    def array(self) -> Any:
+        """Returns the value as a Materials.Array3D"""
+        if self._array is None:
+            self._array = self._build(self._raw)
+        return self._array
+
+def numericArray(type : str, raw : dict[str, Any],
+                 build : Callable[[str, dict[str, Any]], Any]) -> NumericArray2D | NumericArray3D:
+    """
+    Wraps the raw value of a 2D or 3D array, as described in
+    DatabaseMySQL._rawPropertyValue(). build(type, raw) is called to create
+    the Materials array when it's first asked for.
+    """
+    if type == "2DArray":
+        return NumericArray2D(raw, lambda raw: build(type, raw))
+    elif type == "3DArray":
+        return NumericArray3D(raw, lambda raw: build(type, raw))
+    raise ValueError("Property type '{}' isn't an array".format(type))
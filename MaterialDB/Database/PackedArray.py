@@ -0,0 +1,41 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+"""Functions for storing array property values as a single blob"""
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import json
+from typing import Any
+
+from MaterialDB.Database.Codec import ZLIB, encode, decode
+
+def packArray(raw : dict[str, Any], threshold : int, codec : str = ZLIB) -> tuple[str, bytes]:
+    """
+    Packs the raw value of a 2D or 3D array, as described in
+    DatabaseMySQL._rawPropertyValue(), returning the codec and the blob.
+    Cells keep their type, so empty cells stay distinct from empty strings.
+    """
+    text = json.dumps(raw, separators=(",", ":"), ensure_ascii=False)
+    return encode(text.encode("utf-8"), threshold, codec)
+
+def unpackArray(codec : str | None, data : bytes) -> dict[str, Any]:
+    return json.loads(decode(codec, data).decode("utf-8"))
@@ -0,0 +1,119 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+"""Adapts sqlite3 connections to the pyodbc interface used by the database classes"""
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import sqlite3
+from collections import deque
+from typing import Any
+
+class SQLiteRow(sqlite3.Row):
+    """A row whose columns can be read as attributes, as with pyodbc"""
+
+    def __getattr__(self, name : str) -> Any:
+        try:
+            return self[name]
+        except IndexError:
+            raise AttributeError(name) from None
+
+class SQLiteCursor(sqlite3.Cursor):
+    """
+    A cursor that takes parameters the way pyodbc does, as separate
+    arguments, and commits or rolls back its connection's transaction
+    """
+
+    def __init__(self, connection : sqlite3.Connection):
+        super().__init__(connection)
+        self.row_factory = SQLiteRow
+
+        # Accepted for compatibility. sqlite3 is already fast here
+        self.fast_executemany = False
+
+        # Rows returned by a write, see execute()
+        self._returned = None
+
+    def execute(self, sql : str, *params : Any) -> "SQLiteCursor":
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = params[0]
+        self._returned = None
+        super().execute(sql, params)
+        if " RETURNING " in sql.upper():
+            # SQLite can't commit while a write statement is still returning rows
+            self._returned = deque(super().fetchall())
+        return self
+
+    def fetchone(self) -> SQLiteRow | None:
+        if self._returned is None:
+            return super().fetchone()
+        if self._returned:
+            return self._returned.popleft()
+        return None
+
+    def fetchmany(self, size : int | None = None) -> list[SQLiteRow]:
+        if self._returned is None:
+            return super().fetchmany(self.arraysize if size is None else size)
+        count = self.arraysize if size is None else size
+        return [self._returned.popleft() for _ in range(min(count, len(self._returned)))]
+
+    def fetchall(self) -> list[SQLiteRow]:
+        if self._returned is None:
+            return super().fetchall()
+        rows = list(self._returned)
+        self._returned.clear()
+        return rows
+
+    def __next__(self) -> SQLiteRow:
+        if self._returned is None:
+            return super().__next__()
+        if self._returned:
+            return self._returned.popleft()
+        raise StopIteration
+
+    def commit(self) -> None:
+        self.connection.commit()
+
+    def rollback(self) -> None:
+        self.connection.rollback()
+
+class SQLiteConnection(sqlite3.Connection):
+
+    def cursor(self, factory : type = SQLiteCursor) -> SQLiteCursor:
+        return super().cursor(factory)
+
+def connectSQLite(path : str, cacheSize : int = 64, mmapSize : int = 256, timeout : float = 30.0) -> SQLiteConnection:
+    """
+    Opens the database file, creating it if required. Writes go through the
+    write ahead log so readers are never blocked, and are only synced at
+    checkpoints. cacheSize and mmapSize are in megabytes.
+
+    The connection may be used from any thread, but by only one at a time.
+    """
+    connection = sqlite3.connect(path, timeout=timeout, factory=SQLiteConnection, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.execute("PRAGMA temp_store = MEMORY")
+    # A negative cache size is in kibibytes rather than pages
+    connection.execute("PRAGMA cache_size = {}".format(-int(cacheSize) * 1024))
+    connection.execute("PRAGMA mmap_size = {}".format(int(mmapSize) * 1024 * 1024))
+    return connection
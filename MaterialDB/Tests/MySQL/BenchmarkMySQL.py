@@ -0,0 +1,109 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+"""Benchmarks for database writes. These are not unit tests
+
+Run from the FreeCAD Python console:
+
+    from MaterialDB.Tests.MySQL.BenchmarkMySQL import runInsertBenchmark
+    runInsertBenchmark()
+
+Pass database=DatabaseSQLiteTest() to compare with the SQLite backend.
+"""
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import time
+
+from MaterialDB.Database.Database import Database
+from MaterialDB.Database.DatabaseMySQLTest import DatabaseMySQLTest
+
+_ARRAY_INSERT = ("INSERT INTO material_property_array_value "
+                 " (material_property_value_id, material_property_value_row, "
+                 "  material_property_value_column, material_property_value_depth, "
+                 "  material_property_value_depth_rows, material_property_value)"
+                 " VALUES (?, ?, ?, ?, ?, ?)")
+
+def _arrayRows(valueId : int, count : int) -> list[tuple]:
+    """Rows for a 5 column array, as written when migrating a material"""
+    return [(valueId, index // 5, index % 5, -1, -1, "{} mm".format(index)) for index in range(count)]
+
+def _arrayProperty(db : Database) -> int:
+    """Creates a material with an array property for the rows to belong to. Returns the value id"""
+    uuid = "b0000000-0000-0000-0000-000000000001"
+    db.createLibrary("Benchmark", None, False)
+    cursor = db._cursor()
+    libraryId = db._findLibrary(cursor, "Benchmark")
+    cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, 'Benchmark')",
+                   uuid, libraryId)
+    cursor.execute("INSERT INTO material_property_value (material_id, material_property_name, "
+                   "material_property_type) VALUES (?, 'Table', '2DArray')", uuid)
+    valueId = db._lastId(cursor)
+    db._commit(cursor)
+    return valueId
+
+def _executeEach(db : Database, rows : list[tuple]) -> None:
+    cursor = db._cursor()
+    for row in rows:
+        cursor.execute(_ARRAY_INSERT, *row)
+
+def _executeMany(db : Database, rows : list[tuple]) -> None:
+    db._executeMany(db._cursor(), _ARRAY_INSERT, rows, fast=False)
+
+def _fastExecuteMany(db : Database, rows : list[tuple]) -> None:
+    db._executeMany(db._cursor(), _ARRAY_INSERT, rows, fast=True)
+
+def runInsertBenchmark(rowCount : int = 10000, database : Database | None = None) -> dict[str, float]:
+    """
+    Inserts rowCount array values using each write strategy and prints the
+    rows per second achieved. Uses the MySQL test database unless another
+    test database is given. Its tables are dropped afterwards.
+    """
+    db = database if database is not None else DatabaseMySQLTest()
+    db.createTables()
+    results = {}
+    try:
+        rows = _arrayRows(_arrayProperty(db), rowCount)
+        cursor = db._cursor()
+        strategies = [
+            ("execute", _executeEach),
+            ("executemany", _executeMany),
+        ]
+        if db._fastExecuteMany(cursor):
+            strategies.append(("fast_executemany", _fastExecuteMany))
+        else:
+            print("fast_executemany isn't supported by this driver")
+
+        for name, strategy in strategies:
+            cursor.execute("DELETE FROM material_property_array_value")
+            cursor.commit()
+
+            start = time.perf_counter()
+            strategy(db, rows)
+            db._cursor().commit()
+            elapsed = time.perf_counter() - start
+
+            results[name] = rowCount / elapsed
+            print("{0:>18}: {1:10.0f} rows/s ({2:.2f}s)".format(name, results[name], elapsed))
+    finally:
+        db.dropTables()
+
+    return results
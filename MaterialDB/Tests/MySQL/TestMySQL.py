@@ -22,10 +22,23 @@
 __author__ = "David Carter"
 __url__ = "https://www.davesrocketshop.com"
 
+import importlib.util
+import os
+import tempfile
+import threading
 import unittest
+from types import SimpleNamespace
+from typing import Any, Callable
 from pyodbc import Cursor
 
+from MaterialDB.Database.BlobStore import blobHash
+from MaterialDB.Database.ContentHash import materialHash
 from MaterialDB.Database.DatabaseMySQLTest import DatabaseMySQLTest
+from MaterialDB.Database.DeferredValue import DeferredValue, prefetch
+from MaterialDB.Database.Exceptions import DatabaseLibraryCreationError, DatabaseMaterialNotFound, \
+    DatabaseModelNotFound, DatabaseFilterError
+from MaterialDB.manager.MaterialDBManager import MaterialsDBManager
+from MaterialDB.manager.Mirror import LocalMirror
 from MaterialDB.util.UIPath import getUIPath
 
 class MySQLTests(unittest.TestCase):
@@ -45,6 +58,29 @@ class MySQLTests(unittest.TestCase):
         self._db._connect()
         self.assertIsNotNone(self._db._getConnection())
 
+    def testConnectionPool(self):
+        # A thread keeps the same connection until it releases it
+        connection = self._db._getPool().connection()
+        self.assertIs(self._db._getPool().connection(), connection)
+
+        # Other threads check out their own connection
+        other = []
+        def worker():
+            other.append(self._db._getPool().connection())
+            self._db._release()
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        self.assertEqual(len(other), 1)
+        self.assertIsNot(other[0], connection)
+
+        # Released connections are reused
+        self.assertGreaterEqual(self._db._getPool().idle, 1)
+        self._db._release()
+        self.assertIsNone(self._db._getConnection())
+        self._db._connect()
+        self.assertIsNotNone(self._db._getConnection())
+
     def getFolderFunction(self, cursor : Cursor, folderId : int) -> str | None:
         cursor = self._db._cursor()
 
@@ -55,6 +91,14 @@ class MySQLTests(unittest.TestCase):
 
         return None
 
+    def getFolderPath(self, cursor : Cursor, folderId : int) -> str | None:
+        cursor.execute("SELECT folder_path FROM folder WHERE folder_id = ?", folderId)
+        row = cursor.fetchone()
+        if row:
+            return row.folder_path
+
+        return None
+
     def testPaths(self):
         self._db.createLibrary("TestPaths", None,  False)
         cursor = self._db._cursor()
@@ -70,7 +114,7 @@ class MySQLTests(unittest.TestCase):
         id6 = self._db._createPath(cursor, libraryId, "User/Henry")
         id7 = self._db._createPath(cursor, libraryId, "/")
         id8 = self._db._createPath(cursor, libraryId, "")
-        cursor.commit()
+        self._db._commit(cursor)
         self.assertNotEqual(id1, 0)
         self.assertNotEqual(id2, 0)
         self.assertNotEqual(id3, 0)
@@ -99,6 +143,10 @@ class MySQLTests(unittest.TestCase):
         self.assertEqual(self.getFolderFunction(cursor, id7), "")
         self.assertEqual(self.getFolderFunction(cursor, id8), "")
 
+        # The stored path must agree with the function
+        for folderId in [id1, id2, id3, id4, id5, id6, id7, id8]:
+            self.assertEqual(self.getFolderPath(cursor, folderId), self.getFolderFunction(cursor, folderId))
+
         folders = self._db.libraryFolders("TestPaths")
         self.assertEqual(len(folders), 9)
         # self.assertEqual(folders[0], "System")
@@ -111,3 +159,1181 @@ class MySQLTests(unittest.TestCase):
         self.assertTrue("/User" in folders)
         self.assertTrue("/User/Henry" in folders)
         self.assertTrue("/" in folders)
+
+    def testRenameFolder(self):
+        self._db.createLibrary("TestRename", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestRename")
+        id1 = self._db._createPath(cursor, libraryId, "System/Resource/Tests")
+        id2 = self._db._createPath(cursor, libraryId, "System/Resource/Tests/Test1")
+        id3 = self._db._createPath(cursor, libraryId, "System/Resources")
+        self._db._commit(cursor)
+
+        self._db.renameFolder("TestRename", "System/Resource", "System/Renamed")
+        cursor = self._db._cursor()
+        self.assertEqual(self.getFolderPath(cursor, id1), "System/Renamed/Tests")
+        self.assertEqual(self.getFolderPath(cursor, id2), "System/Renamed/Tests/Test1")
+        # Similar names aren't affected
+        self.assertEqual(self.getFolderPath(cursor, id3), "System/Resources")
+
+        # The folder index sees the new name without reloading
+        self.assertEqual(self._db._createPath(cursor, libraryId, "System/Renamed/Tests/Test1"), id2)
+        self._db._commit(cursor)
+
+        folders = self._db.libraryFolders("TestRename")
+        self.assertTrue("/System/Renamed/Tests/Test1" in folders)
+        self.assertFalse("/System/Resource" in folders)
+
+    def testFolderRollback(self):
+        self._db.createLibrary("TestFolderRollback", None,  False)
+        self._db.createLibrary("TestFolderRollbackOther", None,  False)
+        self._db.createFolder("TestFolderRollback", "Kept")
+        self._db.createFolder("TestFolderRollbackOther", "Other")
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestFolderRollback")
+        otherId = self._db._findLibrary(cursor, "TestFolderRollbackOther")
+        self._db._commit(cursor)
+        kept = self._db._folderIndexes[libraryId]
+        other = self._db._folderIndexes[otherId]
+
+        # Folders are staged until the transaction commits
+        cursor = self._db._cursor()
+        created = self._db._createPath(cursor, libraryId, "Kept/Staged")
+        self.assertEqual(self._db._createPath(cursor, libraryId, "Kept/Staged"), created)
+        self.assertEqual(kept.folderId(["Kept", "Staged"]), 0)
+        self._db._rollback(cursor)
+
+        # Only the failed transaction's changes are lost
+        self.assertIs(self._db._folderIndexes[libraryId], kept)
+        self.assertIs(self._db._folderIndexes[otherId], other)
+        with self.assertRaises(DatabaseMaterialNotFound):
+            self._db.getMaterial("10000000-0000-0000-0000-00000000ffff")
+        self.assertIs(self._db._folderIndexes[otherId], other)
+
+        cursor = self._db._cursor()
+        self.assertIsNone(self._db._findFolder(cursor, libraryId, ["Kept", "Staged"]))
+        created = self._db._createPath(cursor, libraryId, "Kept/Staged")
+        self._db._commit(cursor)
+        self.assertEqual(self._db._folderIndexes[libraryId].folderId(["Kept", "Staged"]), created)
+        self.assertNotEqual(self._db._folderIndexes[libraryId].folderId(["Kept"]), 0)
+
+    def createProperty(self, cursor : Cursor, materialUUID : str, name : str, value : str) -> None:
+        cursor.execute("INSERT INTO material_property_value (material_id, material_property_name, "
+                       "material_property_type) VALUES (?, ?, 'String')", materialUUID, name)
+        valueId = self._db._lastId(cursor)
+        cursor.execute("INSERT INTO material_property_string_value (material_property_value_id, "
+                       "material_property_value) VALUES (?, ?)", valueId, value)
+
+    def testMaterialFilter(self):
+        base = "00000000-0000-0000-0000-000000000001"
+        derived = "00000000-0000-0000-0000-000000000002"
+        other = "00000000-0000-0000-0000-000000000003"
+        complete = "10000000-0000-0000-0000-000000000001"
+        incomplete = "10000000-0000-0000-0000-000000000002"
+        baseOnly = "10000000-0000-0000-0000-000000000003"
+        bare = "10000000-0000-0000-0000-000000000004"
+
+        self._db.createLibrary("TestFilter", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestFilter")
+        for uuid, name in [(base, "Base"), (derived, "Derived"), (other, "Other")]:
+            cursor.execute("INSERT INTO model (model_id, library_id, model_type, model_name) "
+                           "VALUES (?, ?, 'Physical', ?)", uuid, libraryId, name)
+        cursor.execute("INSERT INTO model_inheritance (model_id, inherits_id) VALUES (?, ?)", derived, base)
+        for uuid, name in [(base, "Density"), (derived, "Hardness")]:
+            cursor.execute("INSERT INTO model_property (model_id, model_property_name, "
+                           "model_property_display_name, model_property_type, model_property_units, "
+                           "model_property_url) VALUES (?, ?, ?, 'String', '', '')", uuid, name, name)
+        for uuid, name in [(complete, "Complete"), (incomplete, "Incomplete"), (baseOnly, "BaseOnly"), (bare, "Bare")]:
+            cursor.execute("INSERT INTO material (material_id, library_id, material_name) "
+                           "VALUES (?, ?, ?)", uuid, libraryId, name)
+        for materialUUID, modelUUID in [(complete, derived), (incomplete, derived), (baseOnly, base)]:
+            cursor.execute("INSERT INTO material_models (material_id, model_id) VALUES (?, ?)",
+                           materialUUID, modelUUID)
+        self.createProperty(cursor, complete, "Density", "1000 kg/m^3")
+        self.createProperty(cursor, complete, "Hardness", "5")
+        self.createProperty(cursor, incomplete, "Density", "1000 kg/m^3")
+        self.createProperty(cursor, incomplete, "Hardness", "")
+        self.createProperty(cursor, baseOnly, "Density", "1000 kg/m^3")
+        self._db._commit(cursor)
+
+        def filtered(required : list[str], requiredComplete : list[str]) -> set[str]:
+            filter = SimpleNamespace(RequiredModels=required, RequiredCompleteModels=requiredComplete)
+            predicates = self._db._materialFilter(cursor, filter, None)
+            if predicates is None:
+                return set()
+            where, params = predicates
+            cursor.execute("SELECT m.material_id FROM material m WHERE m.library_id = ?" + where,
+                           libraryId, *params)
+            return set([row.material_id for row in cursor.fetchall()])
+
+        self.assertEqual(len(self._db.libraryMaterials("TestFilter")), 4)
+        filter = SimpleNamespace(RequiredModels=[base], RequiredCompleteModels=[derived])
+        self.assertEqual(len(self._db.libraryMaterials("TestFilter", filter)), 1)
+
+        cursor = self._db._cursor()
+        self.assertEqual(filtered([], []), set([complete, incomplete, baseOnly, bare]))
+        # Inheriting a model counts as having it
+        self.assertEqual(filtered([base], []), set([complete, incomplete, baseOnly]))
+        self.assertEqual(filtered([derived], []), set([complete, incomplete]))
+        self.assertEqual(filtered([other], []), set())
+        self.assertEqual(filtered([], [base]), set([complete, incomplete, baseOnly]))
+        self.assertEqual(filtered([], [derived]), set([complete]))
+        self.assertEqual(filtered([base], [derived]), set([complete]))
+        # Unknown models match nothing
+        self.assertEqual(filtered(["20000000-0000-0000-0000-000000000000"], []), set())
+
+    def testFilterOptions(self):
+        self._db.createLibrary("TestFilterOptions", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestFilterOptions")
+        for index in range(3):
+            cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, ?)",
+                           "10000000-0000-0000-0000-00000000002{}".format(index), libraryId,
+                           "Material{}".format(index))
+        self._db._commit(cursor)
+
+        # None of these change which materials are listed
+        for option in ["IncludeLegacy", "IncludeFavorites", "IncludeRecent", "IncludeEmptyFolders",
+                       "IncludeEmptyLibraries"]:
+            for value in [True, False]:
+                options = SimpleNamespace(**{option: value})
+                self.assertEqual(len(self._db.libraryMaterials("TestFilterOptions", None, options)), 3)
+
+        # Unknown options are refused rather than ignored
+        options = SimpleNamespace(IncludeLegacy=False, IncludeUnknown=True)
+        with self.assertRaises(DatabaseFilterError):
+            self._db.libraryMaterials("TestFilterOptions", None, options)
+        with self.assertRaises(DatabaseFilterError):
+            self._db.libraryMaterialsPage("TestFilterOptions", None, 10, None, options)
+        with self.assertRaises(DatabaseFilterError):
+            list(self._db.iterLibraryMaterials("TestFilterOptions", None, options))
+
+        # and the manager lists without them
+        manager = self.manager()
+        self.assertEqual(len(manager.libraryMaterials("TestFilterOptions", None, options)), 3)
+        self.assertEqual(len(manager.libraryMaterialsPage("TestFilterOptions", None, 10, None, options)), 3)
+        self.assertEqual(len(list(manager.iterLibraryMaterials("TestFilterOptions", None, options))), 3)
+
+    def testPaging(self):
+        self._db.createLibrary("TestPaging", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestPaging")
+        for path in ["A", "A/B", "A/B/C", "B", "B/A", "C"]:
+            self._db._createPath(cursor, libraryId, path)
+        for index in range(7):
+            cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, ?)",
+                           "10000000-0000-0000-0000-00000000000{}".format(index), libraryId, "M{}".format(index))
+        self._db._commit(cursor)
+
+        folders = self._db.libraryFolders("TestPaging")
+        self.assertEqual(len(folders), 6)
+        self.assertEqual(list(self._db.iterLibraryFolders("TestPaging", batchSize=1)), folders)
+
+        pages = []
+        after = None
+        while True:
+            page = self._db.libraryFoldersPage("TestPaging", after, 4)
+            if not page:
+                break
+            self.assertTrue(len(page) <= 4)
+            pages.extend(page)
+            after = page[-1]
+        self.assertEqual(pages, sorted(folders))
+
+        self.assertEqual(len(list(self._db.iterLibraryMaterials("TestPaging", batchSize=2))), 7)
+        self.assertEqual(len(self._db.libraryMaterialsPage("TestPaging", None, 5)), 5)
+        self.assertEqual(len(self._db.libraryMaterialsPage("TestPaging", "10000000-0000-0000-0000-000000000004", 5)), 2)
+        self.assertEqual(self._db.libraryModelsPage("TestPaging", None, 5), [])
+
+    def testTags(self):
+        uuid = "10000000-0000-0000-0000-000000000001"
+        self._db.createLibrary("TestTags", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestTags")
+        cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, 'Tagged')",
+                       uuid, libraryId)
+
+        self._db._createTags(cursor, uuid, ["Metal", "Steel", "Steel"], libraryId)
+        self.assertEqual(sorted(self._db._getTags(cursor, uuid)), ["Metal", "Steel"])
+
+        # Tag names aren't case sensitive, and existing tags are reused
+        self._db._createTags(cursor, uuid, ["metal", "Alloy"], libraryId)
+        self.assertEqual(sorted(self._db._getTags(cursor, uuid)), ["Alloy", "Metal", "Steel"])
+        cursor.execute("SELECT COUNT(*) AS tags FROM material_tag")
+        self.assertEqual(cursor.fetchone().tags, 3)
+        self._db._commit(cursor)
+
+    def testConsistency(self):
+        model = "00000000-0000-0000-0000-000000000001"
+        missing = "00000000-0000-0000-0000-000000000099"
+        material = "10000000-0000-0000-0000-000000000001"
+        orphan = "10000000-0000-0000-0000-000000000002"
+        self._db.createLibrary("TestConsistency", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestConsistency")
+        self._db._foreignKeysIgnore(cursor)
+        cursor.execute("INSERT INTO model (model_id, library_id, model_type, model_name) "
+                       "VALUES (?, ?, 'Physical', 'Model')", model, libraryId)
+        cursor.execute("INSERT INTO model_inheritance (model_id, inherits_id) VALUES (?, ?)", model, missing)
+        cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, 'Parent')",
+                       material, libraryId)
+        cursor.execute("INSERT INTO material (material_id, library_id, material_name, material_parent_uuid) "
+                       "VALUES (?, ?, 'Orphan', ?)", orphan, libraryId, missing)
+        cursor.execute("INSERT INTO material_models (material_id, model_id) VALUES (?, ?), (?, ?)",
+                       material, model, orphan, missing)
+        self._db._foreignKeysRestore(cursor)
+        self._db._commit(cursor)
+
+        problems = self._db.checkConsistency("TestConsistency")
+        self.assertEqual(problems["modelInheritance"], [(model, missing)])
+        self.assertEqual(problems["materialModels"], [(orphan, missing)])
+        self.assertEqual(problems["materialParents"], [(orphan, missing)])
+
+    def testUpserts(self):
+        uuid = "10000000-0000-0000-0000-000000000001"
+        self._db.createLibrary("TestUpserts", None,  False)
+        # Creating an identical library again is allowed
+        self._db.createLibrary("TestUpserts", None,  False)
+        with self.assertRaises(DatabaseLibraryCreationError):
+            self._db.createLibrary("TestUpserts", None,  True)
+
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestUpserts")
+        cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, 'Upsert')",
+                       uuid, libraryId)
+
+        valueId = self._db._updateMaterialPropertyValue(cursor, uuid, "Density", "Quantity")
+        self.assertEqual(self._db._updateMaterialPropertyValue(cursor, uuid, "Density", "Quantity"), valueId)
+        self._db._updateStringValue(cursor, uuid, "Density", "Quantity", "1 kg/m^3")
+        self._db._updateStringValue(cursor, uuid, "Density", "Quantity", "2 kg/m^3")
+        cursor.execute("SELECT material_property_value FROM material_property_string_value "
+                       "WHERE material_property_value_id = ?", valueId)
+        self.assertEqual([row.material_property_value for row in cursor.fetchall()], ["2 kg/m^3"])
+
+        self._db._updateListValue(cursor, uuid, "Files", "FileList", ["a", "b", "c"])
+        self._db._updateListValue(cursor, uuid, "Files", "FileList", ["d", "e"])
+        properties = self._db._getMaterialPropertyRecords(cursor, [uuid])[uuid]
+        self.assertEqual(properties["Files"], ("FileList", ["d", "e"]))
+        self.assertEqual(properties["Density"], ("Quantity", "2 kg/m^3"))
+        self._db._commit(cursor)
+
+    def testUpdateProperties(self):
+        uuid = "10000000-0000-0000-0000-000000000002"
+        self._db.createLibrary("TestUpdateProperties", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestUpdateProperties")
+        cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, 'Update')",
+                       uuid, libraryId)
+
+        def material(density, files):
+            return SimpleNamespace(PropertyObjects={
+                "Density" : SimpleNamespace(Name="Density", Type="String", Value=density),
+                "Files" : SimpleNamespace(Name="Files", Type="FileList", Value=files)
+            })
+
+        self._db._updateMaterialProperties(cursor, uuid, self._db._materialRows(material("1", ["a", "b"])), {})
+        stored = self._db._getMaterialPropertyRecords(cursor, [uuid])[uuid]
+        self.assertEqual(stored, { "Density" : ("String", "1"), "Files" : ("FileList", ["a", "b"]) })
+        cursor.execute("SELECT material_property_value_id FROM material_property_value "
+                       "WHERE material_id = ? AND material_property_name = 'Density'", uuid)
+        densityId = cursor.fetchone().material_property_value_id
+
+        # Scalars are updated in place, other values are replaced
+        self._db._updateMaterialProperties(cursor, uuid, self._db._materialRows(material("2", ["c"])), stored)
+        stored = self._db._getMaterialPropertyRecords(cursor, [uuid])[uuid]
+        self.assertEqual(stored, { "Density" : ("String", "2"), "Files" : ("FileList", ["c"]) })
+        cursor.execute("SELECT material_property_value_id FROM material_property_value "
+                       "WHERE material_id = ? AND material_property_name = 'Density'", uuid)
+        self.assertEqual(cursor.fetchone().material_property_value_id, densityId)
+
+        # Properties without a value are removed
+        self._db._updateMaterialProperties(cursor, uuid, self._db._materialRows(material(None, ["c"])), stored)
+        stored = self._db._getMaterialPropertyRecords(cursor, [uuid])[uuid]
+        self.assertEqual(stored, { "Files" : ("FileList", ["c"]) })
+        self._db._commit(cursor)
+
+    def arrayMaterial(self) -> tuple[SimpleNamespace, dict]:
+        """Returns a stand in for a material with a 2D and a 3D array, and their raw values"""
+        def quantity(value):
+            return SimpleNamespace(UserString=value)
+        arrays = {
+            "Table" : SimpleNamespace(Dimensions=2, Rows=2, Columns=2,
+                                      Array=[[quantity("1 mm"), None], ["", "3 mm"]]),
+            "Cube" : SimpleNamespace(Dimensions=3, Columns=2, Depth=1,
+                                     Array=[[[quantity("1 Pa"), quantity("2 Pa")]]],
+                                     getRows=lambda depth: 1,
+                                     getDepthValue=lambda depth: quantity("20 C"))
+        }
+        material = SimpleNamespace(PropertyObjects={
+                "Table" : SimpleNamespace(Name="Table", Type="2DArray"),
+                "Cube" : SimpleNamespace(Name="Cube", Type="3DArray")
+            },
+            hasPhysicalProperty=lambda name: True,
+            getPhysicalValue=lambda name: arrays[name])
+        expected = {
+            "Table" : ("2DArray", { "rows" : 2, "columns" : 2, "values" : [["1 mm", None], ["", "3 mm"]] }),
+            "Cube" : ("3DArray", { "columns" : 2,
+                                   "depths" : [{ "value" : "20 C", "rows" : 1, "values" : [["1 Pa", "2 Pa"]] }] })
+        }
+        return material, expected
+
+    def testPackedArrays(self):
+        uuid = "10000000-0000-0000-0000-000000000004"
+        self._db.createLibrary("TestPackedArrays", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestPackedArrays")
+        cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, 'Packed')",
+                       uuid, libraryId)
+
+        material, expected = self.arrayMaterial()
+        self._db._updateMaterialProperties(cursor, uuid, self._db._materialRows(material), {})
+        self.assertEqual(self._db._getMaterialPropertyRecords(cursor, [uuid])[uuid], expected)
+        cursor.execute("SELECT COUNT(*) AS count FROM material_property_array_packed")
+        self.assertEqual(cursor.fetchone().count, 2)
+
+        # Arrays written a cell per row by earlier versions are read, then packed
+        cursor.execute("DELETE FROM material_property_value WHERE material_property_name = 'Cube'")
+        cursor.execute("DELETE FROM material_property_array_packed")
+        cursor.execute("SELECT material_property_value_id FROM material_property_value "
+                       "WHERE material_id = ? AND material_property_name = 'Table'", uuid)
+        valueId = cursor.fetchone().material_property_value_id
+        cursor.executemany("INSERT INTO material_property_array_value (material_property_value_id, "
+                           "material_property_value_row, material_property_value_column, "
+                           "material_property_value_depth, material_property_value_depth_rows, "
+                           "material_property_value) VALUES (?, ?, ?, -1, -1, ?)",
+                           [(valueId, 0, 0, "1 mm"), (valueId, 1, 0, ""), (valueId, 1, 1, "3 mm")])
+        self._db._commit(cursor)
+        self.assertEqual(self._db._getMaterialPropertyRecords(cursor, [uuid])[uuid], { "Table" : expected["Table"] })
+
+        self.assertEqual(self._db.packArrays(), 1)
+        self.assertEqual(self._db.packArrays(), 0)
+        self.assertEqual(self._db._getMaterialPropertyRecords(cursor, [uuid])[uuid], { "Table" : expected["Table"] })
+        cursor.execute("SELECT COUNT(*) AS count FROM material_property_array_value")
+        self.assertEqual(cursor.fetchone().count, 0)
+
+    @unittest.skipUnless(importlib.util.find_spec("numpy"), "NumPy isn't installed")
+    def testMaterialArrays(self):
+        uuid = "10000000-0000-0000-0000-000000000005"
+        self._db.createLibrary("TestMaterialArrays", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestMaterialArrays")
+        cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, 'Arrays')",
+                       uuid, libraryId)
+        material, expected = self.arrayMaterial()
+        material.PropertyObjects["Density"] = SimpleNamespace(Name="Density", Type="String", Value="1")
+        self._db._updateMaterialProperties(cursor, uuid, self._db._materialRows(material), {})
+        self._db._commit(cursor)
+
+        arrays = self._db.getMaterialArrays([uuid])
+        self.assertEqual(sorted(arrays[uuid].keys()), ["Cube", "Table"])
+        table = arrays[uuid]["Table"]
+        self.assertEqual(table.values.shape, (2, 2))
+        self.assertEqual(table.values[0, 0], 1.0)
+        self.assertEqual(table.units[1, 1], "mm")
+        self.assertEqual(arrays[uuid]["Cube"].values.tolist(), [[[1.0, 2.0]]])
+        self.assertEqual(arrays[uuid]["Cube"].depthValues.tolist(), [20.0])
+
+        self.assertEqual(list(self._db.getMaterialArrays([uuid], ["Cube"])[uuid].keys()), ["Cube"])
+        self.assertEqual(self._db.getMaterialArrays([uuid], ["Density"]), {})
+
+    def testLazyValues(self):
+        uuid = "10000000-0000-0000-0000-000000000006"
+        self._db.createLibrary("TestLazyValues", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestLazyValues")
+        cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, 'Lazy')",
+                       uuid, libraryId)
+        material = SimpleNamespace(PropertyObjects={
+            "Density" : SimpleNamespace(Name="Density", Type="String", Value="1"),
+            "Swatch" : SimpleNamespace(Name="Swatch", Type="SVG", Value="<svg/>"),
+            "Textures" : SimpleNamespace(Name="Textures", Type="ImageList", Value=["a", "b"])
+        })
+        self._db._updateMaterialProperties(cursor, uuid, self._db._materialRows(material), {})
+        self._db._commit(cursor)
+
+        properties = self._db.getMaterialRecords([uuid], lazy=True)[uuid]["properties"]
+        self.assertEqual(properties["Density"], ("String", "1"))
+        swatch = properties["Swatch"][1]
+        textures = properties["Textures"][1]
+        self.assertIsInstance(swatch, DeferredValue)
+        self.assertFalse(swatch.loaded)
+
+        prefetch([swatch, textures])
+        self.assertTrue(swatch.loaded and textures.loaded)
+        self.assertEqual(swatch.value, "<svg/>")
+        self.assertEqual(textures.value, ["a", "b"])
+        self.assertEqual(self._db.getMaterialRecords([uuid], lazy=True)[uuid]["properties"]["Swatch"][1].value,
+                         "<svg/>")
+
+    def testLazyUpdate(self):
+        uuid = "10000000-0000-0000-0000-000000000009"
+        self._db.createLibrary("TestLazyUpdate", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestLazyUpdate")
+        cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, 'Lazy')",
+                       uuid, libraryId)
+
+        def material(density, swatch, textures):
+            return SimpleNamespace(UUID=uuid, Name="Lazy", Author=None, License=None, Parent=None,
+                                   Description=None, URL=None, Reference=None, Tags=[],
+                                   PhysicalModels=[], AppearanceModels=[], PropertyObjects={
+                "Density" : SimpleNamespace(Name="Density", Type="String", Value=density),
+                "Swatch" : SimpleNamespace(Name="Swatch", Type="SVG", Value=swatch),
+                "Textures" : SimpleNamespace(Name="Textures", Type="ImageList", Value=textures)
+            })
+
+        self._db._updateMaterial(cursor, libraryId, "", material("1", "<svg/>", ["a", "b"]))
+        self._db._commit(cursor)
+        textures = self._db.getMaterialRecords([uuid], lazy=True)[uuid]["properties"]["Textures"][1]
+
+        # Unset image values, as on a lazy material, are kept
+        self._db._updateMaterial(cursor, libraryId, "", material("2", None, None))
+        self._db._commit(cursor)
+        record = self._db._getMaterialRecords(cursor, [uuid])[uuid]
+        self.assertEqual(record["properties"], { "Density" : ("String", "2"), "Swatch" : ("SVG", "<svg/>"),
+                                                 "Textures" : ("ImageList", ["a", "b"]) })
+        self.assertEqual(self._db.materialHashes("TestLazyUpdate"), { uuid : materialHash(record) })
+
+        # A value removed after the lazy read can't be loaded
+        removed = material("2", "<svg/>", None)
+        del removed.PropertyObjects["Textures"]
+        self._db._updateMaterial(cursor, libraryId, "", removed)
+        self._db._commit(cursor)
+        with self.assertRaises(DatabaseMaterialNotFound):
+            prefetch([textures])
+
+    def testLazySnapshot(self):
+        uuid = "10000000-0000-0000-0000-000000000019"
+        self._db.createLibrary("TestLazySnapshot", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestLazySnapshot")
+        cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, 'Lazy')",
+                       uuid, libraryId)
+
+        def material(swatch):
+            return SimpleNamespace(UUID=uuid, Name="Lazy", Author=None, License=None, Parent=None,
+                                   Description=None, URL=None, Reference=None, Tags=[],
+                                   PhysicalModels=[], AppearanceModels=[], PropertyObjects={
+                "Swatch" : SimpleNamespace(Name="Swatch", Type="SVG", Value=swatch)
+            })
+
+        self._db._updateMaterial(cursor, libraryId, "", material("<svg>old</svg>"))
+        self._db._commit(cursor)
+        manager = self.manager()
+        swatch = manager.getMaterialRecords([uuid], lazy=True)[uuid]["properties"]["Swatch"][1]
+        self.assertEqual(swatch.value, "<svg>old</svg>")
+        manager.getMaterials([uuid], lazy=True)
+        self.assertIsNone(manager._cache.get(("material", uuid)))
+
+        # A loaded handle keeps the value it was read with
+        self._db._updateMaterial(cursor, libraryId, "", material("<svg>new</svg>"))
+        self._db._commit(cursor)
+        self.assertEqual(swatch.value, "<svg>old</svg>")
+        swatch = manager.getMaterialRecords([uuid], lazy=True)[uuid]["properties"]["Swatch"][1]
+        self.assertEqual(swatch.value, "<svg>new</svg>")
+
+    def testBlobStore(self):
+        uuids = ["10000000-0000-0000-0000-000000000007", "10000000-0000-0000-0000-000000000008"]
+        self._db.createLibrary("TestBlobStore", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestBlobStore")
+        swatch = "<svg>" + "<rect/>" * 1000 + "</svg>"
+        for uuid in uuids:
+            cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, ?)",
+                           uuid, libraryId, uuid)
+            material = SimpleNamespace(PropertyObjects={
+                "Swatch" : SimpleNamespace(Name="Swatch", Type="SVG", Value=swatch),
+                "Textures" : SimpleNamespace(Name="Textures", Type="ImageList", Value=["a", swatch, ""])
+            })
+            self._db._updateMaterialProperties(cursor, uuid, self._db._materialRows(material), {})
+        self._db._commit(cursor)
+
+        # Shared values are stored once
+        cursor.execute("SELECT blob_hash, blob_codec, blob_size FROM blob_store ORDER BY blob_size")
+        blobs = cursor.fetchall()
+        self.assertEqual([row.blob_hash for row in blobs], [blobHash("a"), blobHash(swatch)])
+        self.assertEqual(blobs[1].blob_size, len(swatch))
+        self.assertNotEqual(blobs[1].blob_codec, "")
+        properties = self._db._getMaterialPropertyRecords(cursor, uuids)
+        for uuid in uuids:
+            self.assertEqual(properties[uuid], { "Swatch" : ("SVG", swatch),
+                                                 "Textures" : ("ImageList", ["a", swatch, ""]) })
+
+        # Values written by earlier versions are moved into the store
+        cursor.execute("UPDATE material_property_long_string_value SET material_property_value = ?, blob_hash = NULL "
+                       "WHERE material_property_value_index = 0", "legacy")
+        self._db._commit(cursor)
+        self.assertEqual(self._db._getMaterialPropertyRecords(cursor, uuids)[uuids[0]]["Swatch"], ("SVG", "legacy"))
+        self.assertEqual(self._db.moveToBlobStore(), 4)
+        self.assertEqual(self._db._getMaterialPropertyRecords(cursor, uuids)[uuids[0]]["Swatch"], ("SVG", "legacy"))
+
+        # Blobs are only collected once nothing refers to them. Only "a" was replaced
+        self.assertEqual(self._db.collectBlobs(), 1)
+        cursor.execute("DELETE FROM material_property_value WHERE material_id = ?", uuids[0])
+        self._db._commit(cursor)
+        self.assertEqual(self._db.collectBlobs(), 0)
+        self._db.removeLibrary("TestBlobStore")
+        cursor.execute("SELECT COUNT(*) AS count FROM blob_store")
+        self.assertEqual(cursor.fetchone().count, 0)
+
+    def testBlobCollection(self):
+        uuids = ["10000000-0000-0000-0000-00000000000b", "10000000-0000-0000-0000-00000000000c"]
+        self._db.createLibrary("TestBlobCollection", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestBlobCollection")
+        folderId = self._db._createPath(cursor, libraryId, "Folder")
+
+        def material(swatch, textures):
+            properties = { "Swatch" : SimpleNamespace(Name="Swatch", Type="SVG", Value=swatch) }
+            if textures is not None:
+                properties["Textures"] = SimpleNamespace(Name="Textures", Type="ImageList", Value=textures)
+            return SimpleNamespace(PropertyObjects=properties)
+
+        def blobs():
+            cursor.execute("SELECT blob_hash FROM blob_store")
+            return set([row.blob_hash for row in cursor.fetchall()])
+
+        for uuid in uuids:
+            cursor.execute("INSERT INTO material (material_id, library_id, folder_id, material_name) "
+                           "VALUES (?, ?, ?, ?)", uuid, libraryId, folderId, uuid)
+        self._db._updateMaterialProperties(cursor, uuids[0],
+                                           self._db._materialRows(material("shared", ["one", "two"])), {})
+        self._db._updateMaterialProperties(cursor, uuids[1], self._db._materialRows(material("shared", None)), {})
+        self._db._commit(cursor)
+        self.assertEqual(blobs(), set([blobHash("shared"), blobHash("one"), blobHash("two")]))
+
+        # Replaced values are collected in the same transaction, unless still used
+        stored = self._db._getMaterialPropertyRecords(cursor, [uuids[0]])[uuids[0]]
+        self._db._updateMaterialProperties(cursor, uuids[0],
+                                           self._db._materialRows(material("changed", ["two"])), stored)
+        self.assertEqual(blobs(), set([blobHash("shared"), blobHash("changed"), blobHash("two")]))
+
+        # As are deleted values
+        stored = self._db._getMaterialPropertyRecords(cursor, [uuids[0]])[uuids[0]]
+        self._db._updateMaterialProperties(cursor, uuids[0], self._db._materialRows(material("changed", None)), stored)
+        self._db._commit(cursor)
+        self.assertEqual(blobs(), set([blobHash("shared"), blobHash("changed")]))
+
+        # And the values of the materials in a deleted folder
+        self._db.deleteRecursive("TestBlobCollection", "Folder")
+        self.assertEqual(blobs(), set())
+        self.assertEqual(self._db.collectBlobs(), 0)
+
+    def testCompressedStrings(self):
+        uuid = "10000000-0000-0000-0000-000000000009"
+        self._db.createLibrary("TestCompressedStrings", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestCompressedStrings")
+        cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, 'Compressed')",
+                       uuid, libraryId)
+        notes = "Notes " * 500
+        material = SimpleNamespace(PropertyObjects={
+            "Notes" : SimpleNamespace(Name="Notes", Type="String", Value=notes),
+            "Files" : SimpleNamespace(Name="Files", Type="FileList", Value=["a", notes])
+        })
+        expected = { "Notes" : ("String", notes), "Files" : ("FileList", ["a", notes]) }
+
+        def codecs():
+            cursor.execute("SELECT material_property_value_codec AS codec FROM material_property_string_value "
+                           "ORDER BY material_property_string_value_id")
+            return [row.codec for row in cursor.fetchall()]
+
+        # Written uncompressed, then compressed in place once compression is turned on
+        self._db._compressionThreshold = lambda: -1
+        self._db._updateMaterialProperties(cursor, uuid, self._db._materialRows(material), {})
+        self._db._commit(cursor)
+        self.assertEqual(codecs(), ["", "", ""])
+
+        self._db._compressionThreshold = lambda: 1024
+        self.assertEqual(self._db.recompress(), 2)
+        self.assertEqual(self._db.recompress(), 0)
+        self.assertEqual(sorted(codecs()), ["", "zlib", "zlib"])
+        self.assertEqual(self._db._getMaterialPropertyRecords(cursor, [uuid])[uuid], expected)
+
+        # Updates in place keep the encoding consistent
+        material.PropertyObjects["Notes"].Value = "Short"
+        self._db._updateMaterialProperties(cursor, uuid, self._db._materialRows(material), expected)
+        self._db._commit(cursor)
+        self.assertEqual(self._db._getMaterialPropertyRecords(cursor, [uuid])[uuid]["Notes"], ("String", "Short"))
+        self.assertEqual(sorted(codecs()), ["", "", "zlib"])
+
+    def testRecompressConcurrentEdit(self):
+        uuid = "10000000-0000-0000-0000-00000000000a"
+        self._db.createLibrary("TestRecompressConcurrentEdit", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestRecompressConcurrentEdit")
+        cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, 'Edited')",
+                       uuid, libraryId)
+        def material(notes, length):
+            table = SimpleNamespace(Dimensions=2, Rows=50, Columns=2,
+                                    Array=[[SimpleNamespace(UserString=length)] * 2] * 50)
+            return SimpleNamespace(PropertyObjects={
+                    "Notes" : SimpleNamespace(Name="Notes", Type="String", Value=notes),
+                    "Table" : SimpleNamespace(Name="Table", Type="2DArray")
+                },
+                hasPhysicalProperty=lambda name: True,
+                getPhysicalValue=lambda name: table)
+        self._db._compressionThreshold = lambda: -1
+        self._db._updateMaterialProperties(cursor, uuid, self._db._materialRows(material("Notes " * 500, "1 mm")), {})
+        self._db._commit(cursor)
+
+        # Another session edits each value after recompress() reads it and before it writes
+        edited = material("Edited", "2 mm")
+        def edit(name):
+            editCursor = self._db._cursor()
+            stored = self._db._getMaterialPropertyRecords(editCursor, [uuid])[uuid]
+            rows = self._db._materialRows(edited)
+            self._db._updateMaterialProperties(editCursor, uuid, { name : rows[name] }, { name : stored[name] })
+            self._db._commit(editCursor)
+
+        executeMany = self._db._executeMany
+        pending = { "UPDATE material_property_array_packed" : "Table",
+                    "UPDATE material_property_string_value" : "Notes" }
+        def interrupted(cursor, sql, rows, *args, **kwargs):
+            for prefix, name in list(pending.items()):
+                if sql.startswith(prefix) and rows and threading.current_thread() is threading.main_thread():
+                    del pending[prefix]
+                    self.inThread(lambda: edit(name))
+            executeMany(cursor, sql, rows, *args, **kwargs)
+        self._db._executeMany = interrupted
+
+        self._db._compressionThreshold = lambda: 16
+        self._db.recompress()
+        self.assertEqual(pending, {})
+        self.assertEqual(self._db._getMaterialPropertyRecords(cursor, [uuid])[uuid],
+                         { "Notes" : ("String", "Edited"),
+                           "Table" : ("2DArray", { "rows" : 50, "columns" : 2, "values" : [["2 mm"] * 2] * 50 }) })
+
+    def testContentHashes(self):
+        uuid = "10000000-0000-0000-0000-000000000003"
+        self._db.createLibrary("TestContentHashes", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestContentHashes")
+        cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, 'Hashed')",
+                       uuid, libraryId)
+        self._db._createTags(cursor, uuid, ["Metal"], libraryId)
+        self._db._commit(cursor)
+        self.assertEqual(self._db.materialHashes("TestContentHashes"), { uuid : None })
+
+        self.assertTrue(self._db.updateContentHashes() >= 1)
+        record = self._db._getMaterialRecords(cursor, [uuid])[uuid]
+        self.assertEqual(self._db.materialHashes("TestContentHashes"), { uuid : materialHash(record) })
+        self.assertEqual(self._db.modelHashes("TestContentHashes"), {})
+
+    def testChangeLog(self):
+        start = self._db.lastChange()
+        self._db.createLibrary("TestChangeLog", None,  False)
+        self._db.createFolder("TestChangeLog", "A/B")
+        self._db.renameFolder("TestChangeLog", "A/B", "A/C")
+        self._db.deleteRecursive("TestChangeLog", "A")
+
+        changes = [(change["object"], change["change"], change["library"], change["key"], change["oldKey"])
+                   for change in self._db.changesSince(start)]
+        self.assertEqual(changes, [
+            ("library", "create", "TestChangeLog", "TestChangeLog", None),
+            ("folder", "create", "TestChangeLog", "A", None),
+            ("folder", "create", "TestChangeLog", "A/B", None),
+            ("folder", "rename", "TestChangeLog", "A/C", "A/B"),
+            ("folder", "delete", "TestChangeLog", "A", None)
+        ])
+        self.assertEqual(len(self._db.changesSince(start, 2)), 2)
+
+        last = self._db.lastChange()
+        self.assertEqual(self._db.changesSince(last), [])
+        self._db.removeLibrary("TestChangeLog")
+        self.assertEqual(self._db.changesSince(last)[0]["change"], "delete")
+
+    def testRemoveModelReferences(self):
+        model = "00000000-0000-0000-0000-000000000002"
+        child = "00000000-0000-0000-0000-000000000003"
+        material = "10000000-0000-0000-0000-00000000000d"
+        self._db.createLibrary("TestRemoveModelReferences", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestRemoveModelReferences")
+        for uuid in [model, child]:
+            cursor.execute("INSERT INTO model (model_id, library_id, model_type, model_name, model_hash) "
+                           "VALUES (?, ?, 'Physical', 'Model', 'hash')", uuid, libraryId)
+        cursor.execute("INSERT INTO model_inheritance (model_id, inherits_id) VALUES (?, ?)", child, model)
+        cursor.execute("INSERT INTO material (material_id, library_id, material_name, material_hash) "
+                       "VALUES (?, ?, 'Material', 'hash')", material, libraryId)
+        cursor.execute("INSERT INTO material_models (material_id, model_id) VALUES (?, ?)", material, model)
+        self._db._commit(cursor)
+
+        # Removing the model changes what refers to it, so their hashes are cleared and the change logged
+        start = self._db.lastChange()
+        self._db.removeModel(model)
+        self.assertEqual(self._db.materialHashes("TestRemoveModelReferences"), { material : None })
+        self.assertEqual(self._db.modelHashes("TestRemoveModelReferences"), { child : None })
+        self.assertEqual(sorted([(change["object"], change["change"], change["key"])
+                                 for change in self._db.changesSince(start)]),
+                         [("material", "update", material), ("model", "delete", model), ("model", "update", child)])
+
+    def testChangedMaterials(self):
+        uuid = "10000000-0000-0000-0000-00000000000e"
+        self._db.createLibrary("TestChangedMaterials", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestChangedMaterials")
+        cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, 'Changed')",
+                       uuid, libraryId)
+        material = SimpleNamespace(UUID=uuid, Name="Changed", Author=None, License=None, Parent=None,
+                                   Description=None, URL=None, Reference=None, Tags=[],
+                                   PhysicalModels=[], AppearanceModels=[], PropertyObjects={})
+        self._db._updateMaterial(cursor, libraryId, "A/B", material)
+        self._db._commit(cursor)
+
+        # Moved materials are reported along with changed ones
+        manager = self.manager()
+        self.assertEqual(manager.changedMaterials("TestChangedMaterials", [("/A/B", material)]), [])
+        self.assertEqual(manager.changedMaterials("TestChangedMaterials", [("A", material)]), [("A", material)])
+        material.Name = "Renamed"
+        self.assertEqual(manager.changedMaterials("TestChangedMaterials", [("A/B", material)]),
+                         [("A/B", material)])
+
+    def inThread(self, function : Callable[[], Any]) -> Any:
+        """Runs the function in a thread of its own, with its own connection and transaction"""
+        result = []
+        def worker():
+            try:
+                result.append(function())
+            finally:
+                self._db._release()
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        return result[0] if result else None
+
+    def testChangeOrder(self):
+        self._db.createLibrary("TestChangeOrder", None,  False)
+        start = self._db.lastChange()
+
+        # The first transaction logs its change before the second, but commits after it
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestChangeOrder")
+        self._db._logChange(cursor, "folder", "create", libraryId, "First")
+        self.inThread(lambda: self._db.createFolder("TestChangeOrder", "Second"))
+        seen = self.inThread(lambda: self._db.changesSince(start))
+        self.assertEqual([change["key"] for change in seen], ["Second"])
+        self._db._commit(cursor)
+
+        # A reader carrying on from the last change it saw doesn't miss the first
+        changes = self.inThread(lambda: self._db.changesSince(seen[-1]["sequence"]))
+        self.assertEqual([change["key"] for change in changes], ["First"])
+        self.assertEqual(self._db.lastChange(), changes[-1]["sequence"])
+
+    def manager(self, mirror : LocalMirror | None = None) -> MaterialsDBManager:
+        """Returns a manager using the test database"""
+        manager = MaterialsDBManager()
+        manager._db = self._db
+        manager._mirror = mirror
+        return manager
+
+    def testCachedCopies(self):
+        uuid = "10000000-0000-0000-0000-000000000010"
+        self._db.createLibrary("TestCachedCopies", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestCachedCopies")
+        cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, 'Cached')",
+                       uuid, libraryId)
+        self._db._commit(cursor)
+
+        # Callers get their own objects, even from the cache
+        manager = self.manager()
+        first = manager.getMaterial(uuid)
+        first.material.Name = "Changed"
+        second = manager.getMaterials([uuid, uuid])
+        self.assertEqual(manager.cacheStatistics()["hits"], 2)
+        self.assertIsNot(second[0].material, first.material)
+        self.assertIsNot(second[0].material, second[1].material)
+        self.assertEqual(second[0].material.Name, "Cached")
+
+        # A record read before an invalidation isn't cached
+        manager = self.manager()
+        load = self._db.getMaterialRecords
+        def invalidating(uuids, lazy=False):
+            records = load(uuids, lazy)
+            manager._cache.invalidate(("material", uuid))
+            return records
+        self._db.getMaterialRecords = invalidating
+        try:
+            manager.getMaterial(uuid)
+        finally:
+            del self._db.getMaterialRecords
+        self.assertEqual(manager.cacheStatistics()["entries"], 0)
+
+        with self.assertRaises(DatabaseMaterialNotFound):
+            manager.getMaterials([uuid, "10000000-0000-0000-0000-00000000ffff"])
+
+    def testRemovedModelUncached(self):
+        model = "00000000-0000-0000-0000-000000000004"
+        child = "00000000-0000-0000-0000-000000000005"
+        material = "10000000-0000-0000-0000-000000000011"
+        self._db.createLibrary("TestRemovedModelUncached", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestRemovedModelUncached")
+        for uuid in [model, child]:
+            cursor.execute("INSERT INTO model (model_id, library_id, model_type, model_name) "
+                           "VALUES (?, ?, 'Physical', 'Model')", uuid, libraryId)
+        cursor.execute("INSERT INTO model_inheritance (model_id, inherits_id) VALUES (?, ?)", child, model)
+        cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, 'Material')",
+                       material, libraryId)
+        cursor.execute("INSERT INTO material_models (material_id, model_id) VALUES (?, ?)", material, model)
+        self._db._commit(cursor)
+
+        manager = self.manager()
+        manager.getMaterial(material)
+        manager.getModel(child)
+        self.assertEqual(manager._cache.get(("material", material))["physicalModels"], [model])
+
+        # What referred to the removed model is read again
+        manager.removeModel(model)
+        self.assertIsNone(manager._cache.get(("model", child)))
+        manager.getMaterial(material)
+        self.assertEqual(manager._cache.get(("material", material))["physicalModels"], [])
+
+    def testMirrorPruned(self):
+        uuid = "10000000-0000-0000-0000-000000000005"
+        self._db.createLibrary("TestMirrorPruned", None,  False)
+        directory = tempfile.TemporaryDirectory()
+        mirror = LocalMirror(os.path.join(directory.name, "mirror.sqlite"))
+        try:
+            manager = self.manager(mirror)
+            manager.synchronizeMirror()
+            self.assertEqual(mirror.sequence(), self._db.lastChange())
+
+            cursor = self._db._cursor()
+            libraryId = self._db._findLibrary(cursor, "TestMirrorPruned")
+            cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, 'Pruned')",
+                           uuid, libraryId)
+            self._db._logChange(cursor, "material", "create", libraryId, uuid)
+            self._db._commit(cursor)
+            self._db.pruneChanges(self._db.lastChange())
+
+            # The change is no longer in the log, so the mirror is copied again
+            self.assertEqual(manager.synchronizeMirror(), 0)
+            self.assertEqual(mirror.record("material", uuid)["name"], "Pruned")
+            self.assertEqual(mirror.sequence(), self._db.lastChange())
+            self.assertEqual(manager._changesAfter(mirror.sequence()), [])
+        finally:
+            mirror.close()
+            directory.cleanup()
+
+    def bulkModel(self, uuid : str, inherits : list[str] = [], name : str = "Model") -> SimpleNamespace:
+        return SimpleNamespace(UUID=uuid, Name=name, Type="Physical", URL=None, Description=None, DOI=None,
+                               Inherited=inherits, Properties={})
+
+    def bulkMaterial(self, uuid : str, parent : str | None = None, name : str = "Material") -> SimpleNamespace:
+        return SimpleNamespace(UUID=uuid, Name=name, Author=None, License=None, Parent=parent,
+                               Description=None, URL=None, Reference=None, Tags=[],
+                               PhysicalModels=[], AppearanceModels=[], PropertyObjects={})
+
+    def testCreateModels(self):
+        base = "20000000-0000-0000-0000-000000000001"
+        child = "20000000-0000-0000-0000-000000000002"
+        orphan = "20000000-0000-0000-0000-000000000003"
+        missing = "20000000-0000-0000-0000-0000000000ff"
+        self._db.createLibrary("TestCreateModels", None,  False)
+
+        # Inherited models are written first, whatever the order given
+        self.assertEqual(self._db.createModels("TestCreateModels", [("Bulk", self.bulkModel(child, [base])),
+                                                                    ("Bulk", self.bulkModel(base))]), 2)
+        self.assertEqual(self._db.getModelRecords([child])[child]["inherits"], [base])
+
+        # Existing models are skipped and missing references are reported
+        self.assertEqual(self._db.createModels("TestCreateModels", [("Bulk", self.bulkModel(base)),
+                                                                    ("Bulk", self.bulkModel(orphan, [missing]))]), 1)
+        self.assertEqual(set(self._db.modelHashes("TestCreateModels")), { base, child, orphan })
+        self.assertIn((orphan, missing), [reference for references in
+                                          self._db.checkConsistency("TestCreateModels").values()
+                                          for reference in references])
+
+    def testCreateMaterials(self):
+        parent = "20000000-0000-0000-0000-000000000011"
+        child = "20000000-0000-0000-0000-000000000012"
+        grandchild = "20000000-0000-0000-0000-000000000013"
+        self._db.createLibrary("TestCreateMaterials", None,  False)
+
+        self.assertEqual(self._db.createMaterials("TestCreateMaterials", [
+            ("A/B", self.bulkMaterial(grandchild, child)),
+            ("A", self.bulkMaterial(child, parent)),
+            ("A", self.bulkMaterial(parent))]), 3)
+        self.assertEqual(self._db.createMaterials("TestCreateMaterials", [
+            ("A", self.bulkMaterial(parent)),
+            ("A", self.bulkMaterial(child, parent))]), 0)
+
+        records = self._db.getMaterialRecords([parent, child, grandchild])
+        self.assertEqual(records[grandchild]["parent"], child)
+        self.assertEqual(self._db.materialFolders("TestCreateMaterials"),
+                         { parent : "A", child : "A", grandchild : "A/B" })
+        self.assertFalse(any(self._db.checkConsistency("TestCreateMaterials").values()))
+
+    def testMigrate(self):
+        uuids = ["20000000-0000-0000-0000-00000000002{}".format(index) for index in range(5)]
+        # Each material is the child of the one after it, so all but the last are held back
+        materials = [("Migrated", self.bulkMaterial(uuid, uuids[index + 1] if index + 1 < len(uuids) else None))
+                     for index, uuid in enumerate(uuids)]
+        self._db.createLibrary("TestMigrate", None,  False)
+        manager = self.manager()
+
+        def interrupted():
+            for item in reversed(materials[2:]):
+                yield item
+            raise RuntimeError("Interrupted")
+
+        # Batches written before the interruption are kept
+        with self.assertRaises(RuntimeError):
+            manager.migrateMaterials("TestMigrate", interrupted(), batchSize=2)
+        self.assertEqual(set(self._db.materialHashes("TestMigrate")), set(uuids[3:]))
+
+        # Running it again skips them
+        batches = []
+        createMaterials = self._db.createMaterials
+        def counting(libraryName, batch):
+            batches.append([material.UUID for _, material in batch])
+            return createMaterials(libraryName, batch)
+        self._db.createMaterials = counting
+        progress = []
+        try:
+            created = manager.migrateMaterials("TestMigrate", iter(materials), batchSize=2,
+                                               progress=lambda read, created: progress.append((read, created)))
+        finally:
+            del self._db.createMaterials
+        self.assertEqual(created, 3)
+        self.assertEqual(progress, [(2, 0), (4, 2), (5, 3)])
+        self.assertEqual(set(self._db.materialHashes("TestMigrate")), set(uuids))
+
+        # Parents are in the same or an earlier batch than their children
+        position = { uuid : index for index, batch in enumerate(batches) for uuid in batch }
+        for index in range(len(uuids) - 1):
+            self.assertLessEqual(position[uuids[index + 1]], position[uuids[index]])
+
+    def testGetMaterials(self):
+        # More than fit in one IN (...) clause
+        uuids = ["30000000-0000-0000-0000-{:012d}".format(index) for index in range(1001)]
+        self._db.createLibrary("TestGetMaterials", None,  False)
+        self.assertEqual(self._db.createMaterials("TestGetMaterials", [
+            ("Bulk", self.bulkMaterial(uuid, name=str(index))) for index, uuid in enumerate(uuids)]), len(uuids))
+
+        # In the order asked for, duplicates included
+        wanted = list(reversed(uuids)) + [uuids[5]]
+        materials = self._db.getMaterials(wanted)
+        self.assertEqual([material.material.Name for material in materials],
+                         [str(index) for index in reversed(range(1001))] + ["5"])
+        self.assertEqual(materials[0].libraryName, "TestGetMaterials")
+        self.assertIsNot(materials[-1].material, materials[-6].material)
+        self.assertEqual(self._db.getMaterials([]), [])
+
+        with self.assertRaises(DatabaseMaterialNotFound):
+            self._db.getMaterials([uuids[0], "30000000-0000-0000-0000-ffffffffffff"])
+
+    def testGetModels(self):
+        base = "40000000-0000-0000-0000-000000000000"
+        uuids = ["40000000-0000-0000-0000-{:012d}".format(index) for index in range(1, 1002)]
+        self._db.createLibrary("TestGetModels", None,  False)
+        self.assertEqual(self._db.createModels("TestGetModels", [("Bulk", self.bulkModel(base))] + [
+            ("Bulk", self.bulkModel(uuid, [base], str(index))) for index, uuid in enumerate(uuids)]), len(uuids) + 1)
+
+        wanted = list(reversed(uuids)) + [uuids[5]]
+        models = self._db.getModels(wanted)
+        self.assertEqual([model.model.Name for model in models],
+                         [str(index) for index in reversed(range(1001))] + ["5"])
+        self.assertEqual(models[0].libraryName, "TestGetModels")
+        self.assertIsNot(models[-1].model, models[-6].model)
+        self.assertEqual(self._db.getModelRecords([uuids[0]])[uuids[0]]["inherits"], [base])
+        self.assertEqual(self._db.getModels([]), [])
+
+        with self.assertRaises(DatabaseModelNotFound):
+            self._db.getModels([uuids[0], "40000000-0000-0000-0000-ffffffffffff"])
+
+    def testMaterialQueryCount(self):
+        few = "50000000-0000-0000-0000-000000000001"
+        many = "50000000-0000-0000-0000-000000000002"
+        self._db.createLibrary("TestMaterialQueryCount", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestMaterialQueryCount")
+        for uuid, count in [(few, 1), (many, 30)]:
+            cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, 'Count')",
+                           uuid, libraryId)
+            for index in range(count):
+                self.createProperty(cursor, uuid, "Property{}".format(index), str(index))
+        self._db._commit(cursor)
+
+        class CountingCursor:
+            def __init__(self, cursor : Cursor):
+                self._cursor = cursor
+                self.queries = 0
+
+            def execute(self, *args : Any) -> Any:
+                self.queries += 1
+                return self._cursor.execute(*args)
+
+            def __getattr__(self, name : str) -> Any:
+                return getattr(self._cursor, name)
+
+        # The number of queries doesn't depend on the number of properties
+        queries = []
+        for uuid in [few, many]:
+            counting = CountingCursor(self._db._cursor())
+            record = self._db._getMaterialRecords(counting, [uuid])[uuid]
+            self._db._commit(counting._cursor)
+            queries.append(counting.queries)
+        self.assertEqual(len(record["properties"]), 30)
+        self.assertEqual(record["properties"]["Property29"], ("String", "29"))
+        self.assertEqual(queries[0], queries[1])
+
+    def testMigrateParallel(self):
+        chain = ["60000000-0000-0000-0000-00000000000{}".format(index) for index in range(6)]
+        single = ["60000000-0000-0000-0000-00000000001{}".format(index) for index in range(4)]
+        # Children come before their parents and several folders are used
+        materials = [("Chain/{}".format(index % 2), self.bulkMaterial(uuid, chain[index + 1] if index + 1 < len(chain) else None))
+                     for index, uuid in enumerate(chain)]
+        materials += [("Single", self.bulkMaterial(uuid)) for uuid in single]
+        uuids = chain + single
+        self._db.createLibrary("TestMigrateParallel", None,  False)
+        manager = self.manager()
+
+        def interrupted():
+            for item in reversed(materials[3:6]):
+                yield item
+            raise RuntimeError("Interrupted")
+
+        # Windows committed before the interruption are kept
+        with self.assertRaises(RuntimeError):
+            manager.migrateMaterialsParallel("TestMigrateParallel", interrupted(), workers=2, batchSize=1)
+        self.assertEqual(set(self._db.materialHashes("TestMigrateParallel")), set(chain[4:]))
+
+        # Each batch records when it started and when it was committed
+        lock = threading.Lock()
+        events = []
+        started = {}
+        committed = {}
+        createMaterials = self._db.createMaterials
+        def recording(libraryName, batch):
+            with lock:
+                events.append(None)
+                for _, material in batch:
+                    started[material.UUID] = len(events)
+            created = createMaterials(libraryName, batch)
+            with lock:
+                events.append(None)
+                for _, material in batch:
+                    committed[material.UUID] = len(events)
+            return created
+        self._db.createMaterials = recording
+        progress = []
+        try:
+            created = manager.migrateMaterialsParallel("TestMigrateParallel", iter(materials), workers=2, batchSize=2,
+                                                       progress=lambda read, created: progress.append((read, created)))
+        finally:
+            del self._db.createMaterials
+
+        self.assertEqual(created, len(uuids) - 2)
+        self.assertEqual(progress[-1], (len(uuids), len(uuids) - 2))
+        self.assertEqual(set(self._db.materialHashes("TestMigrateParallel")), set(uuids))
+        self.assertFalse(any(self._db.checkConsistency("TestMigrateParallel").values()))
+
+        # Parents are committed before any worker starts on their children
+        for index in range(len(chain) - 1):
+            self.assertLess(committed[chain[index + 1]], started[chain[index]])
+        self.assertEqual(self._db.materialFolders("TestMigrateParallel")[chain[1]], "Chain/1")
+
+    def testMirrorWrites(self):
+        own, other, later, migrated = ["70000000-0000-0000-0000-00000000000{}".format(index) for index in range(4)]
+        self._db.createLibrary("TestMirrorWrites", None,  False)
+        directory = tempfile.TemporaryDirectory()
+        mirror = LocalMirror(os.path.join(directory.name, "mirror.sqlite"))
+        try:
+            manager = self.manager(mirror)
+            manager.synchronizeMirror()
+
+            # Local writes copy their own objects without reading the change log
+            changesSince = self._db.changesSince
+            def unexpected(*args : Any) -> list:
+                raise AssertionError("The change log was read")
+            self._db.changesSince = unexpected
+            try:
+                manager.addMaterial("TestMirrorWrites", "A", self.bulkMaterial(own))
+                self.assertEqual(mirror.record("material", own)["folder"], "A")
+                self.assertEqual(mirror.sequence(), self._db.lastChange())
+
+                # A change made elsewhere holds the sequence back until the next synchronization
+                self._db.createMaterial("TestMirrorWrites", "A", self.bulkMaterial(other))
+                behind = mirror.sequence()
+                manager.updateMaterial("TestMirrorWrites", "B", self.bulkMaterial(own))
+                self.assertEqual(mirror.record("material", own)["folder"], "B")
+                self.assertEqual(mirror.sequence(), behind)
+
+                # Migrating leaves the mirror to catch up once, when next read
+                manager.migrateMaterial("TestMirrorWrites", "A", self.bulkMaterial(migrated))
+                self.assertIsNone(mirror.record("material", migrated))
+            finally:
+                self._db.changesSince = changesSince
+
+            self.assertIn(migrated, [item.uuid for item in manager.libraryMaterials("TestMirrorWrites")])
+            self.assertIsNotNone(mirror.record("material", other))
+            self.assertEqual(mirror.sequence(), self._db.lastChange())
+        finally:
+            mirror.close()
+            directory.cleanup()
+
+    def testLogChangeLookups(self):
+        uuids = ["80000000-0000-0000-0000-00000000000{}".format(index) for index in range(5)]
+        self._db.createLibrary("TestLogChangeLookups", None,  False)
+        start = self._db.lastChange()
+
+        statements = []
+        class RecordingCursor:
+            def __init__(self, cursor : Cursor):
+                self._cursor = cursor
+
+            def execute(self, sql : str, *params : Any) -> Any:
+                statements.append(sql)
+                return self._cursor.execute(sql, *params)
+
+            def __getattr__(self, name : str) -> Any:
+                return getattr(self._cursor, name)
+
+        cursor = self._db._cursor
+        self._db._cursor = lambda: RecordingCursor(cursor())
+        try:
+            self._db.createMaterials("TestLogChangeLookups", [("Folder/{}".format(index), self.bulkMaterial(uuid))
+                                                              for index, uuid in enumerate(uuids)])
+        finally:
+            del self._db._cursor
+
+        # The library name found at the start is used for every change
+        self.assertFalse([sql for sql in statements if "SELECT library_name FROM library" in sql])
+        changes = self._db.changesSince(start)
+        self.assertEqual(len(changes), len(uuids) * 2 + 1)
+        self.assertEqual({ change["library"] for change in changes }, { "TestLogChangeLookups" })
+
+    def testForeignKeysOnlyOffWhenMissing(self):
+        base, child, orphan = ["90000000-0000-0000-0000-00000000000{}".format(index) for index in range(3)]
+        parent, material, orphanMaterial = ["90000000-0000-0000-0000-00000000001{}".format(index) for index in range(3)]
+        missing = "90000000-0000-0000-0000-0000000000ff"
+        self._db.createLibrary("TestForeignKeys", None,  False)
+
+        ignored = []
+        foreignKeysIgnore = self._db._foreignKeysIgnore
+        def recording(cursor : Cursor) -> None:
+            ignored.append(True)
+            foreignKeysIgnore(cursor)
+        self._db._foreignKeysIgnore = recording
+        try:
+            # Checks stay on when the references exist
+            self._db.createModel("TestForeignKeys", "", self.bulkModel(base))
+            self._db.createModel("TestForeignKeys", "", self.bulkModel(child, [base]))
+            self._db.createMaterial("TestForeignKeys", "", self.bulkMaterial(parent))
+            self._db.createMaterial("TestForeignKeys", "", self.bulkMaterial(material, parent))
+            self._db.updateMaterial("TestForeignKeys", "", self.bulkMaterial(material, parent))
+            self.assertEqual(ignored, [])
+
+            # And are turned off only for missing ones
+            self._db.createModel("TestForeignKeys", "", self.bulkModel(orphan, [missing]))
+            self.assertEqual(len(ignored), 1)
+            self._db.createMaterial("TestForeignKeys", "", self.bulkMaterial(orphanMaterial, missing))
+            self.assertEqual(len(ignored), 2)
+        finally:
+            del self._db._foreignKeysIgnore
+        self.assertEqual(set(self._db.modelHashes("TestForeignKeys")), { base, child, orphan })
+        self.assertEqual(set(self._db.materialHashes("TestForeignKeys")), { parent, material, orphanMaterial })
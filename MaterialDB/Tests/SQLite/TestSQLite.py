@@ -0,0 +1,71 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import os
+
+from MaterialDB.Database.DatabaseSQLiteTest import DatabaseSQLiteTest
+from MaterialDB.Tests.MySQL import TestMySQL
+
+class SQLiteTests(TestMySQL.MySQLTests):
+    """Runs the MySQL tests against an SQLite database"""
+
+    def setUp(self):
+        self._db = DatabaseSQLiteTest()
+        self._db.createTables()
+        self._db.createIndexes()
+
+    def tearDown(self):
+        self._db.dropTables()
+        self._db._release()
+
+    def getFolderFunction(self, cursor, folderId : int) -> str | None:
+        # There's no GetFolder() function in SQLite
+        return self._db._getPath(self._db._cursor(), folderId)
+
+    def testPragmas(self):
+        cursor = self._db._cursor()
+        cursor.execute("PRAGMA journal_mode")
+        self.assertEqual(cursor.fetchone()[0], "wal")
+        cursor.execute("PRAGMA foreign_keys")
+        self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertTrue(os.path.exists(self._db._databasePath()))
+
+    def testRemoveModel(self):
+        model = "00000000-0000-0000-0000-000000000001"
+        material = "10000000-0000-0000-0000-000000000001"
+        self._db.createLibrary("TestRemoveModel", None,  False)
+        cursor = self._db._cursor()
+        libraryId = self._db._findLibrary(cursor, "TestRemoveModel")
+        cursor.execute("INSERT INTO model (model_id, library_id, model_type, model_name) "
+                       "VALUES (?, ?, 'Physical', 'Model')", model, libraryId)
+        cursor.execute("INSERT INTO material (material_id, library_id, material_name) VALUES (?, ?, 'Material')",
+                       material, libraryId)
+        cursor.execute("INSERT INTO material_models (material_id, model_id) VALUES (?, ?)", material, model)
+        cursor.commit()
+
+        # The trigger stands in for the foreign key cascade
+        self._db.removeModel(model)
+        cursor = self._db._cursor()
+        cursor.execute("SELECT COUNT(*) AS models FROM material_models")
+        self.assertEqual(cursor.fetchone().models, 0)
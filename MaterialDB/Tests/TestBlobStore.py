@@ -0,0 +1,48 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import hashlib
+import unittest
+
+from MaterialDB.Database import Codec
+from MaterialDB.Database.BlobStore import blobHash, packBlob, unpackBlob
+
+class BlobStoreTests(unittest.TestCase):
+
+    def testHash(self):
+        self.assertEqual(blobHash("<svg/>"), hashlib.sha256(b"<svg/>").hexdigest())
+        self.assertEqual(len(blobHash("é")), 64)
+        self.assertNotEqual(blobHash("a"), blobHash("b"))
+
+    def testRoundTrip(self):
+        for text in ["", "<svg/>", "é" * 5000]:
+            codec, size, data = packBlob(text, 0)
+            self.assertEqual(size, len(text.encode("utf-8")))
+            self.assertEqual(unpackBlob(codec, data), text)
+
+    def testThreshold(self):
+        text = "<rect/>" * 1000
+        self.assertEqual(packBlob(text, 0)[0], Codec.ZLIB)
+        self.assertEqual(packBlob(text, len(text) + 1)[0], Codec.NONE)
+        self.assertEqual(packBlob(text, -1)[0], Codec.NONE)
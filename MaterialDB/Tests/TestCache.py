@@ -0,0 +1,94 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import unittest
+
+from MaterialDB.manager.Cache import LRUCache
+
+class CacheTests(unittest.TestCase):
+
+    def testHitsAndMisses(self):
+        cache = LRUCache(100)
+        self.assertIsNone(cache.get("a"))
+        cache.put("a", "A", 10)
+        self.assertEqual(cache.get("a"), "A")
+
+        stats = cache.statistics()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["entries"], 1)
+        self.assertEqual(stats["size"], 10)
+
+    def testEviction(self):
+        cache = LRUCache(30)
+        cache.put("a", "A", 10)
+        cache.put("b", "B", 10)
+        cache.put("c", "C", 10)
+
+        # Touch "a" so "b" is the least recently used
+        cache.get("a")
+        cache.put("d", "D", 10)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "A")
+        self.assertEqual(cache.get("d"), "D")
+        self.assertEqual(cache.statistics()["evictions"], 1)
+
+        # Too big to cache at all
+        cache.put("e", "E", 40)
+        self.assertIsNone(cache.get("e"))
+        self.assertLessEqual(cache.statistics()["size"], 30)
+
+    def testInvalidate(self):
+        cache = LRUCache(100)
+        cache.put("a", "A", 10)
+        cache.put("b", "B", 10)
+        cache.invalidate("a")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.statistics()["size"], 10)
+
+        cache.clear()
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.statistics()["size"], 0)
+
+    def testDisabled(self):
+        cache = LRUCache(0)
+        cache.put("a", "A", 10)
+        self.assertIsNone(cache.get("a"))
+
+    def testStalePut(self):
+        cache = LRUCache(100)
+        generation = cache.generation()
+        cache.put("a", "A", 10, generation)
+        self.assertEqual(cache.get("a"), "A")
+
+        # A value read before an invalidation isn't kept
+        generation = cache.generation()
+        cache.invalidate("b")
+        cache.put("b", "old", 10, generation)
+        self.assertIsNone(cache.get("b"))
+
+        generation = cache.generation()
+        cache.clear()
+        cache.put("b", "old", 10, generation)
+        self.assertIsNone(cache.get("b"))
@@ -0,0 +1,63 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import unittest
+
+from MaterialDB.Database import Codec
+
+class CodecTests(unittest.TestCase):
+
+    def setUp(self):
+        self._data = b"<rect/>" * 1000
+
+    def testCodecs(self):
+        self.assertEqual(Codec.available()[:3], [Codec.ZLIB, Codec.BZ2, Codec.LZMA])
+        for codec in Codec.available():
+            encodedCodec, data = Codec.encode(self._data, 0, codec)
+            self.assertEqual(encodedCodec, codec)
+            self.assertLess(len(data), len(self._data))
+            self.assertEqual(Codec.decode(encodedCodec, data), self._data)
+
+    def testThreshold(self):
+        self.assertEqual(Codec.encode(self._data, len(self._data) + 1), (Codec.NONE, self._data))
+        self.assertEqual(Codec.encode(self._data, -1), (Codec.NONE, self._data))
+
+        # Data that doesn't get smaller is stored as is
+        self.assertEqual(Codec.encode(b"ab", 0), (Codec.NONE, b"ab"))
+
+    def testText(self):
+        text = "é" * 2000
+        value, codec, data = Codec.encodeText(text, 1024, Codec.LZMA)
+        self.assertEqual((value, codec), ("", Codec.LZMA))
+        self.assertEqual(Codec.decodeText(value, codec, data), text)
+
+        self.assertEqual(Codec.encodeText("short", 1024), ("short", Codec.NONE, None))
+        self.assertEqual(Codec.decodeText("short", Codec.NONE, None), "short")
+        self.assertEqual(Codec.decodeText("short", None, None), "short")
+
+    def testUnknown(self):
+        with self.assertRaises(ValueError):
+            Codec.encode(self._data, 0, "unknown")
+        with self.assertRaises(ValueError):
+            Codec.decode("unknown", self._data)
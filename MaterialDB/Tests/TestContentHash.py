@@ -0,0 +1,97 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import copy
+import unittest
+
+from MaterialDB.Database.ContentHash import contentHash, materialHash, modelHash
+
+class ContentHashTests(unittest.TestCase):
+
+    def setUp(self):
+        self._material = {
+            "uuid" : "00000000-0000-0000-0000-000000000001",
+            "library" : "Library",
+            "folder" : "Metals",
+            "name" : "Steel",
+            "author" : "Author",
+            "license" : "CC-BY-3.0",
+            "parent" : None,
+            "description" : "Carbon steel",
+            "url" : "",
+            "reference" : "",
+            "tags" : ["Metal", "Steel"],
+            "physicalModels" : ["physical"],
+            "appearanceModels" : ["appearance"],
+            "properties" : {
+                "Density" : ("Quantity", "7900 kg/m^3"),
+                "Table" : ("2DArray", { "rows" : 1, "columns" : 2, "values" : [["1", None]] })
+            }
+        }
+        self._model = {
+            "uuid" : "00000000-0000-0000-0000-000000000002",
+            "library" : "Library",
+            "folder" : "Models",
+            "type" : "Physical",
+            "name" : "Density",
+            "url" : "",
+            "description" : "",
+            "doi" : "",
+            "inherits" : ["a", "b"],
+            "properties" : [
+                { "name" : "Density", "type" : "Quantity", "columns" : [] },
+                { "name" : "Mass", "type" : "Quantity", "columns" : [] }
+            ]
+        }
+
+    def testCanonical(self):
+        self.assertEqual(contentHash({ "a" : 1, "b" : [1, 2] }), contentHash({ "b" : [1, 2], "a" : 1 }))
+        self.assertNotEqual(contentHash([1, 2]), contentHash([2, 1]))
+        self.assertEqual(len(contentHash(None)), 64)
+
+    def testMaterial(self):
+        other = copy.deepcopy(self._material)
+        # Location and ordering aren't content
+        other["library"] = "Other"
+        other["folder"] = ""
+        other["tags"] = ["steel", "metal"]
+        other["physicalModels"] = ["appearance"]
+        other["appearanceModels"] = ["physical"]
+        self.assertEqual(materialHash(other), materialHash(self._material))
+
+        other["properties"]["Table"][1]["values"][0][1] = "2"
+        self.assertNotEqual(materialHash(other), materialHash(self._material))
+
+        other = copy.deepcopy(self._material)
+        other["description"] = "Stainless steel"
+        self.assertNotEqual(materialHash(other), materialHash(self._material))
+
+    def testModel(self):
+        other = copy.deepcopy(self._model)
+        other["inherits"].reverse()
+        other["properties"].reverse()
+        self.assertEqual(modelHash(other), modelHash(self._model))
+
+        other["properties"][0]["type"] = "String"
+        self.assertNotEqual(modelHash(other), modelHash(self._model))
@@ -0,0 +1,69 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import unittest
+
+from MaterialDB.Database.DeferredValue import DeferredValue, prefetch
+
+class DeferredValueTests(unittest.TestCase):
+
+    def setUp(self):
+        self._batches = []
+
+    def load(self, handles):
+        self._batches.append([handle.key for handle in handles])
+        for handle in handles:
+            handle.resolve("value {}".format(handle.key))
+
+    def testLoadOnFirstUse(self):
+        value = DeferredValue(1, self.load)
+        self.assertFalse(value.loaded)
+        self.assertEqual(self._batches, [])
+
+        self.assertEqual(value.value, "value 1")
+        self.assertEqual(value.value, "value 1")
+        self.assertTrue(value.loaded)
+        self.assertEqual(self._batches, [[1]])
+
+    def testPrefetch(self):
+        values = [DeferredValue(key, self.load) for key in range(3)]
+        values[0].value
+        prefetch(values + ["not deferred", None])
+
+        # Loaded values aren't fetched again, and the rest are fetched together
+        self.assertEqual(self._batches, [[0], [1, 2]])
+        self.assertEqual([value.value for value in values], ["value 0", "value 1", "value 2"])
+        self.assertEqual(len(self._batches), 2)
+
+    def testPrefetchByLoader(self):
+        other = []
+        def otherLoad(handles):
+            other.append(len(handles))
+            for handle in handles:
+                handle.resolve(None)
+
+        prefetch([DeferredValue(1, self.load), DeferredValue(2, otherLoad), DeferredValue(3, self.load)])
+        self.assertEqual(self._batches, [[1, 3]])
+        self.assertEqual(other, [1])
+
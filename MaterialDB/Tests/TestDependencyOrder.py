@@ -0,0 +1,116 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import unittest
+
+from MaterialDB.Database.DependencyOrder import dependencyLevels, dependencyOrder, \
+    dependencyStream, dependencyWaves
+
+class DependencyOrderTests(unittest.TestCase):
+
+    def setUp(self):
+        # (key, dependencies) with children listed before their parents
+        self._items = [
+            ("grandchild", ["child"]),
+            ("child", ["parent"]),
+            ("other", []),
+            ("parent", ["external"]),
+            ("mixed", ["parent", "other"]),
+        ]
+
+    def order(self, items : list[tuple[str, list[str]]]) -> list[str]:
+        return [key for key, _ in dependencyOrder(items, lambda item: item[0], lambda item: item[1])]
+
+    def levels(self, items : list[tuple[str, list[str]]]) -> list[list[str]]:
+        return [[key for key, _ in level]
+                for level in dependencyLevels(items, lambda item: item[0], lambda item: item[1])]
+
+    def testOrder(self):
+        order = self.order(self._items)
+        self.assertEqual(len(order), 5)
+        self.assertTrue(order.index("parent") < order.index("child"))
+        self.assertTrue(order.index("child") < order.index("grandchild"))
+        self.assertTrue(order.index("other") < order.index("mixed"))
+        self.assertTrue(order.index("parent") < order.index("mixed"))
+
+    def testLevels(self):
+        # Unknown dependencies are assumed to exist already
+        self.assertEqual(self.levels(self._items), [
+            ["other", "parent"],
+            ["child", "mixed"],
+            ["grandchild"]
+        ])
+
+    def testSelfReference(self):
+        self.assertEqual(self.order([("a", ["a"]), ("b", [])]), ["a", "b"])
+
+    def testCycle(self):
+        items = [("a", ["b"]), ("b", ["a"]), ("c", []), ("d", ["a"])]
+        self.assertEqual(self.levels(items), [["c"], ["a", "b", "d"]])
+
+    def testEmpty(self):
+        self.assertEqual(self.order([]), [])
+        self.assertEqual(self.levels([]), [])
+
+    def stream(self, items : list[tuple[str, list[str]]]) -> list[str]:
+        return [key for key, _ in dependencyStream(iter(items), lambda item: item[0], lambda item: item[1])]
+
+    def waves(self, items : list[tuple[str, list[str]]], size : int) -> list[list[str]]:
+        return [[key for key, _ in wave]
+                for wave in dependencyWaves(iter(items), lambda item: item[0], lambda item: item[1], size)]
+
+    def testStream(self):
+        order = self.stream(self._items)
+        self.assertEqual(len(order), 5)
+        self.assertTrue(order.index("parent") < order.index("child"))
+        self.assertTrue(order.index("child") < order.index("grandchild"))
+        self.assertTrue(order.index("parent") < order.index("mixed"))
+        self.assertEqual(self.stream([("a", ["a"]), ("b", ["a"]), ("c", ["d"]), ("d", ["c"])]), ["a", "b", "c", "d"])
+
+    def testStreamIsLazy(self):
+        # Items are yielded as soon as what they depend on has been read
+        read = []
+        def items():
+            for item in [("child", ["parent"]), ("parent", []), ("other", []), ("last", [])]:
+                read.append(item[0])
+                yield item
+        stream = dependencyStream(items(), lambda item: item[0], lambda item: item[1])
+        self.assertEqual([next(stream)[0], next(stream)[0]], ["parent", "child"])
+        self.assertEqual(read, ["child", "parent"])
+        self.assertEqual(next(stream)[0], "other")
+        self.assertEqual(read, ["child", "parent", "other"])
+
+    def testWaves(self):
+        waves = self.waves(self._items, 2)
+        self.assertTrue(all(len(wave) <= 2 for wave in waves))
+        self.assertEqual(sorted([key for wave in waves for key in wave]), sorted([key for key, _ in self._items]))
+        position = { key : index for index, wave in enumerate(waves) for key in wave }
+        for key, dependencies in self._items:
+            for dependency in dependencies:
+                if dependency in position:
+                    self.assertLess(position[dependency], position[key])
+
+        # Independent items share a wave
+        self.assertEqual(self.waves([("a", []), ("b", ["a"]), ("c", []), ("d", [])], 3), [["a", "c"], ["b", "d"]])
+        self.assertEqual(self.waves([], 2), [])
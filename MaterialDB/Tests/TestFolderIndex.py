@@ -0,0 +1,75 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import unittest
+
+from MaterialDB.Database.FolderIndex import FolderIndex
+
+class FolderIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        # Rows are deliberately out of order
+        self._index = FolderIndex([
+            (3, "Tests", 2),
+            (1, "System", None),
+            (2, "Resource", 1),
+            (4, "User", None),
+            (5, "Henry", 4),
+        ])
+
+    def testFind(self):
+        self.assertEqual(self._index.folderId(["System", "Resource", "Tests"]), 3)
+        self.assertEqual(self._index.folderId(["User", "Henry"]), 5)
+        self.assertEqual(self._index.folderId([]), 0)
+        self.assertEqual(self._index.folderId(["System", "Missing"]), 0)
+
+        # Partial matches report how far they got
+        self.assertEqual(self._index.find(["System", "Resource", "New", "Deeper"]), (2, 2))
+        self.assertEqual(self._index.find(["Missing"]), (0, 0))
+
+    def testPath(self):
+        self.assertEqual(self._index.path(3), "System/Resource/Tests")
+        self.assertEqual(self._index.path(4), "User")
+        self.assertEqual(self._index.path(0), "")
+
+    def testAdd(self):
+        self._index.add(2, "New", 6)
+        self._index.add(0, "Root", 7)
+        self.assertEqual(self._index.folderId(["System", "Resource", "New"]), 6)
+        self.assertEqual(self._index.folderId(["Root"]), 7)
+
+    def testRename(self):
+        self._index.rename(2, "Resources")
+        self.assertEqual(self._index.folderId(["System", "Resource", "Tests"]), 0)
+        self.assertEqual(self._index.folderId(["System", "Resources", "Tests"]), 3)
+        self.assertEqual(self._index.path(3), "System/Resources/Tests")
+
+    def testRemove(self):
+        self._index.remove(1)
+        self.assertEqual(self._index.find(["System", "Resource", "Tests"]), (0, 0))
+        self.assertEqual(self._index.folderId(["User", "Henry"]), 5)
+
+        # The subtree is gone too, so its ids can't be reused as parents
+        with self.assertRaises(KeyError):
+            self._index.add(3, "Orphan", 8)
@@ -0,0 +1,88 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import os
+import tempfile
+import unittest
+
+from MaterialDB.manager.Mirror import LocalMirror
+
+class MirrorTests(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self._path = os.path.join(self._directory.name, "mirror", "mirror.sqlite")
+        self._mirror = LocalMirror(self._path)
+
+    def tearDown(self):
+        self._mirror.close()
+        self._directory.cleanup()
+
+    def record(self, uuid : str, library : str = "Library") -> dict:
+        return {
+            "uuid" : uuid,
+            "library" : library,
+            "folder" : "Metals",
+            "name" : "Name " + uuid,
+            "properties" : { "Density" : ["Quantity", "7900 kg/m^3"] }
+        }
+
+    def testSequence(self):
+        self.assertIsNone(self._mirror.sequence())
+        self._mirror.setSequence(42)
+        self.assertEqual(self._mirror.sequence(), 42)
+
+    def testLibraries(self):
+        self._mirror.setLibraries([("B", None, False), ("A", b"icon", True)])
+        self.assertEqual(self._mirror.libraries(), [("A", b"icon", True), ("B", None, False)])
+        self._mirror.setLibraries([("C", None, False)])
+        self.assertEqual(self._mirror.libraries(), [("C", None, False)])
+
+    def testRecords(self):
+        self._mirror.putRecords("material", { "a" : self.record("a"), "b" : self.record("b", "Other") })
+        self._mirror.putRecords("model", { "a" : self.record("a") })
+        self.assertEqual(self._mirror.record("material", "a"), self.record("a"))
+        self.assertIsNone(self._mirror.record("material", "c"))
+        self.assertEqual(sorted(self._mirror.records("material", ["a", "b", "c"]).keys()), ["a", "b"])
+        self.assertEqual(self._mirror.libraryObjects("material", "Library"), [("a", "Metals", "Name a")])
+
+        self._mirror.setLibraries([("Library", None, False), ("Other", None, False), ("Empty", None, False)])
+        self.assertEqual([name for name, _, _ in self._mirror.libraries("material")], ["Library", "Other"])
+        self.assertEqual([name for name, _, _ in self._mirror.libraries("model")], ["Library"])
+
+        self._mirror.remove("material", ["a"])
+        self.assertIsNone(self._mirror.record("material", "a"))
+        self.assertIsNotNone(self._mirror.record("model", "a"))
+
+        self._mirror.removeLibrary("Other")
+        self.assertEqual(self._mirror.records("material", ["b"]), {})
+
+    def testWarmStart(self):
+        self._mirror.putRecords("material", { "a" : self.record("a") })
+        self._mirror.setSequence(7)
+        self._mirror.close()
+
+        self._mirror = LocalMirror(self._path)
+        self.assertEqual(self._mirror.sequence(), 7)
+        self.assertEqual(self._mirror.record("material", "a"), self.record("a"))
@@ -0,0 +1,134 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import unittest
+
+from MaterialDB.Database.MySQLNativeConnection import NativeConnection
+
+class RecordingCursor:
+    """Records the statements run, in place of a MySQL Connector/Python cursor"""
+
+    def __init__(self, prepared : bool):
+        self.prepared = prepared
+        self.executed = []
+        self.closed = False
+        self.description = None
+        self.with_rows = False
+        self.rowcount = -1
+        self._rows = []
+
+    def execute(self, sql, params):
+        self.executed.append((sql, params))
+        if sql.startswith("SELECT"):
+            self.description = [("id",), ("name",)]
+            self.with_rows = True
+            self._rows = [(1, "one"), (2, "two")]
+        else:
+            self.description = None
+            self.with_rows = False
+            self.rowcount = 1
+
+    def executemany(self, sql, rows):
+        self.executed.append((sql, rows))
+        self.with_rows = False
+        self.rowcount = len(rows)
+
+    def fetchall(self):
+        rows = self._rows
+        self._rows = []
+        return rows
+
+    def close(self):
+        self.closed = True
+
+class RecordingConnection:
+
+    def __init__(self):
+        self.cursors = []
+        self.closed = False
+
+    def cursor(self, prepared : bool = False):
+        cursor = RecordingCursor(prepared)
+        self.cursors.append(cursor)
+        return cursor
+
+    def close(self):
+        self.closed = True
+
+class MySQLNativeConnectionTests(unittest.TestCase):
+
+    def testPreparedStatements(self):
+        driver = RecordingConnection()
+        connection = NativeConnection(driver, statementCacheSize=2)
+        cursor = connection.cursor()
+
+        # Each statement is prepared once and reused
+        cursor.execute("SELECT id, name FROM t WHERE id = ?", 1)
+        cursor.execute("SELECT id, name FROM t WHERE id = ?", 2)
+        self.assertEqual(len(driver.cursors), 1)
+        self.assertTrue(driver.cursors[0].prepared)
+        self.assertEqual([params for _, params in driver.cursors[0].executed], [(1,), (2,)])
+
+        # The least recently used statement is closed when the cache is full
+        cursor.execute("UPDATE t SET name = ? WHERE id = ?", "uno", 1)
+        cursor.execute("SELECT id, name FROM t WHERE id = ?", 3)
+        cursor.execute("DELETE FROM t WHERE id = ?", 1)
+        self.assertEqual(len(driver.cursors), 3)
+        self.assertTrue(driver.cursors[1].closed)
+        self.assertFalse(driver.cursors[0].closed)
+        self.assertEqual(cursor.rowcount, 1)
+
+    def testRows(self):
+        connection = NativeConnection(RecordingConnection())
+        cursor = connection.cursor()
+        cursor.execute("SELECT id, name FROM t")
+        row = cursor.fetchone()
+        self.assertEqual(row.id, 1)
+        self.assertEqual(row.name, "one")
+        self.assertEqual(row[1], "one")
+        with self.assertRaises(AttributeError):
+            row.missing
+        self.assertEqual([row.name for row in cursor], ["two"])
+        self.assertIsNone(cursor.fetchone())
+
+        self.assertEqual(len(cursor.execute("SELECT id, name FROM t").fetchmany(1)), 1)
+        self.assertEqual(len(cursor.fetchall()), 1)
+
+    def testTextProtocol(self):
+        driver = RecordingConnection()
+        connection = NativeConnection(driver)
+        cursor = connection.cursor()
+
+        # Statements that can't be prepared, and batches, use the text protocol
+        cursor.execute("SET FOREIGN_KEY_CHECKS=0")
+        cursor.executemany("INSERT INTO t (id, name) VALUES (?, ?)", [(1, "one"), (2, "two")])
+        self.assertEqual(len(driver.cursors), 1)
+        self.assertFalse(driver.cursors[0].prepared)
+        self.assertEqual(driver.cursors[0].executed[1],
+                         ("INSERT INTO t (id, name) VALUES (%s, %s)", [(1, "one"), (2, "two")]))
+        self.assertEqual(cursor.rowcount, 2)
+
+        connection.close()
+        self.assertTrue(driver.cursors[0].closed)
+        self.assertTrue(driver.closed)
@@ -0,0 +1,93 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import importlib.util
+import math
+import unittest
+
+@unittest.skipUnless(importlib.util.find_spec("numpy"), "NumPy isn't installed")
+class NumericArrayTests(unittest.TestCase):
+
+    def setUp(self):
+        self._built = []
+        def build(type, raw):
+            self._built.append(type)
+            return (type, raw)
+        self._build = build
+
+    def testArray2D(self):
+        from MaterialDB.Database.NumericArray import numericArray
+
+        raw = { "rows" : 2, "columns" : 2, "values" : [["1.5 mm", None], ["2e3 mm", "n/a"]] }
+        array = numericArray("2DArray", raw, self._build)
+        self.assertEqual((array.rows, array.columns), (2, 2))
+        self.assertEqual(array.values[0, 0], 1.5)
+        self.assertEqual(array.values[1, 0], 2000.0)
+        self.assertTrue(math.isnan(array.values[0, 1]))
+        self.assertTrue(math.isnan(array.values[1, 1]))
+        self.assertEqual(array.units.tolist(), [["mm", ""], ["mm", ""]])
+        self.assertIsNone(array.cells[0, 1])
+
+        # The Materials array is only built when asked for, and only once
+        self.assertEqual(self._built, [])
+        self.assertEqual(array.array(), ("2DArray", raw))
+        array.array()
+        self.assertEqual(self._built, ["2DArray"])
+
+    def testArray3D(self):
+        from MaterialDB.Database.NumericArray import numericArray
+
+        raw = {
+            "columns" : 2,
+            "depths" : [
+                { "value" : "20 °C", "rows" : 2, "values" : [["1 Pa", "2 Pa"], ["3 Pa", "4 Pa"]] },
+                { "value" : "40 °C", "rows" : 1, "values" : [["5 Pa", "6 Pa"]] }
+            ]
+        }
+        array = numericArray("3DArray", raw, self._build)
+        self.assertEqual(array.depth, 2)
+        self.assertEqual(array.rows.tolist(), [2, 1])
+        self.assertEqual(array.values.shape, (2, 2, 2))
+        self.assertEqual(array.values[1, 0].tolist(), [5.0, 6.0])
+
+        # Rows past the end of a depth are empty
+        self.assertTrue(all(math.isnan(value) for value in array.values[1, 1]))
+        self.assertEqual(array.depthValues.tolist(), [20.0, 40.0])
+        self.assertEqual(array.depthUnits.tolist(), ["°C", "°C"])
+        self.assertEqual(self._built, [])
+
+    def testEmpty(self):
+        from MaterialDB.Database.NumericArray import numericArray
+
+        array = numericArray("2DArray", { "rows" : 0, "columns" : 3, "values" : [] }, self._build)
+        self.assertEqual(array.values.shape, (0, 3))
+        array = numericArray("3DArray", { "columns" : 3, "depths" : [] }, self._build)
+        self.assertEqual(array.values.shape, (0, 0, 3))
+        self.assertEqual(array.depthValues.shape, (0,))
+
+    def testNotAnArray(self):
+        from MaterialDB.Database.NumericArray import numericArray
+
+        with self.assertRaises(ValueError):
+            numericArray("Quantity", {}, self._build)
@@ -0,0 +1,70 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import unittest
+
+from MaterialDB.Database import Codec
+from MaterialDB.Database.PackedArray import packArray, unpackArray
+
+class PackedArrayTests(unittest.TestCase):
+
+    def setUp(self):
+        self._array2D = { "rows" : 2, "columns" : 2, "values" : [["1 mm", ""], [None, "2 mm"]] }
+        self._array3D = {
+            "columns" : 2,
+            "depths" : [
+                { "value" : "20 °C", "rows" : 1, "values" : [["1 Pa", "2 Pa"]] },
+                { "value" : "40 °C", "rows" : 0, "values" : [] }
+            ]
+        }
+
+    def testRoundTrip(self):
+        for raw in [self._array2D, self._array3D]:
+            codec, data = packArray(raw, -1)
+            self.assertEqual(codec, Codec.NONE)
+            self.assertIsInstance(data, bytes)
+            self.assertEqual(unpackArray(codec, data), raw)
+
+    def testEmptyCells(self):
+        # Empty cells must stay distinct from empty strings
+        codec, data = packArray(self._array2D, -1)
+        values = unpackArray(codec, data)["values"]
+        self.assertEqual(values[0][1], "")
+        self.assertIsNone(values[1][0])
+
+    def testCompression(self):
+        raw = { "rows" : 100, "columns" : 10, "values" : [["1.0 mm"] * 10] * 100 }
+        codec, data = packArray(raw, 0)
+        self.assertEqual(codec, Codec.ZLIB)
+        self.assertEqual(unpackArray(codec, data), raw)
+
+        # Below the threshold, or when compression doesn't help, the data is stored as is
+        codec, _ = packArray(raw, 1 << 20)
+        self.assertEqual(codec, Codec.NONE)
+        codec, _ = packArray(self._array2D, 0)
+        self.assertEqual(codec, Codec.NONE)
+
+    def testUnknownCodec(self):
+        with self.assertRaises(ValueError):
+            unpackArray("unknown", b"{}")
@@ -30,12 +30,12 @@ from PySide.QtGui import QMessageBox
 from DraftTools import translate
 
 # from MaterialDB.manager.MaterialDBManager import MaterialsDBManager
-from MaterialDB.Database.DatabaseMySQLCreate import DatabaseMySQLCreate
+from MaterialDB.Database.Backend import getDatabaseCreate
 
 from MaterialDB.UI.Tasks.TaskCreateDatabase import TaskPanelCreateDatabase
 
 def createDatabase():
-    db = DatabaseMySQLCreate()
+    db = getDatabaseCreate()
     if db.checkIfExists():
         # DB exists
         msgBox = QMessageBox()
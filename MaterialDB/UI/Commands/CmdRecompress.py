@@ -0,0 +1,60 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import threading
+
+import FreeCAD
+
+from DraftTools import translate
+
+from MaterialDB.Database.Backend import getDatabase
+from MaterialDB.Database.Exceptions import DatabaseTableCreationError
+
+def recompressDatabase():
+    """Rewrites stored values with the current compression settings. Runs in its own thread"""
+    FreeCAD.Console.PrintMessage(translate('MaterialDB', "Recompressing the database...") + "\n")
+    try:
+        rewritten = getDatabase().recompress()
+        FreeCAD.Console.PrintMessage(
+            translate('MaterialDB', "Recompression finished. {} values were rewritten.").format(rewritten) + "\n")
+    except DatabaseTableCreationError as tableErr:
+        FreeCAD.Console.PrintError(
+            translate('MaterialDB', "Unable to recompress the database: {}").format(tableErr._error) + "\n")
+
+class CmdRecompress:
+    def __init__(self):
+        self._thread = None
+
+    def Activated(self):
+        self._thread = threading.Thread(target=recompressDatabase, daemon=True)
+        self._thread.start()
+
+    def IsActive(self):
+        # One at a time
+        return self._thread is None or not self._thread.is_alive()
+
+    def GetResources(self):
+        return {'MenuText': translate("MaterialDB", 'Recompress database'),
+                'ToolTip': translate("MaterialDB", 'Compress stored values using the current compression settings, in the background'),
+                'Pixmap': FreeCAD.getUserAppDataDir() + "Mod/MaterialDB/Resources/icons/MaterialDB_Create.svg"}
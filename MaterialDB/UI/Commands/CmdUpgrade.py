@@ -0,0 +1,56 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import FreeCAD
+
+from PySide.QtGui import QMessageBox
+
+from DraftTools import translate
+
+from MaterialDB.Database.Backend import getDatabaseCreate
+from MaterialDB.Database.Exceptions import DatabaseTableCreationError
+
+def upgradeDatabase():
+    db = getDatabaseCreate()
+    msgBox = QMessageBox()
+    try:
+        db.migrateTables()
+        msgBox.setText(translate('MaterialDB', "The database has been upgraded."))
+    except DatabaseTableCreationError as tableErr:
+        msgBox.setText(translate('MaterialDB', "Unable to upgrade the database."))
+        msgBox.setInformativeText(str(tableErr._error))
+    msgBox.setStandardButtons(QMessageBox.Ok)
+    msgBox.exec()
+
+class CmdUpgrade:
+    def Activated(self):
+        upgradeDatabase()
+
+    def IsActive(self):
+        return True
+
+    def GetResources(self):
+        return {'MenuText': translate("MaterialDB", 'Upgrade database...'),
+                'ToolTip': translate("MaterialDB", 'Upgrade an existing database to the current version'),
+                'Pixmap': FreeCAD.getUserAppDataDir() + "Mod/MaterialDB/Resources/icons/MaterialDB_Create.svg"}
@@ -58,13 +58,14 @@ class DlgSettingsDatabase(QtCore.QObject):
         FreeCAD.ParamGet(prefs).SetString("Port", self.form.editPort.text())
         FreeCAD.ParamGet(prefs).SetString("Username", self.form.editUsername.text())
         FreeCAD.ParamGet(prefs).SetString("Password", self.form.editPassword.text())
+        FreeCAD.ParamGet(prefs).SetBool("Compression", self.form.checkCompression.isChecked())
 
         # Get the DSN
 
     def loadSettings(self):
         prefs = getPreferencesLocation()
 
-        connectionTypes = ["ODBC", "MySQL"]
+        connectionTypes = ["ODBC", "MySQL", "SQLite"]
         self.form.comboConnectionType.addItems(connectionTypes)
         connectionType = FreeCAD.ParamGet(prefs).GetString("Connection", "ODBC")
         self.form.comboConnectionType.setCurrentText(connectionType)
@@ -82,6 +83,8 @@ class DlgSettingsDatabase(QtCore.QObject):
         self.form.editUsername.setText(username)
         password = FreeCAD.ParamGet(prefs).GetString("Password", "")
         self.form.editPassword.setText(password)
+        compression = FreeCAD.ParamGet(prefs).GetBool("Compression", False)
+        self.form.checkCompression.setChecked(compression)
 
     def showOdbcDrivers(self):
         self.form.comboDriver.clear()
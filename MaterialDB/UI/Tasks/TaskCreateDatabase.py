@@ -34,7 +34,7 @@ from PySide.QtGui import QMessageBox
 
 from MaterialDB.Configuration import getPreferencesLocation
 
-from MaterialDB.Database.DatabaseMySQLCreate import DatabaseMySQLCreate
+from MaterialDB.Database.Backend import getDatabaseCreate
 from MaterialDB.Database.Exceptions import DatabaseCreationError, DatabaseTableCreationError
 from MaterialDB.util.UIPath import getUIPath
 
@@ -45,7 +45,7 @@ class TaskPanelCreateDatabase(QtCore.QObject):
 
         self.form = FreeCADGui.PySideUic.loadUi(os.path.join(getUIPath(), 'Resources', 'ui', "DlgCreateDatabase.ui"))
 
-        self._db = DatabaseMySQLCreate()
+        self._db = getDatabaseCreate()
         self.initialize()
 
     def initialize(self):
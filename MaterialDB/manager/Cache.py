@@ -0,0 +1,107 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+"""Class for caching objects loaded from the database"""
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import threading
+from collections import OrderedDict
+from typing import Any
+
+class LRUCache:
+    """
+    A thread safe cache that evicts the least recently used entries once the
+    estimated size of its contents exceeds the budget. A budget of 0
+    disables the cache.
+
+    Read generation() before loading a value and pass it to put(). The value
+    is dropped if the cache was invalidated or cleared in between, as it may
+    have been read before the change that caused it.
+    """
+
+    def __init__(self, budget : int):
+        self._budget = budget
+        self._entries = OrderedDict() # key -> (value, size)
+        self._used = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key : Any) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def put(self, key : Any, value : Any, size : int, generation : int | None = None) -> None:
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                # Stale
+                return
+            self._remove(key)
+            if size > self._budget:
+                # Too big to ever fit
+                return
+            self._entries[key] = (value, size)
+            self._used += size
+            while self._used > self._budget:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._used -= evicted
+                self.evictions += 1
+
+    def invalidate(self, key : Any) -> None:
+        with self._lock:
+            self._generation += 1
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._used = 0
+
+    def statistics(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits" : self.hits,
+                "misses" : self.misses,
+                "evictions" : self.evictions,
+                "entries" : len(self._entries),
+                "size" : self._used,
+                "budget" : self._budget
+            }
+
+    def _remove(self, key : Any) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._used -= entry[1]
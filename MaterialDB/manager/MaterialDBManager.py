@@ -22,34 +22,300 @@
 __author__ = "David Carter"
 __url__ = "https://www.davesrocketshop.com"
 
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
+from typing import Any, Callable, Iterable, Iterator
+
+import FreeCAD
 import Materials
 
 from MaterialAPI.MaterialManagerExternal import MaterialManagerExternal, \
     MaterialLibraryType, MaterialLibraryObjectType, ModelObjectType, \
     MaterialObjectType
 
-from MaterialDB.Database.DatabaseMySQL import DatabaseMySQL
-from MaterialDB.Database.Exceptions import DatabaseLibraryCreationError, \
+from MaterialDB.Configuration import getPreferencesLocation
+from MaterialDB.Database.Backend import getDatabase
+from MaterialDB.Database.DependencyOrder import dependencyStream, dependencyWaves
+from MaterialDB.Database.Exceptions import DatabaseConnectionError, DatabaseLibraryCreationError, \
     DatabaseModelCreationError, DatabaseMaterialCreationError, \
     DatabaseModelExistsError, DatabaseMaterialExistsError, \
-    DatabaseModelNotFound, DatabaseMaterialNotFound
+    DatabaseModelNotFound, DatabaseMaterialNotFound, DatabaseFilterError
+from MaterialDB.manager.Cache import LRUCache
+from MaterialDB.manager.Mirror import LocalMirror
 
 class MaterialsDBManager(MaterialManagerExternal):
 
     def __init__(self):
-        self._db = DatabaseMySQL()
+        self._db = getDatabase()
+
+        # Budget is set in MB
+        prefs = getPreferencesLocation()
+        self._cache = LRUCache(FreeCAD.ParamGet(prefs).GetInt("CacheSize", 64) * 1024 * 1024)
+        # Sequence number of the last change applied to the cache
+        self._changeSequence = None
+
+        self._mirror = None
+        self._mirrorLock = threading.Lock()
+        # Set when writes haven't been copied to the mirror. See _mirrorLater()
+        self._mirrorStale = False
+        if FreeCAD.ParamGet(prefs).GetBool("MirrorEnabled", False):
+            path = FreeCAD.ParamGet(prefs).GetString("MirrorPath", "")
+            if not path:
+                path = os.path.join(FreeCAD.getUserAppDataDir(), "MaterialDB", "mirror.sqlite")
+            self._mirror = LocalMirror(path)
+            # Reads are served from the mirror straight away while it catches up
+            threading.Thread(target=self._synchronizeInBackground, daemon=True).start()
+
+    #
+    # Cache methods
+    #
+
+    def cacheStatistics(self) -> dict[str, int]:
+        """Returns the cache hit, miss and eviction counts along with its current size"""
+        return self._cache.statistics()
+
+    def clearCache(self) -> None:
+        self._cache.clear()
+
+    def refreshCache(self) -> int:
+        """
+        Removes the cached objects changed by other users since the last
+        refresh, using the change log. Returns the number of changes read.
+        """
+        self._mirrorChanges()
+        changes = None
+        if self._changeSequence is not None:
+            changes = self._changesAfter(self._changeSequence)
+        if changes is None:
+            # Nothing is known about what was cached before now
+            self._changeSequence = self._db.lastChange()
+            self._cache.clear()
+            return 0
+
+        for change in changes:
+            if change["object"] in ["model", "material"]:
+                self._cache.invalidate((change["object"], change["key"]))
+            elif change["change"] != "create":
+                # Paths and library names are held by many cached objects
+                self._cache.clear()
+        if changes:
+            self._changeSequence = changes[-1]["sequence"]
+        return len(changes)
+
+    def _changesAfter(self, sequence : int) -> list[dict[str, Any]] | None:
+        """
+        Returns every change after the sequence number, or None when any of
+        them are missing from the log, as happens once it has been pruned
+        """
+        # Read first. Anything committed up to here must be in the changes read below
+        last = self._db.lastChange()
+        changes = self._db.changesSince(sequence)
+        expected = sequence + 1
+        for change in changes:
+            if change["sequence"] != expected:
+                return None
+            expected += 1
+        if expected <= last:
+            return None
+        return changes
+
+    def changesSince(self, sequence: int, limit: int = 0) -> list[dict[str, Any]]:
+        return self._db.changesSince(sequence, limit)
+
+    def lastChange(self) -> int:
+        return self._db.lastChange()
+
+    def pruneChanges(self, sequence: int) -> None:
+        self._db.pruneChanges(sequence)
+
+    #
+    # Mirror methods
+    #
+
+    def synchronizeMirror(self) -> int:
+        """
+        Brings the local mirror up to date. An empty mirror is copied from the
+        server in full, as is one whose changes have since been pruned from
+        the change log. Otherwise only the objects named in the change log
+        since the last synchronization are fetched, with whole libraries
+        fetched again when a library or folder is renamed or deleted. Returns
+        the number of changes applied.
+        """
+        if self._mirror is None:
+            return 0
+
+        with self._mirrorLock:
+            sequence = self._mirror.sequence()
+            changes = None
+            if sequence is not None:
+                changes = self._changesAfter(sequence)
+            if changes is None:
+                self._copyToMirror()
+                return 0
+
+            changed = { "model" : set(), "material" : set() }
+            reload = set()
+            librariesChanged = False
+            for change in changes:
+                if change["object"] in changed:
+                    changed[change["object"]].add(change["key"])
+                elif change["object"] == "library":
+                    librariesChanged = True
+                    if change["change"] == "rename":
+                        self._mirror.removeLibrary(change["oldKey"])
+                        reload.discard(change["oldKey"])
+                        reload.add(change["key"])
+                    elif change["change"] == "delete":
+                        self._mirror.removeLibrary(change["key"])
+                        reload.discard(change["key"])
+                elif change["change"] != "create":
+                    # Everything below the folder has a new path
+                    reload.add(change["library"])
+
+            if librariesChanged:
+                self._mirror.setLibraries(self._db.libraryRecords())
+            for libraryName in reload:
+                self._mirror.removeLibrary(libraryName)
+                self._mirrorLibrary(libraryName)
+            for kind, load in [("model", self._db.getModelRecords), ("material", self._db.getMaterialRecords)]:
+                uuids = list(changed[kind])
+                if uuids:
+                    records = load(uuids)
+                    self._mirror.remove(kind, [uuid for uuid in uuids if uuid not in records])
+                    self._mirror.putRecords(kind, records)
+                    for uuid in uuids:
+                        self._cache.invalidate((kind, uuid))
+
+            if changes:
+                self._mirror.setSequence(changes[-1]["sequence"])
+            return len(changes)
+
+    def _copyToMirror(self) -> None:
+        """Replaces the contents of the mirror with a full copy of the server"""
+        # Read first so changes made during the copy are applied next time
+        last = self._db.lastChange()
+        libraries = self._db.libraryRecords()
+        names = [libraryName for libraryName, _, _ in libraries]
+        for libraryName, _, _ in self._mirror.libraries():
+            if libraryName not in names:
+                self._mirror.removeLibrary(libraryName)
+        self._mirror.setLibraries(libraries)
+        for libraryName in names:
+            self._mirror.removeLibrary(libraryName)
+            self._mirrorLibrary(libraryName)
+        self._mirror.setSequence(last)
+        self._cache.clear()
+
+    def _mirrorLibrary(self, libraryName : str) -> None:
+        for kind in ["model", "material"]:
+            for records in self._db.iterLibraryRecords(libraryName, kind):
+                self._mirror.putRecords(kind, records)
+
+    def _mirrored(self) -> LocalMirror | None:
+        """Returns the mirror once it holds a complete copy of the database"""
+        if self._mirrorStale:
+            self._mirrorChanges()
+        if self._mirror is not None and self._mirror.sequence() is not None:
+            return self._mirror
+        return None
+
+    def _mirrorChanges(self) -> None:
+        """Copies a change just written, along with any made elsewhere, to the mirror"""
+        if self._mirror is None:
+            return
+        self._mirrorStale = False
+        try:
+            self.synchronizeMirror()
+        except Exception as ex:
+            # The change is written. The mirror catches up on the next synchronization
+            FreeCAD.Console.PrintWarning("Unable to update the local mirror: {}\n".format(ex))
+
+    def _mirrorWrite(self, keys : list[tuple[str, str]]) -> None:
+        """
+        Copies the models and materials this process has just written, given
+        as (kind, uuid) pairs, to the mirror. Changes made elsewhere are left
+        for the next synchronization, so the mirror's sequence only moves on
+        when no other change came between it and this write.
+        """
+        if self._mirror is None:
+            return
+        try:
+            committed = self._db.lastCommitted()
+            with self._mirrorLock:
+                sequence = self._mirror.sequence()
+                if sequence is None:
+                    # Not yet copied. The copy includes the write
+                    return
+                for kind, load in [("model", self._db.getModelRecords), ("material", self._db.getMaterialRecords)]:
+                    uuids = [uuid for objectKind, uuid in keys if objectKind == kind]
+                    if uuids:
+                        records = load(uuids)
+                        self._mirror.remove(kind, [uuid for uuid in uuids if uuid not in records])
+                        self._mirror.putRecords(kind, records)
+                if committed is not None and committed[0] == sequence + 1:
+                    self._mirror.setSequence(committed[1])
+        except Exception as ex:
+            # The change is written. The mirror catches up on the next synchronization
+            FreeCAD.Console.PrintWarning("Unable to update the local mirror: {}\n".format(ex))
+
+    def _mirrorLater(self) -> None:
+        """
+        Leaves the mirror to catch up once, before it is next read, rather
+        than after each of a run of writes such as a migration
+        """
+        if self._mirror is not None:
+            self._mirrorStale = True
+
+    def _synchronizeInBackground(self) -> None:
+        try:
+            self.synchronizeMirror()
+        except DatabaseConnectionError:
+            FreeCAD.Console.PrintWarning("The material database is unreachable. Using the local mirror\n")
+        except Exception as ex:
+            FreeCAD.Console.PrintWarning("Unable to update the local mirror: {}\n".format(ex))
+        finally:
+            self._db._release()
+
+    def _libraryTypes(self, libraries : list[tuple[str, bytes | None, bool]]) -> list[MaterialLibraryType]:
+        return [MaterialLibraryType(name, icon, readOnly) for name, icon, readOnly in libraries]
+
+    def _objectTypes(self, objects : list[tuple[str, str, str]]) -> list[MaterialLibraryObjectType]:
+        return [MaterialLibraryObjectType(uuid, folder, name) for uuid, folder, name in objects]
+
+    def _unfiltered(self, unsupported : DatabaseFilterError) -> Materials.MaterialFilterOptions | None:
+        """Reports filter options the database can't apply. Returns the options to list with instead"""
+        FreeCAD.Console.PrintWarning("Listing materials unfiltered: {}\n".format(unsupported))
+        return None
+
+    def _recordSize(self, record : dict) -> int:
+        """Estimates the memory used by a model or material record"""
+        return 1024 + len(str(record["properties"]))
 
     def libraries(self) -> list[MaterialLibraryType]:
         # print("libraries()")
-        return self._db.getLibraries()
+        return self._listLibraries(None, self._db.getLibraries)
 
     def modelLibraries(self) -> list[MaterialLibraryType]:
         # print("modelLibraries()")
-        return self._db.getModelLibraries()
+        return self._listLibraries("model", self._db.getModelLibraries)
 
     def materialLibraries(self) -> list[MaterialLibraryType]:
         # print("materialLibraries()")
-        return self._db.getMaterialLibraries()
+        return self._listLibraries("material", self._db.getMaterialLibraries)
+
+    def _listLibraries(self, kind : str | None,
+                       query : Callable[[], list[MaterialLibraryType]]) -> list[MaterialLibraryType]:
+        mirror = self._mirrored()
+        if mirror is not None:
+            return self._libraryTypes(mirror.libraries(kind))
+        try:
+            return query()
+        except DatabaseConnectionError:
+            if self._mirror is None:
+                raise
+            # Whatever was copied before the server went away
+            return self._libraryTypes(self._mirror.libraries(kind))
 
     def getLibrary(self, libraryName: str) -> MaterialLibraryType:
         # print("getLibrary('{}')".format(libraryName))
@@ -58,32 +324,79 @@ class MaterialsDBManager(MaterialManagerExternal):
     def createLibrary(self, libraryName: str, icon: bytes, readOnly: bool) -> None:
         # print("createLibrary('{}', '{}', '{}')".format(libraryName, icon, readOnly))
         self._db.createLibrary(libraryName, icon, readOnly)
+        self._mirrorChanges()
 
     def renameLibrary(self, oldName: str, newName: str) -> None:
         # print("renameLibrary('{}', '{}')".format(oldName, newName))
         self._db.renameLibrary(oldName, newName)
+        self._mirrorChanges()
+        # Paths and library names are held by many cached objects
+        self._cache.clear()
 
     def changeIcon(self, libraryName: str, icon: bytes) -> None:
         # print("changeIcon('{}', '{}')".format(libraryName, icon))
         self._db.changeIcon(libraryName, icon)
+        self._mirrorChanges()
 
     def removeLibrary(self, libraryName: str) -> None:
         # print("removeLibrary('{}')".format(libraryName))
         self._db.removeLibrary(libraryName)
+        self._mirrorChanges()
+        # Paths and library names are held by many cached objects
+        self._cache.clear()
 
     def libraryModels(self, libraryName: str) -> list[MaterialLibraryObjectType]:
         # print("libraryModels('{}')".format(libraryName))
+        mirror = self._mirrored()
+        if mirror is not None:
+            return self._objectTypes(mirror.libraryObjects("model", libraryName))
         return self._db.libraryModels(libraryName)
 
     def libraryMaterials(self, libraryName: str,
                          filter: Materials.MaterialFilter = None,
                          options: Materials.MaterialFilterOptions = None) -> list[MaterialLibraryObjectType]:
         # print("libraryMaterials('{}')".format(libraryName))
-        return self._db.libraryMaterials(libraryName)
+        mirror = self._mirrored()
+        if mirror is not None and filter is None:
+            return self._objectTypes(mirror.libraryObjects("material", libraryName))
+        try:
+            return self._db.libraryMaterials(libraryName, filter, options)
+        except DatabaseFilterError as unsupported:
+            return self._db.libraryMaterials(libraryName, filter, self._unfiltered(unsupported))
 
     def libraryFolders(self, libraryName: str) -> list[str]:
         print("libraryFolders('{}')".format(libraryName))
         return self._db.libraryFolders(libraryName)
+
+    def iterLibraryModels(self, libraryName: str, batchSize: int = 0) -> Iterator[MaterialLibraryObjectType]:
+        return self._db.iterLibraryModels(libraryName, batchSize)
+
+    def iterLibraryMaterials(self, libraryName: str,
+                             filter: Materials.MaterialFilter = None,
+                             options: Materials.MaterialFilterOptions = None,
+                             batchSize: int = 0) -> Iterator[MaterialLibraryObjectType]:
+        try:
+            yield from self._db.iterLibraryMaterials(libraryName, filter, options, batchSize)
+        except DatabaseFilterError as unsupported:
+            # Raised before the first row, so nothing has been returned yet
+            yield from self._db.iterLibraryMaterials(libraryName, filter, self._unfiltered(unsupported), batchSize)
+
+    def iterLibraryFolders(self, libraryName: str, batchSize: int = 0) -> Iterator[str]:
+        return self._db.iterLibraryFolders(libraryName, batchSize)
+
+    def libraryModelsPage(self, libraryName: str, after: str | None, limit: int) -> list[MaterialLibraryObjectType]:
+        return self._db.libraryModelsPage(libraryName, after, limit)
+
+    def libraryMaterialsPage(self, libraryName: str, after: str | None, limit: int,
+                             filter: Materials.MaterialFilter = None,
+                             options: Materials.MaterialFilterOptions = None) -> list[MaterialLibraryObjectType]:
+        try:
+            return self._db.libraryMaterialsPage(libraryName, after, limit, filter, options)
+        except DatabaseFilterError as unsupported:
+            return self._db.libraryMaterialsPage(libraryName, after, limit, filter, self._unfiltered(unsupported))
+
+    def libraryFoldersPage(self, libraryName: str, after: str | None, limit: int) -> list[str]:
+        return self._db.libraryFoldersPage(libraryName, after, limit)
     
     def librarySubFolders(self, libraryName: str, path: str) -> list[str]:
         print("librarySubFolders('{}', '{}')".format(libraryName, path))
@@ -95,14 +408,21 @@ class MaterialsDBManager(MaterialManagerExternal):
     def createFolder(self, libraryName: str, path: str) -> None:
         print("createFolder('{0}', '{1}')".format(libraryName, path))
         self._db.createFolder(libraryName, path)
+        self._mirrorChanges()
 
     def renameFolder(self, libraryName: str, oldPath: str, newPath: str) -> None:
         print("renameFolder('{0}', '{1}', '{2}')".format(libraryName, oldPath, newPath))
         self._db.renameFolder(libraryName, oldPath, newPath)
+        self._mirrorChanges()
+        # Paths and library names are held by many cached objects
+        self._cache.clear()
 
     def deleteRecursive(self, libraryName: str, path: str) -> None:
         print("deleteRecursive('{0}', '{1}')".format(libraryName, path))
         self._db.deleteRecursive(libraryName, path)
+        self._mirrorChanges()
+        # Paths and library names are held by many cached objects
+        self._cache.clear()
 
     def folderMaterials(self, libraryName: str, path: str) -> list[MaterialLibraryObjectType]:
         """Returns a list of materials in the specified folder within the library"""
@@ -114,17 +434,64 @@ class MaterialsDBManager(MaterialManagerExternal):
     #
 
     def getModel(self, uuid: str) -> ModelObjectType:
+        """Returns the model. Each call builds a new object the caller is free to change"""
         # print("getModel('{}')".format(uuid))
-        return self._db.getModel(uuid)
+        return self.getModels([uuid])[0]
+
+    def getModels(self, uuids: list[str]) -> list[ModelObjectType]:
+        """Returns the models in the same order as the UUIDs"""
+        # print("getModels({} models)".format(len(uuids)))
+        records = self._cachedRecords("model", uuids, self._db.getModelRecords)
+        for uuid in uuids:
+            if uuid not in records:
+                raise DatabaseModelNotFound("Model '{}' not found".format(uuid))
+        return [self._db.buildModel(records[uuid]) for uuid in uuids]
+
+    def _cachedRecords(self, kind : str, uuids : list[str],
+                       load : Callable[[list[str]], dict[str, dict]]) -> dict[str, dict]:
+        """
+        Returns the records that exist, reading those not in the cache from
+        the mirror or the server. The cache holds records rather than
+        objects so that no two callers share an object.
+        """
+        records = {}
+        for uuid in uuids:
+            record = self._cache.get((kind, uuid))
+            if record is not None:
+                records[uuid] = record
+        missing = list(dict.fromkeys(uuid for uuid in uuids if uuid not in records))
+        if len(missing) > 0:
+            # Records read before an invalidation aren't cached
+            generation = self._cache.generation()
+            if self._mirror is not None:
+                fetched = self._getMirroredRecords(kind, missing, load)
+            else:
+                fetched = load(missing)
+            for uuid, record in fetched.items():
+                records[uuid] = record
+                self._cache.put((kind, uuid), record, self._recordSize(record), generation)
+        return records
+
+    def _getMirroredRecords(self, kind : str, uuids : list[str],
+                            load : Callable[[list[str]], dict[str, dict]]) -> dict[str, dict]:
+        records = self._mirror.records(kind, uuids)
+        missing = [uuid for uuid in uuids if uuid not in records]
+        if missing:
+            fetched = load(missing)
+            self._mirror.putRecords(kind, fetched)
+            records.update(fetched)
+        return records
 
     def addModel(self, libraryName: str, path: str, model: Materials.Model) -> None:
         # print("addModel('{}', '{}', '{}')".format(libraryName, path, model.Name))
         self._db.createModel(libraryName, path, model)
+        self._mirrorWrite([("model", model.UUID)])
 
     def migrateModel(self, libraryName: str, path: str, model: Materials.Model) -> None:
         # print("migrateModel('{}', '{}', '{}')".format(libraryName, path, model.Name))
         try:
             self._db.createModel(libraryName, path, model)
+            self._mirrorLater()
         except DatabaseModelExistsError:
             # If it exists we just ignore
             pass
@@ -132,63 +499,369 @@ class MaterialsDBManager(MaterialManagerExternal):
     def updateModel(self, libraryName: str, path: str, model: Materials.Model) -> None:
         # print("updateModel('{}', '{}', '{}')".format(libraryName, path, model.Name))
         self._db.updateModel(libraryName, path, model)
+        self._mirrorWrite([("model", model.UUID)])
+        self._cache.invalidate(("model", model.UUID))
 
     def setModelPath(self, libraryName: str, path: str, uuid: str) -> None:
         # print("setModelPath('{}', '{}', '{}')".format(libraryName, path, uuid))
         self._db.setModelPath(libraryName, path, uuid)
+        self._mirrorWrite([("model", uuid)])
+        self._cache.invalidate(("model", uuid))
 
     def renameModel(self, libraryName: str, name: str, uuid: str) -> None:
         # print("renameModel('{}', '{}', '{}')".format(libraryName, name, uuid))
         self._db.renameModel(libraryName, name, uuid)
+        self._mirrorWrite([("model", uuid)])
+        self._cache.invalidate(("model", uuid))
 
     def moveModel(self, libraryName: str, path: str, uuid: str) -> None:
         # print("moveModel('{}', '{}', '{}')".format(libraryName, path, uuid))
         self._db.moveModel(libraryName, path, uuid)
+        self._mirrorWrite([("model", uuid)])
+        self._cache.invalidate(("model", uuid))
 
     def removeModel(self, uuid: str) -> None:
         # print("removeModel('{}')".format(uuid))
-        self.removeModel(uuid)
+        referring = self._db.removeModel(uuid)
+        self._mirrorWrite([("model", uuid)] + referring)
+        self._cache.invalidate(("model", uuid))
+        # Their references to the model are gone too
+        for key in referring:
+            self._cache.invalidate(key)
 
     #
     # Material methods
     #
 
-    def getMaterial(self, uuid: str) -> MaterialObjectType:
+    def getMaterial(self, uuid: str, lazy: bool = False) -> MaterialObjectType:
+        """
+        Returns the material. Each call builds a new object the caller is free
+        to change. When lazy is set and the material has to be read from the
+        server, its SVG, Image and ImageList values are left out. Lazy
+        materials aren't cached. Updating one keeps the stored values of the
+        properties left out.
+        """
         # print("getMaterial('{}')".format(uuid))
-        return self._db.getMaterial(uuid)
+        return self.getMaterials([uuid], lazy)[0]
+
+    def getMaterials(self, uuids: list[str], lazy: bool = False) -> list[MaterialObjectType]:
+        """Returns the materials in the same order as the UUIDs. lazy is as for getMaterial()"""
+        # print("getMaterials({} materials)".format(len(uuids)))
+        if lazy and self._mirror is None:
+            records = {}
+            for uuid in uuids:
+                record = self._cache.get(("material", uuid))
+                if record is not None:
+                    records[uuid] = record
+            missing = [uuid for uuid in uuids if uuid not in records]
+            if len(missing) > 0:
+                # Their handles are snapshots, so these records aren't cached
+                records.update(self._db.getMaterialRecords(missing, lazy=True))
+        else:
+            records = self._cachedRecords("material", uuids, self._db.getMaterialRecords)
+        for uuid in uuids:
+            if uuid not in records:
+                raise DatabaseMaterialNotFound("Material '{}' not found".format(uuid))
+        return [self._db.buildMaterial(records[uuid]) for uuid in uuids]
+
+    def getMaterialRecords(self, uuids: list[str], lazy: bool = False) -> dict[str, dict]:
+        """
+        Returns the materials as plain records. When lazy is set and the
+        records are read from the server, SVG, Image and ImageList values are
+        DeferredValue handles. Those records aren't cached, so invalidating a
+        material never leaves a loaded handle in the cache.
+        """
+        if self._mirror is None:
+            return self._db.getMaterialRecords(uuids, lazy)
+        return self._getMirroredRecords("material", uuids, self._db.getMaterialRecords)
+
+    def buildMaterial(self, record: dict) -> MaterialObjectType:
+        """Builds a material from a record, reading any deferred values in one batch"""
+        return self._db.buildMaterial(record)
+
+    def getMaterialArrays(self, uuids: list[str], names: list[str] | None = None) -> dict[str, dict[str, Any]]:
+        """
+        Returns the array properties of the materials as NumPy arrays, for
+        callers that want the numbers rather than the materials
+        """
+        if self._mirror is None:
+            return self._db.getMaterialArrays(uuids, names)
+
+        records = self._getMirroredRecords("material", uuids, self._db.getMaterialRecords)
+        arrays = {}
+        for uuid, record in records.items():
+            materialArrays = self._db.numericArrays(record["properties"], names)
+            if materialArrays:
+                arrays[uuid] = materialArrays
+        return arrays
 
     def addMaterial(self, libraryName: str, path: str, material: Materials.Material) -> None:
         print("addMaterial('{}', '{}', '{}')".format(libraryName, path, material.Name))
         self._db.createMaterial(libraryName, path, material)
+        self._mirrorWrite([("material", material.UUID)])
 
     def migrateMaterial(self, libraryName: str, path: str, material: Materials.Material) -> None:
         # print("migrateMaterial('{}', '{}', '{}')".format(libraryName, path, material.Name))
         try:
             self._db.createMaterial(libraryName, path, material)
+            self._mirrorLater()
         except DatabaseMaterialExistsError:
             # If it exists we just ignore
             print("Ignore DatabaseModelExistsError error")
             pass
 
+    #
+    # Bulk migration methods
+    #
+
+    def migrateModels(self, libraryName: str, models: Iterable[tuple[str, Materials.Model]],
+                      batchSize: int = 0, progress: Callable[[int, int], None] | None = None) -> int:
+        """
+        Migrates a stream of (path, model) pairs. Each batch is written in its
+        own transaction, so if the migration is interrupted the batches already
+        written are kept and are skipped when it is run again. progress is
+        called after each batch with the number of models read and created so
+        far. Returns the number of models created.
+
+        The stream is read as it is written. Only models read before the
+        models they inherit are held in memory until those are read.
+        """
+        # Write inherited models in earlier batches
+        models = dependencyStream(models, lambda item: item[1].UUID, lambda item: list(item[1].Inherited))
+        return self._migrate(models, batchSize, lambda batch: self._db.createModels(libraryName, batch), progress)
+
+    def migrateMaterials(self, libraryName: str, materials: Iterable[tuple[str, Materials.Material]],
+                         batchSize: int = 0, progress: Callable[[int, int], None] | None = None) -> int:
+        """
+        Migrates a stream of (path, material) pairs in the same way as
+        migrateModels(). Returns the number of materials created.
+        """
+        # Write parents in earlier batches
+        materials = dependencyStream(materials, lambda item: item[1].UUID, self._materialParent)
+        return self._migrate(materials, batchSize, lambda batch: self._db.createMaterials(libraryName, batch), progress)
+
+    def migrateLibrary(self, libraryName: str, models: Iterable[tuple[str, Materials.Model]],
+                       materials: Iterable[tuple[str, Materials.Material]],
+                       batchSize: int = 0, progress: Callable[[int, int], None] | None = None) -> tuple[int, int]:
+        """
+        Migrates the models and then the materials of a library, so the models
+        exist before the materials that use them, then checks the library for
+        references that couldn't be satisfied. Returns the number of models
+        and materials created.
+        """
+        created = (self.migrateModels(libraryName, models, batchSize, progress),
+                   self.migrateMaterials(libraryName, materials, batchSize, progress))
+        self._reportConsistency(libraryName)
+        return created
+
+    def migrateLibraryParallel(self, libraryName: str, models: Iterable[tuple[str, Materials.Model]],
+                               materials: Iterable[tuple[str, Materials.Material]],
+                               workers: int = 0, batchSize: int = 0,
+                               progress: Callable[[int, int], None] | None = None) -> tuple[int, int]:
+        """
+        Migrates a library using a pool of worker threads, each writing
+        batches over its own connection.
+
+        The models are migrated first, so the materials' references to them
+        are satisfied. Materials are then grouped by folder, the folders are
+        created up front so the workers never race to create the same folder,
+        and the batches are shared among the workers. Finally the library is
+        checked for references the disabled foreign keys may have let through.
+        Returns the number of models and materials created.
+        """
+        createdModels = self.migrateModels(libraryName, models, batchSize, progress)
+        createdMaterials = self.migrateMaterialsParallel(libraryName, materials, workers, batchSize, progress)
+        self._reportConsistency(libraryName)
+        return createdModels, createdMaterials
+
+    def migrateMaterialsParallel(self, libraryName: str, materials: Iterable[tuple[str, Materials.Material]],
+                                 workers: int = 0, batchSize: int = 0,
+                                 progress: Callable[[int, int], None] | None = None) -> int:
+        """
+        Migrates a stream of (path, material) pairs using a pool of worker
+        threads. The models the materials use should already be migrated.
+        Materials are written in waves, each only after the wave holding their
+        parents has been committed. The stream is read a wave at a time, and
+        as with migrateMaterials() only materials read before their parents
+        are held back. Restarting an interrupted migration skips the batches
+        already written. Returns the number of materials created.
+        """
+        prefs = getPreferencesLocation()
+        if workers <= 0:
+            workers = FreeCAD.ParamGet(prefs).GetInt("MigrationWorkers", 0)
+        if workers <= 0:
+            # The workers mostly wait on the database
+            workers = min(8, os.cpu_count() or 1)
+        # Each worker needs its own pooled connection
+        workers = max(1, min(workers, FreeCAD.ParamGet(prefs).GetInt("PoolMaxSize", 8)))
+        if batchSize <= 0:
+            batchSize = max(1, FreeCAD.ParamGet(prefs).GetInt("MigrationBatchSize", 500))
+
+        def write(batch : list[tuple[str, Materials.Material]]) -> int:
+            try:
+                return self._db.createMaterials(libraryName, batch)
+            finally:
+                # Hand the connection back for the next batch
+                self._db._release()
+
+        read = 0
+        created = 0
+        waves = dependencyWaves(materials, lambda item: item[1].UUID, self._materialParent, workers * batchSize)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = {}
+            for window in waves:
+                self._db.createFolders(libraryName, [path for path, _ in window])
+                self._db._release()
+                for batch in self._folderBatches(window, batchSize):
+                    pending[executor.submit(write, batch)] = len(batch)
+
+                # Finish the window before starting the next, so parents are
+                # committed before any worker writes their children
+                done, _ = wait(pending.keys(), return_when=FIRST_EXCEPTION)
+                for future in done:
+                    created += future.result()
+                    read += pending.pop(future)
+                if progress is not None:
+                    progress(read, created)
+
+        self._mirrorChanges()
+        return created
+
+    def checkConsistency(self, libraryName: str) -> dict[str, list[tuple[str, str]]]:
+        return self._db.checkConsistency(libraryName)
+
+    def modelHashes(self, libraryName: str) -> dict[str, str | None]:
+        return self._db.modelHashes(libraryName)
+
+    def materialHashes(self, libraryName: str) -> dict[str, str | None]:
+        return self._db.materialHashes(libraryName)
+
+    def modelContentHash(self, model: Materials.Model) -> str:
+        return self._db.modelContentHash(model)
+
+    def materialContentHash(self, material: Materials.Material) -> str:
+        return self._db.materialContentHash(material)
+
+    def updateContentHashes(self) -> int:
+        return self._db.updateContentHashes()
+
+    def collectBlobs(self) -> int:
+        return self._db.collectBlobs()
+
+    def recompress(self, progress: Callable[[int], None] | None = None) -> int:
+        return self._db.recompress(progress)
+
+    def changedModels(self, libraryName: str,
+                      models: Iterable[tuple[str, Materials.Model]]) -> list[tuple[str, Materials.Model]]:
+        """
+        Returns the (path, model) pairs that are missing from the library,
+        differ from the stored copy, or are stored in another folder. The
+        stored hashes and folders are read in a query each.
+        """
+        hashes = self.modelHashes(libraryName)
+        folders = self._db.modelFolders(libraryName)
+        return [item for item in models if hashes.get(item[1].UUID) != self.modelContentHash(item[1]) or
+                folders.get(item[1].UUID) != self._folderPath(item[0])]
+
+    def changedMaterials(self, libraryName: str,
+                         materials: Iterable[tuple[str, Materials.Material]]) -> list[tuple[str, Materials.Material]]:
+        """Returns the (path, material) pairs that are missing from the library, have changed or have moved"""
+        hashes = self.materialHashes(libraryName)
+        folders = self._db.materialFolders(libraryName)
+        return [item for item in materials if hashes.get(item[1].UUID) != self.materialContentHash(item[1]) or
+                folders.get(item[1].UUID) != self._folderPath(item[0])]
+
+    def _folderPath(self, path : str) -> str:
+        """Returns the path as stored in the folder table"""
+        # A leading "/" is ignored, as when the path is created
+        if path.startswith("/"):
+            return path[1:]
+        return path
+
+    def _reportConsistency(self, libraryName : str) -> None:
+        for kind, references in self.checkConsistency(libraryName).items():
+            for uuid, missing in references:
+                FreeCAD.Console.PrintWarning("{0} '{1}' references missing '{2}'\n".format(kind, uuid, missing))
+
+    def _materialParent(self, item : tuple[str, Materials.Material]) -> list[str]:
+        parent = item[1].Parent
+        return [parent] if parent else []
+
+    def _folderBatches(self, window : list[tuple[str, Any]], batchSize : int) -> list[list[tuple[str, Any]]]:
+        """Splits the items into batches, keeping the items in a folder together where possible"""
+        folders = {}
+        for path, item in window:
+            folders.setdefault(path, []).append((path, item))
+
+        batches = []
+        batch = []
+        for items in folders.values():
+            # Large folders are split across batches
+            for start in range(0, len(items), batchSize):
+                part = items[start:start + batchSize]
+                if batch and len(batch) + len(part) > batchSize:
+                    batches.append(batch)
+                    batch = []
+                batch.extend(part)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _migrate(self, stream : Iterable[Any], batchSize : int, write : Callable[[list[Any]], int],
+                 progress : Callable[[int, int], None] | None) -> int:
+        if batchSize <= 0:
+            prefs = getPreferencesLocation()
+            batchSize = max(1, FreeCAD.ParamGet(prefs).GetInt("MigrationBatchSize", 500))
+
+        read = 0
+        created = 0
+        batch = []
+        for item in stream:
+            batch.append(item)
+            if len(batch) >= batchSize:
+                created += write(batch)
+                read += len(batch)
+                batch = []
+                if progress is not None:
+                    progress(read, created)
+        if batch:
+            created += write(batch)
+            read += len(batch)
+            if progress is not None:
+                progress(read, created)
+
+        self._mirrorChanges()
+        return created
+
     def updateMaterial(self, libraryName: str, path: str, material: Materials.Material) -> None:
         print("updateMaterial('{}', '{}', '{}')".format(libraryName, path, material.Name))
         self._db.updateMaterial(libraryName, path, material)
+        self._mirrorWrite([("material", material.UUID)])
+        self._cache.invalidate(("material", material.UUID))
 
     def setMaterialPath(self, libraryName: str, path: str, uuid: str) -> None:
         print("setMaterialPath('{}', '{}', '{}')".format(libraryName, path, uuid))
         self._db.setMaterialPath(libraryName, path, uuid)
+        self._mirrorWrite([("material", uuid)])
+        self._cache.invalidate(("material", uuid))
 
     def renameMaterial(self, libraryName: str, name: str, uuid: str) -> None:
         print("renameMaterial('{}', '{}', '{}')".format(libraryName, name, uuid))
         self._db.renameMaterial(libraryName, name, uuid)
+        self._mirrorWrite([("material", uuid)])
+        self._cache.invalidate(("material", uuid))
 
     def moveMaterial(self, libraryName: str, path: str, uuid: str) -> None:
         print("moveMaterial('{}', '{}', '{}')".format(libraryName, path, uuid))
         self._db.moveMaterial(libraryName, path, uuid)
+        self._mirrorWrite([("material", uuid)])
+        self._cache.invalidate(("material", uuid))
 
     def removeMaterial(self, uuid: str) -> None:
         print("removeMaterial('{}')".format(uuid))
         self._db.removeMaterial(uuid)
+        self._mirrorWrite([("material", uuid)])
+        self._cache.invalidate(("material", uuid))
 
     def materialExists(self, libraryName : str, uuid: str) -> bool:
         print("materialExists('{}')".format(uuid))
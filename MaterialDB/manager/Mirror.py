@@ -0,0 +1,141 @@
+# ***************************************************************************
+# *   Copyright (c) 2024 David Carter <dcarter@davidcarter.ca>              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+"""Class for keeping a local copy of the database"""
+
+__author__ = "David Carter"
+__url__ = "https://www.davesrocketshop.com"
+
+import json
+import os
+import sqlite3
+import threading
+
+class LocalMirror:
+    """
+    A local SQLite copy of the libraries, models and materials. Objects are
+    stored as the plain records returned by the database, keyed by kind
+    ("model" or "material") and UUID. The sequence is that of the last
+    change log entry applied, or None when the mirror has never been
+    loaded.
+    """
+
+    def __init__(self, path : str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS mirror_state ("
+                                     "state_key TEXT NOT NULL PRIMARY KEY, state_value TEXT)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS library ("
+                                     "library_name TEXT NOT NULL PRIMARY KEY, library_icon BLOB, "
+                                     "library_read_only INTEGER NOT NULL DEFAULT 0)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS object ("
+                                     "object_kind TEXT NOT NULL, object_id TEXT NOT NULL, "
+                                     "library_name TEXT NOT NULL, folder_path TEXT, object_name TEXT, "
+                                     "object_record TEXT NOT NULL, "
+                                     "PRIMARY KEY (object_kind, object_id))")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS object_library_index "
+                                     "ON object (object_kind, library_name)")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def sequence(self) -> int | None:
+        with self._lock:
+            row = self._connection.execute("SELECT state_value FROM mirror_state "
+                                           "WHERE state_key = 'sequence'").fetchone()
+        if row is None:
+            return None
+        return int(row[0])
+
+    def setSequence(self, sequence : int) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO mirror_state (state_key, state_value) "
+                                     "VALUES ('sequence', ?)", (str(sequence),))
+
+    def libraries(self, kind : str | None = None) -> list[tuple[str, bytes | None, bool]]:
+        """
+        Returns (name, icon, read only) tuples. When kind is given only the
+        libraries holding objects of that kind are returned.
+        """
+        sql = "SELECT library_name, library_icon, library_read_only FROM library l"
+        params = []
+        if kind is not None:
+            sql += " WHERE EXISTS (SELECT 1 FROM object o WHERE o.object_kind = ? AND o.library_name = l.library_name)"
+            params.append(kind)
+        with self._lock:
+            rows = self._connection.execute(sql + " ORDER BY library_name", params).fetchall()
+        return [(name, icon, bool(readOnly)) for name, icon, readOnly in rows]
+
+    def setLibraries(self, libraries : list[tuple[str, bytes | None, bool]]) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM library")
+            self._connection.executemany("INSERT INTO library (library_name, library_icon, library_read_only) "
+                                         "VALUES (?, ?, ?)", libraries)
+
+    def record(self, kind : str, uuid : str) -> dict | None:
+        return self.records(kind, [uuid]).get(uuid)
+
+    def records(self, kind : str, uuids : list[str]) -> dict[str, dict]:
+        """Returns the records that are in the mirror, keyed by UUID"""
+        records = {}
+        uuids = list(dict.fromkeys(uuids))
+        with self._lock:
+            # Stay below the SQLite limit on host parameters
+            for index in range(0, len(uuids), 500):
+                chunk = uuids[index:index + 500]
+                rows = self._connection.execute("SELECT object_id, object_record FROM object "
+                                                "WHERE object_kind = ? AND object_id IN ({})".format(
+                                                    ", ".join(["?"] * len(chunk))),
+                                                [kind] + chunk).fetchall()
+                for uuid, record in rows:
+                    records[uuid] = json.loads(record)
+        return records
+
+    def putRecords(self, kind : str, records : dict[str, dict]) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR REPLACE INTO object (object_kind, object_id, library_name, "
+                                         "folder_path, object_name, object_record) VALUES (?, ?, ?, ?, ?, ?)",
+                                         [(kind, uuid, record["library"], record["folder"], record["name"],
+                                           json.dumps(record)) for uuid, record in records.items()])
+
+    def remove(self, kind : str, uuids : list[str]) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany("DELETE FROM object WHERE object_kind = ? AND object_id = ?",
+                                         [(kind, uuid) for uuid in uuids])
+
+    def removeLibrary(self, libraryName : str) -> None:
+        """Removes the objects in the library, but not the library itself"""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM object WHERE library_name = ?", (libraryName,))
+
+    def libraryObjects(self, kind : str, libraryName : str) -> list[tuple[str, str, str]]:
+        """Returns (uuid, folder, name) tuples for the objects in the library"""
+        with self._lock:
+            return self._connection.execute("SELECT object_id, folder_path, object_name FROM object "
+                                            "WHERE object_kind = ? AND library_name = ? ORDER BY object_id",
+                                            (kind, libraryName)).fetchall()
@@ -28,8 +28,12 @@ from MaterialDB.UI.Commands.CmdTest import CmdTest
 from MaterialDB.UI.Commands.CmdCreate import CmdCreate
 from MaterialDB.UI.Commands.CmdManageUsers import CmdManageUsers
 from MaterialDB.UI.Commands.CmdMigrate import CmdMigrate
+from MaterialDB.UI.Commands.CmdRecompress import CmdRecompress
+from MaterialDB.UI.Commands.CmdUpgrade import CmdUpgrade
 
 FreeCADGui.addCommand('MaterialDB_Test', CmdTest())
 FreeCADGui.addCommand('MaterialDB_CreateDatabase', CmdCreate())
 FreeCADGui.addCommand('MaterialDB_Migrate', CmdMigrate())
+FreeCADGui.addCommand('MaterialDB_Upgrade', CmdUpgrade())
+FreeCADGui.addCommand('MaterialDB_Recompress', CmdRecompress())
 FreeCADGui.addCommand('MaterialDB_ManageUsers', CmdManageUsers())
@@ -15,6 +15,7 @@ DROP TABLE IF EXISTS folder;
 CREATE TABLE folder (
 	folder_id INTEGER AUTO_INCREMENT NOT NULL PRIMARY KEY,
 	folder_name VARCHAR(512) NOT NULL,
+	folder_path VARCHAR(1024) NOT NULL DEFAULT '',
 	library_id INTEGER NOT NULL,
 	parent_id INTEGER,
 	FOREIGN KEY (library_id)
@@ -24,9 +25,11 @@ CREATE TABLE folder (
         REFERENCES folder(folder_id)
 		ON DELETE CASCADE
 );
+CREATE INDEX folder_path_index ON folder (library_id, folder_path(255));
 
 DROP TABLE IF EXISTS model;
 DROP INDEX IF EXISTS model_model_id_index;
+DROP INDEX IF EXISTS model_hash_index;
 CREATE TABLE model (
     model_id CHAR(36) NOT NULL,
 	library_id INTEGER NOT NULL,
@@ -36,6 +39,7 @@ CREATE TABLE model (
 	model_url VARCHAR(255),
 	model_description TEXT,
 	model_doi VARCHAR(255),
+	model_hash CHAR(64),
     PRIMARY KEY (model_id, library_id),
 	FOREIGN KEY (library_id)
         REFERENCES library(library_id)
@@ -45,12 +49,14 @@ CREATE TABLE model (
 		ON DELETE RESTRICT
 );
 CREATE INDEX model_model_id_index ON model (model_id);
+CREATE INDEX model_hash_index ON model (library_id, model_hash);
 
 DROP TABLE IF EXISTS model_inheritance;
 CREATE TABLE model_inheritance (
 	model_inheritance_id INTEGER AUTO_INCREMENT NOT NULL PRIMARY KEY,
 	model_id CHAR(36) NOT NULL,
 	inherits_id CHAR(36) NOT NULL,
+	UNIQUE KEY model_inheritance_unique (model_id, inherits_id),
 	FOREIGN KEY (model_id)
         REFERENCES model(model_id)
 		ON DELETE CASCADE,
@@ -69,6 +75,7 @@ CREATE TABLE model_property (
 	model_property_units VARCHAR(255) NOT NULL,
 	model_property_url VARCHAR(255) NOT NULL,
 	model_property_description TEXT,
+	UNIQUE KEY model_property_unique (model_id, model_property_name),
 	FOREIGN KEY (model_id)
         REFERENCES model(model_id)
 		ON DELETE CASCADE
@@ -84,6 +91,7 @@ CREATE TABLE model_property_column (
 	model_property_units VARCHAR(255) NOT NULL,
 	model_property_url VARCHAR(255) NOT NULL,
 	model_property_description TEXT,
+	UNIQUE KEY model_property_column_unique (model_property_id, model_property_name),
 	FOREIGN KEY (model_property_id)
         REFERENCES model_property(model_property_id)
 		ON DELETE CASCADE
@@ -91,6 +99,7 @@ CREATE TABLE model_property_column (
 
 DROP TABLE IF EXISTS material;
 DROP INDEX IF EXISTS material_material_id_index;
+DROP INDEX IF EXISTS material_hash_index;
 CREATE TABLE material (
     material_id CHAR(36) NOT NULL,
 	library_id INTEGER NOT NULL,
@@ -102,6 +111,7 @@ CREATE TABLE material (
 	material_description TEXT,
 	material_url VARCHAR(255),
 	material_reference VARCHAR(255),
+	material_hash CHAR(64),
     PRIMARY KEY (material_id, library_id),
 	FOREIGN KEY (library_id)
         REFERENCES library(library_id)
@@ -114,6 +124,7 @@ CREATE TABLE material (
 		ON DELETE RESTRICT
 );
 CREATE INDEX material_material_id_index ON material (material_id);
+CREATE INDEX material_hash_index ON material (library_id, material_hash);
 
 DROP TABLE IF EXISTS material_tag;
 CREATE TABLE material_tag (
@@ -154,6 +165,7 @@ CREATE TABLE material_property_value (
 	material_id CHAR(36) NOT NULL,
 	material_property_name VARCHAR(255) NOT NULL,
 	material_property_type VARCHAR(255) NOT NULL,
+	UNIQUE KEY material_property_value_unique (material_id, material_property_name),
 	FOREIGN KEY (material_id)
         REFERENCES material(material_id)
 		ON DELETE CASCADE
@@ -164,20 +176,37 @@ DROP TABLE IF EXISTS material_property_string_value;
 CREATE TABLE material_property_string_value (
     material_property_string_value_id INTEGER AUTO_INCREMENT NOT NULL PRIMARY KEY,
 	material_property_value_id INTEGER NOT NULL,
+	material_property_value_index INTEGER NOT NULL DEFAULT 0,
 	material_property_value TEXT NOT NULL,
+	material_property_value_codec VARCHAR(16) NOT NULL DEFAULT '',
+	material_property_value_data LONGBLOB,
+	UNIQUE KEY material_property_string_value_unique (material_property_value_id, material_property_value_index),
 	FOREIGN KEY (material_property_value_id)
         REFERENCES material_property_value(material_property_value_id)
 		ON DELETE CASCADE
 );
 
+DROP TABLE IF EXISTS blob_store;
+CREATE TABLE blob_store (
+    blob_hash CHAR(64) NOT NULL PRIMARY KEY,
+	blob_codec VARCHAR(16) NOT NULL DEFAULT '',
+	blob_size INTEGER NOT NULL,
+	blob_data LONGBLOB NOT NULL
+);
+
 DROP TABLE IF EXISTS material_property_long_string_value;
 CREATE TABLE material_property_long_string_value (
     material_property_long_string_value_id INTEGER AUTO_INCREMENT NOT NULL PRIMARY KEY,
 	material_property_value_id INTEGER NOT NULL,
+	material_property_value_index INTEGER NOT NULL DEFAULT 0,
 	material_property_value MEDIUMTEXT NOT NULL,
+	blob_hash CHAR(64),
+	UNIQUE KEY material_property_long_string_value_unique (material_property_value_id, material_property_value_index),
 	FOREIGN KEY (material_property_value_id)
         REFERENCES material_property_value(material_property_value_id)
-		ON DELETE CASCADE
+		ON DELETE CASCADE,
+	CONSTRAINT material_property_long_string_value_blob FOREIGN KEY (blob_hash)
+        REFERENCES blob_store(blob_hash)
 );
 
 DROP TABLE IF EXISTS material_property_array_description;
@@ -206,6 +235,33 @@ CREATE TABLE material_property_array_value (
 		ON DELETE CASCADE
 );
 
+DROP TABLE IF EXISTS material_property_array_packed;
+CREATE TABLE material_property_array_packed (
+    material_property_value_id INTEGER NOT NULL PRIMARY KEY,
+	material_property_array_codec VARCHAR(16) NOT NULL DEFAULT '',
+	material_property_array_data LONGBLOB NOT NULL,
+	FOREIGN KEY (material_property_value_id)
+        REFERENCES material_property_value(material_property_value_id)
+		ON DELETE CASCADE
+);
+
+DROP TABLE IF EXISTS change_log;
+CREATE TABLE change_log (
+    change_id BIGINT AUTO_INCREMENT NOT NULL PRIMARY KEY,
+	change_time TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+	change_object ENUM('library', 'folder', 'model', 'material') NOT NULL,
+	change_type ENUM('create', 'update', 'rename', 'delete') NOT NULL,
+	library_name VARCHAR(512) NOT NULL,
+	change_key VARCHAR(1024) NOT NULL,
+	change_old_key VARCHAR(1024)
+);
+
+DROP TABLE IF EXISTS change_sequence;
+CREATE TABLE change_sequence (
+    change_id BIGINT NOT NULL
+);
+INSERT INTO change_sequence (change_id) VALUES (0);
+
 DELIMITER //
 DROP FUNCTION IF EXISTS GetFolder//
 CREATE FUNCTION GetFolder(id INTEGER)
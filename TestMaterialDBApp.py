@@ -24,7 +24,19 @@ __url__ = "https://www.davesrocketshop.com"
 
 import unittest
 
+from MaterialDB.Tests.TestBlobStore import BlobStoreTests
+from MaterialDB.Tests.TestCache import CacheTests
+from MaterialDB.Tests.TestCodec import CodecTests
+from MaterialDB.Tests.TestContentHash import ContentHashTests
+from MaterialDB.Tests.TestDeferredValue import DeferredValueTests
+from MaterialDB.Tests.TestDependencyOrder import DependencyOrderTests
+from MaterialDB.Tests.TestFolderIndex import FolderIndexTests
+from MaterialDB.Tests.TestMirror import MirrorTests
+from MaterialDB.Tests.TestMySQLNativeConnection import MySQLNativeConnectionTests
+from MaterialDB.Tests.TestNumericArray import NumericArrayTests
+from MaterialDB.Tests.TestPackedArray import PackedArrayTests
 from MaterialDB.Tests.MySQL.TestMySQL import MySQLTests
+from MaterialDB.Tests.SQLite.TestSQLite import SQLiteTests
 
 def runMaterialDBUnitTests():
     suite = unittest.TestSuite()